@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Adaptive Concurrency for SD WebUI Backends
+WebUI 後端自適應並行控制
+
+Each backend gets an AIMD limiter on in-flight requests. The limit grows by
+about one request per round trip while latency stays near the no-load
+baseline, and shrinks multiplicatively on errors or when latency climbs past
+`tolerance × baseline` (requests are queueing on the GPU). Optional polling
+of /sdapi/v1/progress blocks growth while the server reports a backlog.
+Request timeouts follow observed latency instead of a flat 300 s.
+
+Usage:
+    pool = BackendPool(["http://127.0.0.1:7860", "http://gpu2:7860"], max_concurrency=4)
+    backend = pool.acquire()
+    try:
+        response = backend.session.post(f"{backend.api_url}/txt2img", json=payload,
+                                        timeout=backend.limiter.timeout())
+    finally:
+        pool.release(backend, latency, ok)
+"""
+
+import threading
+import time
+from typing import List, Optional
+
+class AdaptiveLimiter:
+    """AIMD limit with a latency gradient; not thread-safe on its own (see BackendPool)"""
+
+    def __init__(self, initial=1, min_limit=1, max_limit=4, tolerance=1.5, backoff=0.7,
+                 min_timeout=30.0, max_timeout=300.0, timeout_factor=4.0):
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_factor = timeout_factor
+        self.inflight = 0
+        self.baseline = None  # no-load latency estimate
+        self.smoothed = None  # EWMA of recent latency
+        self.congested = False  # server-reported backlog (progress polling)
+
+    def headroom(self) -> int:
+        return int(self.limit) - self.inflight
+
+    def on_start(self):
+        self.inflight += 1
+
+    def on_done(self, latency: Optional[float], ok: bool):
+        """Update the limit from one finished request"""
+        was_saturated = self.inflight >= int(self.limit)
+        self.inflight -= 1
+
+        if not ok:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            return
+        if latency is None:
+            return
+
+        self.smoothed = latency if self.smoothed is None else 0.8 * self.smoothed + 0.2 * latency
+        if self.baseline is None or latency < self.baseline:
+            self.baseline = latency
+        else:
+            # Drift up slowly so a slower model or larger image resets the baseline
+            self.baseline += (self.smoothed - self.baseline) * 0.02
+
+        gradient = self.baseline / self.smoothed if self.smoothed else 1.0
+        if gradient * self.tolerance < 1.0:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        elif was_saturated and not self.congested:
+            # Only grow when the current limit is actually being used
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def timeout(self) -> float:
+        """Request timeout derived from observed latency"""
+        if self.smoothed is None:
+            return self.max_timeout
+        expected = max(self.smoothed, self.baseline or 0.0) * self.timeout_factor
+        return max(self.min_timeout, min(self.max_timeout, expected))
+
+class Backend:
+    """One WebUI instance with its own session and limiter"""
+
+    def __init__(self, webui_url: str, limiter: AdaptiveLimiter):
+        self.url = webui_url.rstrip("/")
+        self.api_url = f"{self.url}/sdapi/v1"
+        # requests is imported here rather than at module load to keep CLI startup fast
+        import requests
+        self.session = requests.Session()
+        self.limiter = limiter
+        self.poll_progress = True
+
+class BackendPool:
+    """Hands out request slots on whichever backend has the most headroom"""
+
+    def __init__(self, urls: List[str], max_concurrency: int = 4, initial: int = 1):
+        self.backends = [Backend(url, AdaptiveLimiter(initial=initial, max_limit=max_concurrency))
+                         for url in urls]
+        self.max_concurrency = max_concurrency * len(self.backends)
+        self._cond = threading.Condition()
+        self._poller = None
+
+    def acquire(self, cancel=None) -> Optional[Backend]:
+        """Block until a backend slot is free; None if cancelled first"""
+        with self._cond:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    return None
+                backend = max(self.backends, key=lambda b: b.limiter.headroom())
+                if backend.limiter.headroom() > 0:
+                    backend.limiter.on_start()
+                    return backend
+                self._cond.wait(timeout=0.5)
+
+    def release(self, backend: Backend, latency: Optional[float], ok: bool):
+        with self._cond:
+            before = int(backend.limiter.limit)
+            backend.limiter.on_done(latency, ok)
+            after = int(backend.limiter.limit)
+            self._cond.notify_all()
+        if after != before:
+            print(f"  📶 {backend.url}: concurrency {before} → {after}")
+
+    def limits(self) -> dict:
+        with self._cond:
+            return {b.url: round(b.limiter.limit, 2) for b in self.backends}
+
+    def start_progress_polling(self, interval: float = 2.0):
+        """Poll /sdapi/v1/progress and hold back growth while a backlog is reported"""
+        if self._poller is not None:
+            return
+
+        def poll():
+            while True:
+                for backend in self.backends:
+                    if backend.poll_progress:
+                        self._poll_backend(backend)
+                time.sleep(interval)
+
+        self._poller = threading.Thread(target=poll, daemon=True)
+        self._poller.start()
+
+    def _poll_backend(self, backend: Backend):
+        import requests
+
+        try:
+            response = backend.session.get(f"{backend.api_url}/progress",
+                                           params={"skip_current_image": "true"}, timeout=5)
+        except requests.exceptions.RequestException:
+            return
+        if response.status_code == 404:
+            backend.poll_progress = False
+            return
+        if response.status_code != 200:
+            return
+
+        try:
+            eta = float(response.json().get("eta_relative") or 0.0)
+        except (ValueError, AttributeError, TypeError):
+            # Not JSON (a proxy error page) or not the expected object: skip this poll
+            return
+        with self._cond:
+            limiter = backend.limiter
+            # Remaining work longer than a tolerated request means requests are queueing
+            limiter.congested = bool(limiter.baseline and eta > limiter.tolerance * limiter.baseline)
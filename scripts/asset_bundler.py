@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+Content-Hashed Asset Bundler
+內容雜湊素材打包工具
+
+Groups the files the game currently fetches one by one (tileset.json, level
+JSONs, manifests, hundreds of PNG frames) into per-level bundles:
+
+    <bundle>.atlas-<n>.<hash>.png   packed, alpha-trimmed texture atlas pages
+    <bundle>.levels.<hash>.lvl      the bundle's LVL1 levels (see level_compiler.py), concatenated
+    <bundle>.<hash>.json            merged JSON: metadata files + atlas frames
+
+File names carry the first 12 hex digits of their SHA-256, so browsers and
+CDNs can cache them forever. bundle-manifest.json maps every logical path
+(e.g. "assets/levels/Level1.json") to its hashed URL (plus the atlas rect for
+images). A bundle is only rebuilt when one of its inputs or its settings
+change; --dry-run reports per-bundle bytes and request counts.
+
+Images already packed into the "common" bundle are not duplicated in level
+bundles.
+
+Usage:
+    python asset_bundler.py
+    python asset_bundler.py --dry-run
+    python asset_bundler.py --config bundles.json --output ../dist/bundles --atlas-size 4096
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+from PIL import Image
+
+from atomic_io import atomic_write
+from level_compiler import (COMPILER_VERSION, GID_MASK, LevelCompileError, file_hash, level_to_binary,
+                            load_tile_catalog, optimize_level, parse_map_json, parse_tmx)
+
+BUNDLER_VERSION = 1
+CACHE_FILE = ".bundle-cache.json"
+HASH_LENGTH = 12
+
+# Mirrors DEFAULT_LEVELS in src/world/level-manager.js; override with --config
+DEFAULT_BUNDLES = {
+    "common": {
+        "data": ["assets/tileset.json", "assets/asset-index.json", "assets/characters/*/manifest.json"],
+        "images": ["assets/freetileset/png/Tiles/*.png", "assets/sprites/player/JackOLantern/*/*.png"],
+        "tileset": "assets/tileset.json",
+    },
+    "demo-ground-sky": {
+        "levels": ["assets/levels/ground-layer.json", "assets/levels/sky-layer.json"],
+    },
+    "level1": {
+        "levels": ["assets/levels/Level1.json", "assets/levels/skylevel1.json"],
+    },
+    "platform-test": {
+        "levels": ["assets/levels/platformer-level1.json", "assets/levels/skylevel2.json"],
+    },
+}
+
+def content_name(stem: str, suffix: str, data: bytes) -> str:
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{suffix}"
+
+def expand(patterns, root: Path) -> List[Path]:
+    """Resolve glob patterns (relative to the project root) to existing files, in order"""
+    seen, files = set(), []
+    for pattern in patterns:
+        matches = sorted(root.glob(pattern)) if any(c in pattern for c in "*?[") else [root / pattern]
+        for path in matches:
+            if path.is_file() and path not in seen:
+                seen.add(path)
+                files.append(path)
+    return files
+
+def logical(path: Path, root: Path) -> str:
+    return Path(os.path.relpath(path.resolve(), root.resolve())).as_posix()
+
+# ----------------------------------------------------------------------
+# Level inputs
+# ----------------------------------------------------------------------
+
+def load_level(path: Path, root: Path) -> dict:
+    level = parse_tmx(path, root) if path.suffix.lower() == ".tmx" else parse_map_json(path, root)
+    return optimize_level(level, catalog=load_tile_catalog(root))
+
+def level_images(level: dict, tileset: dict) -> List[str]:
+    """Project paths of every tile image a level actually uses"""
+    used = set()
+    for layer in level["layers"]:
+        if layer["type"] == "tilelayer":
+            used.update(gid & GID_MASK for gid in layer["data"])
+    used.discard(0)
+
+    images = {}
+    if level["tilesets"]:
+        for ts in level["tilesets"]:
+            for tile_id, tile in ts["tiles"].items():
+                if tile.get("image"):
+                    images[ts["firstgid"] + int(tile_id)] = tile["image"]
+    else:
+        # Maps without tilesets index straight into assets/tileset.json
+        images = {int(gid): tile["path"] for gid, tile in tileset.get("tiles", {}).items()}
+    return sorted({images[gid] for gid in used if gid in images})
+
+# ----------------------------------------------------------------------
+# Atlas packing
+# ----------------------------------------------------------------------
+
+def trimmed(path: Path):
+    """Load an image and crop it to its alpha bounds; returns (image, [ox, oy, sw, sh])"""
+    with Image.open(path) as img:
+        img = img.convert("RGBA")
+    box = img.getchannel("A").getbbox() or (0, 0, 1, 1)
+    return img.crop(box), [box[0], box[1], img.width, img.height]
+
+def pack_atlas(paths: List[Path], root: Path, max_size=2048, padding=2):
+    """Shelf-pack trimmed images into as many max_size pages as needed
+
+    Returns (pages, frames) where frames[logical path] =
+    {"page", "rect": [x, y, w, h], "offset": [ox, oy], "source": [sw, sh]}.
+    """
+    sprites = []
+    for path in paths:
+        img, (ox, oy, sw, sh) = trimmed(path)
+        if img.width + padding > max_size or img.height + padding > max_size:
+            raise ValueError(f"{path} ({img.width}x{img.height}) does not fit a {max_size}px atlas page")
+        sprites.append((logical(path, root), img, ox, oy, sw, sh))
+    sprites.sort(key=lambda s: (-s[1].height, s[0]))
+
+    pages, placements, frames = [], [], {}
+    x = y = shelf_h = 0
+    page_w = page_h = 0
+    for name, img, ox, oy, sw, sh in sprites:
+        w, h = img.width + padding, img.height + padding
+        if x + w > max_size:
+            x, y, shelf_h = 0, y + shelf_h, 0
+        if not placements or y + h > max_size:
+            if placements:
+                pages.append((page_w, page_h, placements))
+            placements, x, y, shelf_h, page_w, page_h = [], 0, 0, 0, 0, 0
+        placements.append((img, x, y))
+        frames[name] = {"page": len(pages), "rect": [x, y, img.width, img.height],
+                        "offset": [ox, oy], "source": [sw, sh]}
+        x += w
+        shelf_h = max(shelf_h, h)
+        page_w, page_h = max(page_w, x), max(page_h, y + shelf_h)
+    if placements:
+        pages.append((page_w, page_h, placements))
+
+    images = []
+    for page_w, page_h, items in pages:
+        page = Image.new("RGBA", (page_w, page_h), (0, 0, 0, 0))
+        for img, px, py in items:
+            page.paste(img, (px, py))
+        images.append(page)
+    return images, frames
+
+def encode_png(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+# ----------------------------------------------------------------------
+# Bundles
+# ----------------------------------------------------------------------
+
+class BundleSpec:
+    """Resolved inputs of one bundle"""
+
+    def __init__(self, name: str, config: dict, root: Path):
+        self.name = name
+        self.root = root
+        self.levels = expand(config.get("levels", []), root)
+        self.data = expand(config.get("data", []), root)
+        self.images = expand(config.get("images", []), root)
+        self.tileset_path = root / config.get("tileset", "assets/tileset.json")
+
+    def add_level_images(self, exclude: set):
+        """Pull in tile images the levels reference, minus those bundled elsewhere"""
+        tileset = {}
+        if self.tileset_path.exists():
+            tileset = json.loads(self.tileset_path.read_text(encoding="utf-8"))
+        known = {p.resolve() for p in self.images}
+        for path in self.levels:
+            try:
+                level = load_level(path, self.root)
+            except LevelCompileError:
+                continue
+            for image in level_images(level, tileset):
+                image_path = (self.root / image)
+                if image_path.exists() and image_path.resolve() not in known | exclude:
+                    known.add(image_path.resolve())
+                    self.images.append(image_path)
+
+    def inputs(self) -> List[Path]:
+        return self.levels + self.data + self.images
+
+    def fingerprint(self, settings: dict) -> dict:
+        inputs = self.inputs()
+        if self.levels and self.tileset_path.exists():
+            # Compiled levels take their collision from tileset.json solid flags
+            inputs = inputs + [self.tileset_path]
+        return {
+            "version": BUNDLER_VERSION,
+            "compiler": COMPILER_VERSION,
+            "settings": settings,
+            "inputs": {logical(p, self.root): file_hash(p) for p in inputs},
+        }
+
+def build_bundle(spec: BundleSpec, output_dir: Path, atlas_size=2048, padding=2):
+    """Write one bundle; returns its manifest entry"""
+    files, assets = [], {}
+    start = time.perf_counter()
+
+    def emit(stem, suffix, data):
+        name = content_name(f"{spec.name}.{stem}" if stem else spec.name, suffix, data)
+        target = output_dir / name
+        if not target.exists():
+            atomic_write(target, data)
+        files.append({"url": name, "bytes": len(data)})
+        return name
+
+    merged = {"bundle": spec.name, "data": {}, "levels": {}, "atlas": {"pages": [], "frames": {}}}
+
+    if spec.images:
+        pages, frames = pack_atlas(spec.images, spec.root, atlas_size, padding)
+        urls = [emit(f"atlas-{i}", ".png", encode_png(page)) for i, page in enumerate(pages)]
+        merged["atlas"] = {"pages": urls, "frames": frames}
+        for name, frame in frames.items():
+            assets[name] = {"url": urls[frame["page"]], "rect": frame["rect"],
+                            "offset": frame["offset"], "source": frame["source"]}
+
+    if spec.levels:
+        # All levels of a bundle share one file; each LVL1 blob starts 4-byte aligned
+        pack, ranges = bytearray(), {}
+        for path in spec.levels:
+            pack.extend(b"\0" * (-len(pack) % 4))
+            blob = level_to_binary(load_level(path, spec.root))
+            ranges[logical(path, spec.root)] = [len(pack), len(blob)]
+            pack.extend(blob)
+        url = emit("levels", ".lvl", bytes(pack))
+        for name, (offset, length) in ranges.items():
+            merged["levels"][name] = {"url": url, "offset": offset, "length": length}
+            assets[name] = {"url": url, "offset": offset, "length": length, "format": "LVL1"}
+
+    for path in spec.data:
+        merged["data"][logical(path, spec.root)] = json.loads(path.read_text(encoding="utf-8"))
+
+    data_url = emit("", ".json", json.dumps(merged, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+    for path in spec.data:
+        assets[logical(path, spec.root)] = {"url": data_url, "key": logical(path, spec.root)}
+
+    return {
+        "files": files,
+        "data": data_url,
+        "assets": assets,
+        "bytes": sum(f["bytes"] for f in files),
+        "requests": len(files),
+        "sourceBytes": sum(p.stat().st_size for p in spec.inputs()),
+        "sourceRequests": len(spec.inputs()),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+class AssetBundler:
+    """Incremental builder for all bundles in a config"""
+
+    def __init__(self, config: Dict[str, dict], root, output_dir, atlas_size=2048, padding=2, jobs=None):
+        self.root = Path(root)
+        self.output_dir = Path(output_dir)
+        self.atlas_size = atlas_size
+        self.padding = padding
+        self.jobs = jobs or os.cpu_count() or 1
+        self.cache_path = self.output_dir / CACHE_FILE
+        self.manifest_path = self.output_dir / "bundle-manifest.json"
+
+        self.specs = {name: BundleSpec(name, cfg, self.root) for name, cfg in config.items()}
+        common = self.specs.get("common")
+        shared = {p.resolve() for p in common.images} if common else set()
+        for name, spec in self.specs.items():
+            spec.add_level_images(set() if name == "common" else shared)
+
+    def load_cache(self) -> dict:
+        try:
+            cache = json.loads(self.cache_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return {"version": BUNDLER_VERSION, "bundles": {}}
+        if cache.get("version") != BUNDLER_VERSION:
+            return {"version": BUNDLER_VERSION, "bundles": {}}
+        return cache
+
+    def plan(self, force=False):
+        """Return (stale, fresh, fingerprints)"""
+        cache = self.load_cache()
+        settings = {"atlasSize": self.atlas_size, "padding": self.padding}
+        stale, fresh, fingerprints = [], [], {}
+        for name, spec in self.specs.items():
+            fingerprint = spec.fingerprint(settings)
+            fingerprints[name] = fingerprint
+            previous = cache["bundles"].get(name, {})
+            outputs_exist = bool(previous.get("entry")) and all(
+                (self.output_dir / f["url"]).exists() for f in previous["entry"]["files"])
+            if not force and outputs_exist and previous.get("fingerprint") == fingerprint:
+                fresh.append(name)
+            else:
+                stale.append(name)
+        return stale, fresh, fingerprints
+
+    def report(self, stale, fresh):
+        cache = self.load_cache()
+        print(f"  {'bundle':<20} {'files':>6} {'source':>11} {'bundled':>11} {'requests':>10}")
+        for name, spec in self.specs.items():
+            inputs = spec.inputs()
+            source_bytes = sum(p.stat().st_size for p in inputs)
+            entry = cache["bundles"].get(name, {}).get("entry")
+            if name in fresh and entry:
+                bundled = f"{entry['bytes'] / 1024:>8.1f} KB"
+                requests = f"{len(inputs)} → {entry['requests']}"
+            else:
+                # Estimate: atlas pages unknown until packed, assume one
+                estimate = (1 if spec.images else 0) + (1 if spec.levels else 0) + 1
+                bundled = "rebuild"
+                requests = f"{len(inputs)} → ~{estimate}"
+            print(f"  {name:<20} {len(inputs):>6} {source_bytes / 1024:>8.1f} KB {bundled:>11} {requests:>10}")
+
+    def build(self, force=False, dry_run=False):
+        stale, fresh, fingerprints = self.plan(force)
+
+        print(f"\n{'='*70}")
+        print(f"📦 Asset Bundler")
+        print(f"{'='*70}")
+        print(f"Root:    {self.root}")
+        print(f"Output:  {self.output_dir}")
+        print(f"Bundles: {len(stale)} to build, {len(fresh)} up to date")
+        print(f"{'='*70}\n")
+
+        if dry_run:
+            self.report(stale, fresh)
+            print()
+            return True
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        cache = self.load_cache()
+        failures = 0
+
+        def run(name):
+            return name, build_bundle(self.specs[name], self.output_dir, self.atlas_size, self.padding)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.jobs, len(stale) or 1))) as pool:
+            futures = [pool.submit(run, name) for name in stale]
+            for future in futures:
+                try:
+                    name, entry = future.result()
+                except (LevelCompileError, ValueError, OSError) as e:
+                    failures += 1
+                    print(f"  ❌ {e}")
+                    continue
+                cache["bundles"][name] = {"fingerprint": fingerprints[name], "entry": entry}
+                print(f"  ✅ {name:<20} {entry['sourceRequests']:>4} files {entry['sourceBytes'] / 1024:>8.1f} KB → "
+                      f"{entry['requests']:>2} files {entry['bytes'] / 1024:>8.1f} KB  ({entry['seconds']:.2f}s)")
+        for name in fresh:
+            print(f"  ⏭️  {name:<20} up to date")
+
+        cache["bundles"] = {k: v for k, v in cache["bundles"].items() if k in self.specs}
+        atomic_write(self.cache_path, json.dumps(cache, indent=2))
+        self.write_manifest(cache)
+
+        print(f"\n{'='*70}")
+        print(f"✅ Built {len(stale) - failures}, skipped {len(fresh)}, failed {failures}")
+        print(f"Manifest: {self.manifest_path}")
+        print(f"{'='*70}\n")
+        return failures == 0
+
+    def write_manifest(self, cache):
+        manifest = {"version": BUNDLER_VERSION, "bundles": {}, "assets": {}}
+        for name in self.specs:
+            entry = cache["bundles"].get(name, {}).get("entry")
+            if not entry:
+                continue
+            manifest["bundles"][name] = {"data": entry["data"], "files": [f["url"] for f in entry["files"]],
+                                         "bytes": entry["bytes"]}
+            for path, asset in entry["assets"].items():
+                manifest["assets"].setdefault(path, dict(asset, bundle=name))
+        atomic_write(self.manifest_path, json.dumps(manifest, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build content-hashed per-level asset bundles",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Build changed bundles into ../dist/bundles
+  python asset_bundler.py
+
+  # Per-bundle bytes and request counts, no writes
+  python asset_bundler.py --dry-run
+
+  # Custom bundle definitions (same shape as DEFAULT_BUNDLES)
+  python asset_bundler.py --config bundles.json --force
+        """
+    )
+
+    parser.add_argument("--root", type=str, default="..", help="Project root (folder containing assets/)")
+    parser.add_argument("--output", "-o", type=str, default="../dist/bundles", help="Output directory")
+    parser.add_argument("--config", "-c", type=str, help="JSON file with bundle definitions")
+    parser.add_argument("--atlas-size", type=int, default=2048, help="Max atlas page edge (default: 2048)")
+    parser.add_argument("--padding", type=int, default=2, help="Pixels between atlas sprites")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(), help="Bundles built in parallel")
+    parser.add_argument("--force", action="store_true", help="Rebuild every bundle")
+    parser.add_argument("--dry-run", action="store_true", help="Report bytes and request counts only")
+
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    if not (root / "assets").exists():
+        print(f"❌ No assets/ folder under project root: {root}")
+        sys.exit(1)
+
+    config = DEFAULT_BUNDLES
+    if args.config:
+        config = json.loads(Path(args.config).read_text(encoding="utf-8"))
+        config = config.get("bundles", config)
+
+    bundler = AssetBundler(config, root, args.output, args.atlas_size, args.padding, args.jobs)
+    ok = bundler.build(force=args.force, dry_run=args.dry_run)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
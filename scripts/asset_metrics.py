@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Pipeline Metrics for Asset Scripts
+素材管線效能量測
+
+Records per-stage durations as histograms, bytes transferred and cache hit
+rates for sd_batch_generator.py, batch_remove_bg.py and download_models.py.
+Results are appended to a JSON lines file and can also be scraped from a
+local Prometheus endpoint while a long run is in progress.
+
+Usage:
+    from asset_metrics import metrics
+
+    with metrics.timer("http"):
+        response = requests.post(...)
+    metrics.add_bytes("http_in", len(response.content))
+    metrics.cache("models", hit=True)
+
+    # From the command line of any instrumented script
+    python sd_batch_generator.py ... --metrics-out metrics.jsonl
+    python batch_remove_bg.py ... --metrics-port 9108   # http://127.0.0.1:9108/metrics
+"""
+
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# Upper bounds in seconds; covers sub-millisecond encodes up to the 300 s API timeout
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, math.inf)
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics)"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by linear interpolation inside the bucket"""
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, n in zip(self.buckets, self.counts):
+            if n and seen + n >= rank:
+                upper = self.max if math.isinf(bound) else min(bound, self.max)
+                lower = max(lower, self.min)
+                return lower + (upper - lower) * ((rank - seen) / n)
+            seen += n
+            lower = bound
+        return self.max
+
+    def to_dict(self) -> dict:
+        cumulative = 0
+        buckets = {}
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            buckets["+Inf" if math.isinf(bound) else repr(bound)] = cumulative
+
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": round(self.min, 6) if self.count else 0.0,
+            "max": round(self.max, 6),
+            "p50": round(self.quantile(0.5), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "buckets": buckets,
+        }
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+class Metrics:
+    """Thread-safe registry of stage histograms and counters"""
+
+    def __init__(self, namespace: str = "asset_pipeline"):
+        self.namespace = namespace
+        self.script = None
+        self.jsonl_path: Optional[Path] = None
+        self._lock = threading.Lock()
+        self._histograms: Dict[LabelKey, Histogram] = {}
+        self._counters: Dict[LabelKey, float] = {}
+        self._server = None
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> LabelKey:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, stage: str, seconds: float, **labels):
+        """Record one duration for a pipeline stage"""
+        key = self._key("stage_seconds", dict(labels, stage=stage))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str, **labels):
+        """Time the enclosed block, recording it even if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Increment a counter"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def add_bytes(self, stage: str, nbytes: int, **labels):
+        """Count bytes moved by a stage (network, disk)"""
+        self.inc("bytes_total", nbytes, stage=stage, **labels)
+
+    def cache(self, cache: str, hit: bool, **labels):
+        """Count a cache lookup as a hit or a miss"""
+        self.inc("cache_requests_total", 1, cache=cache,
+                 result="hit" if hit else "miss", **labels)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+
+    def snapshot(self) -> list:
+        """Return every series as a JSON-serializable record"""
+        records = []
+        with self._lock:
+            for (name, labels), hist in sorted(self._histograms.items()):
+                records.append({"type": "histogram", "name": name,
+                                "labels": dict(labels), **hist.to_dict()})
+            for (name, labels), value in sorted(self._counters.items()):
+                records.append({"type": "counter", "name": name,
+                                "labels": dict(labels), "value": value})
+        return records
+
+    def cache_hit_rates(self) -> Dict[str, float]:
+        totals: Dict[str, list] = {}
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                if name != "cache_requests_total":
+                    continue
+                labels = dict(labels)
+                hits_total = totals.setdefault(labels["cache"], [0, 0])
+                hits_total[1] += value
+                if labels["result"] == "hit":
+                    hits_total[0] += value
+        return {cache: hits / total for cache, (hits, total) in totals.items() if total}
+
+    def dump_jsonl(self, path):
+        """Append the current snapshot to a JSON lines file"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        stamp = time.time()
+        with open(path, "a", encoding="utf-8") as f:
+            for record in self.snapshot():
+                record = {"ts": stamp, "script": self.script, **record}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def render_prometheus(self) -> str:
+        """Render all series in the Prometheus text exposition format"""
+        def fmt_labels(labels: dict) -> str:
+            if self.script:
+                labels = dict(labels, script=self.script)
+            if not labels:
+                return ""
+            body = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+            return "{" + body + "}"
+
+        lines = []
+        seen_types = set()
+        for record in self.snapshot():
+            name = f"{self.namespace}_{record['name']}"
+            if name not in seen_types:
+                lines.append(f"# TYPE {name} {record['type']}")
+                seen_types.add(name)
+
+            labels = record["labels"]
+            if record["type"] == "counter":
+                lines.append(f"{name}{fmt_labels(labels)} {record['value']}")
+                continue
+
+            for bound, cumulative in record["buckets"].items():
+                lines.append(f"{name}_bucket{fmt_labels(dict(labels, le=bound))} {cumulative}")
+            lines.append(f"{name}_sum{fmt_labels(labels)} {record['sum']}")
+            lines.append(f"{name}_count{fmt_labels(labels)} {record['count']}")
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Serve /metrics (Prometheus) and /metrics.json from a daemon thread"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.render_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(registry.snapshot()).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        thread.start()
+        print(f"📈 Metrics endpoint: http://{host}:{port}/metrics")
+
+    # ------------------------------------------------------------------
+    # CLI integration
+    # ------------------------------------------------------------------
+
+    def configure(self, script: str, jsonl_path=None, port: Optional[int] = None):
+        self.script = script
+        self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+        if port:
+            self.serve(port)
+
+    def print_summary(self):
+        """Print per-stage timings so the bottleneck is visible at a glance"""
+        records = [r for r in self.snapshot() if r["type"] == "histogram"]
+        if not records:
+            return
+
+        print(f"\n{'='*70}")
+        print(f"⏱️  Stage Timings")
+        print(f"{'='*70}")
+        print(f"   {'stage':<16} {'count':>6} {'total s':>9} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+        for r in records:
+            mean_ms = r["sum"] / r["count"] * 1000 if r["count"] else 0
+            print(f"   {r['labels'].get('stage', r['name']):<16} {r['count']:>6} {r['sum']:>9.2f} "
+                  f"{mean_ms:>9.1f} {r['p50'] * 1000:>9.1f} {r['p99'] * 1000:>9.1f}")
+
+        for r in self.snapshot():
+            if r["name"] == "bytes_total":
+                print(f"   📦 {r['labels']['stage']}: {r['value'] / (1024 * 1024):.2f} MB")
+        for cache, rate in self.cache_hit_rates().items():
+            print(f"   🗃️  {cache} cache hit rate: {rate:.0%}")
+        print(f"{'='*70}\n")
+
+    def finish(self):
+        """Print the summary and flush to the configured JSON lines file"""
+        self.print_summary()
+        if self.jsonl_path:
+            self.dump_jsonl(self.jsonl_path)
+            print(f"📈 Metrics written to {self.jsonl_path}")
+
+def add_metrics_arguments(parser):
+    """Add the shared --metrics-out / --metrics-port options to a CLI"""
+    parser.add_argument("--metrics-out", type=str, metavar="FILE",
+                        help="Append stage timings and counters as JSON lines to FILE")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+
+# Shared registry used by all scripts
+metrics = Metrics()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Asset Tree Helpers
+素材目錄掃描工具
+
+Shared helpers for tools that walk generated frame folders such as
+sprites/enemies/slime/idle/idle(1..10).png or characters/hero/idle/idle_01.png.
+"""
+
+import os
+import re
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+FRAME_EXTENSIONS = (".png", ".webp")
+
+_DIGITS = re.compile(r"(\d+)")
+
+def natural_key(name: str):
+    """Sort key that orders idle(2).png before idle(10).png"""
+    return [int(part) if part.isdigit() else part.lower() for part in _DIGITS.split(name)]
+
+def walk_tree(root) -> Iterator[Tuple[Path, List[str]]]:
+    """Yield (directory, file names) for every directory below root, depth first
+
+    Uses a single os.scandir walk; hidden entries are skipped.
+    """
+    stack = [Path(root)]
+    while stack:
+        directory = stack.pop()
+        files, subdirs = [], []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(Path(entry.path))
+                    else:
+                        files.append(entry.name)
+        except OSError:
+            continue
+
+        yield directory, files
+        stack.extend(sorted(subdirs, key=lambda p: natural_key(p.name), reverse=True))
+
+def frame_names(files, extensions=FRAME_EXTENSIONS) -> List[str]:
+    return sorted((name for name in files if name.lower().endswith(extensions)), key=natural_key)
+
+def scan_frame_dirs(root, extensions=FRAME_EXTENSIONS) -> Iterator[Tuple[Path, List[str]]]:
+    """Yield (directory, naturally sorted frame names) for every folder holding frames"""
+    for directory, files in walk_tree(root):
+        frames = frame_names(files, extensions)
+        if frames:
+            yield directory, frames
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Asset Pipeline Command Line
+素材管線統一命令列
+
+One entry point for every script in this folder. Only the module of the
+chosen subcommand is imported, so `assets.py --help` and editor hooks start
+in a few milliseconds; each subcommand takes the same arguments as the
+script it runs.
+
+Usage:
+    python assets.py --help
+    python assets.py generate --type character --name slime --action idle --frames 10
+    python assets.py remove-bg --input temp_generated --output ../assets/sprites/enemies/slime/idle
+    python assets.py manifest --dry-run
+
+    # Shell alias for hooks
+    alias assets="python /path/to/scripts/assets.py"
+"""
+
+import importlib
+import sys
+
+# subcommand → (module, summary); modules are imported only when run
+COMMANDS = {
+    "generate":   ("sd_batch_generator", "Generate frames with SD WebUI (also --serve, --check)"),
+    "sweep":      ("seed_sweep", "Rank stored seed previews and redraw the contact sheet"),
+    "webui":      ("async_webui", "Queue txt2img jobs from one asyncio loop"),
+    "fake-webui": ("fake_webui", "Offline stand-in for the WebUI API"),
+    "remove-bg":  ("batch_remove_bg", "Remove backgrounds (rembg / tuned ONNX Runtime)"),
+    "matting":    ("rembg_runtime", "Benchmark or run the tuned ONNX matting session"),
+    "resize":     ("resize_engine", "Premultiplied batch resize with HiDPI scales"),
+    "analyze":    ("sprite_analyzer", "Find inconsistent frames in animations"),
+    "quality":    ("frame_quality", "Score frames for coverage, cropping, blur and noise"),
+    "delta":      ("sprite_delta", "Delta-encoded SPD1 animations (encode/decode/info)"),
+    "quantize":   ("palette_quantizer", "Shared indexed palette per character"),
+    "frames":     ("frame_store", "Memory-mapped frame store (build/info/clear)"),
+    "manifest":   ("manifest_generator", "Write manifest.json files and the asset index"),
+    "farm":       ("build_farm", "Distributed build stages with work-stealing workers"),
+    "bundle":     ("asset_bundler", "Content-hashed per-level bundles"),
+    "levels":     ("level_compiler", "Compile Tiled maps to runtime JSON/binary"),
+    "chunks":     ("chunk_generator", "Deterministic infinite-level chunks (pregen/serve)"),
+    "parallax":   ("parallax_tiles", "Tile parallax backgrounds with mip chains"),
+    "download":   ("download_models", "Download SD models from the registry"),
+    "models":     ("model_store", "Deduplicating model store (scan/link/gc)"),
+    "registry":   ("model_registry", "Show the model registry and sources"),
+    "verify":     ("verify_sd_paths", "Verify model folders and the WebUI"),
+    "bench":      ("bench_pipeline", "Offline pipeline benchmarks"),
+}
+
+def print_help():
+    print("usage: assets.py <command> [args...]\n")
+    print("Asset pipeline tools. Run `assets.py <command> --help` for a command's options.\n")
+    print("commands:")
+    for name, (module, summary) in COMMANDS.items():
+        print(f"  {name:<12} {summary}")
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] in ("-h", "--help", "help"):
+        print_help()
+        return 0
+
+    name, rest = argv[0], argv[1:]
+    if name not in COMMANDS:
+        print(f"❌ Unknown command: {name}\n")
+        print_help()
+        return 2
+
+    module = importlib.import_module(COMMANDS[name][0])
+    # The script's own argparse sees `assets.py <command>` as its program name
+    sys.argv = [f"assets.py {name}"] + rest
+    module.main()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
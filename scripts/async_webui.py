@@ -0,0 +1,534 @@
+#!/usr/bin/env python3
+"""
+Async SD WebUI Client with Deadlines, Stall Detection and Cancellation
+非同步 SD WebUI 客戶端（逾時、卡住偵測與取消）
+
+One asyncio event loop drives every request, so hundreds of queued frames
+cost a task each instead of a thread. Per WebUI backend:
+
+- In-flight requests are bounded by the same AIMD limiter the threaded
+  generator uses (adaptive_limiter.AdaptiveLimiter)
+- Every attempt has a deadline; the limiter shrinks it to a few multiples of
+  the observed latency once requests have completed
+- A monitor polls /sdapi/v1/progress, streams it to an on_progress callback
+  and declares a stall when the sampler has not moved for stall_timeout
+  seconds while requests are in flight. The stuck job is stopped with
+  /sdapi/v1/interrupt and retried, so a hung generation costs seconds
+  instead of the 300 s request timeout
+- Ctrl-C (or a threading.Event passed as cancel) interrupts the jobs
+  running on the WebUI before the loop exits
+
+Transport: httpx if installed, else aiohttp, else requests on a private
+thread pool, so the client works with the base requirements.txt:
+
+    pip install httpx        # or: pip install aiohttp
+
+Usage:
+    python async_webui.py --url http://127.0.0.1:7860 --jobs 200 --deadline 90 --stall-timeout 15
+
+    # From Python
+    async with AsyncWebUIClient(["http://127.0.0.1:7860"], max_inflight=4) as client:
+        img_bytes, info = await client.txt2img(payload)
+"""
+
+import argparse
+import asyncio
+import base64
+import functools
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from adaptive_limiter import AdaptiveLimiter
+from asset_metrics import metrics
+
+class WebUIError(Exception):
+    """A request to the WebUI failed (connection, HTTP status or bad response)"""
+
+class StallError(WebUIError):
+    """The WebUI stopped making progress on this request"""
+
+class DeadlineError(WebUIError):
+    """The request did not finish before its deadline"""
+
+class WebUICancelled(WebUIError):
+    """The client was cancelled while the request was in flight"""
+
+# ----------------------------------------------------------------------
+# Transports: (status, body bytes, headers) for one HTTP request
+# ----------------------------------------------------------------------
+
+class HttpxTransport:
+    name = "httpx"
+
+    def __init__(self, limit: int):
+        import httpx
+        self._errors = (httpx.HTTPError,)
+        self._client = httpx.AsyncClient(
+            timeout=None, limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit))
+
+    async def request(self, method, url, json=None, timeout=None):
+        try:
+            response = await self._client.request(method, url, json=json, timeout=timeout)
+        except self._errors as e:
+            raise WebUIError(f"{type(e).__name__}: {e}") from e
+        return response.status_code, response.content, response.headers
+
+    async def close(self):
+        await self._client.aclose()
+
+class AiohttpTransport:
+    name = "aiohttp"
+
+    def __init__(self, limit: int):
+        import aiohttp
+        self._aiohttp = aiohttp
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=limit))
+
+    async def request(self, method, url, json=None, timeout=None):
+        try:
+            async with self._session.request(method, url, json=json,
+                                             timeout=self._aiohttp.ClientTimeout(total=timeout)) as response:
+                return response.status, await response.read(), response.headers
+        except (self._aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise WebUIError(f"{type(e).__name__}: {e}") from e
+
+    async def close(self):
+        await self._session.close()
+
+class ThreadTransport:
+    """requests on a private thread pool
+
+    A cancelled request leaves its thread blocked until the WebUI answers;
+    the interrupt sent on cancellation is what makes it answer.
+    """
+    name = "requests"
+
+    def __init__(self, limit: int):
+        import requests
+        self._requests = requests
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=limit, pool_maxsize=limit)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=limit, thread_name_prefix="webui")
+
+    def _call(self, method, url, json, timeout):
+        response = self._session.request(method, url, json=json, timeout=(5, timeout))
+        return response.status_code, response.content, response.headers
+
+    async def request(self, method, url, json=None, timeout=None):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self._call, method, url, json, timeout)
+        try:
+            return await loop.run_in_executor(self._executor, call)
+        except self._requests.exceptions.RequestException as e:
+            raise WebUIError(f"{type(e).__name__}: {e}") from e
+
+    async def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._session.close()
+
+TRANSPORTS = {"httpx": HttpxTransport, "aiohttp": AiohttpTransport, "requests": ThreadTransport}
+
+def make_transport(name: str, limit: int):
+    """Build the named transport; "auto" picks the first library that is installed"""
+    if name != "auto":
+        return TRANSPORTS[name](limit)
+    for cls in (HttpxTransport, AiohttpTransport):
+        try:
+            return cls(limit)
+        except ImportError:
+            continue
+    return ThreadTransport(limit)
+
+# ----------------------------------------------------------------------
+# Client
+# ----------------------------------------------------------------------
+
+def decode_result(body: bytes):
+    """(first image as PNG bytes, info dict) from a txt2img/img2img response body"""
+    try:
+        result = json.loads(body)
+        return base64.b64decode(result["images"][0]), json.loads(result["info"])
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        raise WebUIError(f"Malformed WebUI response: {e}") from e
+
+class AsyncBackend:
+    """One WebUI instance: limiter, in-flight requests and progress state"""
+
+    def __init__(self, url: str, max_inflight: int, deadline: float):
+        self.url = url.rstrip("/")
+        self.api_url = f"{self.url}/sdapi/v1"
+        self.limiter = AdaptiveLimiter(initial=1, max_limit=max_inflight, max_timeout=deadline,
+                                       min_timeout=min(30.0, deadline))
+        self.active: Dict[asyncio.Future, float] = {}  # request → start time
+        self.cancelled: Dict[asyncio.Future, str] = {}  # request → "stall" | "cancel"
+        self.completed = 0
+        self.sampling_seen = False
+        self.progress: Optional[dict] = None
+        self.poll_progress = True
+        self.abandoned = False
+
+    def oldest(self) -> Optional[asyncio.Future]:
+        return min(self.active, key=self.active.get) if self.active else None
+
+class AsyncWebUIClient:
+    """asyncio WebUI client spreading requests over one or more backends
+
+    deadline caps every attempt; stall_timeout is how long the sampler may
+    sit still before the current job is interrupted and retried. Stall
+    detection on a backend arms once its sampler has been seen stepping (or
+    a request has completed), since loading a checkpoint reports no steps.
+    """
+
+    def __init__(self, urls, max_inflight=4, deadline=120.0, stall_timeout=20.0,
+                 poll_interval=1.0, retries=2, transport="auto",
+                 on_progress: Optional[Callable[[str, dict], None]] = None, cancel=None):
+        urls = [urls] if isinstance(urls, str) else list(urls)
+        self.backends = [AsyncBackend(url, max_inflight, deadline) for url in urls]
+        self.max_inflight = max_inflight
+        self.deadline = deadline
+        self.stall_timeout = stall_timeout
+        self.poll_interval = poll_interval
+        self.retries = max(0, retries)
+        self.transport_name = transport
+        self.on_progress = on_progress
+        self.cancel = cancel
+        self.transport = None
+        self.stalls = 0
+        self.deadlines = 0
+        self._cond = None
+        self._tasks = []
+        self._cancelled = False
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None and issubclass(exc_type, (asyncio.CancelledError, KeyboardInterrupt)):
+            await self.interrupt([b for b in self.backends if b.abandoned or b.active])
+        await self.close()
+
+    async def start(self):
+        # One slot per in-flight request plus one per progress poller
+        limit = self.max_inflight * len(self.backends) + len(self.backends)
+        self.transport = make_transport(self.transport_name, limit)
+        self._cond = asyncio.Condition()
+        self._tasks = [asyncio.ensure_future(self._monitor(b)) for b in self.backends]
+        if self.cancel is not None:
+            self._tasks.append(asyncio.ensure_future(self._watch_cancel()))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.transport is not None:
+            await self.transport.close()
+            self.transport = None
+
+    # ------------------------------------------------------------------
+    # Slots
+    # ------------------------------------------------------------------
+
+    @property
+    def aborted(self) -> bool:
+        return self._cancelled
+
+    async def _acquire(self, exclude=None) -> AsyncBackend:
+        async with self._cond:
+            while True:
+                if self._cancelled:
+                    raise WebUICancelled("client cancelled")
+                candidates = [b for b in self.backends if b is not exclude] or self.backends
+                backend = max(candidates, key=lambda b: b.limiter.headroom())
+                if backend.limiter.headroom() > 0:
+                    backend.limiter.on_start()
+                    return backend
+                await self._cond.wait()
+
+    async def _release(self, backend: AsyncBackend, latency: Optional[float], ok: bool):
+        async with self._cond:
+            before = int(backend.limiter.limit)
+            backend.limiter.on_done(latency, ok)
+            after = int(backend.limiter.limit)
+            self._cond.notify_all()
+        if after != before:
+            print(f"  📶 {backend.url}: concurrency {before} → {after}")
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+
+    async def txt2img(self, payload: dict, endpoint="txt2img", queued_at: Optional[float] = None):
+        """POST one generation with deadline, stall detection and retries → (PNG bytes, info)
+
+        With queued_at (a perf_counter stamp), the wait until the first
+        attempt gets a backend slot is recorded as queue_wait.
+        """
+        last_error = None
+        failed_on = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(min(0.5 * attempt, 2.0))
+            # Retry on another backend when there is one
+            backend = await self._acquire(exclude=failed_on)
+            if attempt == 0 and queued_at is not None:
+                metrics.observe("queue_wait", time.perf_counter() - queued_at)
+            latency = None
+            ok = False
+            try:
+                start = time.perf_counter()
+                status, body, headers = await self._attempt(backend, endpoint, payload)
+                latency = time.perf_counter() - start
+                metrics.observe("http", latency, backend=backend.url)
+                metrics.add_bytes("http_in", len(body))
+                if status != 200:
+                    raise WebUIError(f"HTTP {status}: {body[:200].decode('utf-8', 'replace')}")
+                with metrics.timer("decode"):
+                    img_data, info = decode_result(body)
+                process_time = headers.get("X-Process-Time") if headers else None
+                if process_time is not None:
+                    metrics.observe("server_generate", float(process_time))
+                ok = True
+                backend.completed += 1
+                return img_data, info
+            except WebUICancelled:
+                raise
+            except WebUIError as e:
+                last_error = e
+                failed_on = backend
+                metrics.inc("webui_retries", reason=type(e).__name__)
+                if attempt < self.retries:
+                    print(f"  🔁 {backend.url}: {e}; retrying ({attempt + 1}/{self.retries})")
+            finally:
+                await self._release(backend, latency, ok)
+        raise last_error
+
+    async def _attempt(self, backend: AsyncBackend, endpoint: str, payload: dict):
+        deadline = backend.limiter.timeout()
+        request = asyncio.ensure_future(self.transport.request(
+            "POST", f"{backend.api_url}/{endpoint}", json=payload, timeout=deadline + 5))
+        backend.active[request] = time.monotonic()
+        try:
+            return await asyncio.wait_for(request, deadline)
+        except asyncio.TimeoutError:
+            self.deadlines += 1
+            # Only the job the WebUI is working on can be stuck; queued ones are just waiting
+            if backend.oldest() is request:
+                await self.interrupt([backend])
+            raise DeadlineError(f"no response within {deadline:.0f}s")
+        except asyncio.CancelledError:
+            reason = backend.cancelled.get(request)
+            if reason == "stall":
+                raise StallError(f"no progress for {self.stall_timeout:.0f}s")
+            if reason == "cancel":
+                raise WebUICancelled("cancelled while in flight")
+            backend.abandoned = True
+            raise
+        finally:
+            backend.active.pop(request, None)
+            backend.cancelled.pop(request, None)
+
+    async def interrupt(self, backends: Optional[List[AsyncBackend]] = None):
+        """POST /sdapi/v1/interrupt to the given backends (default: all)"""
+        if self.transport is None:
+            return
+
+        async def one(backend):
+            try:
+                await asyncio.wait_for(
+                    self.transport.request("POST", f"{backend.api_url}/interrupt", timeout=5), 5)
+                print(f"  ⏹️  Interrupted {backend.url}")
+            except (WebUIError, asyncio.TimeoutError) as e:
+                print(f"  ⚠️  Could not interrupt {backend.url}: {e}")
+
+        await asyncio.gather(*(one(b) for b in (self.backends if backends is None else backends)))
+
+    async def abort(self):
+        """Stop every in-flight request and refuse new ones"""
+        self._cancelled = True
+        busy = [b for b in self.backends if b.active]
+        await self.interrupt(busy)
+        for backend in busy:
+            for request in list(backend.active):
+                backend.cancelled[request] = "cancel"
+                request.cancel()
+        async with self._cond:
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # Progress monitor
+    # ------------------------------------------------------------------
+
+    async def _poll(self, backend: AsyncBackend) -> Optional[dict]:
+        try:
+            status, body, _ = await asyncio.wait_for(self.transport.request(
+                "GET", f"{backend.api_url}/progress?skip_current_image=true", timeout=5), 5)
+        except (WebUIError, asyncio.TimeoutError):
+            return None
+        if status == 404:
+            # Old WebUI without the endpoint: deadlines only
+            backend.poll_progress = False
+            return None
+        if status != 200:
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+    async def _monitor(self, backend: AsyncBackend):
+        last = None
+        moved_at = time.monotonic()
+        while backend.poll_progress:
+            await asyncio.sleep(self.poll_interval)
+            if not backend.active:
+                last, moved_at = None, time.monotonic()
+                continue
+
+            data = await self._poll(backend)
+            now = time.monotonic()
+            if data is not None:
+                state = data.get("state") or {}
+                snapshot = (state.get("job_timestamp"), state.get("job_count"),
+                            state.get("sampling_step"), data.get("progress"))
+                # Limiter growth waits while the WebUI reports a backlog
+                limiter = backend.limiter
+                eta = data.get("eta_relative") or 0.0
+                limiter.congested = bool(limiter.baseline and eta > limiter.tolerance * limiter.baseline)
+                if state.get("sampling_step"):
+                    backend.sampling_seen = True
+                if snapshot != last:
+                    last, moved_at = snapshot, now
+                    backend.progress = data
+                    if self.on_progress:
+                        self.on_progress(backend.url, data)
+            # An unreachable /progress counts as no progress
+
+            armed = backend.completed or backend.sampling_seen
+            if self.stall_timeout and armed and now - moved_at > self.stall_timeout:
+                request = backend.oldest()
+                if request is None:
+                    continue
+                self.stalls += 1
+                print(f"  ⏸️  {backend.url}: no progress for {now - moved_at:.0f}s, interrupting")
+                await self.interrupt([backend])
+                backend.cancelled[request] = "stall"
+                request.cancel()
+                last, moved_at = None, time.monotonic()
+
+    async def _watch_cancel(self):
+        while not self.cancel.is_set():
+            await asyncio.sleep(0.25)
+        await self.abort()
+
+    # ------------------------------------------------------------------
+    # Batches
+    # ------------------------------------------------------------------
+
+    async def txt2img_many(self, payloads: List[dict],
+                           on_result: Optional[Callable[[int, object], None]] = None):
+        """Run all payloads concurrently; results (or the exception) in input order"""
+
+        async def one(i, payload):
+            try:
+                result = await self.txt2img(payload)
+            except WebUIError as e:
+                result = e
+            if on_result:
+                on_result(i, result)
+            return result
+
+        return await asyncio.gather(*(one(i, p) for i, p in enumerate(payloads)))
+
+def run(coro):
+    """asyncio.run that turns Ctrl-C into a clean exit after WebUI jobs are interrupted"""
+    try:
+        return asyncio.run(coro)
+    except KeyboardInterrupt:
+        print("\n⏹️  Cancelled")
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Queue many txt2img jobs on SD WebUI from one asyncio event loop",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # 200 jobs on one WebUI, stuck samplers retried after 15 s without progress
+  python async_webui.py --url http://127.0.0.1:7860 --jobs 200 --stall-timeout 15
+
+  # Against the fake server with injected stalls
+  python fake_webui.py --port 7861 --latency 0.5 --slots 1 --stall-rate 0.1
+  python async_webui.py --url http://127.0.0.1:7861 --jobs 50 --stall-timeout 3
+        """
+    )
+
+    parser.add_argument("--url", type=str, nargs="+", default=["http://127.0.0.1:7860"], help="WebUI URL(s)")
+    parser.add_argument("--jobs", type=int, default=20, help="Number of txt2img jobs to queue")
+    parser.add_argument("--prompt", type=str, default="game sprite, cute slime, white background")
+    parser.add_argument("--size", nargs=2, type=int, default=[512, 512], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--max-inflight", type=int, default=4, help="Upper bound on in-flight requests per WebUI")
+    parser.add_argument("--deadline", type=float, default=120.0, help="Seconds per attempt before it is abandoned")
+    parser.add_argument("--stall-timeout", type=float, default=20.0,
+                        help="Seconds without sampler progress before a job is interrupted and retried (0: off)")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per job after a failure, stall or deadline")
+    parser.add_argument("--transport", choices=["auto"] + list(TRANSPORTS), default="auto")
+
+    args = parser.parse_args()
+
+    payloads = [{
+        "prompt": args.prompt,
+        "seed": -1,
+        "steps": args.steps,
+        "width": args.size[0],
+        "height": args.size[1],
+        "save_images": False,
+    } for _ in range(args.jobs)]
+
+    def on_progress(url, data):
+        state = data.get("state") or {}
+        print(f"  ⏳ {url}: {data.get('progress', 0) * 100:3.0f}% "
+              f"step {state.get('sampling_step', 0)}/{state.get('sampling_steps', 0)}, "
+              f"{state.get('job_count', 0)} queued")
+
+    async def go():
+        async with AsyncWebUIClient(args.url, max_inflight=args.max_inflight, deadline=args.deadline,
+                                    stall_timeout=args.stall_timeout, retries=args.retries,
+                                    transport=args.transport, on_progress=on_progress) as client:
+            print(f"Transport: {client.transport.name}")
+            start = time.perf_counter()
+            done = 0
+
+            def on_result(i, result):
+                nonlocal done
+                if not isinstance(result, Exception):
+                    done += 1
+                    print(f"  ✅ Job {i + 1}: seed {result[1].get('seed')}")
+                else:
+                    print(f"  ❌ Job {i + 1}: {result}")
+
+            await client.txt2img_many(payloads, on_result)
+            elapsed = time.perf_counter() - start
+            print(f"\n✅ {done}/{len(payloads)} jobs in {elapsed:.1f}s "
+                  f"({client.stalls} stalls, {client.deadlines} deadlines)")
+            return done == len(payloads)
+
+    print(f"\n{'='*70}")
+    print(f"⚡ Async WebUI Client")
+    print(f"{'='*70}")
+    print(f"WebUI: {', '.join(args.url)}")
+    print(f"Jobs: {args.jobs}  Deadline: {args.deadline:.0f}s  Stall timeout: {args.stall_timeout:.0f}s")
+    print(f"{'='*70}\n")
+
+    if not run(go()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Atomic File Writes
+原子寫入（暫存檔、fsync、改名）
+
+Every script writes its outputs through this module so a crash, a killed
+process or a full disk never leaves a truncated PNG, JSON or model file that
+a later run mistakes for a finished one. A write goes to a uniquely named
+temporary file in the destination folder, is flushed and fsynced, and then
+renamed over the target with os.replace, which readers see as all or
+nothing. Temporary names are unique per call (mkstemp), so any number of
+threads and processes can write into the same folders, even to the same
+path, without clobbering each other's half-written data: the last complete
+file wins.
+
+The rename itself only survives a power loss once the folder is fsynced
+too. Writers that produce many files wrap the loop in sync_batch(), which
+fsyncs each touched folder once at the end instead of once per file.
+
+Leftover temporaries of a crashed run are hidden files named
+".<name>.<random>.tmp", which no scanner picks up as an asset.
+
+Set ASSET_FSYNC=0 to skip the fsyncs (still atomic, not durable) for
+throwaway builds on slow disks.
+
+Usage:
+    from atomic_io import atomic_write, atomic_open, save_image, sync_batch
+
+    atomic_write(path, data)                        # bytes or str
+    with atomic_open(path, "w") as f:
+        json.dump(report, f)
+    save_image(img, path, "PNG", optimize=True)
+
+    with sync_batch():                              # one folder fsync per folder
+        for img, path in frames:
+            save_image(img, path)
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+FSYNC = os.environ.get("ASSET_FSYNC", "1") != "0"
+TEMP_SUFFIX = ".tmp"
+
+# Permissions a plain open() would give new files (mkstemp uses 0600)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+_dirs_lock = threading.Lock()
+_pending_dirs = set()
+_batch_depth = 0
+
+def fsync_dir(directory):
+    """Persist a folder's entries (renames, new files); a no-op where unsupported"""
+    if not FSYNC or os.name == "nt":
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _dir_changed(directory: Path):
+    with _dirs_lock:
+        if _batch_depth:
+            _pending_dirs.add(str(directory))
+            return
+    fsync_dir(directory)
+
+def flush_dirs():
+    """fsync every folder touched since the last flush"""
+    with _dirs_lock:
+        dirs = sorted(_pending_dirs)
+        _pending_dirs.clear()
+    for directory in dirs:
+        fsync_dir(directory)
+
+@contextmanager
+def sync_batch():
+    """Defer folder fsyncs of writes from any thread until the outermost batch exits"""
+    global _batch_depth
+    with _dirs_lock:
+        _batch_depth += 1
+    try:
+        yield
+    finally:
+        with _dirs_lock:
+            _batch_depth -= 1
+            last = _batch_depth == 0
+        if last:
+            flush_dirs()
+
+def temp_path(path) -> Path:
+    """Create an empty, uniquely named temporary file next to path"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=TEMP_SUFFIX, dir=path.parent)
+    os.close(fd)
+    return Path(name)
+
+def rename_into(tmp, path):
+    """os.replace plus the folder fsync; for temporaries that are links, not data"""
+    os.replace(tmp, path)
+    _dir_changed(Path(path).parent)
+    return Path(path)
+
+def commit_file(tmp, path, mode=None):
+    """fsync a finished temporary file and rename it over path"""
+    if FSYNC:
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+    os.chmod(tmp, FILE_MODE if mode is None else mode)
+    return rename_into(tmp, path)
+
+def discard(tmp):
+    try:
+        os.unlink(tmp)
+    except FileNotFoundError:
+        pass
+
+@contextmanager
+def atomic_open(path, mode="wb", encoding=None, newline=None):
+    """File object whose contents replace path only if the block completes"""
+    if "r" in mode or "a" in mode or "+" in mode:
+        raise ValueError(f"atomic_open only writes whole files, got mode {mode!r}")
+    if "b" not in mode and encoding is None:
+        encoding = "utf-8"
+    tmp = temp_path(path)
+    try:
+        with open(tmp, mode, encoding=encoding, newline=newline) as f:
+            yield f
+            f.flush()
+            if FSYNC:
+                os.fsync(f.fileno())
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        discard(tmp)
+        raise
+    _dir_changed(Path(path).parent)
+
+def atomic_write(path, data, encoding="utf-8") -> Path:
+    """Write bytes or str to path atomically"""
+    if isinstance(data, str):
+        data = data.encode(encoding)
+    with atomic_open(path, "wb") as f:
+        f.write(data)
+    return Path(path)
+
+def atomic_copy(src, dst) -> Path:
+    """Copy src to dst atomically (dst never holds a partial copy)"""
+    with atomic_open(dst, "wb") as f:
+        with open(src, "rb") as source:
+            shutil.copyfileobj(source, f, 1 << 20)
+    return Path(dst)
+
+def save_image(img, path, format=None, **params) -> Path:
+    """PIL Image.save through atomic_open; the format defaults to the file extension"""
+    if format is None:
+        from PIL import Image
+        format = Image.registered_extensions().get(Path(path).suffix.lower())
+    with atomic_open(path, "wb") as f:
+        img.save(f, format, **params)
+    return Path(path)
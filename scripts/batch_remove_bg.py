@@ -13,38 +13,123 @@ Usage:
     python batch_remove_bg.py --input ../assets/sprites/enemies/slime/idle
     python batch_remove_bg.py --input ../assets/effects/explosion/small --output ../assets/effects/explosion/small_transparent
     python batch_remove_bg.py --recursive --input ../assets/sprites/enemies
+    python batch_remove_bg.py --input temp --output out --resize 64 64 --frame-store temp_generated/frame_store
 """
 
 import argparse
+import importlib.util
+import io
 from pathlib import Path
-from rembg import remove
 from PIL import Image
 import sys
 
-def process_image(input_path, output_path, resize=None):
+from asset_metrics import metrics, add_metrics_arguments
+from atomic_io import save_image, sync_batch
+
+# rembg (onnxruntime, scipy, scikit-image) and the NumPy resize engine are
+# imported on first use so --help and argument errors return immediately
+_remove = None
+_resize_engine = None
+
+def rembg_remove(data):
+    global _remove
+    if _remove is None:
+        with metrics.timer("import"):
+            from rembg import remove
+        _remove = remove
+    return _remove(data)
+
+def get_resize_engine():
+    global _resize_engine
+    if _resize_engine is None:
+        from resize_engine import ResizeEngine
+        _resize_engine = ResizeEngine()
+    return _resize_engine
+
+def remove_background(input_path):
+    """Read one image, remove its background and return it as a PIL image"""
+    # Read input image
+    with metrics.timer("read"):
+        with open(input_path, "rb") as f:
+            input_data = f.read()
+    metrics.add_bytes("read", len(input_data))
+
+    # Remove background
+    with metrics.timer("rembg"):
+        output_data = rembg_remove(input_data)
+
+    # Open as PIL Image (rembg returns encoded PNG bytes for bytes input)
+    with metrics.timer("decode"):
+        img = Image.open(io.BytesIO(output_data))
+        img.load()
+    return img
+
+def open_frame(input_path):
+    """Decode one frame fully, so a corrupt file fails on its own instead of mid-batch"""
+    with metrics.timer("decode"):
+        img = Image.open(input_path)
+        img.load()
+    return img
+
+def load_batch(pairs, runtime=None, store=None):
+    """Inputs for one folder's batch: (good pairs, images, [(path, error), ...])
+
+    Every frame is decoded (or cut out, without a runtime) on its own; frames
+    that fail are returned separately and left out of the batch. With a
+    frame store, a cache hit over the whole folder skips the per-frame decode.
+    """
+    if runtime is not None and store is not None:
+        try:
+            frames = store.load(pairs[0][0].parent, [src.name for src, _ in pairs])
+            return pairs, [frames.image(i) for i in range(len(frames))], []
+        except Exception:
+            pass  # Find the bad frames below, then store the good ones
+
+    good, images, bad = [], [], []
+    for src, dst in pairs:
+        try:
+            images.append(open_frame(src) if runtime is not None else remove_background(src))
+            good.append((src, dst))
+        except Exception as e:
+            bad.append((src, e))
+
+    if runtime is not None and store is not None and good:
+        frames = store.load(good[0][0].parent, [src.name for src, _ in good])
+        images = [frames.image(i) for i in range(len(frames))]
+    return good, images, bad
+
+def save_png(img, output_path):
+    """Save with transparency (atomically: --in-place never leaves a truncated original)"""
+    with metrics.timer("encode"):
+        save_image(img, output_path, "PNG", optimize=True)
+    metrics.add_bytes("write", Path(output_path).stat().st_size)
+
+def save_resized(images, output_paths, resize, scales=(1,)):
+    """Resize a batch of frames (premultiplied, see resize_engine.py) and save every scale"""
+    from resize_engine import scaled_name
+
+    with metrics.timer("resize"):
+        resized = get_resize_engine().resize_images(images, resize, scales)
+    for scale, frames in resized.items():
+        for frame, output_path in zip(frames, output_paths):
+            save_png(frame, scaled_name(Path(output_path), scale))
+    return resized
+
+def process_image(input_path, output_path, resize=None, scales=(1,)):
     """Process single image to remove background"""
 
     try:
         print(f"  Processing: {input_path.name}...", end=" ")
 
-        # Read input image
-        with open(input_path, "rb") as f:
-            input_data = f.read()
-
-        # Remove background
-        output_data = remove(input_data)
-
-        # Open as PIL Image
-        img = Image.open(output_data)
+        img = remove_background(input_path)
 
         # Resize if specified
         if resize:
             width, height = resize
-            img = img.resize((width, height), Image.Resampling.LANCZOS)
+            save_resized([img], [output_path], resize, scales)
             print(f"[Resized to {width}x{height}]", end=" ")
-
-        # Save with transparency
-        img.save(output_path, "PNG", optimize=True)
+        else:
+            save_png(img, output_path)
 
         print("✅")
         return True
@@ -53,8 +138,15 @@ def process_image(input_path, output_path, resize=None):
         print(f"❌ Error: {e}")
         return False
 
-def process_directory(input_dir, output_dir=None, recursive=False, resize=None):
-    """Process all PNG images in directory"""
+def process_directory(input_dir, output_dir=None, recursive=False, resize=None, scales=(1,), runtime=None,
+                      store=None):
+    """Process all PNG images in directory
+
+    runtime: optional rembg_runtime.MattingSession used instead of rembg.remove
+    for batched inference with explicit ONNX Runtime threading.
+    store: optional frame_store.FrameStore; each output folder's 1x frames are
+    written into it, and the tuned runtime reads its inputs through it.
+    """
 
     input_dir = Path(input_dir)
 
@@ -81,7 +173,7 @@ def process_directory(input_dir, output_dir=None, recursive=False, resize=None):
     print(f"Output: {output_dir}")
     print(f"Recursive: {recursive}")
     if resize:
-        print(f"Resize: {resize[0]}x{resize[1]}")
+        print(f"Resize: {resize[0]}x{resize[1]} (scales: {', '.join(f'{s}x' for s in scales)})")
     print(f"{'='*70}\n")
 
     # Find all PNG files
@@ -99,6 +191,8 @@ def process_directory(input_dir, output_dir=None, recursive=False, resize=None):
     success_count = 0
     fail_count = 0
 
+    # With --resize, a tuned runtime or a frame store, each folder's frames are processed as one batch
+    batches = {}
     for png_file in png_files:
         # Calculate relative path for recursive mode
         if recursive and output_dir != input_dir:
@@ -108,10 +202,47 @@ def process_directory(input_dir, output_dir=None, recursive=False, resize=None):
         else:
             output_path = output_dir / png_file.name
 
-        if process_image(png_file, output_path, resize):
-            success_count += 1
-        else:
-            fail_count += 1
+        if not resize and runtime is None and store is None:
+            if process_image(png_file, output_path):
+                success_count += 1
+            else:
+                fail_count += 1
+            continue
+
+        batches.setdefault(png_file.parent, []).append((png_file, output_path))
+
+    for folder, pairs in batches.items():
+        print(f"  Processing: {folder.name}/ ({len(pairs)} frames)...", end=" ")
+        pairs, images, bad = load_batch(pairs, runtime, store)
+        if bad:
+            print(f"⚠️  {len(bad)} unreadable frame(s) skipped", end=" ")
+            for src, e in bad:
+                print(f"\n    ❌ {src.name}: {e}", end="")
+            print("\n   ", end=" ")
+            fail_count += len(bad)
+        if not pairs:
+            print("❌ No readable frames")
+            continue
+
+        try:
+            if runtime is not None:
+                with metrics.timer("rembg"):
+                    images = runtime.remove(images)
+            output_paths = [dst for _, dst in pairs]
+            if resize:
+                resized = save_resized(images, output_paths, resize, scales)
+                print(f"[Resized to {resize[0]}x{resize[1]}]", end=" ")
+                images = resized.get(1)
+            else:
+                for img, dst in zip(images, output_paths):
+                    save_png(img, dst)
+            if store is not None and images:
+                store.write_images(output_paths[0].parent, [dst.name for dst in output_paths], images)
+            success_count += len(pairs)
+            print("✅")
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            fail_count += len(pairs)
 
     print(f"\n{'='*70}")
     print(f"✅ Processing Complete")
@@ -121,6 +252,8 @@ def process_directory(input_dir, output_dir=None, recursive=False, resize=None):
     print(f"Output:  {output_dir}")
     print(f"{'='*70}\n")
 
+    metrics.finish()
+
 def main():
     parser = argparse.ArgumentParser(
         description="Remove backgrounds from game asset images",
@@ -139,6 +272,15 @@ Examples:
   # Process with resize
   python batch_remove_bg.py --input temp --output assets --resize 64 64
 
+  # Resize with HiDPI variants (name.png, name@2x.png, name@4x.png)
+  python batch_remove_bg.py --input temp --output assets --resize 64 64 --scales 1 2 4
+
+  # Tuned ONNX Runtime: 4 threads, 4 frames per inference (see rembg_runtime.py)
+  python batch_remove_bg.py --input temp --output assets --threads 4 --batch-size 4
+
+  # Keep the cut-out frames in the memory-mapped frame store for the next stage
+  python batch_remove_bg.py --input temp --output assets --frame-store temp_generated/frame_store
+
   # Process in-place (overwrite originals)
   python batch_remove_bg.py --input ../assets/effects/explosion/small --in-place
         """
@@ -148,14 +290,20 @@ Examples:
     parser.add_argument("--output", "-o", type=str, help="Output directory (default: same as input)")
     parser.add_argument("--recursive", "-r", action="store_true", help="Process subdirectories recursively")
     parser.add_argument("--resize", nargs=2, type=int, metavar=("WIDTH", "HEIGHT"), help="Resize images to WIDTHxHEIGHT")
+    parser.add_argument("--scales", nargs="+", type=int, default=[1],
+                        help="With --resize, also write name@2x.png etc. (e.g. --scales 1 2 4)")
+    parser.add_argument("--threads", type=int, help="ONNX Runtime intra-op threads (uses the tuned runtime)")
+    parser.add_argument("--batch-size", type=int, default=1, help="Images per inference call (uses the tuned runtime if > 1)")
     parser.add_argument("--in-place", action="store_true", help="Overwrite original files (same as not specifying --output)")
+    parser.add_argument("--frame-store", type=str, help="Write output frames to a memory-mapped frame store at this path")
+    add_metrics_arguments(parser)
 
     args = parser.parse_args()
 
-    # Check if rembg is installed
-    try:
-        import rembg
-    except ImportError:
+    metrics.configure("batch_remove_bg", args.metrics_out, args.metrics_port)
+
+    # Check if rembg is installed (without paying for the import yet)
+    if importlib.util.find_spec("rembg") is None:
         print("❌ Error: rembg is not installed")
         print("\nInstall with:")
         print("  pip install rembg pillow")
@@ -168,14 +316,29 @@ Examples:
     if args.resize:
         resize = tuple(args.resize)
 
+    runtime = None
+    if args.threads or args.batch_size > 1:
+        from rembg_runtime import MattingSession
+        runtime = MattingSession(intra_threads=args.threads, batch_size=args.batch_size)
+        print(f"⚙️  ONNX Runtime: {args.threads or 'default'} threads, batch {runtime.batch_size}")
+
+    store = None
+    if args.frame_store:
+        from frame_store import FrameStore
+        store = FrameStore(args.frame_store)
+
     # Process directory
     output = None if args.in_place else args.output
-    process_directory(
-        input_dir=args.input,
-        output_dir=output,
-        recursive=args.recursive,
-        resize=resize
-    )
+    with sync_batch():
+        process_directory(
+            input_dir=args.input,
+            output_dir=output,
+            recursive=args.recursive,
+            resize=resize,
+            scales=tuple(args.scales),
+            runtime=runtime,
+            store=store
+        )
 
 if __name__ == "__main__":
     main()
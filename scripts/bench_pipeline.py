@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+Asset Pipeline Benchmarks
+素材管線效能基準測試
+
+Runs the real pipeline code against local stand-ins so throughput can be
+compared between commits without a GPU or network:
+
+    generator   GameAssetGenerator end to end against fake_webui.py
+    batching    txt2img requests built by GameAssetGenerator, swept over the
+                WebUI's batch_size × n_iter against fake_webui.py
+    remove-bg   batch_remove_bg.process_image on synthetic frames (needs rembg)
+    download    ModelDownloader.download_file from a local HTTP file server
+    imports     `python -X importtime` per CLI module and `assets.py <cmd> --help` wall time
+
+Each case reports images (or MB) per second, p50/p99 latency and peak RSS.
+pytest-benchmark cases for process_image and the download path live in
+tests/test_bench.py and share the fixtures below (synthetic frames, local
+file server).
+
+Usage:
+    python bench_pipeline.py generator --frames 20 --concurrency 1 2 4 --latency 0.2 --jitter 0.05
+    python bench_pipeline.py generator --frames 40 --slots 2 --max-inflight 1 4 8
+    python bench_pipeline.py batching --batch-size 1 2 4 --n-iter 1 2 --latency 0.2 --image-latency 0.05
+    python bench_pipeline.py remove-bg --images 8 --size 512 --rounds 3
+    python bench_pipeline.py download --size-mb 64 --rounds 3
+    python bench_pipeline.py imports --rounds 5 --import-budget-ms 50
+    python bench_pipeline.py all --json bench.json
+"""
+
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from asset_metrics import metrics
+from fake_webui import FakeWebUI, encode_png
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (0 where unsupported)"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def child_peak_rss_mb():
+    """Largest peak RSS among finished child processes in MB"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+def stage_stats(stage):
+    """p50/p99 for a stage recorded through asset_metrics"""
+    for record in metrics.snapshot():
+        if record["type"] == "histogram" and record["labels"].get("stage") == stage:
+            return record["p50"], record["p99"]
+    return 0.0, 0.0
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the pipeline's per-frame output while timing"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+@contextlib.contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+class QuietFileHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+@contextlib.contextmanager
+def file_server(directory):
+    """Serve a folder over HTTP on a free localhost port; yields the base URL"""
+    handler = functools.partial(QuietFileHandler, directory=str(directory))
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+def write_blob(path, size_mb):
+    """Random file of size_mb MiB (incompressible, like model weights)"""
+    with open(path, "wb") as f:
+        chunk = os.urandom(1024 * 1024)
+        for _ in range(size_mb):
+            f.write(chunk)
+    return path
+
+def synthetic_frames(directory, images, size):
+    """Write `images` size×size PNG frames named frame(1).png…; returns their paths"""
+    paths = []
+    for i in range(images):
+        path = Path(directory) / f"frame({i + 1}).png"
+        path.write_bytes(encode_png(size, size, seed=i))
+        paths.append(path)
+    return paths
+
+def print_result(result):
+    name = result["case"]
+    params = ", ".join(f"{k}={v}" for k, v in result["params"].items())
+    print(f"   {name:<10} {params:<40} "
+          f"{result['throughput']:>8.2f} {result['unit']:<9} "
+          f"p50 {result['p50_ms']:>8.1f} ms  p99 {result['p99_ms']:>8.1f} ms  "
+          f"RSS {result['peak_rss_mb']:>7.1f} MB")
+
+# ----------------------------------------------------------------------
+# Cases
+# ----------------------------------------------------------------------
+
+def bench_generator(frames, concurrency, latency, jitter, error_rate, image_size,
+                    slots=None, max_concurrency=4):
+    """Run `concurrency` character animations in parallel against the stub"""
+    from sd_batch_generator import GameAssetGenerator
+
+    metrics.reset()
+    with FakeWebUI(latency=latency, jitter=jitter, error_rate=error_rate,
+                   image_size=image_size, slots=slots) as server, tempfile.TemporaryDirectory() as tmp:
+        with working_directory(tmp), quiet():
+            generator = GameAssetGenerator(webui_url=server.url, project_root=Path(tmp) / "assets",
+                                           max_concurrency=max_concurrency)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                runs = [pool.submit(generator.generate_character_animation,
+                                    f"bench{i}", "idle", frames, 1000 + i)
+                        for i in range(concurrency)]
+                for run in runs:
+                    run.result()
+            elapsed = time.perf_counter() - start
+
+        written = len(list((Path(tmp) / "assets").rglob("*.png")))
+
+    p50, p99 = stage_stats("http")
+    return {
+        "case": "generator",
+        "params": {"frames": frames, "concurrency": concurrency, "latency": latency,
+                   "max_inflight": max_concurrency},
+        "throughput": written / elapsed,
+        "unit": "images/s",
+        "images": written,
+        "requests": server.request_count,
+        "errors": server.error_count,
+        "final_limits": generator.backends.limits(),
+        "seconds": elapsed,
+        "p50_ms": p50 * 1000,
+        "p99_ms": p99 * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def bench_batching(batch_size, n_iter, requests, concurrency, latency, image_latency, slots=None):
+    """Post generator-built txt2img payloads with WebUI batch_size/n_iter set"""
+    from sd_batch_generator import GameAssetGenerator
+
+    with FakeWebUI(latency=latency, image_latency=image_latency, slots=slots) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        with working_directory(tmp), quiet():
+            generator = GameAssetGenerator(webui_url=server.url, project_root=Path(tmp) / "assets",
+                                           max_concurrency=concurrency)
+
+        def post(i):
+            payload = generator._txt2img_payload("bench sprite", "blurry", 1000 + i * batch_size * n_iter,
+                                                 64, 64)
+            payload.update(batch_size=batch_size, n_iter=n_iter)
+            backend = generator.backends.acquire()
+            latency_s, ok = None, False
+            try:
+                t0 = time.perf_counter()
+                response = backend.session.post(f"{backend.api_url}/txt2img", json=payload,
+                                                timeout=backend.limiter.timeout())
+                latency_s = time.perf_counter() - t0
+                ok = response.status_code == 200
+                return latency_s, len(response.json()["images"]) if ok else 0
+            finally:
+                generator.backends.release(backend, latency_s, ok)
+
+        with quiet():
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                outcomes = list(pool.map(post, range(requests)))
+            elapsed = time.perf_counter() - start
+
+    samples = [latency_s for latency_s, _ in outcomes]
+    images = sum(count for _, count in outcomes)
+    return {
+        "case": "batching",
+        "params": {"batch_size": batch_size, "n_iter": n_iter, "requests": requests,
+                   "concurrency": concurrency},
+        "throughput": images / elapsed,
+        "unit": "images/s",
+        "images": images,
+        "server_images": server.image_count,
+        "seconds": elapsed,
+        "p50_ms": percentile(samples, 0.5) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def bench_remove_bg(images, size, rounds):
+    """Time batch_remove_bg.process_image on synthetic frames"""
+    try:
+        # batch_remove_bg defers this import to the first image
+        import rembg  # noqa: F401
+    except ImportError as e:
+        print(f"   ⏭️  remove-bg skipped ({e})")
+        return None
+    from batch_remove_bg import process_image
+
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        inputs = synthetic_frames(tmp, images, size)
+
+        with quiet():
+            # Warm-up loads the ONNX model so it is not billed to the first sample
+            process_image(inputs[0], tmp / "warmup.png")
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for path in inputs:
+                    t0 = time.perf_counter()
+                    process_image(path, tmp / f"out_{path.name}")
+                    samples.append(time.perf_counter() - t0)
+            elapsed = time.perf_counter() - start
+
+    return {
+        "case": "remove-bg",
+        "params": {"images": images, "size": size, "rounds": rounds},
+        "throughput": len(samples) / elapsed,
+        "unit": "images/s",
+        "seconds": elapsed,
+        "mean_ms": statistics.mean(samples) * 1000,
+        "p50_ms": percentile(samples, 0.5) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def bench_download(size_mb, rounds):
+    """Time ModelDownloader.download_file against a local file server"""
+    from download_models import ModelDownloader
+
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        served = tmp / "served"
+        served.mkdir()
+        write_blob(served / "model.safetensors", size_mb)
+
+        downloader = ModelDownloader()
+        with file_server(served) as base_url, quiet():
+            url = f"{base_url}/model.safetensors"
+            for i in range(rounds):
+                target = tmp / f"download_{i}.safetensors"
+                t0 = time.perf_counter()
+                ok = downloader.download_file(url, target, "bench", f"{size_mb}MB")
+                samples.append(time.perf_counter() - t0)
+                if not ok:
+                    raise RuntimeError("download failed")
+                target.unlink()
+
+    elapsed = sum(samples)
+    return {
+        "case": "download",
+        "params": {"size_mb": size_mb, "rounds": rounds},
+        "throughput": size_mb * rounds / elapsed,
+        "unit": "MB/s",
+        "seconds": elapsed,
+        "p50_ms": percentile(samples, 0.5) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def import_ms(module):
+    """Cumulative import time of a module in a fresh interpreter, from -X importtime"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=SCRIPT_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return None
+    for line in reversed(proc.stderr.splitlines()):
+        match = re.match(r"import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*(\S+)$", line)
+        if match and match.group(2) == module:
+            return int(match.group(1)) / 1000
+    return None
+
+def bench_imports(rounds, budget_ms=None):
+    """Import cost of every CLI module and wall time of `assets.py <command> --help`"""
+    from assets import COMMANDS
+
+    results = []
+    for command, (module, _) in COMMANDS.items():
+        imports = [import_ms(module) for _ in range(rounds)]
+        if None in imports:
+            print(f"   ⏭️  {module} skipped (import failed)")
+            continue
+        samples = []
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, "assets.py", command, "--help"], cwd=SCRIPT_DIR,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            samples.append(time.perf_counter() - t0)
+        median_import = statistics.median(imports)
+        results.append({
+            "case": "imports",
+            "params": {"module": module, "import_ms": round(median_import, 1)},
+            "import_ms": median_import,
+            "over_budget": bool(budget_ms and median_import > budget_ms),
+            "throughput": 1 / statistics.median(samples),
+            "unit": "runs/s",
+            "seconds": sum(samples),
+            "p50_ms": percentile(samples, 0.5) * 1000,
+            "p99_ms": percentile(samples, 0.99) * 1000,
+            "peak_rss_mb": child_peak_rss_mb(),
+        })
+    return results
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the asset pipeline offline",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Generator throughput at several client concurrencies
+  python bench_pipeline.py generator --frames 20 --concurrency 1 2 4 8
+
+  # Does batching on the WebUI side pay off? (cost = latency + image_latency per extra image)
+  python bench_pipeline.py batching --batch-size 1 2 4 8 --n-iter 1 2 --slots 1 --image-latency 0.02
+
+  # Simulate a slow, flaky backend
+  python bench_pipeline.py generator --latency 1.5 --jitter 0.5 --error-rate 0.05
+
+  # CLI startup: fail if any module takes more than 50 ms to import
+  python bench_pipeline.py imports --import-budget-ms 50
+
+  # Everything, saved for comparison
+  python bench_pipeline.py all --json bench.json
+        """
+    )
+
+    parser.add_argument("case", choices=["generator", "batching", "remove-bg", "download", "imports", "all"], help="Benchmark to run")
+    parser.add_argument("--frames", type=int, default=10, help="Frames per animation (generator)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="Parallel animations (generator); the last value is used for batching")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub latency in seconds (generator)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Stub latency jitter in seconds (generator)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Stub failure rate (generator)")
+    parser.add_argument("--image-size", nargs=2, type=int, metavar=("WIDTH", "HEIGHT"),
+                        help="Force stub image size (generator)")
+    parser.add_argument("--slots", type=int, help="Stub generation slots, emulating GPU capacity (generator)")
+    parser.add_argument("--max-inflight", type=int, nargs="+", default=[4],
+                        help="Adaptive per-backend concurrency caps to compare (generator)")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 2, 4],
+                        help="WebUI batch_size values to sweep (batching)")
+    parser.add_argument("--n-iter", type=int, nargs="+", default=[1],
+                        help="WebUI n_iter values to sweep (batching)")
+    parser.add_argument("--requests", type=int, default=8, help="txt2img requests per setting (batching)")
+    parser.add_argument("--image-latency", type=float, default=0.01,
+                        help="Stub seconds per extra image in a batch (batching)")
+    parser.add_argument("--images", type=int, default=4, help="Synthetic frames (remove-bg)")
+    parser.add_argument("--size", type=int, default=512, help="Synthetic frame size (remove-bg)")
+    parser.add_argument("--size-mb", type=int, default=32, help="Served file size (download)")
+    parser.add_argument("--rounds", type=int, default=3, help="Repetitions (remove-bg, download, imports)")
+    parser.add_argument("--import-budget-ms", type=float,
+                        help="Exit with status 1 if a CLI module imports slower than this (imports)")
+    parser.add_argument("--json", type=str, metavar="FILE", help="Write results as JSON")
+
+    args = parser.parse_args()
+
+    print(f"\n{'='*70}")
+    print(f"🏁 Asset Pipeline Benchmarks")
+    print(f"{'='*70}\n")
+
+    results = []
+    cases = ["generator", "batching", "remove-bg", "download", "imports"] if args.case == "all" else [args.case]
+
+    if "generator" in cases:
+        image_size = tuple(args.image_size) if args.image_size else None
+        for max_inflight in args.max_inflight:
+            for concurrency in args.concurrency:
+                results.append(bench_generator(args.frames, concurrency, args.latency,
+                                               args.jitter, args.error_rate, image_size,
+                                               slots=args.slots, max_concurrency=max_inflight))
+                print_result(results[-1])
+
+    if "batching" in cases:
+        for batch_size in args.batch_size:
+            for n_iter in args.n_iter:
+                results.append(bench_batching(batch_size, n_iter, args.requests, args.concurrency[-1],
+                                              args.latency, args.image_latency, slots=args.slots))
+                print_result(results[-1])
+
+    if "remove-bg" in cases:
+        result = bench_remove_bg(args.images, args.size, args.rounds)
+        if result:
+            results.append(result)
+            print_result(result)
+
+    if "download" in cases:
+        results.append(bench_download(args.size_mb, args.rounds))
+        print_result(results[-1])
+
+    over_budget = []
+    if "imports" in cases:
+        for result in bench_imports(args.rounds, args.import_budget_ms):
+            results.append(result)
+            print_result(result)
+            if result["over_budget"]:
+                over_budget.append(result["params"]["module"])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"timestamp": time.time(), "python": sys.version.split()[0],
+                       "results": results}, f, indent=2)
+        print(f"\n📄 Results written to {args.json}")
+
+    if over_budget:
+        print(f"\n❌ Import budget of {args.import_budget_ms:.0f} ms exceeded: {', '.join(over_budget)}")
+
+    print(f"\n{'='*70}\n")
+
+    if over_budget:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1169 @@
+#!/usr/bin/env python3
+"""
+Distributed Asset Build Farm (Coordinator + Work-Stealing Workers)
+分散式素材建置（協調器與工作竊取 Worker）
+
+Spreads the image-heavy stages of a full asset rebuild over any number of
+worker processes on any number of hosts. The coordinator walks the asset
+tree the way manifest_generator.py does and turns it into a job graph:
+
+    frame job    one per frame: remove-bg, resize          (per-frame stages)
+    action job   one per action, after all its frame jobs:
+                 trim, analyze, quality, delta             (per-action stages)
+
+Workers talk HTTP/JSON to the coordinator over TCP or a Unix socket (the
+same transport as the generation daemon) and pull work:
+
+    - Ready jobs are sharded by action: a worker asking for work takes a
+      whole action's frames from the backlog into its own queue, and the
+      action job is queued on the worker that built most of its frames,
+      whose cache already holds them.
+    - A worker whose queue and the backlog are empty steals the newest
+      half of the longest other queue.
+    - A leased job that is not reported back within --lease seconds (a
+      worker died or hangs) goes back to the backlog and is retried up to
+      --max-attempts times.
+
+Everything moves by SHA-256. Jobs list their inputs by hash and workers keep
+a content-addressed cache (shared by the workers of one host), so a frame is
+downloaded at most once per host. Results are reported as hashes first and
+the coordinator only asks for the blobs it does not already have: unchanged
+outputs and identical frames are never uploaded. A job whose stage settings
+and input hashes match a previous build (.farm-cache.json in the output
+root) is not dispatched at all. Frame results that a later trim replaces
+are intermediate: they stay in the coordinator's blob store (.farm-blobs)
+instead of the output tree, so the next build can still reuse them.
+
+The coordinator trusts nobody by default: it binds to loopback unless a
+shared secret is set (--token or BUILD_FARM_TOKEN), which every request
+must then carry in the X-Farm-Token header, and it only accepts results
+named like the files a job can produce (its input frames, plus
+<action>.analyze.json, <action>.quality.json and <action>.spd).
+
+Atlas packing stays in asset_bundler.py, which packs whole bundles from the
+output tree once the farm is done. With --frame-store the coordinator puts
+every completed output action into the memory-mapped frame store
+(frame_store.py) at the end, so later analysis, quantization and delta
+encoding open the farm's results without decoding a PNG. Workers keep
+reading their inputs as blobs: they may run on other hosts.
+
+Usage:
+    # Coordinator, then workers on any host that can reach it (same secret on both)
+    export BUILD_FARM_TOKEN=$(python -c "import secrets; print(secrets.token_hex(16))")
+    python build_farm.py serve --input ../assets --output build/assets \\
+        --stages resize,trim,analyze --size 256 256 --host 0.0.0.0 --port 7890
+    python build_farm.py work --connect http://build-01:7890
+
+    # Coordinator and 4 worker processes on this machine over a Unix socket
+    python build_farm.py local --workers 4 --input ../assets --output build/assets \\
+        --stages resize,trim,delta --size 256 256 --frame-store temp_generated/frame_store
+"""
+
+import argparse
+import hashlib
+import hmac
+import ipaddress
+import http.client
+import io
+import json
+import os
+import secrets
+import shutil
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from asset_tree import frame_names, natural_key
+from atomic_io import atomic_copy, atomic_write, sync_batch
+
+FARM_VERSION = 1
+CACHE_FILE = ".farm-cache.json"
+BLOB_DIR = ".farm-blobs"
+DEFAULT_WORKER_CACHE = "temp_generated/farm_cache"
+
+FRAME_STAGES = ("remove-bg", "resize")
+ACTION_STAGES = ("trim", "analyze", "quality", "delta")
+
+TOKEN_HEADER = "X-Farm-Token"
+TOKEN_ENV = "BUILD_FARM_TOKEN"
+
+WAITING = "waiting"
+READY = "ready"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+class FarmError(Exception):
+    """Raised for protocol errors between workers and the coordinator"""
+
+def blob_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def parse_stages(text: str) -> List[str]:
+    stages = [s.strip() for s in text.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in FRAME_STAGES + ACTION_STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {', '.join(unknown)} "
+                         f"(choose from {', '.join(FRAME_STAGES + ACTION_STAGES)})")
+    return stages
+
+# ----------------------------------------------------------------------
+# Job graph
+# ----------------------------------------------------------------------
+
+class FarmJob:
+    """One frame or action job of the graph"""
+
+    def __init__(self, job_id: int, kind: str, group: str, out_dir: Path, stages: List[str], final=True):
+        self.id = job_id
+        self.kind = kind
+        self.group = group
+        self.out_dir = out_dir
+        self.stages = stages
+        self.final = final
+        self.inputs: List[dict] = []
+        self.deps = set()
+        self.dependents: List[int] = []
+        self.state = WAITING
+        self.owner = None
+        self.deadline = 0.0
+        self.attempts = 0
+        self.outputs: List[dict] = []
+        self.key = None
+        self.error = None
+
+    def output_names(self) -> set:
+        """Every file name a result of this job may carry"""
+        action = self.group.rsplit("/", 1)[-1]
+        names = {i["name"] for i in self.inputs}
+        if "analyze" in self.stages:
+            names.add(f"{action}.analyze.json")
+        if "quality" in self.stages:
+            names.add(f"{action}.quality.json")
+        if "delta" in self.stages:
+            names.add(f"{action}.spd")
+        return names
+
+    def to_wire(self, options: dict) -> dict:
+        return {"id": self.id, "kind": self.kind, "group": self.group, "stages": self.stages,
+                "inputs": self.inputs, "options": options}
+
+def job_key(job: FarmJob, options: dict) -> str:
+    """Hash of everything that determines a job's outputs"""
+    data = {"version": FARM_VERSION, "kind": job.kind, "stages": job.stages, "options": options,
+            "inputs": [[i["name"], i["sha256"]] for i in job.inputs]}
+    return blob_hash(json.dumps(data, sort_keys=True).encode("utf-8"))
+
+def build_graph(assets_root: Path, output_root: Path, stages: List[str], jobs=8):
+    """Frame and action jobs for every action under assets_root
+
+    Returns (jobs by id, {sha256: source path}).
+    """
+    from manifest_generator import scan_assets
+
+    frame_stages = [s for s in stages if s in FRAME_STAGES]
+    action_stages = [s for s in stages if s in ACTION_STAGES]
+    graph: Dict[int, FarmJob] = {}
+    sources = []
+
+    for entry in scan_assets(assets_root):
+        for action, (folder, names) in entry.actions.items():
+            src_dir = entry.path if folder == "." else entry.path / folder
+            out_dir = output_root / src_dir.relative_to(assets_root)
+            group = f"{entry.path.relative_to(assets_root).as_posix()}/{action}"
+
+            action_job = None
+            if action_stages:
+                action_job = FarmJob(len(graph), "action", group, out_dir, action_stages)
+                graph[action_job.id] = action_job
+            for name in names:
+                if frame_stages:
+                    # Frames a trim rewrites afterwards never go to the output tree
+                    job = FarmJob(len(graph), "frame", group, out_dir, frame_stages,
+                                  final="trim" not in action_stages)
+                    graph[job.id] = job
+                    sources.append((job, name, src_dir / name))
+                    if action_job:
+                        action_job.deps.add(job.id)
+                        job.dependents.append(action_job.id)
+                else:
+                    sources.append((action_job, name, src_dir / name))
+
+    def describe(item):
+        job, name, path = item
+        return job, name, path, file_hash(path), path.stat().st_size
+
+    index = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for job, name, path, sha, size in pool.map(describe, sources):
+            job.inputs.append({"name": name, "sha256": sha, "bytes": size})
+            index[sha] = path
+    return graph, index
+
+# ----------------------------------------------------------------------
+# Coordinator
+# ----------------------------------------------------------------------
+
+class Coordinator:
+    """Job graph, per-worker queues with stealing, leases and the blob index"""
+
+    def __init__(self, graph: Dict[int, FarmJob], index: Dict[str, Path], output_root: Path,
+                 options: dict, lease=300.0, max_attempts=3, force=False):
+        self.jobs = graph
+        self.index = dict(index)
+        self.output_root = Path(output_root)
+        self.blob_dir = self.output_root / BLOB_DIR
+        self.options = options
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.lock = threading.RLock()
+        self.finished = threading.Event()
+        self.backlog = deque()
+        self.leased = set()
+        self.queues: Dict[str, deque] = {}
+        self.workers: Dict[str, dict] = {}
+        self.affinity: Dict[str, Dict[str, int]] = {}
+        self.stats = {"served_bytes": 0, "uploaded_bytes": 0, "skipped_uploads": 0,
+                      "skipped_bytes": 0, "cached_jobs": 0, "steals": 0, "requeued": 0}
+        self.started = time.time()
+
+        self.cache_path = self.output_root / CACHE_FILE
+        self.cache = {"version": FARM_VERSION, "jobs": {}}
+        if self.cache_path.exists() and not force:
+            try:
+                cache = json.loads(self.cache_path.read_text(encoding="utf-8"))
+                if cache.get("version") == FARM_VERSION:
+                    self.cache = cache
+            except json.JSONDecodeError:
+                pass
+
+        with self.lock:
+            for job in self.jobs.values():
+                if not job.deps:
+                    self._make_ready(job)
+            self._check_finished()
+
+    # -- scheduling -----------------------------------------------------
+
+    def _cached_outputs(self, job: FarmJob) -> Optional[List[dict]]:
+        outputs = self.cache["jobs"].get(job.key)
+        if outputs is None:
+            return None
+        for output in outputs:
+            path = job.out_dir / output["name"] if job.final else self.blob_dir / output["sha256"]
+            try:
+                if path.stat().st_size != output["bytes"]:
+                    return None
+            except FileNotFoundError:
+                return None
+        return outputs
+
+    def _make_ready(self, job: FarmJob):
+        job.key = job_key(job, self.options)
+        cached = self._cached_outputs(job)
+        if cached is not None:
+            self.stats["cached_jobs"] += 1
+            self._complete(job, cached)
+            return
+
+        job.state = READY
+        if job.kind == "action":
+            # Queue it where most of its frames were built (their blobs are cached there)
+            counts = self.affinity.get(job.group, {})
+            owner = max(counts, key=counts.get) if counts else None
+            if owner in self.queues:
+                self.queues[owner].append(job.id)
+                return
+        self.backlog.append(job.id)
+
+    def _complete(self, job: FarmJob, outputs: List[dict]):
+        job.state = DONE
+        job.outputs = outputs
+        self.cache["jobs"][job.key] = outputs
+        for output in outputs:
+            path = job.out_dir / output["name"] if job.final else self.blob_dir / output["sha256"]
+            self.index.setdefault(output["sha256"], path)
+        by_name = {o["name"]: o for o in outputs}
+        for dep_id in job.dependents:
+            dependent = self.jobs[dep_id]
+            dependent.deps.discard(job.id)
+            for i in job.inputs:
+                out = by_name.get(i["name"], i)
+                dependent.inputs.append({"name": out["name"], "sha256": out["sha256"], "bytes": out["bytes"]})
+            if not dependent.deps and dependent.state == WAITING:
+                dependent.inputs.sort(key=lambda i: natural_key(i["name"]))
+                self._make_ready(dependent)
+
+    def _fail(self, job: FarmJob, error: str):
+        job.error = error
+        if job.attempts < self.max_attempts:
+            job.state = READY
+            self.backlog.appendleft(job.id)
+            self.stats["requeued"] += 1
+            return
+        job.state = FAILED
+        # Dependents can never run
+        pending = list(job.dependents)
+        while pending:
+            dependent = self.jobs[pending.pop()]
+            if dependent.state == WAITING:
+                dependent.state = FAILED
+                dependent.error = f"dependency {job.id} failed"
+                pending.extend(dependent.dependents)
+        # The last open job may have just failed (e.g. its final lease expired)
+        self._check_finished()
+
+    def _check_finished(self):
+        if all(job.state in (DONE, FAILED) for job in self.jobs.values()):
+            self.finished.set()
+
+    def _reap(self, now: float):
+        """Requeue expired leases and the queues of workers that stopped asking"""
+        for job_id in list(self.leased):
+            job = self.jobs[job_id]
+            if job.deadline < now:
+                self.leased.discard(job_id)
+                self._fail(job, f"lease expired on {job.owner}")
+        for worker_id, worker in self.workers.items():
+            queue = self.queues[worker_id]
+            if queue and now - worker["seen"] > self.lease:
+                self.backlog.extendleft(reversed(queue))
+                queue.clear()
+
+    def _take_backlog(self, queue: deque):
+        """Move the action at the head of the backlog (all its ready jobs) to a worker's queue"""
+        group = self.jobs[self.backlog[0]].group
+        while self.backlog and self.jobs[self.backlog[0]].group == group:
+            queue.append(self.backlog.popleft())
+
+    def _steal(self, thief: str) -> bool:
+        victims = [(len(q), w) for w, q in self.queues.items() if w != thief and len(q) > 1]
+        if not victims:
+            victims = [(len(q), w) for w, q in self.queues.items() if w != thief and q]
+        if not victims:
+            return False
+        _, victim = max(victims)
+        source = self.queues[victim]
+        count = max(1, len(source) // 2)
+        stolen = [source.pop() for _ in range(count)]
+        self.queues[thief].extend(reversed(stolen))
+        self.workers[thief]["stolen"] += count
+        self.stats["steals"] += 1
+        return True
+
+    # -- protocol -------------------------------------------------------
+
+    def register(self, info: dict) -> dict:
+        with self.lock:
+            worker_id = f"{info.get('host', 'worker')}-{info.get('pid', 0)}-{len(self.workers) + 1}"
+            self.workers[worker_id] = {"host": info.get("host"), "seen": time.time(), "jobs": 0,
+                                       "stolen": 0, "failed": 0, "seconds": 0.0,
+                                       "fetched": 0, "cache_hits": 0}
+            self.queues[worker_id] = deque()
+        return {"worker": worker_id, "options": self.options}
+
+    def lease_job(self, worker_id: str) -> dict:
+        with self.lock:
+            if worker_id not in self.workers:
+                raise FarmError(f"Unknown worker {worker_id}")
+            now = time.time()
+            self.workers[worker_id]["seen"] = now
+            self._reap(now)
+            if self.finished.is_set():
+                return {"finished": True}
+
+            queue = self.queues[worker_id]
+            while True:
+                if not queue:
+                    if self.backlog:
+                        self._take_backlog(queue)
+                    elif not self._steal(worker_id):
+                        return {"wait": 0.2}
+                job = self.jobs[queue.popleft()]
+                if job.state == READY:
+                    break
+
+            job.state = LEASED
+            self.leased.add(job.id)
+            job.owner = worker_id
+            job.attempts += 1
+            job.deadline = now + self.lease
+            return {"job": job.to_wire(self.options)}
+
+    def blob_path(self, sha256: str) -> Optional[Path]:
+        with self.lock:
+            path = self.index.get(sha256)
+        return path if path is not None and path.exists() else None
+
+    def store_blob(self, sha256: str, data: bytes):
+        if blob_hash(data) != sha256:
+            raise FarmError("Uploaded blob does not match its hash")
+        path = self.blob_dir / sha256
+        atomic_write(path, data)
+        with self.lock:
+            self.index[sha256] = path
+            self.stats["uploaded_bytes"] += len(data)
+
+    @staticmethod
+    def _check_outputs(job: FarmJob, outputs) -> List[dict]:
+        """Reject result entries that are malformed or name files the job cannot produce"""
+        if not isinstance(outputs, list):
+            raise FarmError("outputs must be a list")
+        allowed = job.output_names()
+        out_dir = job.out_dir.resolve()
+        checked = []
+        for output in outputs:
+            name = output.get("name") if isinstance(output, dict) else None
+            sha256 = output.get("sha256") if isinstance(output, dict) else None
+            if not isinstance(name, str) or Path(name).name != name or name in ("", ".", ".."):
+                raise FarmError(f"Job {job.id}: invalid output name {name!r}")
+            if (out_dir / name).resolve().parent != out_dir:
+                raise FarmError(f"Job {job.id}: output {name!r} leaves the output folder")
+            if name not in allowed:
+                raise FarmError(f"Job {job.id}: unexpected output {name!r}")
+            if not isinstance(sha256, str) or len(sha256) != 64 or \
+                    any(c not in "0123456789abcdef" for c in sha256):
+                raise FarmError(f"Job {job.id}: invalid hash for {name!r}")
+            if not isinstance(output.get("bytes"), int) or output["bytes"] < 0:
+                raise FarmError(f"Job {job.id}: invalid size for {name!r}")
+            checked.append({"name": name, "sha256": sha256, "bytes": output["bytes"]})
+        return checked
+
+    def report(self, job_id: int, result: dict) -> dict:
+        """Accept a job's result; returns {"missing": [...]} until every output blob is here"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            worker_id = result.get("worker")
+            if job is None:
+                raise FarmError(f"Unknown job {job_id}")
+            if job.state != LEASED or job.owner != worker_id:
+                # Lease expired and the job went to someone else; drop this late result
+                return {"stale": True}
+            worker = self.workers[worker_id]
+
+            if result.get("error"):
+                worker["failed"] += 1
+                self.leased.discard(job.id)
+                self._fail(job, result["error"])
+                return {"ok": False}
+
+            outputs = self._check_outputs(job, result["outputs"])
+            missing = []
+            for output in outputs:
+                path = self.index.get(output["sha256"])
+                if path is None or not path.exists():
+                    missing.append(output["sha256"])
+            if missing:
+                return {"missing": sorted(set(missing))}
+            uploaded = set(result.get("uploaded", ()))
+            for output in outputs:
+                if output["sha256"] not in uploaded:
+                    self.stats["skipped_uploads"] += 1
+                    self.stats["skipped_bytes"] += output["bytes"]
+
+        # Place outputs outside the lock: copies of large frames take a while
+        if job.final:
+            with sync_batch():
+                for output in outputs:
+                    target = job.out_dir / output["name"]
+                    source = self.blob_path(output["sha256"])
+                    if source is None:
+                        return {"missing": [output["sha256"]]}
+                    if source.resolve() == target.resolve():
+                        continue
+                    if target.exists() and target.stat().st_size == output["bytes"] and \
+                            file_hash(target) == output["sha256"]:
+                        continue
+                    atomic_copy(source, target)
+        else:
+            for output in outputs:
+                # Intermediate results live in the blob store (needed by the next build's cache)
+                if not (self.blob_dir / output["sha256"]).exists():
+                    source = self.blob_path(output["sha256"])
+                    if source is None:
+                        return {"missing": [output["sha256"]]}
+                    atomic_copy(source, self.blob_dir / output["sha256"])
+
+        with self.lock:
+            if job.state != LEASED or job.owner != worker_id:
+                return {"stale": True}
+            self.leased.discard(job.id)
+            worker["jobs"] += 1
+            worker["seconds"] += result.get("seconds", 0.0)
+            worker["fetched"] += result.get("fetched", 0)
+            worker["cache_hits"] += result.get("cache_hits", 0)
+            counts = self.affinity.setdefault(job.group, {})
+            counts[worker_id] = counts.get(worker_id, 0) + 1
+            self._complete(job, outputs)
+            self._check_finished()
+        return {"ok": True}
+
+    def status(self) -> dict:
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.state] = counts.get(job.state, 0) + 1
+            return {"jobs": len(self.jobs), "states": counts, "backlog": len(self.backlog),
+                    "queues": {w: len(q) for w, q in self.queues.items()},
+                    "workers": self.workers, "stats": self.stats,
+                    "finished": self.finished.is_set(), "uptime": round(time.time() - self.started, 1)}
+
+    def save_cache(self):
+        """Write the result cache and drop blobs no intermediate result refers to"""
+        with self.lock:
+            done = [job for job in self.jobs.values() if job.state == DONE and job.key]
+            live = {job.key for job in done}
+            self.cache["jobs"] = {k: v for k, v in self.cache["jobs"].items() if k in live}
+            keep = {o["sha256"] for job in done if not job.final for o in job.outputs}
+            atomic_write(self.cache_path, json.dumps(self.cache, indent=2))
+        if self.blob_dir.exists():
+            for path in self.blob_dir.iterdir():
+                if path.name not in keep:
+                    path.unlink()
+
+    def store_frames(self, store) -> int:
+        """Put every fully built output folder into a frame store; returns the folder count"""
+        with self.lock:
+            folders: Dict[Path, List[FarmJob]] = {}
+            for job in self.jobs.values():
+                if job.final:
+                    folders.setdefault(job.out_dir, []).append(job)
+            complete = {out_dir: frame_names([o["name"] for job in jobs for o in job.outputs])
+                        for out_dir, jobs in folders.items() if all(job.state == DONE for job in jobs)}
+        stored = 0
+        for out_dir, names in complete.items():
+            if names:
+                store.load(out_dir, names)
+                stored += 1
+        return stored
+
+def make_handler(coordinator: Coordinator, token: Optional[str] = None):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _authorized(self) -> bool:
+            if not token:
+                return True
+            if hmac.compare_digest(self.headers.get(TOKEN_HEADER, ""), token):
+                return True
+            # Drain the body so the keep-alive connection stays usable
+            self._body()
+            self._send_json(401, {"error": f"missing or wrong {TOKEN_HEADER}"})
+            return False
+
+        def _send(self, status, body: bytes, content_type="application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status, obj):
+            self._send(status, json.dumps(obj).encode("utf-8"))
+
+        def _body(self) -> bytes:
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+            except ValueError:
+                raise FarmError("invalid Content-Length")
+            return self.rfile.read(max(0, length))
+
+        def _parts(self):
+            return [p for p in self.path.split("?")[0].split("/") if p]
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            parts = self._parts()
+            if parts == ["health"]:
+                self._send_json(200, coordinator.status())
+            elif len(parts) == 2 and parts[0] == "blobs":
+                path = coordinator.blob_path(parts[1])
+                if path is None:
+                    self._send_json(404, {"error": "blob not found"})
+                    return
+                data = path.read_bytes()
+                with coordinator.lock:
+                    coordinator.stats["served_bytes"] += len(data)
+                self._send(200, data, "application/octet-stream")
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_PUT(self):
+            if not self._authorized():
+                return
+            parts = self._parts()
+            if len(parts) != 2 or parts[0] != "blobs":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                coordinator.store_blob(parts[1], self._body())
+            except FarmError as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            self._send_json(201, {"ok": True})
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            parts = self._parts()
+            try:
+                request = json.loads(self._body() or b"{}")
+                if parts == ["workers"]:
+                    self._send_json(200, coordinator.register(request))
+                elif parts == ["work"]:
+                    self._send_json(200, coordinator.lease_job(request.get("worker")))
+                elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "result":
+                    reply = coordinator.report(int(parts[1]), request)
+                    self._send_json(409 if "missing" in reply else 200, reply)
+                else:
+                    self._send_json(404, {"error": "not found"})
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": "invalid JSON"})
+            except (FarmError, ValueError, KeyError) as e:
+                self._send_json(400, {"error": str(e)})
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ("local", 0)
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def start_server(coordinator: Coordinator, host="127.0.0.1", port=7890, socket_path=None, token=None):
+    """Serve the coordinator from a background thread; returns (server, address for workers)"""
+    if not socket_path and not token and not is_loopback(host):
+        raise FarmError(f"Refusing to serve on {host} without a shared secret (--token or {TOKEN_ENV})")
+    handler = make_handler(coordinator, token)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, handler)
+        address = f"unix:{socket_path}"
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        address = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, address
+
+# ----------------------------------------------------------------------
+# Worker
+# ----------------------------------------------------------------------
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=60):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+class FarmClient:
+    """Keep-alive HTTP client for http://host:port or unix:/path coordinators"""
+
+    def __init__(self, address: str, timeout=60, token: Optional[str] = None):
+        self.address = address
+        self.timeout = timeout
+        self.token = token
+        self.conn = None
+
+    def _connect(self):
+        if self.address.startswith("unix:"):
+            return UnixHTTPConnection(self.address[5:], self.timeout)
+        parsed = urlparse(self.address if "://" in self.address else f"http://{self.address}")
+        return http.client.HTTPConnection(parsed.hostname, parsed.port or 7890, timeout=self.timeout)
+
+    def request(self, method: str, path: str, body: bytes = None, retries=3):
+        for attempt in range(retries):
+            if self.conn is None:
+                self.conn = self._connect()
+            try:
+                headers = {"Content-Length": str(len(body or b""))}
+                if self.token:
+                    headers[TOKEN_HEADER] = self.token
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                return response.status, response.read()
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                self.conn = None
+                if attempt == retries - 1:
+                    raise
+                time.sleep(0.5 * (attempt + 1))
+
+    def call(self, method: str, path: str, obj=None):
+        status, data = self.request(method, path, json.dumps(obj or {}).encode("utf-8"))
+        reply = json.loads(data or b"{}")
+        if status >= 400 and "missing" not in reply:
+            raise FarmError(f"{method} {path}: {status} {reply.get('error')}")
+        return reply
+
+class BlobCache:
+    """Content-addressed blobs on a worker host, shared by its worker processes"""
+
+    def __init__(self, root=DEFAULT_WORKER_CACHE):
+        self.root = Path(root) / "blobs"
+
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def put(self, data: bytes) -> str:
+        sha = blob_hash(data)
+        path = self.path(sha)
+        if not path.exists():
+            atomic_write(path, data)
+        return sha
+
+def encode_png(img) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+def run_stages(images: Dict[str, "Image.Image"], job: dict, workdir: Path):
+    """Run a job's stages; returns (frames changed by the stages, extra files {name: bytes}, report)"""
+    import numpy as np
+    from PIL import Image
+
+    options = job["options"]
+    names = sorted(images, key=natural_key)
+    changed = set()
+    files, report = {}, {}
+
+    for stage in job["stages"]:
+        if stage == "remove-bg":
+            from batch_remove_bg import remove_background
+            for name in names:
+                images[name] = remove_background(workdir / name)
+                changed.add(name)
+        elif stage == "resize":
+            from batch_remove_bg import get_resize_engine
+            resized = get_resize_engine().resize_images([images[n] for n in names], tuple(options["size"]))[1]
+            images.update(zip(names, resized))
+            changed.update(names)
+        elif stage == "trim":
+            # One crop box for the whole action so frames stay aligned
+            boxes = [images[n].convert("RGBA").getchannel("A").getbbox() for n in names]
+            boxes = [b for b in boxes if b]
+            if boxes:
+                box = (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                       max(b[2] for b in boxes), max(b[3] for b in boxes))
+                report["trim"] = list(box)
+                for name in names:
+                    if images[name].size != (box[2] - box[0], box[3] - box[1]):
+                        images[name] = images[name].crop(box)
+                        changed.add(name)
+        elif stage in ("analyze", "quality"):
+            for name in changed:
+                # Scratch files are hardlinks into the blob cache: replace, never write through
+                (workdir / name).unlink()
+                images[name].save(workdir / name, "PNG")
+            if stage == "analyze":
+                from sprite_analyzer import analyze_action
+                result = analyze_action(workdir, names)
+            else:
+                from frame_quality import FrameScorer, score_action
+                result = score_action(FrameScorer(), workdir, names)
+            result["path"] = job["group"]
+            files[f"{job['group'].rsplit('/', 1)[-1]}.{stage}.json"] = \
+                json.dumps(result, indent=2, default=float).encode("utf-8")
+        elif stage == "delta":
+            from sprite_delta import encode_frames
+            frames = [np.asarray(images[n].convert("RGBA")) for n in names]
+            files[f"{job['group'].rsplit('/', 1)[-1]}.spd"] = encode_frames(frames, names)
+    return changed, files, report
+
+class FarmWorker:
+    """Pulls jobs from a coordinator until the build is finished"""
+
+    def __init__(self, address: str, cache_root=DEFAULT_WORKER_CACHE, token: Optional[str] = None):
+        self.client = FarmClient(address, token=token)
+        self.cache = BlobCache(cache_root)
+        self.scratch = Path(cache_root) / "work"
+        self.id = None
+        self.done = 0
+
+    def fetch(self, sha256: str) -> bool:
+        """Make sure a blob is in the local cache; returns True when it had to be downloaded"""
+        if self.cache.path(sha256).exists():
+            return False
+        status, data = self.client.request("GET", f"/blobs/{sha256}")
+        if status != 200 or blob_hash(data) != sha256:
+            raise FarmError(f"Cannot fetch blob {sha256[:12]} ({status})")
+        self.cache.put(data)
+        return True
+
+    def run_job(self, job: dict) -> dict:
+        from PIL import Image
+
+        start = time.perf_counter()
+        fetched = sum(self.fetch(i["sha256"]) for i in job["inputs"])
+        workdir = self.scratch / f"{os.getpid()}-{job['id']}"
+        workdir.mkdir(parents=True, exist_ok=True)
+        try:
+            images = {}
+            for item in job["inputs"]:
+                path = workdir / item["name"]
+                try:
+                    os.link(self.cache.path(item["sha256"]), path)
+                except OSError:
+                    shutil.copyfile(self.cache.path(item["sha256"]), path)
+                with Image.open(path) as img:
+                    img.load()
+                    images[item["name"]] = img
+
+            changed, files, report = run_stages(images, job, workdir)
+            # Frame jobs and trims hand back every frame; unchanged ones keep their input bytes
+            emit = job["kind"] == "frame" or "trim" in job["stages"]
+            for item in job["inputs"]:
+                name = item["name"]
+                if name in changed:
+                    files[name] = encode_png(images[name])
+                elif emit:
+                    files[name] = self.cache.path(item["sha256"]).read_bytes()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        outputs = [{"name": name, "sha256": self.cache.put(data), "bytes": len(data)}
+                   for name, data in sorted(files.items())]
+        return {"worker": self.id, "outputs": outputs, "report": report,
+                "seconds": round(time.perf_counter() - start, 3),
+                "fetched": fetched, "cache_hits": len(job["inputs"]) - fetched}
+
+    def submit(self, job_id: int, result: dict):
+        result["uploaded"] = []
+        for _ in range(3):
+            reply = self.client.call("POST", f"/jobs/{job_id}/result", result)
+            if "missing" not in reply:
+                return reply
+            for sha in reply["missing"]:
+                status, _ = self.client.request("PUT", f"/blobs/{sha}", self.cache.path(sha).read_bytes())
+                if status >= 400:
+                    raise FarmError(f"Upload of {sha[:12]} rejected ({status})")
+                result["uploaded"].append(sha)
+        raise FarmError(f"Job {job_id}: coordinator still missing outputs")
+
+    def run(self, quiet=False):
+        reply = self.client.call("POST", "/workers", {"host": socket.gethostname(), "pid": os.getpid()})
+        self.id = reply["worker"]
+        if not quiet:
+            print(f"🛠️  Worker {self.id} connected to {self.client.address}")
+
+        while True:
+            reply = self.client.call("POST", "/work", {"worker": self.id})
+            if reply.get("finished"):
+                break
+            if "wait" in reply:
+                time.sleep(reply["wait"])
+                continue
+            job = reply["job"]
+            try:
+                result = self.run_job(job)
+            except Exception as e:
+                result = {"worker": self.id, "error": f"{type(e).__name__}: {e}"}
+            self.submit(job["id"], result)
+            self.done += 1
+            if not quiet:
+                status = "❌ " + result["error"] if result.get("error") else "✅"
+                print(f"  {status} {job['kind']:<6} {job['group']} ({len(job['inputs'])} inputs)")
+
+        if not quiet:
+            print(f"🏁 Worker {self.id}: {self.done} jobs")
+
+# ----------------------------------------------------------------------
+# Scheduler self-check
+# ----------------------------------------------------------------------
+
+def self_check() -> bool:
+    """Run the coordinator's failure paths in-process, without workers or a socket"""
+    root = Path(tempfile.mkdtemp(prefix="build-farm-check-"))
+
+    def coordinator(jobs, **kwargs):
+        graph = {}
+        for kind, deps in jobs:
+            job = FarmJob(len(graph), kind, "check/idle", root, ["resize"])
+            job.inputs.append({"name": f"{job.id}.png", "sha256": blob_hash(str(job.id).encode()), "bytes": 1})
+            for dep in deps:
+                job.deps.add(dep)
+                graph[dep].dependents.append(job.id)
+            graph[job.id] = job
+        return Coordinator(graph, {}, root, {"size": None}, force=True, **kwargs)
+
+    def expired_final_attempt():
+        c = coordinator([("frame", [])], lease=0.05, max_attempts=1)
+        worker = c.register({"host": "check", "pid": 0})["worker"]
+        assert "job" in c.lease_job(worker)
+        time.sleep(0.1)
+        reply = c.lease_job(worker)
+        assert reply == {"finished": True}, reply
+        assert c.jobs[0].state == FAILED
+
+    def expired_lease_retried():
+        c = coordinator([("frame", [])], lease=0.05, max_attempts=2)
+        worker = c.register({"host": "check", "pid": 0})["worker"]
+        c.lease_job(worker)
+        time.sleep(0.1)
+        assert "job" in c.lease_job(worker)
+        assert c.stats["requeued"] == 1 and not c.finished.is_set()
+
+    def failed_dependency():
+        c = coordinator([("frame", []), ("action", [0])], max_attempts=1)
+        worker = c.register({"host": "check", "pid": 0})["worker"]
+        job = c.lease_job(worker)["job"]
+        c.report(job["id"], {"worker": worker, "error": "boom"})
+        assert c.jobs[1].state == FAILED
+        assert c.lease_job(worker) == {"finished": True}
+
+    def rejected_output_names():
+        c = coordinator([("frame", [])])
+        worker = c.register({"host": "check", "pid": 0})["worker"]
+        job = c.lease_job(worker)["job"]
+        for name in ("../../../escaped.txt", "/tmp/escaped.txt", "sub/0.png", "other.png", ".."):
+            output = {"name": name, "sha256": "0" * 64, "bytes": 1}
+            try:
+                c.report(job["id"], {"worker": worker, "outputs": [output]})
+            except FarmError:
+                continue
+            raise AssertionError(f"accepted output {name!r}")
+        assert c.jobs[0].state == LEASED
+
+    def token_required():
+        c = coordinator([("frame", [])])
+        server, address = start_server(c, "127.0.0.1", 0, token="secret")
+        try:
+            try:
+                FarmClient(address).call("POST", "/workers", {})
+                raise AssertionError("request without the token was accepted")
+            except FarmError:
+                pass
+            assert "worker" in FarmClient(address, token="secret").call("POST", "/workers", {})
+            try:
+                start_server(c, "0.0.0.0", 0)
+                raise AssertionError("served off loopback without a token")
+            except FarmError:
+                pass
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    ok = True
+    try:
+        for check in (expired_final_attempt, expired_lease_retried, failed_dependency,
+                      rejected_output_names, token_required):
+            try:
+                check()
+                print(f"  ✅ {check.__name__}")
+            except AssertionError as e:
+                ok = False
+                print(f"  ❌ {check.__name__}: {e}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return ok
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+
+def print_summary(coordinator: Coordinator, elapsed: float):
+    status = coordinator.status()
+    stats = status["stats"]
+    print(f"\n{'='*70}")
+    print(f"Worker                              jobs  stolen  failed  fetched  cache hits    busy")
+    for worker_id, w in status["workers"].items():
+        print(f"  {worker_id:<32} {w['jobs']:>5} {w['stolen']:>7} {w['failed']:>7} {w['fetched']:>8} "
+              f"{w['cache_hits']:>11} {w['seconds']:>6.1f}s")
+    print(f"{'='*70}")
+    states = status["states"]
+    print(f"✅ {states.get(DONE, 0)}/{status['jobs']} jobs done in {elapsed:.1f}s "
+          f"({stats['cached_jobs']} from the previous build), {states.get(FAILED, 0)} failed")
+    print(f"📦 Sent {stats['served_bytes'] / 1024 / 1024:.1f} MB, received "
+          f"{stats['uploaded_bytes'] / 1024 / 1024:.1f} MB; {stats['skipped_uploads']} uploads "
+          f"({stats['skipped_bytes'] / 1024 / 1024:.1f} MB) skipped by hash")
+    print(f"🔀 {stats['steals']} steals, {stats['requeued']} requeued")
+    for job in coordinator.jobs.values():
+        if job.state == FAILED:
+            print(f"  ❌ {job.kind} {job.group}: {job.error}")
+    print(f"{'='*70}\n")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Distribute asset build stages over work-stealing worker processes",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Coordinator on the build box; a non-loopback bind needs a shared secret
+  export BUILD_FARM_TOKEN=<secret>
+  python build_farm.py serve --input ../assets --output build/assets \\
+      --stages remove-bg,resize,trim,analyze --size 256 256 --host 0.0.0.0 --port 7890
+
+  # One worker per core on every farm host (same BUILD_FARM_TOKEN)
+  python build_farm.py work --connect http://build-01:7890
+
+  # Scheduler regression checks (lease expiry, retries, failed dependencies, result names, token)
+  python build_farm.py check
+
+  # Everything on this machine: coordinator plus 4 worker processes over a Unix socket
+  python build_farm.py local --workers 4 --input ../assets --output build/assets \\
+      --stages resize,trim,delta --size 256 256
+        """
+    )
+    parser.add_argument("command", choices=["serve", "work", "local", "check"],
+                        help="Role (check: run the scheduler's failure-path self-check)")
+    parser.add_argument("--input", "-i", type=str, help="Asset tree (serve, local)")
+    parser.add_argument("--output", "-o", type=str, help="Output tree (serve, local)")
+    parser.add_argument("--stages", type=str, default="resize,trim,analyze",
+                        help=f"Comma separated stages: {', '.join(FRAME_STAGES)} per frame, "
+                             f"{', '.join(ACTION_STAGES)} per action (default: resize,trim,analyze)")
+    parser.add_argument("--size", type=int, nargs=2, metavar=("W", "H"), help="Target size for resize")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Coordinator bind address")
+    parser.add_argument("--port", type=int, default=7890, help="Coordinator port (default: 7890)")
+    parser.add_argument("--socket", type=str, help="Serve on a Unix socket instead of TCP")
+    parser.add_argument("--connect", type=str, help="Coordinator address for work: http://host:port or unix:/path")
+    parser.add_argument("--token", type=str, default=os.environ.get(TOKEN_ENV),
+                        help=f"Shared secret for serve/work (default: ${TOKEN_ENV}); required off loopback")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (local)")
+    parser.add_argument("--cache-dir", type=str, default=DEFAULT_WORKER_CACHE,
+                        help=f"Worker blob cache, shared by the workers of a host (default: {DEFAULT_WORKER_CACHE})")
+    parser.add_argument("--lease", type=float, default=300.0, help="Seconds before an unreported job is requeued")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per job (default: 3)")
+    parser.add_argument("--force", action="store_true", help="Ignore results of the previous build")
+    parser.add_argument("--quiet", "-q", action="store_true", help="Workers print only errors")
+    parser.add_argument("--frame-store", type=str,
+                        help="Put finished output actions into a memory-mapped frame store (serve, local)")
+
+    args = parser.parse_args()
+
+    if args.command == "check":
+        print("🧪 Scheduler self-check")
+        sys.exit(0 if self_check() else 1)
+
+    if args.command == "work":
+        if not args.connect:
+            print("❌ work needs --connect")
+            sys.exit(1)
+        try:
+            FarmWorker(args.connect, args.cache_dir, args.token).run(args.quiet)
+        except (OSError, FarmError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        return
+
+    if not args.input or not Path(args.input).is_dir() or not args.output:
+        print("❌ --input must be an existing folder and --output is required")
+        sys.exit(1)
+    try:
+        stages = parse_stages(args.stages)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    if "resize" in stages and not args.size:
+        print("❌ The resize stage needs --size W H")
+        sys.exit(1)
+
+    assets_root, output_root = Path(args.input), Path(args.output)
+    options = {"size": args.size}
+    start = time.perf_counter()
+    graph, index = build_graph(assets_root, output_root, stages)
+    if not graph:
+        print(f"❌ No asset frames under {assets_root} (expected the layouts manifest_generator.py knows)")
+        sys.exit(1)
+    coordinator = Coordinator(graph, index, output_root, options, lease=args.lease,
+                              max_attempts=args.max_attempts, force=args.force)
+
+    socket_path = args.socket
+    if args.command == "local" and not socket_path and hasattr(socket, "AF_UNIX"):
+        socket_path = os.path.join(tempfile.gettempdir(), f"build-farm-{os.getpid()}.sock")
+    # Local workers get a one-off secret, so nothing else on the host can post results
+    token = args.token or (secrets.token_hex(16) if args.command == "local" else None)
+    try:
+        server, address = start_server(coordinator, args.host, args.port, socket_path, token)
+    except FarmError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    frames = sum(1 for job in graph.values() if job.kind == "frame")
+    print(f"\n{'='*70}")
+    print(f"🏭 Build Farm Coordinator")
+    print(f"{'='*70}")
+    print(f"Input:    {assets_root}")
+    print(f"Output:   {output_root}")
+    print(f"Stages:   {', '.join(stages)}")
+    print(f"Jobs:     {len(graph)} ({frames} frame, {len(graph) - frames} action; "
+          f"{coordinator.stats['cached_jobs']} unchanged)")
+    print(f"Listen:   {address}")
+    print(f"{'='*70}\n")
+
+    procs = []
+    if args.command == "local" and not coordinator.finished.is_set():
+        command = [sys.executable, str(Path(__file__).resolve()), "work", "--connect", address,
+                   "--cache-dir", args.cache_dir]
+        if args.quiet:
+            command.append("--quiet")
+        env = dict(os.environ, **{TOKEN_ENV: token})
+        procs = [subprocess.Popen(command, env=env) for _ in range(max(1, args.workers))]
+
+    try:
+        while not coordinator.finished.wait(timeout=1.0):
+            if procs and all(p.poll() is not None for p in procs):
+                print("❌ Every worker exited before the build finished")
+                break
+        for proc in procs:
+            proc.wait()
+        if not procs:
+            # Remote workers learn the build is over on their next request
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        print("\nStopping coordinator...")
+        for proc in procs:
+            proc.terminate()
+    finally:
+        server.shutdown()
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+        coordinator.save_cache()
+
+    print_summary(coordinator, time.perf_counter() - start)
+    if args.frame_store:
+        from frame_store import FrameStore
+        store = FrameStore(args.frame_store)
+        print(f"🗄️  {coordinator.store_frames(store)} actions in {store.root} "
+              f"({store.hits} unchanged, {store.misses} updated)\n")
+    if any(job.state == FAILED for job in graph.values()) or not coordinator.finished.is_set():
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,580 @@
+#!/usr/bin/env python3
+"""
+Procedural Infinite Level Chunk Generator
+無限關卡區塊生成器（可重現種子）
+
+Generates endless horizontal terrain as fixed-size chunks from the tile
+types in assets/tileset.json (ground_top / ground_middle / ground_fill /
+ground_bottom, platform_left / middle / right, cloud_platform, blocks and
+grass). A chunk is addressed by (seed, cx) and always comes out the same:
+its random stream is derived from the seed and chunk index alone, and the
+ground height at every chunk border is a function of (seed, border), so
+neighbouring chunks join without either one knowing about the other.
+
+Each chunk has the runtime level layout of level_compiler.py: tile layers
+plus merged collision rectangles ("collision" for solid tiles, "oneWay"
+for cloud platforms) in world tile coordinates. With --base, chunk 0 is
+the hand-made infinite-base.json and generated terrain continues from its
+edges.
+
+Chunks are cached as JSON under --cache, pre-generated across a process
+pool, and served over a small HTTP endpoint that prefetches the chunks
+after each request, so the game streams terrain instead of blocking on it.
+
+Usage:
+    python chunk_generator.py --seed 42 --pregen=-8:64 --jobs 4
+    python chunk_generator.py --seed 42 --preview 3
+    python chunk_generator.py --seed 42 --serve --port 7880
+
+    # Streaming API
+    GET /health                    generator status, including its fingerprint
+    GET /chunks/<cx>?seed=42       one chunk (generated on demand, then cached)
+    GET /chunks?from=0&to=8        several chunks in one response
+
+Chunk responses carry an ETag and are revalidated (no-cache). Adding
+&v=<fingerprint from /health> together with seed pins the URL to one
+generator state, and those responses are cached as immutable. /health and
+errors are never cached.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from atomic_io import atomic_write, sync_batch
+from level_compiler import merge_solid_rects
+
+GENERATOR_VERSION = 1
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_TILESET = SCRIPT_DIR.parent / "assets" / "tileset.json"
+DEFAULT_BASE = SCRIPT_DIR.parent / "assets" / "levels" / "infinite-base.json"
+DEFAULT_CACHE = SCRIPT_DIR / "temp_generated" / "chunks"
+
+CHUNK_WIDTH = 32
+CHUNK_HEIGHT = 30
+TILE_SIZE = 32
+
+# Surface rows stay in the bottom part of the chunk; one step is at most
+# MAX_STEP tiles so every ledge can be jumped
+SURFACE_RANGE = 8
+MAX_STEP = 2
+
+class ChunkError(Exception):
+    """Raised when the tileset lacks a tile type the generator needs"""
+
+def stable_int(*parts) -> int:
+    """64-bit integer from parts, identical across runs, processes and platforms"""
+    digest = hashlib.sha256(":".join(str(p) for p in parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little")
+
+class TilePalette:
+    """Tile ids of tileset.json grouped by type, plus solid and one-way flags"""
+
+    REQUIRED = ("ground_top", "ground_middle", "ground_fill")
+
+    def __init__(self, path=DEFAULT_TILESET):
+        self.path = Path(path)
+        data = json.loads(self.path.read_text(encoding="utf-8"))
+        self.by_type: Dict[str, List[int]] = {}
+        self.solid, self.one_way = set(), set()
+        for tile_id, tile in sorted(data["tiles"].items(), key=lambda item: int(item[0])):
+            gid = int(tile_id)
+            self.by_type.setdefault(tile.get("type", ""), []).append(gid)
+            if tile.get("oneWay"):
+                self.one_way.add(gid)
+            elif tile.get("solid"):
+                self.solid.add(gid)
+        missing = [t for t in self.REQUIRED if t not in self.by_type]
+        if missing:
+            raise ChunkError(f"{self.path}: no tile of type {', '.join(missing)}")
+        self.digest = hashlib.sha256(self.path.read_bytes()).hexdigest()[:12]
+
+    def first(self, tile_type: str, fallback: Optional[str] = None) -> int:
+        ids = self.by_type.get(tile_type) or (self.by_type.get(fallback) if fallback else None)
+        return ids[0] if ids else 0
+
+    def pick(self, rng: random.Random, tile_type: str) -> int:
+        ids = self.by_type.get(tile_type)
+        return rng.choice(ids) if ids else 0
+
+class ChunkGenerator:
+    """Deterministic terrain chunks addressed by (seed, cx)"""
+
+    def __init__(self, tileset=DEFAULT_TILESET, base=None, width=CHUNK_WIDTH, height=CHUNK_HEIGHT):
+        self.palette = TilePalette(tileset)
+        self.base = self._load_base(base) if base else None
+        if self.base:
+            width, height = self.base["width"], self.base["height"]
+        self.width = width
+        self.height = height
+        self.lowest = height - 1
+        self.highest = max(4, height - SURFACE_RANGE)
+
+    @property
+    def fingerprint(self) -> str:
+        """Everything besides (seed, cx) that changes a chunk; part of the cache path"""
+        base = self.base["digest"] if self.base else "none"
+        return f"v{GENERATOR_VERSION}-{self.width}x{self.height}-{self.palette.digest}-{base}"
+
+    def _load_base(self, path):
+        path = Path(path)
+        data = json.loads(path.read_text(encoding="utf-8"))
+        layers = [l for l in data["layers"] if l["type"] == "tilelayer"]
+        if not layers:
+            raise ChunkError(f"{path}: no tile layer")
+        return {
+            "width": data["width"],
+            "height": data["height"],
+            "tilewidth": data.get("tilewidth", TILE_SIZE),
+            "layers": [{"name": l.get("name", "terrain"), "data": list(l["data"])} for l in layers],
+            "digest": hashlib.sha256(path.read_bytes()).hexdigest()[:12],
+        }
+
+    # ------------------------------------------------------------------
+    # Terrain
+    # ------------------------------------------------------------------
+
+    def _base_surface(self, column: int) -> int:
+        """Highest solid row of the base chunk in a column"""
+        data = self.base["layers"][0]["data"]
+        for y in range(self.height):
+            gid = data[y * self.width + column]
+            if gid in self.palette.solid:
+                return y
+        return self.lowest
+
+    def edge_height(self, seed: int, border: int) -> int:
+        """Surface row at the border between chunk border-1 and chunk border"""
+        if self.base and border in (0, 1):
+            return min(self.lowest, max(self.highest, self._base_surface(0 if border == 0 else self.width - 1)))
+        return self.highest + stable_int(seed, "edge", border) % (self.lowest - self.highest + 1)
+
+    def _surface(self, rng: random.Random, left: int, right: int) -> List[int]:
+        """Column surface rows as plateaus of 3-7 tiles walking from left to right
+
+        Plateaus differ by at most MAX_STEP rows and always leave enough
+        plateaus to reach the right edge height.
+        """
+        lengths = []
+        remaining = self.width
+        while remaining > 0:
+            length = min(remaining, rng.randint(3, 7))
+            lengths.append(length)
+            remaining -= length
+
+        last = len(lengths) - 1
+        heights, h = [], left
+        for i, length in enumerate(lengths):
+            if i == 0:
+                target = left
+            elif i == last:
+                target = right
+            else:
+                reach = MAX_STEP * (last - i)
+                lo = max(h - MAX_STEP, right - reach, self.highest)
+                hi = min(h + MAX_STEP, right + reach, self.lowest)
+                if lo <= hi:
+                    target = min(max(h + rng.randint(-MAX_STEP, MAX_STEP), lo), hi)
+                else:
+                    target = max(right - reach, min(right + reach, h))
+            heights.extend([target] * length)
+            h = target
+        return heights
+
+    def generate(self, seed: int, cx: int) -> dict:
+        """One chunk as a runtime level fragment"""
+        if self.base and cx == 0:
+            terrain = list(self.base["layers"][0]["data"])
+            decoration = [0] * len(terrain)
+        else:
+            terrain, decoration = self._generate_tiles(seed, cx)
+
+        is_solid = lambda gid: gid in self.palette.solid
+        is_one_way = lambda gid: gid in self.palette.one_way
+        ox = cx * self.width
+        collision = [[x + ox, y, w, h] for x, y, w, h in merge_solid_rects(terrain, self.width, self.height, is_solid)]
+        one_way = [[x + ox, y, w, h] for x, y, w, h in merge_solid_rects(terrain, self.width, self.height, is_one_way)]
+
+        layers = [{"type": "tilelayer", "name": "terrain", "width": self.width, "height": self.height,
+                   "data": terrain}]
+        if any(decoration):
+            layers.append({"type": "tilelayer", "name": "decoration", "width": self.width,
+                           "height": self.height, "data": decoration, "properties": {"collision": False}})
+        return {
+            "type": "chunk",
+            "generator": GENERATOR_VERSION,
+            "seed": seed,
+            "cx": cx,
+            "x": ox,
+            "width": self.width,
+            "height": self.height,
+            "tilewidth": self.base["tilewidth"] if self.base else TILE_SIZE,
+            "tileheight": self.base["tilewidth"] if self.base else TILE_SIZE,
+            "edges": [self.edge_height(seed, cx), self.edge_height(seed, cx + 1)],
+            "layers": layers,
+            "collision": collision,
+            "oneWay": one_way,
+        }
+
+    def _generate_tiles(self, seed: int, cx: int):
+        p = self.palette
+        w, h = self.width, self.height
+        rng = random.Random(stable_int(seed, "chunk", cx))
+        terrain = [0] * (w * h)
+        decoration = [0] * (w * h)
+
+        def put(layer, x, y, gid):
+            if 0 <= x < w and 0 <= y < h and gid:
+                layer[y * w + x] = gid
+
+        surface = self._surface(rng, self.edge_height(seed, cx), self.edge_height(seed, cx + 1))
+
+        # Pits: 2-3 columns, away from the chunk edges so borders always join on ground
+        pits = set()
+        if rng.random() < 0.6:
+            start = rng.randint(4, w - 8)
+            pits.update(range(start, start + rng.randint(2, 3)))
+
+        top, middle = p.first("ground_top"), p.first("ground_middle")
+        fill, bottom = p.first("ground_fill"), p.first("ground_bottom", "ground_fill")
+        for x, s in enumerate(surface):
+            if x in pits:
+                continue
+            put(terrain, x, s, top)
+            for y in range(s + 1, h):
+                put(terrain, x, y, middle if y == s + 1 else bottom if y == h - 1 else fill)
+
+        # Floating platforms reachable from the ground, cloud platforms above them
+        for _ in range(rng.randint(1, 3)):
+            length = rng.randint(3, 6)
+            x0 = rng.randint(1, w - length - 1)
+            ground = min(surface[x0:x0 + length])
+            y = ground - rng.randint(3, 4)
+            if y < 2 or any(terrain[y * w + x] for x in range(x0 - 1, x0 + length + 1)):
+                continue
+            for x in range(x0, x0 + length):
+                kind = "platform_left" if x == x0 else "platform_right" if x == x0 + length - 1 else "platform_middle"
+                put(terrain, x, y, p.first(kind, "platform_middle"))
+            if rng.random() < 0.5 and "cloud_platform" in p.by_type:
+                cloud_y = y - rng.randint(3, 4)
+                cloud_x = min(w - 4, max(0, x0 + rng.randint(-3, 3)))
+                if cloud_y >= 2:
+                    for x in range(cloud_x, cloud_x + rng.randint(3, 4)):
+                        put(terrain, x, cloud_y, p.first("cloud_platform"))
+
+        # Blocks and grass on flat ground, never next to a pit
+        for x, s in enumerate(surface):
+            if x in pits or x - 1 in pits or x + 1 in pits or terrain[(s - 1) * w + x]:
+                continue
+            roll = rng.random()
+            if roll < 0.06 and 0 < x < w - 1:
+                block = p.pick(rng, rng.choice(["block_stone", "block_wood"])) or p.first("ground_fill")
+                for y in range(s - rng.randint(1, 2), s):
+                    put(terrain, x, y, block)
+            elif roll < 0.25:
+                put(decoration, x, s - 1, p.pick(rng, "grass_decor"))
+        return terrain, decoration
+
+    def preview(self, chunk: dict) -> str:
+        """ASCII rendering: # solid, = one-way, " decoration"""
+        rows = []
+        layers = {layer["name"]: layer["data"] for layer in chunk["layers"]}
+        for y in range(chunk["height"]):
+            row = []
+            for x in range(chunk["width"]):
+                gid = layers["terrain"][y * chunk["width"] + x]
+                deco = layers.get("decoration", [0] * (chunk["width"] * chunk["height"]))[y * chunk["width"] + x]
+                row.append("#" if gid in self.palette.solid else "=" if gid in self.palette.one_way
+                           else '"' if deco else ".")
+            rows.append("".join(row))
+        return "\n".join(rows)
+
+# ----------------------------------------------------------------------
+# Cache and parallel pre-generation
+# ----------------------------------------------------------------------
+
+def chunk_bytes(chunk: dict) -> bytes:
+    return json.dumps(chunk, separators=(",", ":")).encode("utf-8")
+
+class ChunkCache:
+    """JSON chunk files under <root>/<fingerprint>/<seed>/<cx>.json"""
+
+    def __init__(self, generator: ChunkGenerator, root=DEFAULT_CACHE):
+        self.generator = generator
+        self.root = Path(root) / generator.fingerprint
+
+    def path(self, seed: int, cx: int) -> Path:
+        return self.root / str(seed) / f"{cx}.json"
+
+    def get(self, seed: int, cx: int) -> bytes:
+        """Cached chunk bytes, generating and storing them on a miss"""
+        path = self.path(seed, cx)
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            pass
+        data = chunk_bytes(self.generator.generate(seed, cx))
+        self.store(path, data)
+        return data
+
+    @staticmethod
+    def store(path: Path, data: bytes):
+        # Readers (the server, other workers) never see a half-written chunk
+        atomic_write(path, data)
+
+    def count(self, seed: Optional[int] = None) -> int:
+        folders = [self.root / str(seed)] if seed is not None else [d for d in self.root.glob("*") if d.is_dir()]
+        return sum(1 for folder in folders for _ in folder.glob("*.json"))
+
+_worker_cache = None
+
+def _init_worker(tileset, base, root):
+    global _worker_cache
+    _worker_cache = ChunkCache(ChunkGenerator(tileset, base), root)
+
+def _pregen_batch(task):
+    """Generate the missing chunks of one batch; the folder is fsynced once per batch"""
+    seed, cxs = task
+    generated = 0
+    with sync_batch():
+        for cx in cxs:
+            if not _worker_cache.path(seed, cx).exists():
+                _worker_cache.get(seed, cx)
+                generated += 1
+    return generated
+
+def pregenerate(tileset, base, root, seed: int, cxs, jobs=None):
+    """Generate every missing chunk in cxs across a process pool; returns (generated, cached)"""
+    cxs = list(cxs)
+    size = max(1, len(cxs) // 64)
+    tasks = [(seed, cxs[i:i + size]) for i in range(0, len(cxs), size)]
+    generated = 0
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1, initializer=_init_worker,
+                             initargs=(str(tileset), str(base) if base else None, str(root))) as pool:
+        for new in pool.map(_pregen_batch, tasks):
+            generated += new
+    return generated, len(cxs) - generated
+
+# ----------------------------------------------------------------------
+# Streaming server
+# ----------------------------------------------------------------------
+
+class ChunkServer:
+    """HTTP endpoint serving cached chunks and prefetching the ones after them"""
+
+    def __init__(self, cache: ChunkCache, seed: int, host="127.0.0.1", port=7880, lookahead=4, max_range=64):
+        self.cache = cache
+        self.seed = seed
+        self.lookahead = lookahead
+        self.max_range = max_range
+        self.served = 0
+        self._inflight: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        self._prefetch = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chunk-prefetch")
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def chunk(self, seed: int, cx: int) -> bytes:
+        """Chunk bytes; waits for a prefetch of the same chunk instead of generating it twice"""
+        with self._lock:
+            future = self._inflight.get((seed, cx))
+        if future is not None:
+            return future.result()
+        return self.cache.get(seed, cx)
+
+    def prefetch(self, seed: int, cxs):
+        for cx in cxs:
+            key = (seed, cx)
+            with self._lock:
+                if key in self._inflight or self.cache.path(seed, cx).exists():
+                    continue
+                future = self._prefetch.submit(self.cache.get, seed, cx)
+                self._inflight[key] = future
+            future.add_done_callback(lambda _, key=key: self._forget(key))
+
+    def _forget(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, status, body: bytes, cache="no-store", etag=None):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                # The game is served from another origin (vite dev server)
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.send_header("Cache-Control", cache)
+                if etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _error(self, status, message):
+                self._send(status, json.dumps({"error": message}).encode("utf-8"))
+
+            def _send_chunks(self, query, seed, key, load):
+                """A chunk response; immutable only when the URL names the seed and fingerprint"""
+                fingerprint = server.cache.generator.fingerprint
+                etag = f'"{fingerprint}-{seed}-{key}"'
+                pinned = "seed" in query and query.get("v") == fingerprint
+                cache = "public, max-age=31536000, immutable" if pinned else "no-cache"
+                if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+                    self.send_response(304)
+                    self.send_header("Access-Control-Allow-Origin", "*")
+                    self.send_header("Cache-Control", cache)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self._send(200, load(), cache=cache, etag=etag)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                parts = [p for p in url.path.split("/") if p]
+                try:
+                    seed = int(query.get("seed", server.seed))
+                    if parts == ["health"]:
+                        body = {"status": "ok", "seed": server.seed, "fingerprint": server.cache.generator.fingerprint,
+                                "served": server.served, "cached": server.cache.count(server.seed)}
+                        self._send(200, json.dumps(body).encode("utf-8"))
+                    elif len(parts) == 2 and parts[0] == "chunks":
+                        cx = int(parts[1])
+                        self._send_chunks(query, seed, cx, lambda: server.chunk(seed, cx))
+                        server.served += 1
+                        server.prefetch(seed, [cx + d for d in range(1, server.lookahead + 1)]
+                                        + [cx - d for d in range(1, server.lookahead // 2 + 1)])
+                    elif parts == ["chunks"]:
+                        start, end = int(query["from"]), int(query["to"])
+                        if not 0 <= end - start <= server.max_range:
+                            return self._error(400, f"range must hold 0..{server.max_range} chunks")
+                        self._send_chunks(query, seed, f"{start}:{end}", lambda: b'{"chunks":[' + b",".join(
+                            server.chunk(seed, cx) for cx in range(start, end)) + b"]}")
+                        server.served += end - start
+                        server.prefetch(seed, range(end, end + server.lookahead))
+                    else:
+                        self._error(404, "not found")
+                except (KeyError, ValueError) as e:
+                    self._error(400, f"bad request: {e}")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._prefetch.shutdown(wait=False)
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+
+def parse_range(text: str) -> range:
+    """"0:64" → range(0, 64); "5" → range(0, 5)"""
+    if ":" in text:
+        start, end = text.split(":", 1)
+        return range(int(start), int(end))
+    return range(int(text))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate deterministic infinite-level chunks from tileset.json and serve them",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Pre-generate chunks -8..63 of world 42 on 4 processes
+  python chunk_generator.py --seed 42 --pregen=-8:64 --jobs 4
+
+  # Look at one chunk in the terminal
+  python chunk_generator.py --seed 42 --preview 3
+
+  # Stream chunks to the game (GET /chunks/<cx>, GET /chunks?from=0&to=8)
+  python chunk_generator.py --seed 42 --serve --port 7880 --pregen 0:16
+        """
+    )
+    parser.add_argument("--seed", type=int, default=0, help="World seed")
+    parser.add_argument("--tileset", type=str, default=str(DEFAULT_TILESET), help="tileset.json with tile types")
+    parser.add_argument("--base", type=str, default=str(DEFAULT_BASE),
+                        help="Hand-made chunk 0 to continue from ('' for fully generated worlds)")
+    parser.add_argument("--cache", type=str, default=str(DEFAULT_CACHE), help="Chunk cache directory")
+    parser.add_argument("--pregen", type=str, metavar="FROM:TO", help="Pre-generate this chunk range into the cache")
+    parser.add_argument("--jobs", "-j", type=int, help="Worker processes for --pregen (default: CPU count)")
+    parser.add_argument("--preview", type=int, metavar="CX", help="Print one chunk as ASCII")
+    parser.add_argument("--serve", action="store_true", help="Serve chunks over HTTP")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Bind address")
+    parser.add_argument("--port", type=int, default=7880, help="Port (default: 7880)")
+    parser.add_argument("--lookahead", type=int, default=4, help="Chunks prefetched after each request")
+
+    args = parser.parse_args()
+
+    base = args.base if args.base and Path(args.base).exists() else None
+    try:
+        generator = ChunkGenerator(args.tileset, base)
+    except (ChunkError, OSError, KeyError, json.JSONDecodeError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    cache = ChunkCache(generator, args.cache)
+
+    if args.preview is not None:
+        chunk = generator.generate(args.seed, args.preview)
+        print(f"\nSeed {args.seed}, chunk {args.preview} (edges {chunk['edges']}, "
+              f"{len(chunk['collision'])} collision / {len(chunk['oneWay'])} one-way rects)\n")
+        print(generator.preview(chunk))
+        print()
+        return
+
+    if not args.pregen and not args.serve:
+        parser.print_help()
+        return
+
+    print(f"\n{'='*70}")
+    print(f"🌄 Infinite Chunk Generator")
+    print(f"{'='*70}")
+    print(f"Seed:    {args.seed}")
+    print(f"Tileset: {args.tileset}")
+    print(f"Base:    {base or 'none'}")
+    print(f"Chunk:   {generator.width}x{generator.height} tiles")
+    print(f"Cache:   {cache.root}")
+    print(f"{'='*70}\n")
+
+    if args.pregen:
+        cxs = parse_range(args.pregen)
+        start = time.perf_counter()
+        generated, cached = pregenerate(args.tileset, base, args.cache, args.seed, cxs, args.jobs)
+        elapsed = time.perf_counter() - start
+        print(f"✅ {generated} chunk(s) generated, {cached} already cached in {elapsed:.2f}s")
+
+    if args.serve:
+        server = ChunkServer(cache, args.seed, host=args.host, port=args.port, lookahead=args.lookahead)
+        print(f"🛰️  Serving chunks on {server.url}  (GET /chunks/<cx>, /chunks?from=&to=, /health)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nStopped.")
+
+if __name__ == "__main__":
+    main()
@@ -5,66 +5,48 @@ Automatic Model Downloader for SD WebUI
 
 下載 ControlNet、VAE 等必備模型到客製化路徑
 
+Models come from model_registry.json (see model_registry.py). Each one is
+taken from the offline cache directory or the first mirror that has it
+before falling back to the upstream URL, and checked against its SHA-256
+when the registry lists one. Downloads go through the content-addressed
+model store (model_store.py): a model the store already holds is
+hardlinked instead of downloaded, and new downloads are added to it so
+other layouts can share them.
+
 Usage:
     python download_models.py --all
     python download_models.py --controlnet
     python download_models.py --vae
+    python download_models.py --all --root /data/models
+    python download_models.py --all --mirror http://nas.lan/models --cache-dir /mnt/usb/models
 """
 
 import argparse
+import hashlib
+import shutil
 import sys
-import urllib.request
+import urllib.parse
 import os
+import time
 from pathlib import Path
 
+from asset_metrics import metrics, add_metrics_arguments
+from atomic_io import commit_file, discard, temp_path
+from model_registry import ModelRegistry, add_registry_arguments
+from model_store import ModelStore, ModelStoreError, add_store_arguments, DEFAULT_ROOT, layout_dir
+
 class ModelDownloader:
-    def __init__(self):
-        self.base_path = Path("/mnt/c/AI_LLM_projects/ai_warehouse/models")
-        self.controlnet_path = self.base_path / "controlnet"
-        self.vae_path = self.base_path / "stable-diffusion" / "vae"
-
-        # 模型定義
-        self.models = {
-            "controlnet": [
-                {
-                    "name": "OpenPoseXL2 (必備)",
-                    "filename": "OpenPoseXL2.safetensors",
-                    "url": "https://huggingface.co/thibaud/controlnet-openpose-sdxl-1.0/resolve/main/OpenPoseXL2.safetensors",
-                    "size": "5GB",
-                    "priority": 1,
-                },
-                {
-                    "name": "Canny (強烈建議)",
-                    "filename": "sai_xl_canny_256lora.safetensors",
-                    "url": "https://huggingface.co/lllyasviel/sd_control_collection/resolve/main/sai_xl_canny_256lora.safetensors",
-                    "size": "774MB",
-                    "priority": 2,
-                },
-                {
-                    "name": "Depth (建議)",
-                    "filename": "sai_xl_depth_256lora.safetensors",
-                    "url": "https://huggingface.co/lllyasviel/sd_control_collection/resolve/main/sai_xl_depth_256lora.safetensors",
-                    "size": "774MB",
-                    "priority": 3,
-                },
-                {
-                    "name": "Lineart (建議)",
-                    "filename": "sai_xl_sketch_256lora.safetensors",
-                    "url": "https://huggingface.co/lllyasviel/sd_control_collection/resolve/main/sai_xl_sketch_256lora.safetensors",
-                    "size": "774MB",
-                    "priority": 3,
-                },
-            ],
-            "vae": [
-                {
-                    "name": "SDXL VAE (必備)",
-                    "filename": "sdxl_vae.safetensors",
-                    "url": "https://huggingface.co/stabilityai/sdxl-vae/resolve/main/sdxl_vae.safetensors",
-                    "size": "335MB",
-                    "priority": 1,
-                },
-            ],
-        }
+    def __init__(self, base_path=None, store=None, registry=None):
+        self.base_path = Path(base_path or DEFAULT_ROOT)
+        self.controlnet_path = layout_dir("warehouse", "controlnet", self.base_path)
+        self.vae_path = layout_dir("warehouse", "vae", self.base_path)
+        # Optional ModelStore: dedupes downloads across tools
+        self.store = store
+        # 模型定義 (model_registry.json, read on first use)
+        self.registry = registry or ModelRegistry()
+
+    def model_path(self, entry):
+        return layout_dir("warehouse", entry.kind, self.base_path) / entry.filename
 
     def ensure_directories(self):
         """確保目錄存在"""
@@ -75,48 +57,135 @@ class ModelDownloader:
         print(f"   VAE:        {self.vae_path}")
         print()
 
-    def download_file(self, url, filepath, model_name, size):
-        """下載單一檔案"""
+    def download_model(self, entry):
+        """Fetch one registry entry into the warehouse layout"""
+        return self.download_file(
+            url=self.registry.sources(entry),
+            filepath=self.model_path(entry),
+            model_name=entry.label,
+            size=entry.size,
+            kind=entry.kind,
+            sha256=entry.sha256,
+            cached=self.registry.cached_file(entry)
+        )
+
+    def download_file(self, url, filepath, model_name, size, kind=None, sha256=None, cached=None):
+        """下載單一檔案
+
+        url may be a list of sources (mirrors first); file:// sources and
+        the offline cache are copied directly. With sha256 set, a source
+        whose file does not match is discarded and the next one tried.
+        """
 
         # 檢查檔案是否已存在
         if filepath.exists():
+            metrics.cache("models", hit=True)
             file_size_mb = filepath.stat().st_size / (1024 * 1024)
             print(f"⏭️  Skipping {model_name} (already exists, {file_size_mb:.1f} MB)")
             return True
 
+        # Already stored for another layout: link instead of downloading
+        if self.store is not None and kind:
+            known = sha256 if sha256 and self.store.has(sha256) else self.store.find(kind, filepath.name)
+            if known:
+                try:
+                    mode = self.store.link(known, filepath, kind)
+                    metrics.cache("models", hit=True)
+                    print(f"🔗 Linked {model_name} from model store ({mode}, {known[:12]})")
+                    return True
+                except ModelStoreError as e:
+                    print(f"⚠️  {e}; downloading instead")
+
+        metrics.cache("models", hit=False)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+
+        sources = [url] if isinstance(url, str) else list(url)
+        if cached is not None:
+            sources.insert(0, Path(cached).resolve().as_uri())
+        if not sources:
+            print(f"❌ No source for {model_name} (add a URL or mirror to the registry)")
+            print()
+            return False
+
         print(f"📥 Downloading {model_name} ({size})...")
-        print(f"   URL: {url}")
         print(f"   Destination: {filepath}")
         print(f"   This may take a while...")
         print()
 
-        try:
-            def progress_hook(block_num, block_size, total_size):
-                """顯示下載進度"""
-                if total_size > 0:
-                    downloaded = block_num * block_size
-                    percent = min(downloaded * 100 / total_size, 100)
-                    downloaded_mb = downloaded / (1024 * 1024)
-                    total_mb = total_size / (1024 * 1024)
-
-                    # 每 5% 輸出一次
-                    if block_num % 100 == 0:
-                        print(f"   Progress: {percent:.1f}% ({downloaded_mb:.1f}/{total_mb:.1f} MB)", end='\r')
-
-            urllib.request.urlretrieve(url, filepath, reporthook=progress_hook)
-            print()  # 換行
-
-            # 驗證檔案大小
-            file_size_mb = filepath.stat().st_size / (1024 * 1024)
-            print(f"✅ Downloaded successfully: {filepath.name} ({file_size_mb:.1f} MB)")
-            print()
-            return True
+        for source in sources:
+            print(f"   Source: {source}")
+            # Fetched into a temporary file: an interrupted download never
+            # leaves a partial model at filepath for the next run to skip
+            tmp = temp_path(filepath)
+            try:
+                start = time.perf_counter()
+                self._fetch(source, tmp)
+                elapsed = time.perf_counter() - start
+                print()  # 換行
+
+                if sha256:
+                    with metrics.timer("verify"):
+                        actual = self._sha256(tmp)
+                    if actual != sha256:
+                        print(f"⚠️  SHA-256 mismatch ({actual[:12]} != {sha256[:12]}), trying next source")
+                        discard(tmp)
+                        continue
+                commit_file(tmp, filepath)
+
+                # 驗證檔案大小
+                file_bytes = filepath.stat().st_size
+                metrics.observe("download", elapsed)
+                metrics.add_bytes("download", file_bytes)
+                file_size_mb = file_bytes / (1024 * 1024)
+                print(f"✅ Downloaded successfully: {filepath.name} ({file_size_mb:.1f} MB, "
+                      f"{file_size_mb / max(elapsed, 1e-6):.0f} MB/s)")
+
+                if self.store is not None and kind:
+                    stored, duplicate = self.store.ingest(filepath, kind, source=source, sha256=sha256)
+                    print(f"🗃️  Stored as {stored[:12]}" + (" (duplicate of a stored model)" if duplicate else ""))
+                print()
+                return True
+
+            except Exception as e:
+                print()
+                print(f"❌ Failed to download {model_name} from {source}")
+                print(f"   Error: {e}")
+                discard(tmp)
 
-        except Exception as e:
-            print(f"❌ Failed to download {model_name}")
-            print(f"   Error: {e}")
-            print()
-            return False
+        print()
+        return False
+
+    @staticmethod
+    def _sha256(path):
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(4 << 20), b""):
+                h.update(block)
+        return h.hexdigest()
+
+    @staticmethod
+    def _fetch(url, filepath):
+        """Copy a file:// source at disk speed, download anything else"""
+        import urllib.request
+
+        parsed = urllib.parse.urlparse(url)
+        if parsed.scheme == "file":
+            shutil.copyfile(urllib.request.url2pathname(parsed.path), filepath)
+            return
+
+        def progress_hook(block_num, block_size, total_size):
+            """顯示下載進度"""
+            if total_size > 0:
+                downloaded = block_num * block_size
+                percent = min(downloaded * 100 / total_size, 100)
+                downloaded_mb = downloaded / (1024 * 1024)
+                total_mb = total_size / (1024 * 1024)
+
+                # 每 5% 輸出一次
+                if block_num % 100 == 0:
+                    print(f"   Progress: {percent:.1f}% ({downloaded_mb:.1f}/{total_mb:.1f} MB)", end='\r')
+
+        urllib.request.urlretrieve(url, filepath, reporthook=progress_hook)
 
     def download_controlnet(self, priority_only=False):
         """下載 ControlNet 模型"""
@@ -128,19 +197,8 @@ class ModelDownloader:
         success_count = 0
         fail_count = 0
 
-        models = self.models["controlnet"]
-        if priority_only:
-            models = [m for m in models if m["priority"] == 1]
-
-        for model in models:
-            filepath = self.controlnet_path / model["filename"]
-
-            if self.download_file(
-                url=model["url"],
-                filepath=filepath,
-                model_name=model["name"],
-                size=model["size"]
-            ):
+        for entry in self.registry.downloadable("controlnet", priority_only):
+            if self.download_model(entry):
                 success_count += 1
             else:
                 fail_count += 1
@@ -159,15 +217,8 @@ class ModelDownloader:
         print("="*70)
         print()
 
-        model = self.models["vae"][0]
-        filepath = self.vae_path / model["filename"]
-
-        success = self.download_file(
-            url=model["url"],
-            filepath=filepath,
-            model_name=model["name"],
-            size=model["size"]
-        )
+        entries = self.registry.downloadable("vae", priority_only=True)
+        success = bool(entries) and all([self.download_model(entry) for entry in entries])
 
         print("="*70)
         print(f"VAE Download: {'✅ Success' if success else '❌ Failed'}")
@@ -229,20 +280,14 @@ class ModelDownloader:
         print("="*70)
         print()
 
-        print("ControlNet Models:")
-        for i, model in enumerate(self.models["controlnet"], 1):
-            priority = "⭐" * model["priority"]
-            exists = "✅" if (self.controlnet_path / model["filename"]).exists() else "❌"
-            print(f"  {i}. {exists} {model['name']:<30} {model['size']:<8} {priority}")
-
-        print()
-        print("VAE Models:")
-        for i, model in enumerate(self.models["vae"], 1):
-            priority = "⭐" * model["priority"]
-            exists = "✅" if (self.vae_path / model["filename"]).exists() else "❌"
-            print(f"  {i}. {exists} {model['name']:<30} {model['size']:<8} {priority}")
+        for kind, title in (("controlnet", "ControlNet Models"), ("vae", "VAE Models")):
+            print(f"{title}:")
+            for i, entry in enumerate(self.registry.downloadable(kind), 1):
+                priority = "⭐" * entry.priority
+                exists = "✅" if self.model_path(entry).exists() else "❌"
+                print(f"  {i}. {exists} {entry.label:<30} {entry.size:<8} {priority}")
+            print()
 
-        print()
         print("Legend:")
         print("  ✅ = Already downloaded")
         print("  ❌ = Not downloaded")
@@ -282,10 +327,18 @@ Examples:
                        help="Download only VAE model")
     parser.add_argument("--list", action="store_true",
                        help="List all available models")
+    parser.add_argument("--no-store", action="store_true",
+                       help="Plain downloads without the deduplicating model store")
+    add_store_arguments(parser)
+    add_registry_arguments(parser)
+    add_metrics_arguments(parser)
 
     args = parser.parse_args()
 
-    downloader = ModelDownloader()
+    metrics.configure("download_models", args.metrics_out, args.metrics_port)
+
+    registry = ModelRegistry(args.registry, mirrors=args.mirror, cache_dir=args.cache_dir)
+    downloader = ModelDownloader(base_path=args.root, registry=registry)
 
     # 如果沒有參數，顯示幫助
     if not any([args.all, args.priority, args.controlnet, args.vae, args.list]):
@@ -296,6 +349,9 @@ Examples:
         print()
         return
 
+    if not args.list and not args.no_store:
+        downloader.store = ModelStore(args.root)
+
     # 執行對應操作
     if args.list:
         downloader.list_models()
@@ -310,5 +366,7 @@ Examples:
         downloader.ensure_directories()
         downloader.download_vae()
 
+    metrics.finish()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Fake SD WebUI Server for Offline Benchmarks
+離線測試用的假 SD WebUI 伺服器
+
+Implements just enough of the AUTOMATIC1111 API for sd_batch_generator.py:
+/sdapi/v1/txt2img, /sdapi/v1/img2img, /sdapi/v1/sd-models,
+/sdapi/v1/progress and /sdapi/v1/interrupt. Latency, jitter, error rate,
+image size and the number of concurrent generation slots are configurable
+so throughput numbers are reproducible without a GPU. A stall rate makes
+some generations freeze halfway until they are interrupted, which is how
+a hung sampler looks to a client. With --sprites every image is an outlined
+disc on a white background, one in eight of them cropped at the frame edge,
+so frame_quality.py has something to accept and reject. Requests for several
+images (batch_size × n_iter) cost `latency` for the first image plus
+`image_latency` for each further one, so batching sweeps have a shape.
+
+Usage:
+    python fake_webui.py --port 7861 --latency 0.2 --jitter 0.05 --error-rate 0.01
+    python fake_webui.py --port 7861 --latency 1.0 --slots 1 --stall-rate 0.1
+    python sd_batch_generator.py --url http://127.0.0.1:7861 --type character --name slime --action idle
+
+    # From Python (benchmarks)
+    with FakeWebUI(latency=0.05) as server:
+        generator = GameAssetGenerator(webui_url=server.url)
+"""
+
+import argparse
+import base64
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def encode_png(width, height, seed=0, sprite=False):
+    """Encode a deterministic RGB test pattern as PNG using only the stdlib
+
+    sprite=True draws an outlined disc in the seed's colour on white; every
+    eighth seed pushes it over the right edge of the frame.
+    """
+    rng = random.Random(seed)
+    base = bytes(rng.randrange(256) for _ in range(3))
+    if sprite:
+        white, black = b"\xff" * 3, b"\x00" * 3
+        radius = min(width, height) * 0.3
+        cx = width * (0.95 if seed % 8 == 7 else 0.5) + rng.uniform(-0.02, 0.02) * width
+        cy = height * 0.5
+        rows = []
+        for y in range(height):
+            dy = y + 0.5 - cy
+            if abs(dy) >= radius:
+                rows.append(b"\x00" + white * width)
+                continue
+            half = (radius * radius - dy * dy) ** 0.5
+            inner = max(0.0, (radius - 6) ** 2 - dy * dy) ** 0.5
+            left, right = max(0, int(cx - half)), min(width, int(cx + half))
+            in_left, in_right = max(left, int(cx - inner)), min(right, int(cx + inner))
+            rows.append(b"\x00" + white * left + black * (in_left - left) + base * (in_right - in_left)
+                        + black * (right - in_right) + white * (width - right))
+        raw = b"".join(rows)
+    else:
+        row = b"\x00" + base * width
+        raw = row * height
+
+    def chunk(tag, data):
+        return (struct.pack(">I", len(data)) + tag + data
+                + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b""))
+
+STEPS = 28
+
+class FakeJob:
+    """One generation as seen by /progress"""
+
+    def __init__(self, delay, stall):
+        self.delay = delay
+        self.stall = stall
+        self.started = None
+        self.interrupted = threading.Event()
+
+    def progress(self, now):
+        if self.started is None or self.delay <= 0:
+            return 0.0
+        done = (now - self.started) / self.delay
+        # A stalled job freezes halfway, like a hung sampler
+        return min(done, 0.5 if self.stall else 0.99)
+
+class FakeWebUI:
+    """Threaded stub of the WebUI API with tunable latency and failures"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, image_size=None, models=("AnythingXL_v50",), rng_seed=1234,
+                 slots=None, stall_rate=0.0, stall_seconds=3600.0, sprites=False, image_latency=0.0):
+        self.latency = latency
+        self.image_latency = image_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.image_size = image_size
+        self.sprites = sprites
+        self.models = list(models)
+        self.rng = random.Random(rng_seed)
+        self.rng_lock = threading.Lock()
+        # Like a real WebUI, only `slots` generations run at once; the rest queue
+        self.slots = threading.Semaphore(slots) if slots else None
+        self.request_count = 0
+        self.image_count = 0
+        self.error_count = 0
+        self.stall_count = 0
+        self.interrupt_count = 0
+        self._jobs = []
+        self._job_timestamp = time.strftime("%Y%m%d%H%M%S")
+        self._png_cache = {}
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _delay_and_fail(self, images=1):
+        """Sleep for latency ± jitter (plus image_latency per extra image); return True if this request should fail
+
+        Stalled jobs sleep until /sdapi/v1/interrupt (or stall_seconds) and
+        interrupted jobs return early, as the real WebUI does.
+        """
+        with self.rng_lock:
+            self.request_count += 1
+            delay = max(0.0, self.latency + self.image_latency * (images - 1)
+                        + self.rng.uniform(-self.jitter, self.jitter))
+            fail = self.rng.random() < self.error_rate
+            stall = not fail and self.rng.random() < self.stall_rate
+            if fail:
+                self.error_count += 1
+            if stall:
+                self.stall_count += 1
+            job = FakeJob(delay, stall)
+            self._jobs.append(job)
+        start = time.perf_counter()
+        try:
+            if self.slots:
+                with self.slots:
+                    self._run(job)
+            else:
+                self._run(job)
+        finally:
+            with self.rng_lock:
+                self._jobs.remove(job)
+        return fail, time.perf_counter() - start
+
+    def _run(self, job):
+        with self.rng_lock:
+            job.started = time.perf_counter()
+            self._job_timestamp = time.strftime("%Y%m%d%H%M%S")
+        job.interrupted.wait(self.stall_seconds if job.stall else job.delay)
+
+    def interrupt(self):
+        """Stop the generations currently running (queued ones are unaffected)"""
+        with self.rng_lock:
+            running = [job for job in self._jobs if job.started is not None]
+            self.interrupt_count += 1
+        for job in running:
+            job.interrupted.set()
+        return len(running)
+
+    def progress(self):
+        now = time.perf_counter()
+        with self.rng_lock:
+            running = [job for job in self._jobs if job.started is not None]
+            current = min(running, key=lambda job: job.started) if running else None
+            job_count = len(self._jobs)
+            timestamp = self._job_timestamp
+        progress = current.progress(now) if current else 0.0
+        eta = 0.0
+        if current and not current.stall:
+            eta = max(0.0, current.delay - (now - current.started))
+        return {
+            "progress": round(progress, 4),
+            "eta_relative": round(eta, 3),
+            "state": {
+                "skipped": False,
+                "interrupted": bool(current and current.interrupted.is_set()),
+                "job": f"task({timestamp})" if current else "",
+                "job_count": job_count,
+                "job_timestamp": timestamp,
+                "job_no": 0,
+                "sampling_step": int(progress * STEPS),
+                "sampling_steps": STEPS,
+            },
+            "current_image": None,
+            "textinfo": None,
+        }
+
+    def _image(self, width, height, seed):
+        if self.image_size:
+            width, height = self.image_size
+        key = (width, height, seed % 16)
+        png = self._png_cache.get(key)
+        if png is None:
+            png = self._png_cache[key] = base64.b64encode(
+                encode_png(width, height, seed % 16, sprite=self.sprites)).decode("ascii")
+        return png
+
+    @staticmethod
+    def image_total(payload):
+        return max(1, int(payload.get("batch_size", 1))) * max(1, int(payload.get("n_iter", 1)))
+
+    def _generate(self, payload):
+        seed = payload.get("seed", -1)
+        if seed == -1:
+            with self.rng_lock:
+                seed = self.rng.randrange(2**32)
+
+        count = self.image_total(payload)
+        width = int(payload.get("width", 512))
+        height = int(payload.get("height", 512))
+        images = [self._image(width, height, seed + i) for i in range(count)]
+        info = {
+            "seed": seed,
+            "all_seeds": [seed + i for i in range(count)],
+            "prompt": payload.get("prompt", ""),
+            "width": width,
+            "height": height,
+            "steps": payload.get("steps", 20),
+        }
+        return {"images": images, "parameters": payload, "info": json.dumps(info)}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send_json(self, status, obj, process_time=None):
+                body = json.dumps(obj).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if process_time is not None:
+                    self.send_header("X-Process-Time", f"{process_time:.4f}")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.split("?", 1)[0] == "/sdapi/v1/progress":
+                    self._send_json(200, server.progress())
+                elif self.path == "/sdapi/v1/sd-models":
+                    models = [{"title": f"{m}.safetensors", "model_name": m} for m in server.models]
+                    self._send_json(200, models)
+                elif self.path == "/":
+                    self._send_json(200, {"status": "ok"})
+                else:
+                    self._send_json(404, {"detail": "Not Found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self._send_json(422, {"detail": "Invalid JSON"})
+                    return
+
+                if self.path == "/sdapi/v1/interrupt":
+                    server.interrupt()
+                    self._send_json(200, {})
+                    return
+                if self.path not in ("/sdapi/v1/txt2img", "/sdapi/v1/img2img"):
+                    self._send_json(404, {"detail": "Not Found"})
+                    return
+
+                images = server.image_total(payload)
+                fail, delay = server._delay_and_fail(images)
+                if fail:
+                    self._send_json(500, {"error": "RuntimeError", "detail": "Injected failure"})
+                    return
+                with server.rng_lock:
+                    server.image_count += images
+                self._send_json(200, server._generate(payload), process_time=delay)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake SD WebUI API for offline benchmarks")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Bind address")
+    parser.add_argument("--port", type=int, default=7861, help="Port (default: 7861)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Base generation latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform ± jitter in seconds")
+    parser.add_argument("--image-latency", type=float, default=0.0,
+                        help="Extra seconds per additional image in a batch_size × n_iter request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--stall-rate", type=float, default=0.0,
+                        help="Fraction of generations that freeze until /sdapi/v1/interrupt")
+    parser.add_argument("--slots", type=int, help="Concurrent generations before requests queue (default: unlimited)")
+    parser.add_argument("--image-size", nargs=2, type=int, metavar=("WIDTH", "HEIGHT"),
+                        help="Force returned image size (default: use payload width/height)")
+    parser.add_argument("--sprites", action="store_true",
+                        help="Return outlined sprites on white, some cropped (for frame_quality.py)")
+
+    args = parser.parse_args()
+
+    server = FakeWebUI(host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+                       error_rate=args.error_rate, slots=args.slots, stall_rate=args.stall_rate,
+                       image_size=tuple(args.image_size) if args.image_size else None,
+                       sprites=args.sprites, image_latency=args.image_latency)
+    print(f"🧪 Fake SD WebUI listening on {server.url} (Ctrl-C to stop)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Generated Frame Quality Scorer
+生成影格品質評分（CPU）
+
+Scores one generated frame at a time on the CPU so bad frames can be sent
+back to the WebUI with a new seed instead of waiting for a human to spot
+them. Every check works on NumPy arrays of the decoded image:
+
+    coverage    share of the frame covered by the subject after matting
+                (empty frames and un-removed backgrounds both fail)
+    cropped     subject pixels touching the frame border
+    similarity  SSIM and colour histogram distance to the action's
+                reference frame (see sprite_analyzer.py)
+    sharpness   variance of the Laplacian on the subject
+    noise       Immerkær's fast noise estimate of the whole frame
+
+Matting for the coverage and border checks uses the frame's own alpha when
+it has one, otherwise a background key from the border colour; rembg can be
+used instead where it is installed.
+
+Installation:
+    pip install numpy pillow
+
+Usage:
+    python frame_quality.py --input ../assets/sprites/enemies/slime/idle
+    python frame_quality.py --input temp_generated --reference idle_ref.png --report quality.json
+
+    # From Python (the generator does this with --quality)
+    scorer = FrameScorer(reference="idle(1).png")
+    result = scorer.score(png_bytes)
+    if not result["ok"]:
+        print(result["flags"], result["score"])
+"""
+
+import argparse
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from asset_tree import scan_frame_dirs
+from atomic_io import atomic_open
+from sprite_analyzer import ALPHA_THRESHOLD, colour_histograms, ssim_pairs
+
+MATTE_MODES = ("auto", "key", "rembg")
+
+DEFAULT_THRESHOLDS = {
+    "min_coverage": 0.02,    # subject covers at least this share of the frame
+    "max_coverage": 0.85,    # more than this means the background was not removed
+    "border": 0.03,          # max share of any frame edge covered by the subject
+    "ssim": 0.35,            # min SSIM against the reference frame
+    "histogram": 0.35,       # max colour histogram distance to the reference (0..1)
+    "sharpness": 0.0015,     # min Laplacian variance on the subject (luma in 0..1)
+    "noise": 0.02,           # max estimated noise sigma (luma in 0..1)
+    "key": 0.08,             # colour distance from the border colour that starts the subject
+}
+
+LAPLACIAN_NOISE = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+def open_image(source) -> Image.Image:
+    """PIL image from a path, PNG bytes or an image"""
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray)):
+        img = Image.open(io.BytesIO(source))
+    else:
+        img = Image.open(source)
+    img.load()
+    return img
+
+def convolve3(plane, kernel):
+    """'valid' 3×3 correlation of a 2-D array using shifted slices"""
+    h, w = plane.shape
+    out = np.zeros((h - 2, w - 2), dtype=np.float32)
+    for dy in range(3):
+        for dx in range(3):
+            if kernel[dy, dx]:
+                out += kernel[dy, dx] * plane[dy:dy + h - 2, dx:dx + w - 2]
+    return out
+
+def key_matte(rgb, threshold):
+    """Alpha in 0..1 from the distance to the median border colour"""
+    border = np.concatenate([rgb[0], rgb[-1], rgb[:, 0], rgb[:, -1]])
+    background = np.median(border, axis=0)
+    distance = np.sqrt(((rgb - background) ** 2).sum(axis=2)) / np.sqrt(3)
+    return np.clip((distance - threshold) / threshold, 0, 1)
+
+def noise_sigma(luma):
+    """Immerkær's estimate of Gaussian noise sigma from a 3×3 Laplacian"""
+    h, w = luma.shape
+    if h < 3 or w < 3:
+        return 0.0
+    total = np.abs(convolve3(luma, LAPLACIAN_NOISE)).sum()
+    return float(total * np.sqrt(np.pi / 2) / (6 * (w - 2) * (h - 2)))
+
+def sharpness(luma, mask):
+    """Variance of the 4-neighbour Laplacian over subject pixels"""
+    if luma.shape[0] < 3 or luma.shape[1] < 3:
+        return 0.0
+    lap = (luma[1:-1, :-2] + luma[1:-1, 2:] + luma[:-2, 1:-1] + luma[2:, 1:-1]
+           - 4 * luma[1:-1, 1:-1])
+    inner = mask[1:-1, 1:-1]
+    if inner.sum() < 16:
+        return 0.0
+    return float(lap[inner].var())
+
+class FrameScorer:
+    """CPU quality checks for single generated frames, optionally against a reference"""
+
+    def __init__(self, reference=None, thresholds=None, matte="auto", analysis_size=192, min_score=0.0):
+        if matte not in MATTE_MODES:
+            raise ValueError(f"matte must be one of {', '.join(MATTE_MODES)}")
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self.matte = matte
+        self.analysis_size = analysis_size
+        self.min_score = min_score
+        self.reference = None
+        if reference is not None:
+            self.set_reference(reference)
+
+    def _matte(self, img):
+        """(H, W, 4) float32 RGBA in 0..1 with the subject in alpha"""
+        if self.matte == "rembg":
+            from batch_remove_bg import rembg_remove
+            buffer = io.BytesIO()
+            img.save(buffer, "PNG")
+            img = open_image(rembg_remove(buffer.getvalue()))
+
+        rgba = np.asarray(img.convert("RGBA"), dtype=np.float32) / 255
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+        if self.matte == "key" or (self.matte == "auto" and not has_alpha):
+            rgba = rgba.copy()
+            rgba[..., 3] = key_matte(rgba[..., :3], self.thresholds["key"])
+        return rgba
+
+    def prepare(self, source):
+        """Matte a frame and reduce it to the analysis size for comparisons"""
+        rgba = self._matte(open_image(source))
+        h, w = rgba.shape[:2]
+        factor = max(1, max(h, w) // self.analysis_size)
+        small = Image.fromarray((rgba * 255).round().astype(np.uint8), "RGBA")
+        if factor > 1:
+            small = small.reduce(factor)
+        small = np.asarray(small)
+        alpha = small[..., 3].astype(np.float32) / 255
+        luma = (small[..., :3].astype(np.float32) @ LUMA) / 255 * alpha
+        return {"rgba": rgba, "small": small, "luma": luma, "hist": colour_histograms(small[None])[0]}
+
+    def set_reference(self, source):
+        """Use this frame (path, PNG bytes or image) as the action's reference"""
+        self.reference = self.prepare(source)
+
+    def score(self, source, reference=None) -> dict:
+        """Check one frame; returns its flags, per-check values and a 0..1 score
+
+        reference is a prepare()d frame used instead of the scorer's own, so
+        one scorer can serve several actions at once.
+        """
+        t = self.thresholds
+        frame = self.prepare(source)
+        rgba = frame["rgba"]
+        alpha = rgba[..., 3]
+        mask = alpha > ALPHA_THRESHOLD / 255
+        luma = rgba[..., :3] @ LUMA
+
+        coverage = float(mask.mean())
+        edges = (mask[0], mask[-1], mask[:, 0], mask[:, -1])
+        border = float(max(edge.mean() for edge in edges))
+        sharp = sharpness(luma, mask)
+        noise = noise_sigma(luma)
+
+        flags = []
+        if coverage < t["min_coverage"]:
+            flags.append("empty")
+        elif coverage > t["max_coverage"]:
+            flags.append("background")
+        if border > t["border"]:
+            flags.append("cropped")
+        if sharp < t["sharpness"] and coverage >= t["min_coverage"]:
+            flags.append("blurry")
+        if noise > t["noise"]:
+            flags.append("noisy")
+
+        parts = [
+            min(1.0, coverage / t["min_coverage"]) if coverage <= t["max_coverage"]
+            else max(0.0, (1 - coverage) / (1 - t["max_coverage"])),
+            max(0.0, 1 - border / (2 * t["border"])),
+            min(1.0, sharp / (2 * t["sharpness"])),
+            min(1.0, t["noise"] / max(noise, 1e-9) / 2),
+        ]
+        result = {
+            "coverage": round(coverage, 4),
+            "border": round(border, 4),
+            "sharpness": round(sharp, 6),
+            "noise": round(noise, 5),
+        }
+
+        reference = reference if reference is not None else self.reference
+        if reference is not None:
+            luma_small = frame["luma"]
+            ref_luma = reference["luma"]
+            if ref_luma.shape != luma_small.shape:
+                ref_luma = np.asarray(Image.fromarray(ref_luma).resize(luma_small.shape[::-1], Image.BILINEAR))
+            ssim = float(ssim_pairs(luma_small[None], ref_luma[None])[0])
+            hist_dist = float(0.5 * np.abs(frame["hist"] - reference["hist"]).sum())
+            if ssim < t["ssim"]:
+                flags.append("off_model")
+            if hist_dist > t["histogram"]:
+                flags.append("palette")
+            parts += [min(1.0, max(0.0, ssim) / (2 * t["ssim"])), max(0.0, 1 - hist_dist / (2 * t["histogram"]))]
+            result.update(ssim=round(ssim, 4), histogram_distance=round(hist_dist, 4))
+
+        score = float(np.mean(parts))
+        if score < self.min_score and "low_score" not in flags:
+            flags.append("low_score")
+        result.update(score=round(score, 4), flags=flags, ok=not flags)
+        return result
+
+def score_action(scorer: FrameScorer, directory: Path, frame_names, keep_reference=False):
+    """Score every frame of one action against its first frame, or the scorer's fixed reference"""
+    if not keep_reference:
+        scorer.set_reference(directory / frame_names[0])
+    frames = []
+    for name in frame_names:
+        result = scorer.score(directory / name)
+        result["frame"] = name
+        frames.append(result)
+    rejected = [f["frame"] for f in frames if not f["ok"]]
+    return {"path": str(directory), "frame_count": len(frames), "ok": not rejected,
+            "rejected": rejected, "frames": frames}
+
+def add_quality_arguments(parser):
+    """Scorer options shared by this script and the generator"""
+    parser.add_argument("--reference", type=str, help="Reference frame for the similarity check")
+    parser.add_argument("--matte", choices=MATTE_MODES, default="auto",
+                        help="How the subject is separated: own alpha / border colour key (auto), "
+                             "always key, or rembg")
+    parser.add_argument("--min-score", type=float, default=0.0,
+                        help="Also reject frames scoring below this (0..1)")
+    parser.add_argument("--max-noise", type=float, default=DEFAULT_THRESHOLDS["noise"],
+                        help="Max estimated noise sigma (luma 0..1)")
+    parser.add_argument("--min-sharpness", type=float, default=DEFAULT_THRESHOLDS["sharpness"],
+                        help="Min Laplacian variance on the subject")
+
+def scorer_from_args(args) -> FrameScorer:
+    thresholds = {"noise": args.max_noise, "sharpness": args.min_sharpness}
+    return FrameScorer(reference=args.reference, thresholds=thresholds, matte=args.matte,
+                       min_score=args.min_score)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Score generated frames for coverage, cropping, reference similarity, blur and noise",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # One action, first frame as reference
+  python frame_quality.py --input ../assets/sprites/enemies/slime/idle
+
+  # Raw WebUI output against a hand-picked reference, as a pipeline gate
+  python frame_quality.py --input temp_generated --reference idle_ref.png --report quality.json --fail-on-reject
+
+  # Generate and regenerate rejected frames with new seeds (see sd_batch_generator.py)
+  python sd_batch_generator.py --type character --name slime --action idle --quality --regen-budget 5
+        """
+    )
+
+    parser.add_argument("--input", "-i", type=str, required=True, help="Action folder or tree of action folders")
+    parser.add_argument("--report", "-o", type=str, help="Write the JSON report to this file")
+    parser.add_argument("--fail-on-reject", action="store_true", help="Exit with status 1 if any frame is rejected")
+    add_quality_arguments(parser)
+
+    args = parser.parse_args()
+
+    input_dir = Path(args.input)
+    if not input_dir.exists():
+        print(f"❌ Input directory does not exist: {input_dir}")
+        sys.exit(1)
+
+    actions = list(scan_frame_dirs(input_dir))
+    if not actions:
+        print(f"❌ No frames found in {input_dir}")
+        sys.exit(1)
+
+    print(f"\n{'='*70}")
+    print(f"🧪 Frame Quality Scorer")
+    print(f"{'='*70}")
+    print(f"Input:     {input_dir}")
+    print(f"Actions:   {len(actions)}")
+    print(f"Reference: {args.reference or 'first frame of each action'}")
+    print(f"Matte:     {args.matte}")
+    print(f"{'='*70}\n")
+
+    start = time.perf_counter()
+    scorer = scorer_from_args(args)
+    results = []
+    for directory, names in actions:
+        result = score_action(scorer, directory, names, keep_reference=args.reference is not None)
+        results.append(result)
+        print(f"  {'✅' if result['ok'] else '⚠️ '} {result['path']} ({result['frame_count']} frames)")
+        for frame in result["frames"]:
+            if frame["flags"]:
+                print(f"      {frame['frame']:<24} {frame['score']:.2f}  {', '.join(frame['flags'])}")
+    elapsed = time.perf_counter() - start
+
+    frames = sum(r["frame_count"] for r in results)
+    rejected = sum(len(r["rejected"]) for r in results)
+    if args.report:
+        with atomic_open(args.report, "w") as f:
+            json.dump({
+                "input": str(input_dir),
+                "seconds": round(elapsed, 3),
+                "thresholds": scorer.thresholds,
+                "summary": {"actions": len(results), "frames": frames, "rejected": rejected},
+                "actions": results,
+            }, f, indent=2)
+
+    print(f"\n{'='*70}")
+    print(f"{'✅' if not rejected else '⚠️ '} {frames - rejected}/{frames} frames passed "
+          f"({elapsed:.2f}s, {elapsed / max(frames, 1) * 1000:.0f} ms/frame)")
+    if args.report:
+        print(f"📄 Report: {args.report}")
+    print(f"{'='*70}\n")
+
+    if rejected and args.fail_on_reject:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Memory-Mapped Frame Store
+記憶體映射影格快取
+
+Generation, background removal, analysis, quantization and packing all
+decode the same PNG frames again. The frame store keeps one uncompressed
+RGBA array file per action folder, memory-mapped with NumPy, next to a small
+index.json:
+
+    <store>/<folder>-<hash>/frames.rgba   (N, H, W, 4) uint8, frames padded to the largest size
+    <store>/<folder>-<hash>/index.json    shape, frame names, real sizes, source hashes
+
+Readers get zero-copy views. Stages that produce frames (sd_batch_generator,
+batch_remove_bg, resize_engine, sprite_delta decode, build_farm) write their
+output folders into the store when given --frame-store, so the next stage
+(sprite_analyzer, palette_quantizer, sprite_delta encode, batch_remove_bg
+with a tuned runtime, resize_engine) opens them without a PNG decode.
+Entries are invalidated per source file: the size and mtime are checked
+first and the SHA-256 only when those changed, so an unchanged action is
+opened without decoding a single PNG.
+
+Usage:
+    python frame_store.py build --input ../assets/sprites
+    python frame_store.py info
+    python frame_store.py clear
+
+    # From Python
+    store = FrameStore()
+    frames = store.load(Path("../assets/sprites/player/Cat/idle"))
+    frames.stack.shape          # (10, 542, 542, 4), memory-mapped
+    frames.frame(3)             # view cropped to the frame's real size
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from PIL import Image
+
+from asset_tree import frame_names, natural_key, scan_frame_dirs
+from atomic_io import atomic_write, commit_file, temp_path
+
+STORE_VERSION = 1
+DEFAULT_STORE = "temp_generated/frame_store"
+DATA_FILE = "frames.rgba"
+INDEX_FILE = "index.json"
+
+def source_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class FrameSet:
+    """Memory-mapped frames of one action"""
+
+    def __init__(self, stack: np.ndarray, names: List[str], sizes: List[List[int]], path: Path):
+        self.stack = stack
+        self.names = names
+        self.sizes = sizes
+        self.path = path
+
+    def __len__(self):
+        return len(self.names)
+
+    def frame(self, i: int) -> np.ndarray:
+        """Zero-copy (h, w, 4) view of frame i without the padding"""
+        w, h = self.sizes[i]
+        return self.stack[i, :h, :w]
+
+    def image(self, i: int) -> Image.Image:
+        return Image.fromarray(np.ascontiguousarray(self.frame(i)))
+
+class FrameStore:
+    """Directory of memory-mapped RGBA arrays keyed by source folder"""
+
+    def __init__(self, root=DEFAULT_STORE):
+        self.root = Path(root)
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def entry_dir(self, directory: Path) -> Path:
+        resolved = str(Path(directory).resolve())
+        digest = hashlib.sha1(resolved.encode("utf-8")).hexdigest()[:10]
+        return self.root / f"{Path(directory).name}-{digest}"
+
+    def _entry_lock(self, entry: Path) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(entry, threading.Lock())
+
+    def _read_index(self, entry: Path) -> Optional[dict]:
+        try:
+            index = json.loads((entry / INDEX_FILE).read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return None
+        if index.get("version") != STORE_VERSION or not (entry / DATA_FILE).exists():
+            return None
+        return index
+
+    def _is_fresh(self, index: dict, directory: Path, names: List[str]):
+        """Return (fresh, touched); touched means stat info in the index was refreshed"""
+        if [f["name"] for f in index["frames"]] != names:
+            return False, False
+        touched = False
+        for record in index["frames"]:
+            path = directory / record["name"]
+            try:
+                stat = path.stat()
+            except OSError:
+                return False, False
+            if stat.st_size == record["bytes"] and stat.st_mtime_ns == record["mtime"]:
+                continue
+            # Touched or rewritten: only a content change invalidates
+            if source_hash(path) != record["sha256"]:
+                return False, False
+            record["bytes"], record["mtime"] = stat.st_size, stat.st_mtime_ns
+            touched = True
+        return True, touched
+
+    def _open(self, entry: Path, index: dict, mode="r") -> FrameSet:
+        stack = np.memmap(entry / DATA_FILE, dtype=np.uint8, mode=mode, shape=tuple(index["shape"]))
+        return FrameSet(stack, [f["name"] for f in index["frames"]], [f["size"] for f in index["frames"]], entry)
+
+    def load(self, directory: Path, names: Optional[List[str]] = None, mode="r") -> FrameSet:
+        """Open the cached frames of a folder, decoding the PNGs only when sources changed"""
+        directory = Path(directory)
+        if names is None:
+            names = frame_names(os.listdir(directory))
+        if not names:
+            raise ValueError(f"No frames in {directory}")
+        entry = self.entry_dir(directory)
+
+        with self._entry_lock(entry):
+            index = self._read_index(entry)
+            fresh, touched = self._is_fresh(index, directory, names) if index else (False, False)
+            if fresh:
+                if touched:
+                    atomic_write(entry / INDEX_FILE, json.dumps(index, indent=2))
+                self.hits += 1
+                return self._open(entry, index, mode)
+
+            self.misses += 1
+            images = []
+            for name in names:
+                with Image.open(directory / name) as img:
+                    images.append(np.asarray(img.convert("RGBA")))
+            return self.write(directory, names, images, mode=mode)
+
+    def write(self, directory: Path, names: List[str], frames, mode="r") -> FrameSet:
+        """Store frames (list of (h, w, 4) arrays or one (N, H, W, 4) array) for a folder
+
+        Stages that produce frames (e.g. background removal) call this with
+        their output so the next stage opens it without a PNG decode. Source
+        hashes are taken from directory/<name> when those files exist.
+        """
+        directory = Path(directory)
+        entry = self.entry_dir(directory)
+        entry.mkdir(parents=True, exist_ok=True)
+
+        height = max(f.shape[0] for f in frames)
+        width = max(f.shape[1] for f in frames)
+        shape = (len(frames), height, width, 4)
+
+        tmp = temp_path(entry / DATA_FILE)
+        stack = np.memmap(tmp, dtype=np.uint8, mode="w+", shape=shape)
+        records = []
+        for i, (name, frame) in enumerate(zip(names, frames)):
+            h, w = frame.shape[:2]
+            stack[i, :h, :w] = frame
+            if h < height or w < width:
+                stack[i, h:, :] = 0
+                stack[i, :h, w:] = 0
+            record = {"name": name, "size": [w, h], "bytes": 0, "mtime": 0, "sha256": None}
+            path = directory / name
+            if path.exists():
+                stat = path.stat()
+                record.update(bytes=stat.st_size, mtime=stat.st_mtime_ns, sha256=source_hash(path))
+            records.append(record)
+        stack.flush()
+        del stack
+        # Drop the old index first: a crash before the new one is written
+        # leaves an entry that is rebuilt, never old metadata over new data
+        (entry / INDEX_FILE).unlink(missing_ok=True)
+        commit_file(tmp, entry / DATA_FILE)
+
+        index = {
+            "version": STORE_VERSION,
+            "source": str(directory.resolve()),
+            "shape": list(shape),
+            "dtype": "uint8",
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "frames": records,
+        }
+        atomic_write(entry / INDEX_FILE, json.dumps(index, indent=2))
+        return self._open(entry, index, mode)
+
+    def write_images(self, directory: Path, names: List[str], images) -> Optional[FrameSet]:
+        """write() for PIL images, stored in the natural frame order readers ask for
+
+        Readers open a folder with all of its frames, so nothing is stored
+        (None) when the folder also holds other frames, e.g. @2x variants.
+        """
+        order = sorted(range(len(names)), key=lambda i: natural_key(names[i]))
+        if frame_names(os.listdir(directory)) != [names[i] for i in order]:
+            return None
+        return self.write(directory, [names[i] for i in order],
+                          [np.asarray(images[i].convert("RGBA")) for i in order])
+
+    def entries(self):
+        if not self.root.exists():
+            return []
+        result = []
+        for entry in sorted(self.root.iterdir()):
+            index = self._read_index(entry)
+            if index is not None:
+                result.append((entry, index))
+        return result
+
+    def clear(self):
+        if self.root.exists():
+            shutil.rmtree(self.root)
+
+def load_frames(directory: Path, names: List[str], store: Optional[FrameStore] = None) -> List[np.ndarray]:
+    """RGBA arrays for the given frames: views into the store if one is used, else decoded PNGs"""
+    if store is not None:
+        frame_set = store.load(directory, names)
+        return [frame_set.frame(i) for i in range(len(frame_set))]
+    frames = []
+    for name in names:
+        with Image.open(Path(directory) / name) as img:
+            frames.append(np.asarray(img.convert("RGBA")))
+    return frames
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Manage the memory-mapped frame store",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Decode every action under ../assets/sprites once
+  python frame_store.py build --input ../assets/sprites
+
+  # Show cached actions and sizes
+  python frame_store.py info
+
+  # Other tools reuse the store with --frame-store
+  python sprite_analyzer.py --input ../assets/sprites --frame-store temp_generated/frame_store
+
+  # Producing stages fill it as they write frames
+  python batch_remove_bg.py --input temp --output out --resize 64 64 --frame-store temp_generated/frame_store
+        """
+    )
+    parser.add_argument("command", choices=["build", "info", "clear"], help="Action")
+    parser.add_argument("--input", "-i", type=str, help="Tree of action folders (build)")
+    parser.add_argument("--store", type=str, default=DEFAULT_STORE, help=f"Store directory (default: {DEFAULT_STORE})")
+
+    args = parser.parse_args()
+    store = FrameStore(args.store)
+
+    if args.command == "clear":
+        store.clear()
+        print(f"🗑️  Cleared {store.root}")
+        return
+
+    if args.command == "info":
+        entries = store.entries()
+        total = 0
+        for entry, index in entries:
+            size = (entry / DATA_FILE).stat().st_size
+            total += size
+            n, h, w, _ = index["shape"]
+            print(f"  {entry.name:<40} {n:>4} x {w}x{h}  {size / 1024 / 1024:>8.1f} MB")
+        print(f"\n{len(entries)} actions, {total / 1024 / 1024:.1f} MB in {store.root}")
+        return
+
+    if not args.input or not Path(args.input).exists():
+        print(f"❌ --input must be an existing folder")
+        sys.exit(1)
+
+    print(f"\n{'='*70}")
+    print(f"🗄️  Frame Store")
+    print(f"{'='*70}")
+    print(f"Input: {args.input}")
+    print(f"Store: {store.root}")
+    print(f"{'='*70}\n")
+
+    start = time.perf_counter()
+    count = 0
+    for directory, names in scan_frame_dirs(Path(args.input)):
+        t = time.perf_counter()
+        before = store.hits
+        frames = store.load(directory, names)
+        status = "⏭️ " if store.hits > before else "✅"
+        count += len(frames)
+        print(f"  {status} {directory}  {len(frames)} frames  {(time.perf_counter() - t) * 1000:.1f} ms")
+
+    print(f"\n✅ {count} frames, {store.hits} cached / {store.misses} decoded in "
+          f"{time.perf_counter() - start:.2f}s\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Generation Daemon with a Local HTTP/JSON Job API
+常駐生成服務（本機 HTTP/JSON 工作 API）
+
+Keeps one GameAssetGenerator warm (imports, pooled WebUI session, job store)
+and accepts jobs over HTTP on localhost or a Unix socket, so editor tooling
+can submit small jobs without re-spawning sd_batch_generator.py.
+
+Endpoints:
+    GET    /health               daemon and queue status
+    POST   /jobs                 submit {"type", "name", "action", "category", "frames", "animated", "seed"}
+    GET    /jobs                 list jobs
+    GET    /jobs/<id>            job status and finished frames
+    DELETE /jobs/<id>            cancel (queued jobs are dropped, running jobs stop after the current frame)
+    GET    /jobs/<id>/events     stream frame events as JSON lines until the job ends
+
+Usage:
+    python sd_batch_generator.py --serve --port 7870
+    python sd_batch_generator.py --serve --socket /tmp/asset-gen.sock
+
+    curl -X POST localhost:7870/jobs -H "Content-Type: application/json" \
+        -d '{"type": "character", "name": "slime", "action": "idle", "frames": 4}'
+    curl localhost:7870/jobs/<id>/events
+
+Submissions must be sent as Content-Type: application/json, which browsers
+cannot do cross-origin without a preflight, so web pages cannot queue jobs
+on the daemon. name, action and category become folder names under the
+asset tree and may only use letters, digits, "_" and "-".
+"""
+
+import json
+import os
+import queue
+import re
+import socketserver
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Fields that become path components of the output folder
+PATH_FIELDS = ("name", "action", "category")
+SAFE_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+class JobValidationError(ValueError):
+    """Raised when a submitted job is missing required fields"""
+
+class DaemonJob:
+    """One submitted request plus its event log"""
+
+    def __init__(self, request):
+        self.id = uuid.uuid4().hex[:12]
+        self.request = request
+        self.state = QUEUED
+        self.seed = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.events = []
+        self.cancel = threading.Event()
+        self.changed = threading.Condition()
+
+    def add_event(self, event):
+        with self.changed:
+            self.events.append(dict(event, ts=time.time()))
+            self.changed.notify_all()
+
+    def set_state(self, state, **fields):
+        with self.changed:
+            self.state = state
+            for key, value in fields.items():
+                setattr(self, key, value)
+            if state in FINISHED:
+                self.finished_at = time.time()
+            self.events.append({"event": "state", "state": state, "ts": time.time()})
+            self.changed.notify_all()
+
+    def to_dict(self):
+        frames = [e for e in self.events if e.get("event") == "frame"]
+        return {
+            "id": self.id,
+            "state": self.state,
+            "request": self.request,
+            "seed": self.seed,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+            "frames": frames,
+        }
+
+def validate_request(request):
+    """Normalize a submitted job using the same rules as the CLI"""
+    if not isinstance(request, dict):
+        raise JobValidationError("job must be a JSON object")
+
+    asset_type = request.get("type")
+    if asset_type not in ("character", "effect", "projectile"):
+        raise JobValidationError("type must be one of: character, effect, projectile")
+    if not request.get("name"):
+        raise JobValidationError("name is required")
+    if asset_type == "character" and not request.get("action"):
+        raise JobValidationError("action is required for character type")
+    if asset_type == "effect" and not request.get("category"):
+        raise JobValidationError("category is required for effect type")
+    for field in PATH_FIELDS:
+        value = request.get(field)
+        if value is not None and not (isinstance(value, str) and SAFE_NAME.match(value)):
+            raise JobValidationError(f"{field} may only contain letters, digits, '_' and '-'")
+
+    try:
+        frames = int(request.get("frames", 10))
+        seed = int(request.get("seed", -1))
+    except (TypeError, ValueError):
+        raise JobValidationError("frames and seed must be integers")
+    if frames < 1:
+        raise JobValidationError("frames must be at least 1")
+
+    return dict(request, frames=frames, seed=seed, animated=bool(request.get("animated", False)))
+
+class GenerationDaemon:
+    """Runs submitted jobs one at a time on a warm generator"""
+
+    def __init__(self, generator):
+        self.generator = generator
+        self.jobs = {}
+        self.queue = queue.Queue()
+        self.started_at = time.time()
+        self._worker = threading.Thread(target=self._work, daemon=True)
+        self._worker.start()
+
+    def submit(self, request):
+        job = DaemonJob(validate_request(request))
+        self.jobs[job.id] = job
+        self.queue.put(job)
+        return job
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        job.cancel.set()
+        if job.state == QUEUED:
+            job.set_state(CANCELLED)
+        return job
+
+    def status(self):
+        states = {}
+        for job in list(self.jobs.values()):
+            states[job.state] = states.get(job.state, 0) + 1
+        return {"status": "ok", "uptime": time.time() - self.started_at,
+                "queued": self.queue.qsize(), "jobs": states,
+                "webui": self.generator.api_url}
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job.state != QUEUED:
+                continue
+            job.set_state(RUNNING)
+            try:
+                seed = self._run(job)
+            except Exception as e:
+                job.set_state(FAILED, error=str(e))
+                continue
+
+            if job.cancel.is_set():
+                job.set_state(CANCELLED, seed=seed)
+                continue
+
+            # The job store is the source of truth: frames finished by an earlier
+            # run (--resume) or taken from a seed sweep preview emit no event
+            spec = self._spec(job.request)
+            expected = len(spec["filenames"])
+            done = self.generator.jobs.counts(spec["run_key"])["done"]
+            if done < expected:
+                job.set_state(FAILED, seed=seed, error=f"{expected - done} frame(s) failed")
+            else:
+                job.set_state(DONE, seed=seed)
+
+    def _spec(self, request):
+        if request["type"] == "character":
+            return self.generator.character_spec(request["name"], request["action"], request["frames"])
+        if request["type"] == "effect":
+            return self.generator.effect_spec(request["category"], request["name"], request["frames"])
+        return self.generator.projectile_spec(request["name"], request["animated"], request["frames"])
+
+    def _run(self, job):
+        request = job.request
+        hooks = {"on_event": job.add_event, "cancel": job.cancel}
+
+        if request["type"] == "character":
+            return self.generator.generate_character_animation(
+                character_name=request["name"], action=request["action"],
+                frame_count=request["frames"], seed=request["seed"], **hooks)
+        if request["type"] == "effect":
+            return self.generator.generate_effect_animation(
+                effect_type=request["category"], effect_name=request["name"],
+                frame_count=request["frames"], seed=request["seed"], **hooks)
+        return self.generator.generate_projectile(
+            projectile_name=request["name"], animated=request["animated"],
+            frame_count=request["frames"] if request["animated"] else 1,
+            seed=request["seed"], **hooks)
+
+def make_handler(daemon):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status, obj):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _job_path(self):
+            parts = [p for p in self.path.split("?")[0].split("/") if p]
+            if len(parts) >= 2 and parts[0] == "jobs":
+                return daemon.jobs.get(parts[1]), parts[2:]
+            return None, None
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/health":
+                self._send_json(200, daemon.status())
+                return
+            if path == "/jobs":
+                self._send_json(200, [job.to_dict() for job in daemon.jobs.values()])
+                return
+
+            job, rest = self._job_path()
+            if job is None:
+                self._send_json(404, {"error": "job not found"})
+            elif rest == ["events"]:
+                self._stream_events(job)
+            elif not rest:
+                self._send_json(200, job.to_dict())
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path.split("?")[0] != "/jobs":
+                self._send_json(404, {"error": "not found"})
+                return
+            content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+            except ValueError:
+                self.close_connection = True
+                self._send_json(400, {"error": "invalid Content-Length"})
+                return
+            body = self.rfile.read(max(0, length))
+            if content_type != "application/json":
+                # Blocks cross-site "simple" requests (text/plain, form posts)
+                self._send_json(415, {"error": "Content-Type must be application/json"})
+                return
+            try:
+                job = daemon.submit(json.loads(body or b"{}"))
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": "invalid JSON"})
+                return
+            except JobValidationError as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            self._send_json(202, {"id": job.id, "state": job.state})
+
+        def do_DELETE(self):
+            job, rest = self._job_path()
+            if job is None or rest:
+                self._send_json(404, {"error": "job not found"})
+                return
+            daemon.cancel(job.id)
+            self._send_json(200, {"id": job.id, "state": job.state})
+
+        def _stream_events(self, job):
+            """Chunked JSON lines; ends when the job reaches a final state"""
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            sent = 0
+            while True:
+                with job.changed:
+                    while sent == len(job.events) and job.state not in FINISHED:
+                        job.changed.wait(timeout=15)
+                    pending = job.events[sent:]
+                    finished = job.state in FINISHED
+                sent += len(pending)
+
+                try:
+                    for event in pending:
+                        line = (json.dumps(event) + "\n").encode("utf-8")
+                        self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+                    self.wfile.flush()
+                    if finished:
+                        self.wfile.write(b"0\r\n\r\n")
+                        return
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ("local", 0)
+
+def serve(generator, host="127.0.0.1", port=7870, socket_path=None):
+    """Run the daemon until interrupted"""
+    daemon = GenerationDaemon(generator)
+    handler = make_handler(daemon)
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, handler)
+        where = f"unix:{socket_path}"
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        where = f"http://{host}:{port}"
+
+    print(f"\n{'='*70}")
+    print(f"🛰️  Generation daemon listening on {where}")
+    print(f"{'='*70}")
+    print(f"WebUI: {generator.api_url}")
+    print(f"Submit: POST /jobs  |  Status: GET /jobs/<id>  |  Stream: GET /jobs/<id>/events")
+    print(f"{'='*70}\n")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping daemon...")
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Durable Job Store for Generation Runs
+生成工作佇列（可中斷續跑）
+
+SQLite-backed record of every frame job: payload, seed, status, attempts
+and output path. A run that dies halfway (WebUI OOM, laptop sleep) can be
+restarted with --resume and only the frames that were actually lost are
+generated again. Quality scores of every generated candidate are kept too,
+so a frame the scorer sent back can be traced to the seed that replaced it,
+and seed sweep previews are kept per run key so a full run can reuse them.
+
+Usage:
+    store = JobStore("temp_generated/jobs.db")
+    store.start_run("character/slime/idle", seed=-1, fresh=True)
+    store.add_job("character/slime/idle", frame=1, payload={...}, output_path="...")
+    for path in store.trim_jobs("character/slime/idle", frame_count=10):
+        Path(path).unlink(missing_ok=True)
+    for job in store.pending_jobs("character/slime/idle"):
+        store.mark_running(job["id"])
+        ...
+        store.mark_done(job["id"], seed=123, output_path="...")
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_key     TEXT PRIMARY KEY,
+    seed        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_key      TEXT NOT NULL REFERENCES runs(run_key) ON DELETE CASCADE,
+    frame        INTEGER NOT NULL,
+    payload      TEXT NOT NULL,
+    seed         INTEGER,
+    status       TEXT NOT NULL DEFAULT 'pending',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    output_path  TEXT NOT NULL,
+    error        TEXT,
+    updated_at   REAL NOT NULL,
+    UNIQUE (run_key, frame)
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (run_key, status);
+CREATE TABLE IF NOT EXISTS scores (
+    job_id      INTEGER NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    seed        INTEGER NOT NULL,
+    score       REAL NOT NULL,
+    flags       TEXT NOT NULL,
+    accepted    INTEGER NOT NULL,
+    created_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_by_job ON scores (job_id);
+CREATE TABLE IF NOT EXISTS previews (
+    run_key     TEXT NOT NULL,
+    seed        INTEGER NOT NULL,
+    payload     TEXT NOT NULL,
+    path        TEXT NOT NULL,
+    score       REAL,
+    flags       TEXT NOT NULL DEFAULT '[]',
+    created_at  REAL NOT NULL,
+    PRIMARY KEY (run_key, seed, payload)
+);
+"""
+
+class JobStore:
+    """Thread-safe SQLite store of generation runs and their frame jobs"""
+
+    def __init__(self, db_path="temp_generated/jobs.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params)
+
+    def _query(self, sql, params=()) -> List[Dict]:
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    # ------------------------------------------------------------------
+    # Runs
+    # ------------------------------------------------------------------
+
+    def get_run(self, run_key: str) -> Optional[Dict]:
+        rows = self._query("SELECT * FROM runs WHERE run_key = ?", (run_key,))
+        return rows[0] if rows else None
+
+    def start_run(self, run_key: str, seed: int, fresh: bool = True) -> Dict:
+        """Create a run; a fresh start discards any earlier jobs for the key"""
+        now = time.time()
+        if fresh:
+            self._execute("DELETE FROM runs WHERE run_key = ?", (run_key,))
+        self._execute(
+            "INSERT OR IGNORE INTO runs (run_key, seed, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (run_key, seed, now, now))
+        return self.get_run(run_key)
+
+    def set_run_seed(self, run_key: str, seed: int):
+        self._execute("UPDATE runs SET seed = ?, updated_at = ? WHERE run_key = ?",
+                      (seed, time.time(), run_key))
+
+    # ------------------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------------------
+
+    def add_job(self, run_key: str, frame: int, payload: dict, output_path) -> None:
+        """Register a frame job
+
+        Finished frames are kept as they are. A frame that still needs work
+        takes the new payload and output path, so resuming with a changed
+        prompt or size generates the rest with the new settings.
+        """
+        self._execute(
+            "INSERT INTO jobs (run_key, frame, payload, output_path, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (run_key, frame) DO UPDATE SET payload = excluded.payload, "
+            "output_path = excluded.output_path, updated_at = excluded.updated_at "
+            "WHERE jobs.status != ?",
+            (run_key, frame, json.dumps(payload), str(output_path), time.time(), DONE))
+
+    def trim_jobs(self, run_key: str, frame_count: int) -> List[str]:
+        """Drop jobs beyond frame_count (a resume with fewer --frames)
+
+        Returns the output paths of the dropped jobs so the caller can remove
+        files already generated for them.
+        """
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT output_path FROM jobs WHERE run_key = ? AND frame > ?", (run_key, frame_count)).fetchall()
+            self._conn.execute("DELETE FROM jobs WHERE run_key = ? AND frame > ?", (run_key, frame_count))
+        return [row["output_path"] for row in rows]
+
+    def reset_attempts(self, run_key: str) -> int:
+        """Give unfinished jobs a fresh attempt budget (a --resume retries them again)"""
+        cursor = self._execute("UPDATE jobs SET attempts = 0 WHERE run_key = ? AND status != ?",
+                               (run_key, DONE))
+        return cursor.rowcount
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._decode(rows[0]) if rows else None
+
+    def jobs(self, run_key: str) -> List[Dict]:
+        rows = self._query("SELECT * FROM jobs WHERE run_key = ? ORDER BY frame", (run_key,))
+        return [self._decode(row) for row in rows]
+
+    def pending_jobs(self, run_key: str) -> List[Dict]:
+        """Jobs that still need work, including ones interrupted mid-run"""
+        rows = self._query(
+            "SELECT * FROM jobs WHERE run_key = ? AND status != ? ORDER BY frame",
+            (run_key, DONE))
+        return [self._decode(row) for row in rows]
+
+    def requeue_missing_outputs(self, run_key: str) -> int:
+        """Send completed jobs back to pending if their file has disappeared"""
+        missing = [job["id"] for job in self.jobs(run_key)
+                   if job["status"] == DONE and not Path(job["output_path"]).exists()]
+        for job_id in missing:
+            self._set_status(job_id, PENDING)
+        return len(missing)
+
+    def mark_running(self, job_id: int):
+        self._execute(
+            "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+            (RUNNING, time.time(), job_id))
+
+    def mark_done(self, job_id: int, seed: int, output_path):
+        self._execute(
+            "UPDATE jobs SET status = ?, seed = ?, output_path = ?, error = NULL, updated_at = ? "
+            "WHERE id = ?",
+            (DONE, seed, str(output_path), time.time(), job_id))
+
+    def requeue(self, job_id: int, seed: int, reason: str):
+        """Send a finished job back to pending to be generated again with this seed
+
+        The new seed is a new candidate, so its attempt count starts over;
+        how often a frame is regenerated is bounded by the caller.
+        """
+        self._execute(
+            "UPDATE jobs SET status = ?, seed = ?, error = ?, attempts = 0, updated_at = ? WHERE id = ?",
+            (PENDING, seed, reason, time.time(), job_id))
+
+    def mark_failed(self, job_id: int, error: str):
+        self._execute("UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                      (FAILED, error, time.time(), job_id))
+
+    def _set_status(self, job_id: int, status: str):
+        self._execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                      (status, time.time(), job_id))
+
+    def counts(self, run_key: str) -> Dict[str, int]:
+        rows = self._query(
+            "SELECT status, COUNT(*) AS n FROM jobs WHERE run_key = ? GROUP BY status", (run_key,))
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    def record_score(self, job_id: int, seed: int, score: float, flags: List[str], accepted: bool):
+        self._execute(
+            "INSERT INTO scores (job_id, seed, score, flags, accepted, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, seed, score, json.dumps(flags), int(accepted), time.time()))
+
+    def scores(self, run_key: str) -> List[Dict]:
+        """Every scored candidate of a run, oldest first"""
+        rows = self._query(
+            "SELECT jobs.frame, scores.* FROM scores JOIN jobs ON jobs.id = scores.job_id "
+            "WHERE jobs.run_key = ? ORDER BY scores.created_at", (run_key,))
+        for row in rows:
+            row["flags"] = json.loads(row["flags"])
+            row["accepted"] = bool(row["accepted"])
+        return rows
+
+    # ------------------------------------------------------------------
+    # Seed sweep previews (kept across fresh runs)
+    # ------------------------------------------------------------------
+
+    def add_preview(self, run_key: str, seed: int, payload: dict, path, score=None, flags=()):
+        self._execute(
+            "INSERT OR REPLACE INTO previews (run_key, seed, payload, path, score, flags, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run_key, seed, json.dumps(payload, sort_keys=True), str(path), score, json.dumps(list(flags)),
+             time.time()))
+
+    def previews(self, run_key: str) -> List[Dict]:
+        """Previews of a run key, best score first"""
+        rows = self._query(
+            "SELECT * FROM previews WHERE run_key = ? ORDER BY score IS NULL, score DESC, created_at",
+            (run_key,))
+        for row in rows:
+            row["payload"] = json.loads(row["payload"])
+            row["flags"] = json.loads(row["flags"])
+        return rows
+
+    def find_preview(self, run_key: str, seed: int, payload: dict) -> Optional[Dict]:
+        """A preview generated with exactly this seed and payload, if its file still exists"""
+        rows = self._query(
+            "SELECT * FROM previews WHERE run_key = ? AND seed = ? AND payload = ?",
+            (run_key, seed, json.dumps(payload, sort_keys=True)))
+        if rows and Path(rows[0]["path"]).exists():
+            return rows[0]
+        return None
+
+    @staticmethod
+    def _decode(row: Dict) -> Dict:
+        row["payload"] = json.loads(row["payload"])
+        return row
@@ -0,0 +1,923 @@
+#!/usr/bin/env python3
+"""
+Tiled Level Compiler (TMX/TSX → runtime JSON / binary)
+Tiled 關卡編譯器
+
+Parses Tiled sources directly (TMX maps, TSX tilesets; CSV, base64, zlib and
+gzip layer encodings) and emits compact runtime levels: minified JSON that
+the game's TilemapLoader reads as-is, and/or a binary .lvl container. Maps
+that only exist as Tiled JSON (large-test-map.json, infinite-base.json) are
+compiled too.
+
+Builds are incremental: each level's dependency graph (map + referenced
+tilesets) is content-hashed and only levels whose inputs changed are rebuilt,
+across a process pool.
+
+Objects from object layers (enemies, pickups, spawn points, triggers) are
+bucketed into a spatial hash keyed by chunk ("entityChunks"), so the runtime
+can activate only the entities in chunks around the camera instead of
+scanning every object each frame.
+
+Usage:
+    python level_compiler.py
+    python level_compiler.py --input ../assets/levels --output ../assets/levels/compiled --format both
+    python level_compiler.py --dry-run          # show what would be rebuilt
+    python level_compiler.py --force --jobs 8
+    python level_compiler.py --sync             # also refresh each TMX's JSON export target
+    python level_compiler.py --entity-chunk 32  # 32×32-tile entity buckets
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import math
+import os
+import struct
+import sys
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from atomic_io import atomic_write, sync_batch
+
+COMPILER_VERSION = 3
+CACHE_FILE = ".level-cache.json"
+
+# The runtime tile catalog (per-tile image path and `solid` flag) that
+# TilemapLoader reads, relative to the project root
+TILE_CATALOG = "assets/tileset.json"
+
+# Entity buckets are ENTITY_CHUNK × ENTITY_CHUNK tiles; objects spanning more
+# than MAX_ENTITY_CHUNKS buckets (level-wide triggers) go to "always" instead
+ENTITY_CHUNK = 16
+MAX_ENTITY_CHUNKS = 64
+
+# Tiled stores flip/rotation flags in the top bits of each GID
+FLIP_FLAGS = 0xE0000000
+GID_MASK = 0x1FFFFFFF
+
+LVL_MAGIC = b"LVL1"
+
+class LevelCompileError(Exception):
+    """Raised when a map or tileset cannot be parsed"""
+
+# ----------------------------------------------------------------------
+# Parsing helpers
+# ----------------------------------------------------------------------
+
+def decode_tile_data(text: str, encoding: Optional[str], compression: Optional[str]) -> List[int]:
+    """Decode a Tiled <data> payload into a flat list of GIDs"""
+    if encoding == "csv":
+        return [int(v) for v in text.replace("\n", "").split(",") if v.strip()]
+
+    if encoding == "base64":
+        raw = base64.b64decode(text.strip())
+        if compression == "zlib":
+            raw = zlib.decompress(raw)
+        elif compression == "gzip":
+            raw = gzip.decompress(raw)
+        elif compression:
+            raise LevelCompileError(f"Unsupported layer compression: {compression}")
+        return list(struct.unpack(f"<{len(raw) // 4}I", raw))
+
+    raise LevelCompileError(f"Unsupported layer encoding: {encoding}")
+
+def convert_property(ptype: str, value):
+    if ptype == "int" or ptype == "object":
+        return int(value)
+    if ptype == "float":
+        return float(value)
+    if ptype == "bool":
+        return value in (True, "true", "1")
+    return value
+
+def parse_xml_properties(element) -> dict:
+    props = {}
+    node = element.find("properties")
+    if node is None:
+        return props
+    for prop in node.findall("property"):
+        value = prop.get("value")
+        if value is None:
+            value = prop.text or ""
+        props[prop.get("name")] = convert_property(prop.get("type", "string"), value)
+    return props
+
+def parse_json_properties(obj) -> dict:
+    return {p["name"]: convert_property(p.get("type", "string"), p.get("value"))
+            for p in obj.get("properties", [])}
+
+def project_path(path: Path, root: Path) -> str:
+    """Asset path relative to the project root, as the game loads it"""
+    return Path(os.path.relpath(path.resolve(), root.resolve())).as_posix()
+
+# ----------------------------------------------------------------------
+# Tilesets
+# ----------------------------------------------------------------------
+
+def parse_tsx(path: Path, root: Path) -> dict:
+    try:
+        element = ET.parse(path).getroot()
+    except (ET.ParseError, OSError) as e:
+        raise LevelCompileError(f"{path}: {e}")
+    return tileset_from_xml(element, path.parent, root)
+
+def tileset_from_xml(element, base_dir: Path, root: Path) -> dict:
+    tileset = {
+        "name": element.get("name"),
+        "tilewidth": int(element.get("tilewidth", 0)),
+        "tileheight": int(element.get("tileheight", 0)),
+        "tilecount": int(element.get("tilecount", 0)),
+        "columns": int(element.get("columns", 0)),
+        "properties": parse_xml_properties(element),
+        "tiles": {},
+    }
+
+    image = element.find("image")
+    if image is not None:
+        tileset["image"] = project_path(base_dir / image.get("source"), root)
+        tileset["imagewidth"] = int(image.get("width", 0))
+        tileset["imageheight"] = int(image.get("height", 0))
+
+    for tile in element.findall("tile"):
+        entry = {}
+        tile_image = tile.find("image")
+        if tile_image is not None:
+            entry["image"] = project_path(base_dir / tile_image.get("source"), root)
+            entry["width"] = int(tile_image.get("width", 0))
+            entry["height"] = int(tile_image.get("height", 0))
+        props = parse_xml_properties(tile)
+        if props:
+            entry["properties"] = props
+        if tile.get("type") or tile.get("class"):
+            entry["type"] = tile.get("type") or tile.get("class")
+        tileset["tiles"][tile.get("id")] = entry
+
+    return tileset
+
+def parse_tileset_json(path: Path, root: Path) -> dict:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (json.JSONDecodeError, OSError) as e:
+        raise LevelCompileError(f"{path}: {e}")
+    return tileset_from_json(data, path.parent, root)
+
+def tileset_from_json(data: dict, base_dir: Path, root: Path) -> dict:
+    tileset = {
+        "name": data.get("name"),
+        "tilewidth": data.get("tilewidth", 0),
+        "tileheight": data.get("tileheight", 0),
+        "tilecount": data.get("tilecount", 0),
+        "columns": data.get("columns", 0),
+        "properties": parse_json_properties(data),
+        "tiles": {},
+    }
+    if data.get("image"):
+        tileset["image"] = project_path(base_dir / data["image"], root)
+        tileset["imagewidth"] = data.get("imagewidth", 0)
+        tileset["imageheight"] = data.get("imageheight", 0)
+
+    for tile in data.get("tiles", []):
+        entry = {}
+        if tile.get("image"):
+            entry["image"] = project_path(base_dir / tile["image"], root)
+            entry["width"] = tile.get("imagewidth", 0)
+            entry["height"] = tile.get("imageheight", 0)
+        props = parse_json_properties(tile)
+        if props:
+            entry["properties"] = props
+        if tile.get("type") or tile.get("class"):
+            entry["type"] = tile.get("type") or tile.get("class")
+        tileset["tiles"][str(tile["id"])] = entry
+
+    return tileset
+
+def load_tileset_source(source: str, base_dir: Path, root: Path) -> dict:
+    path = base_dir / source
+    if path.suffix.lower() == ".tsx":
+        return parse_tsx(path, root)
+    return parse_tileset_json(path, root)
+
+# ----------------------------------------------------------------------
+# Maps
+# ----------------------------------------------------------------------
+
+def parse_tmx(path: Path, root: Path) -> dict:
+    """Parse a TMX map into the runtime level structure"""
+    try:
+        element = ET.parse(path).getroot()
+    except (ET.ParseError, OSError) as e:
+        raise LevelCompileError(f"{path}: {e}")
+
+    level = {
+        "type": "map",
+        "width": int(element.get("width")),
+        "height": int(element.get("height")),
+        "tilewidth": int(element.get("tilewidth")),
+        "tileheight": int(element.get("tileheight")),
+        "orientation": element.get("orientation", "orthogonal"),
+        "infinite": element.get("infinite") == "1",
+        "properties": parse_xml_properties(element),
+        "tilesets": [],
+        "layers": [],
+    }
+
+    for ts in element.findall("tileset"):
+        if ts.get("source"):
+            tileset = load_tileset_source(ts.get("source"), path.parent, root)
+        else:
+            tileset = tileset_from_xml(ts, path.parent, root)
+        tileset["firstgid"] = int(ts.get("firstgid"))
+        level["tilesets"].append(tileset)
+
+    _collect_xml_layers(element, level, level["layers"], 0.0, 0.0, "")
+    return level
+
+def _collect_xml_layers(parent, level, out, offset_x, offset_y, prefix):
+    for child in parent:
+        ox = offset_x + float(child.get("offsetx", 0))
+        oy = offset_y + float(child.get("offsety", 0))
+        name = prefix + (child.get("name") or "")
+
+        if child.tag == "layer":
+            out.append(_xml_tile_layer(child, level, name, ox, oy))
+        elif child.tag == "objectgroup":
+            out.append({
+                "type": "objectgroup",
+                "id": int(child.get("id", 0)),
+                "name": name,
+                "visible": child.get("visible", "1") != "0",
+                "offsetx": ox,
+                "offsety": oy,
+                "properties": parse_xml_properties(child),
+                "objects": [_xml_object(obj) for obj in child.findall("object")],
+            })
+        elif child.tag == "group":
+            _collect_xml_layers(child, level, out, ox, oy, name + "/")
+
+def _xml_tile_layer(element, level, name, offset_x, offset_y):
+    width = int(element.get("width", level["width"]))
+    height = int(element.get("height", level["height"]))
+    data_el = element.find("data")
+    encoding = data_el.get("encoding") if data_el is not None else None
+    compression = data_el.get("compression") if data_el is not None else None
+
+    chunks = data_el.findall("chunk") if data_el is not None else []
+    if chunks:
+        raw_chunks = []
+        for chunk in chunks:
+            if encoding:
+                gids = decode_tile_data(chunk.text or "", encoding, compression)
+            else:
+                gids = [int(t.get("gid", 0)) for t in chunk.findall("tile")]
+            raw_chunks.append((int(chunk.get("x")), int(chunk.get("y")),
+                               int(chunk.get("width")), int(chunk.get("height")), gids))
+        return _assemble_chunks(raw_chunks, name, element, offset_x, offset_y)
+
+    if data_el is None:
+        data = [0] * (width * height)
+    elif encoding:
+        data = decode_tile_data(data_el.text or "", encoding, compression)
+    else:
+        data = [int(t.get("gid", 0)) for t in data_el.findall("tile")]
+
+    if len(data) != width * height:
+        raise LevelCompileError(f"Layer '{name}': expected {width * height} tiles, got {len(data)}")
+
+    return {
+        "type": "tilelayer",
+        "id": int(element.get("id", 0)),
+        "name": name,
+        "width": width,
+        "height": height,
+        "x": 0,
+        "y": 0,
+        "opacity": float(element.get("opacity", 1)),
+        "visible": element.get("visible", "1") != "0",
+        "offsetx": offset_x,
+        "offsety": offset_y,
+        "properties": parse_xml_properties(element),
+        "data": data,
+    }
+
+def _assemble_chunks(chunks, name, element, offset_x, offset_y):
+    """Flatten infinite-map chunks into one dense layer"""
+    min_x = min(c[0] for c in chunks)
+    min_y = min(c[1] for c in chunks)
+    max_x = max(c[0] + c[2] for c in chunks)
+    max_y = max(c[1] + c[3] for c in chunks)
+    width, height = max_x - min_x, max_y - min_y
+    data = [0] * (width * height)
+    for cx, cy, cw, ch, gids in chunks:
+        for row in range(ch):
+            start = (cy - min_y + row) * width + (cx - min_x)
+            data[start:start + cw] = gids[row * cw:(row + 1) * cw]
+
+    return {
+        "type": "tilelayer",
+        "id": int(element.get("id", 0)),
+        "name": name,
+        "width": width,
+        "height": height,
+        "x": min_x,
+        "y": min_y,
+        "opacity": float(element.get("opacity", 1)),
+        "visible": element.get("visible", "1") not in ("0", False),
+        "offsetx": offset_x,
+        "offsety": offset_y,
+        "properties": {},
+        "data": data,
+    }
+
+def _xml_object(element) -> dict:
+    obj = {
+        "id": int(element.get("id", 0)),
+        "name": element.get("name", ""),
+        "type": element.get("type") or element.get("class") or "",
+        "x": float(element.get("x", 0)),
+        "y": float(element.get("y", 0)),
+        "width": float(element.get("width", 0)),
+        "height": float(element.get("height", 0)),
+        "rotation": float(element.get("rotation", 0)),
+    }
+    if element.get("gid"):
+        obj["gid"] = int(element.get("gid"))
+    if element.find("point") is not None:
+        obj["point"] = True
+    if element.find("ellipse") is not None:
+        obj["ellipse"] = True
+    for shape in ("polygon", "polyline"):
+        node = element.find(shape)
+        if node is not None:
+            obj[shape] = [{"x": float(x), "y": float(y)}
+                          for x, y in (p.split(",") for p in node.get("points").split())]
+    props = parse_xml_properties(element)
+    if props:
+        obj["properties"] = props
+    return obj
+
+def parse_map_json(path: Path, root: Path) -> dict:
+    """Normalize a Tiled JSON map into the runtime level structure"""
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (json.JSONDecodeError, OSError) as e:
+        raise LevelCompileError(f"{path}: {e}")
+
+    level = {
+        "type": "map",
+        "width": data["width"],
+        "height": data["height"],
+        "tilewidth": data["tilewidth"],
+        "tileheight": data["tileheight"],
+        "orientation": data.get("orientation", "orthogonal"),
+        "infinite": bool(data.get("infinite", False)),
+        "properties": parse_json_properties(data),
+        "tilesets": [],
+        "layers": [],
+    }
+
+    for ts in data.get("tilesets", []):
+        if ts.get("source"):
+            tileset = load_tileset_source(ts["source"], path.parent, root)
+        else:
+            tileset = tileset_from_json(ts, path.parent, root)
+        tileset["firstgid"] = ts["firstgid"]
+        level["tilesets"].append(tileset)
+
+    _collect_json_layers(data.get("layers", []), level, level["layers"], 0.0, 0.0, "")
+    return level
+
+def _collect_json_layers(layers, level, out, offset_x, offset_y, prefix):
+    for layer in layers:
+        ox = offset_x + layer.get("offsetx", 0)
+        oy = offset_y + layer.get("offsety", 0)
+        name = prefix + layer.get("name", "")
+
+        if layer["type"] == "tilelayer":
+            if layer.get("chunks"):
+                chunks = [(c["x"], c["y"], c["width"], c["height"], _json_layer_data(c, layer))
+                          for c in layer["chunks"]]
+                out.append(_assemble_chunks(chunks, name, layer, ox, oy))
+                continue
+            data = _json_layer_data(layer, layer)
+            width = layer.get("width", level["width"])
+            height = layer.get("height", level["height"])
+            if len(data) != width * height:
+                raise LevelCompileError(f"Layer '{name}': expected {width * height} tiles, got {len(data)}")
+            out.append({
+                "type": "tilelayer",
+                "id": layer.get("id", 0),
+                "name": name,
+                "width": width,
+                "height": height,
+                "x": layer.get("x", 0),
+                "y": layer.get("y", 0),
+                "opacity": layer.get("opacity", 1),
+                "visible": layer.get("visible", True),
+                "offsetx": ox,
+                "offsety": oy,
+                "properties": parse_json_properties(layer),
+                "data": data,
+            })
+        elif layer["type"] == "objectgroup":
+            objects = []
+            for obj in layer.get("objects", []):
+                entry = {k: obj[k] for k in ("id", "name", "x", "y", "width", "height", "rotation",
+                                             "gid", "point", "ellipse", "polygon", "polyline")
+                         if k in obj}
+                entry["type"] = obj.get("type") or obj.get("class") or ""
+                props = parse_json_properties(obj)
+                if props:
+                    entry["properties"] = props
+                objects.append(entry)
+            out.append({
+                "type": "objectgroup",
+                "id": layer.get("id", 0),
+                "name": name,
+                "visible": layer.get("visible", True),
+                "offsetx": ox,
+                "offsety": oy,
+                "properties": parse_json_properties(layer),
+                "objects": objects,
+            })
+        elif layer["type"] == "group":
+            _collect_json_layers(layer.get("layers", []), level, out, ox, oy, name + "/")
+
+def _json_layer_data(holder, layer):
+    data = holder.get("data", [])
+    if isinstance(data, str):
+        return decode_tile_data(data, layer.get("encoding", "base64"), layer.get("compression") or None)
+    return list(data)
+
+# ----------------------------------------------------------------------
+# Optimization
+# ----------------------------------------------------------------------
+
+def load_tile_catalog(root: Path) -> dict:
+    """tileset.json tiles keyed by GID string, or {} when the project has none"""
+    try:
+        with open(root / TILE_CATALOG, encoding="utf-8") as f:
+            return json.load(f).get("tiles", {})
+    except (OSError, json.JSONDecodeError, AttributeError):
+        return {}
+
+def solid_gid_filter(level: dict, catalog: Optional[dict] = None):
+    """Decide solidity per GID the way TilemapLoader does
+
+    A tile's own `solid` property wins. Otherwise its image is looked up in
+    tileset.json and that entry's `solid` flag applies. Maps without
+    tilesets use tileset.json GIDs directly; tiles the catalog does not know
+    (sheet-based tilesets) stay solid.
+    """
+    catalog = catalog or {}
+    if not level["tilesets"]:
+        solid = {int(gid) for gid, tile in catalog.items() if tile.get("solid")}
+        return lambda gid: (gid & GID_MASK) in solid
+
+    by_image = {tile["path"]: bool(tile.get("solid")) for tile in catalog.values() if tile.get("path")}
+    non_solid = set()
+    for tileset in level["tilesets"]:
+        for tile_id, tile in tileset["tiles"].items():
+            solid = tile.get("properties", {}).get("solid")
+            if solid is None:
+                solid = by_image.get(tile.get("image"), True)
+            if not solid:
+                non_solid.add(tileset["firstgid"] + int(tile_id))
+    return lambda gid: (gid & GID_MASK) != 0 and (gid & GID_MASK) not in non_solid
+
+def merge_solid_rects(data, width, height, is_solid) -> List[List[int]]:
+    """Merge solid tiles into [x, y, w, h] rectangles (in tiles)
+
+    Horizontal runs are found per row and extended downwards while the run
+    below has exactly the same span, which keeps the rectangle count low for
+    typical platformer terrain.
+    """
+    rects = []
+    open_runs = {}
+    for y in range(height):
+        row_runs = {}
+        row = y * width
+        x = 0
+        while x < width:
+            if not is_solid(data[row + x]):
+                x += 1
+                continue
+            start = x
+            while x < width and is_solid(data[row + x]):
+                x += 1
+            span = (start, x - start)
+            rect = open_runs.get(span)
+            if rect is None:
+                rect = [start, y, x - start, 1]
+                rects.append(rect)
+            else:
+                rect[3] += 1
+            row_runs[span] = rect
+        open_runs = row_runs
+    return rects
+
+def object_bounds(obj: dict, offset_x=0.0, offset_y=0.0):
+    """Pixel AABB (left, top, right, bottom) of a Tiled object in map space"""
+    x, y = obj["x"] + offset_x, obj["y"] + offset_y
+    w, h = obj.get("width", 0), obj.get("height", 0)
+    points = obj.get("polygon") or obj.get("polyline")
+    if points:
+        xs = [p["x"] for p in points]
+        ys = [p["y"] for p in points]
+        left, top, right, bottom = x + min(xs), y + min(ys), x + max(xs), y + max(ys)
+    elif "gid" in obj:
+        # Tile objects are anchored at their bottom-left corner
+        left, top, right, bottom = x, y - h, x + w, y
+    else:
+        left, top, right, bottom = x, y, x + w, y + h
+
+    if obj.get("rotation"):
+        # Objects rotate around (x, y); the circle through the far corner bounds every angle
+        radius = max(math.hypot(px - x, py - y) for px in (left, right) for py in (top, bottom))
+        left, top, right, bottom = x - radius, y - radius, x + radius, y + radius
+    return left, top, right, bottom
+
+def is_spawn(obj: dict) -> bool:
+    return any("spawn" in (obj.get(key) or "").lower() for key in ("type", "name"))
+
+def index_entities(level: dict, chunk_tiles=ENTITY_CHUNK) -> Optional[dict]:
+    """Spatial hash of object-layer entities keyed by "cx,cy" chunk
+
+    Each bucket lists [layer index, object index] pairs into level["layers"];
+    an object overlapping several chunks is listed in each of them, so the
+    runtime dedupes by object id when it activates a neighbourhood. Chunk
+    coordinates may be negative on infinite maps.
+    """
+    chunk_w = chunk_tiles * level["tilewidth"]
+    chunk_h = chunk_tiles * level["tileheight"]
+    buckets, always, spawns = {}, [], []
+    count = 0
+    for layer_index, layer in enumerate(level["layers"]):
+        if layer["type"] != "objectgroup":
+            continue
+        for object_index, obj in enumerate(layer["objects"]):
+            ref = [layer_index, object_index]
+            count += 1
+            if is_spawn(obj):
+                spawns.append(ref)
+            left, top, right, bottom = object_bounds(obj, layer.get("offsetx", 0), layer.get("offsety", 0))
+            cx0, cy0 = math.floor(left / chunk_w), math.floor(top / chunk_h)
+            # A right/bottom edge exactly on a chunk border does not reach into the next chunk
+            cx1 = max(cx0, math.ceil(right / chunk_w) - 1)
+            cy1 = max(cy0, math.ceil(bottom / chunk_h) - 1)
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > MAX_ENTITY_CHUNKS:
+                always.append(ref)
+                continue
+            for cy in range(cy0, cy1 + 1):
+                for cx in range(cx0, cx1 + 1):
+                    buckets.setdefault(f"{cx},{cy}", []).append(ref)
+
+    if not count:
+        return None
+    return {
+        "chunkWidth": chunk_w,
+        "chunkHeight": chunk_h,
+        "count": count,
+        "buckets": buckets,
+        "always": always,
+        "spawns": spawns,
+    }
+
+def optimize_level(level: dict, chunk_tiles=ENTITY_CHUNK, catalog: Optional[dict] = None) -> dict:
+    """Drop empty defaults, precompute merged collision rectangles and bucket entities"""
+    is_solid = solid_gid_filter(level, catalog)
+    collision = []
+    for layer in level["layers"]:
+        if layer["type"] != "tilelayer":
+            continue
+        for key, default in (("offsetx", 0), ("offsety", 0), ("x", 0), ("y", 0),
+                             ("opacity", 1), ("visible", True), ("properties", {})):
+            if layer.get(key) == default:
+                layer.pop(key, None)
+        if layer.get("properties", {}).get("collision") is False:
+            continue
+        rects = merge_solid_rects(layer["data"], layer["width"], layer["height"], is_solid)
+        ox, oy = layer.get("x", 0), layer.get("y", 0)
+        collision.extend([x + ox, y + oy, w, h] for x, y, w, h in rects)
+
+    for tileset in level["tilesets"]:
+        if not tileset.get("properties"):
+            tileset.pop("properties", None)
+    if not level.get("properties"):
+        level.pop("properties", None)
+
+    level["collision"] = collision
+    entities = index_entities(level, chunk_tiles)
+    if entities:
+        level["entityChunks"] = entities
+    level["compiler"] = COMPILER_VERSION
+    return level
+
+# ----------------------------------------------------------------------
+# Writers
+# ----------------------------------------------------------------------
+
+def level_to_json_bytes(level: dict) -> bytes:
+    return json.dumps(level, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def level_to_binary(level: dict) -> bytes:
+    """Pack a level as LVL1: magic, header length, JSON header, tile arrays
+
+    Tile layers keep their metadata in the header with "data" replaced by
+    {"offset", "count", "dtype"}; offsets are relative to the payload start,
+    4-byte aligned, little-endian. dtype is "u16" when every GID fits
+    (no flip flags), otherwise "u32".
+    """
+    header = dict(level, layers=[])
+    payload = bytearray()
+    for layer in level["layers"]:
+        if layer["type"] != "tilelayer":
+            header["layers"].append(layer)
+            continue
+        data = layer["data"]
+        wide = any(gid > 0xFFFF for gid in data)
+        packed = struct.pack(f"<{len(data)}{'I' if wide else 'H'}", *data)
+        payload.extend(b"\0" * (-len(payload) % 4))
+        entry = dict(layer, data={"offset": len(payload), "count": len(data),
+                                  "dtype": "u32" if wide else "u16"})
+        payload.extend(packed)
+        header["layers"].append(entry)
+
+    header_bytes = level_to_json_bytes(header)
+    header_bytes += b" " * (-len(header_bytes) % 4)
+    return LVL_MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes + bytes(payload)
+
+def read_binary_level(blob: bytes) -> dict:
+    """Inverse of level_to_binary (used for verification and tooling)"""
+    if blob[:4] != LVL_MAGIC:
+        raise LevelCompileError("Not a LVL1 file")
+    (header_len,) = struct.unpack_from("<I", blob, 4)
+    header = json.loads(blob[8:8 + header_len].decode("utf-8"))
+    base = 8 + header_len
+    for layer in header["layers"]:
+        if layer["type"] == "tilelayer":
+            ref = layer["data"]
+            fmt = "I" if ref["dtype"] == "u32" else "H"
+            layer["data"] = list(struct.unpack_from(f"<{ref['count']}{fmt}", blob, base + ref["offset"]))
+    return header
+
+# ----------------------------------------------------------------------
+# Dependency graph and incremental builds
+# ----------------------------------------------------------------------
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def level_dependencies(source: Path) -> List[Path]:
+    """The map itself plus every external tileset it references"""
+    deps = [source]
+    try:
+        if source.suffix.lower() == ".tmx":
+            refs = [ts.get("source") for ts in ET.parse(source).getroot().findall("tileset")]
+        else:
+            refs = [ts.get("source") for ts in json.loads(source.read_text(encoding="utf-8")).get("tilesets", [])]
+    except (ET.ParseError, json.JSONDecodeError, OSError):
+        return deps
+    deps.extend(source.parent / ref for ref in refs if ref)
+    return deps
+
+def discover_levels(input_dir: Path) -> Dict[str, Path]:
+    """Map level name → source, preferring TMX over its hand-exported JSON twin"""
+    levels = {}
+    twins = set()
+    for tmx in sorted(input_dir.glob("*.tmx")):
+        levels[tmx.stem] = tmx
+        try:
+            export = ET.parse(tmx).getroot().find("editorsettings/export")
+        except ET.ParseError:
+            export = None
+        if export is not None and export.get("target"):
+            twins.add((input_dir / export.get("target")).resolve())
+
+    for path in sorted(input_dir.glob("*.json")):
+        if path.stem in levels or path.resolve() in twins:
+            continue
+        try:
+            with open(path, encoding="utf-8") as f:
+                if json.load(f).get("type") != "map":
+                    continue
+        except (json.JSONDecodeError, OSError, AttributeError):
+            continue
+        levels[path.stem] = path
+    return levels
+
+def compile_level(task):
+    """Worker entry point: parse, optimize and write one level"""
+    name, source, output_dir, root, formats, sync_target, chunk_tiles = task
+    source, output_dir, root = Path(source), Path(output_dir), Path(root)
+    start = time.perf_counter()
+
+    try:
+        if source.suffix.lower() == ".tmx":
+            level = parse_tmx(source, root)
+        else:
+            level = parse_map_json(source, root)
+        level = optimize_level(level, chunk_tiles, load_tile_catalog(root))
+    except KeyError as e:
+        raise LevelCompileError(f"{source.name}: missing field {e}")
+    except (ValueError, TypeError, IndexError, zlib.error) as e:
+        # Includes JSON decode errors and malformed base64 layer data
+        raise LevelCompileError(f"{source.name}: {e}")
+
+    outputs = []
+    with sync_batch():
+        if "json" in formats:
+            target = output_dir / f"{name}.json"
+            atomic_write(target, level_to_json_bytes(level))
+            outputs.append(target.name)
+        if "bin" in formats:
+            target = output_dir / f"{name}.lvl"
+            atomic_write(target, level_to_binary(level))
+            outputs.append(target.name)
+        if sync_target:
+            atomic_write(sync_target, level_to_json_bytes(level))
+
+    return {
+        "name": name,
+        "outputs": outputs,
+        "bytes": sum((output_dir / o).stat().st_size for o in outputs),
+        "source_bytes": source.stat().st_size,
+        "collision_rects": len(level["collision"]),
+        "entities": level.get("entityChunks", {}).get("count", 0),
+        "seconds": time.perf_counter() - start,
+    }
+
+class LevelCompiler:
+    """Incremental, parallel compiler for a directory of Tiled levels"""
+
+    def __init__(self, input_dir, output_dir=None, root=None, formats=("json",), jobs=None, sync=False,
+                 chunk_tiles=ENTITY_CHUNK):
+        self.input_dir = Path(input_dir)
+        self.output_dir = Path(output_dir) if output_dir else self.input_dir / "compiled"
+        # Project root: the folder that contains assets/, so image paths match tileset.json
+        self.root = Path(root) if root else self.input_dir.resolve().parent.parent
+        self.formats = tuple(formats)
+        self.jobs = jobs or os.cpu_count() or 1
+        self.sync = sync
+        self.chunk_tiles = chunk_tiles
+        self.cache_path = self.output_dir / CACHE_FILE
+        self._hashes = {}
+
+    def _hash(self, path: Path) -> Optional[str]:
+        key = path.resolve()
+        if key not in self._hashes:
+            self._hashes[key] = file_hash(path) if path.exists() else None
+        return self._hashes[key]
+
+    def load_cache(self) -> dict:
+        try:
+            cache = json.loads(self.cache_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return {"version": COMPILER_VERSION, "levels": {}}
+        if cache.get("version") != COMPILER_VERSION:
+            return {"version": COMPILER_VERSION, "levels": {}}
+        return cache
+
+    def plan(self, force=False):
+        """Return (stale, fresh, fingerprints) for every discovered level"""
+        cache = self.load_cache()
+        stale, fresh, fingerprints = [], [], {}
+        for name, source in discover_levels(self.input_dir).items():
+            # tileset.json decides tile solidity, so editing it rebuilds collision
+            deps = level_dependencies(source) + [self.root / TILE_CATALOG]
+            fingerprint = {
+                "source": source.name,
+                "formats": sorted(self.formats),
+                "entity_chunk": self.chunk_tiles,
+                "hashes": {Path(os.path.relpath(d, self.input_dir)).as_posix(): self._hash(d) for d in deps},
+            }
+            fingerprints[name] = fingerprint
+            previous = cache["levels"].get(name, {})
+            outputs_exist = all((self.output_dir / o).exists() for o in previous.get("outputs", [None]) if o)
+            unchanged = (previous.get("hashes") == fingerprint["hashes"]
+                         and previous.get("formats") == fingerprint["formats"]
+                         and previous.get("entity_chunk") == fingerprint["entity_chunk"]
+                         and previous.get("outputs") and outputs_exist)
+            (fresh if unchanged and not force else stale).append((name, source))
+        return stale, fresh, fingerprints
+
+    def build(self, force=False, dry_run=False):
+        stale, fresh, fingerprints = self.plan(force)
+
+        print(f"\n{'='*70}")
+        print(f"🧱 Level Compiler")
+        print(f"{'='*70}")
+        print(f"Input:   {self.input_dir}")
+        print(f"Output:  {self.output_dir}")
+        print(f"Formats: {', '.join(self.formats)}")
+        print(f"Levels:  {len(stale)} to build, {len(fresh)} up to date")
+        print(f"{'='*70}\n")
+
+        if dry_run:
+            for name, source in stale:
+                print(f"  🔨 would build {name} ({source.name})")
+            for name, _ in fresh:
+                print(f"  ✔️  {name} up to date")
+            return True
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        cache = self.load_cache()
+        tasks = []
+        for name, source in stale:
+            sync_target = self._sync_target(source) if self.sync else None
+            tasks.append((name, str(source), str(self.output_dir), str(self.root), self.formats,
+                          str(sync_target) if sync_target else None, self.chunk_tiles))
+
+        failures = 0
+        if tasks:
+            with ProcessPoolExecutor(max_workers=min(self.jobs, len(tasks))) as pool:
+                futures = {pool.submit(compile_level, task): task[0] for task in tasks}
+                for future, name in futures.items():
+                    try:
+                        result = future.result()
+                    except (LevelCompileError, OSError) as e:
+                        failures += 1
+                        cache["levels"].pop(name, None)
+                        print(f"  ❌ {name}: {e}")
+                        continue
+                    cache["levels"][name] = dict(fingerprints[name], outputs=result["outputs"])
+                    print(f"  ✅ {name:<24} {result['source_bytes'] / 1024:>7.1f} KB → "
+                          f"{result['bytes'] / 1024:>7.1f} KB  "
+                          f"{result['collision_rects']:>4} rects  {result['entities']:>4} entities  "
+                          f"{result['seconds'] * 1000:>6.1f} ms")
+
+        cache["levels"] = {k: v for k, v in cache["levels"].items() if k in fingerprints}
+        atomic_write(self.cache_path, json.dumps(cache, indent=2))
+
+        print(f"\n{'='*70}")
+        print(f"✅ Built {len(tasks) - failures}, skipped {len(fresh)}, failed {failures}")
+        print(f"{'='*70}\n")
+        return failures == 0
+
+    def _sync_target(self, source: Path) -> Optional[Path]:
+        if source.suffix.lower() != ".tmx":
+            return None
+        try:
+            export = ET.parse(source).getroot().find("editorsettings/export")
+        except (ET.ParseError, OSError):
+            # compile_level reports the broken map; there is just nothing to sync
+            return None
+        if export is None or not export.get("target"):
+            return None
+        return source.parent / export.get("target")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile Tiled TMX/TSX (and Tiled JSON) levels into runtime JSON or binary",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Build changed levels into ../assets/levels/compiled
+  python level_compiler.py
+
+  # JSON and binary, rebuild everything on 8 processes
+  python level_compiler.py --format both --force --jobs 8
+
+  # Show what is out of date without building
+  python level_compiler.py --dry-run
+
+  # Bucket object-layer entities into 32×32-tile chunks
+  python level_compiler.py --entity-chunk 32
+        """
+    )
+
+    parser.add_argument("--input", "-i", type=str, default="../assets/levels", help="Levels directory")
+    parser.add_argument("--output", "-o", type=str, help="Output directory (default: <input>/compiled)")
+    parser.add_argument("--root", type=str, help="Project root for asset paths (default: parent of assets/)")
+    parser.add_argument("--format", choices=["json", "bin", "both"], default="json", help="Output format")
+    parser.add_argument("--jobs", "-j", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Rebuild every level")
+    parser.add_argument("--dry-run", action="store_true", help="List stale levels without building")
+    parser.add_argument("--sync", action="store_true",
+                        help="Also write each TMX's editor export target (e.g. Level1.json)")
+    parser.add_argument("--entity-chunk", type=int, default=ENTITY_CHUNK,
+                        help=f"Entity spatial hash chunk size in tiles (default: {ENTITY_CHUNK})")
+
+    args = parser.parse_args()
+
+    if not Path(args.input).is_dir():
+        print(f"❌ Input directory does not exist: {args.input}")
+        sys.exit(1)
+
+    formats = ("json", "bin") if args.format == "both" else (args.format,)
+    compiler = LevelCompiler(args.input, args.output, root=args.root, formats=formats,
+                             jobs=args.jobs, sync=args.sync, chunk_tiles=max(1, args.entity_chunk))
+    if not compiler.build(force=args.force, dry_run=args.dry_run):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Asset Manifest Generator
+素材清單產生器
+
+Walks the character, enemy, effect and projectile trees once with
+os.scandir, natural-sorts frames ({action}(1).png … {action}(10).png) and
+writes or updates manifest.json for every asset with frame lists, frame
+size, alpha bounds, origin and animation durations. Hand-tuned fields
+already in a manifest (frameRate, loop, origin, onComplete, physics,
+gameplay, ...) are kept; frame lists, sizes, bounds and durations are
+refreshed. A combined asset index is written as well so the browser can
+preload everything with one fetch.
+
+Layouts recognised (relative to --assets):
+    characters/<name>/<action>/*.png        character
+    sprites/player/<name>/<action>/*.png    character
+    sprites/enemies/<name>/<action>/*.png   enemy
+    effects/<type>/<name>/*.png             effect (single animation)
+    projectiles/<name>/*.png                projectile (single animation)
+
+Usage:
+    python manifest_generator.py
+    python manifest_generator.py --assets ../assets --index ../assets/asset-index.json --dry-run
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from PIL import Image
+
+from asset_tree import frame_names, walk_tree
+from atomic_io import atomic_write
+
+INDEX_VERSION = 1
+
+DEFAULT_FRAME_RATE = {"character": 12, "enemy": 10, "effect": 20, "projectile": 12}
+
+# Actions that play once unless a manifest says otherwise
+ONE_SHOT_ACTIONS = {"attack", "dead", "death", "die", "hurt", "hit", "jump", "land", "spawn"}
+
+# Fields the generator owns; everything else in an existing manifest is preserved
+GENERATED_ACTION_FIELDS = ("folder", "frames", "frameCount", "size", "bounds", "durationMs", "frameDuration")
+
+class AssetEntry:
+    """One character/enemy/effect/projectile found during the walk"""
+
+    def __init__(self, kind: str, name: str, path: Path):
+        self.kind = kind
+        self.name = name
+        self.path = path
+        self.actions: Dict[str, tuple] = {}
+        self.manifest_path: Optional[Path] = None
+
+def classify(rel_parts):
+    """Map a frame directory (parts relative to the assets root) to (kind, asset depth)"""
+    if not rel_parts:
+        return None
+    top = rel_parts[0]
+    if top == "characters" and len(rel_parts) >= 3:
+        return "character", 2
+    if top == "sprites" and len(rel_parts) >= 4:
+        kind = {"player": "character", "players": "character", "enemies": "enemy"}.get(rel_parts[1], "character")
+        return kind, 3
+    if top == "sprites" and len(rel_parts) == 3:
+        # sprites/<group>/<name>/*.png — frames directly in the character folder
+        return "character", 3
+    if top == "effects" and len(rel_parts) >= 3:
+        return "effect", 3
+    if top == "projectiles" and len(rel_parts) >= 2:
+        return "projectile", 2
+    return None
+
+def action_key(frames, folder):
+    """Action name: the folder name, or the frame prefix for single-folder assets (Jump(0).png → jump)"""
+    stem = frames[0].rsplit(".", 1)[0]
+    prefix = stem.split("(", 1)[0].rstrip("_-0123456789 ")
+    return (prefix or folder).lower()
+
+def scan_assets(assets_root: Path):
+    """Single walk collecting frame folders and existing manifests per asset"""
+    assets: Dict[Path, AssetEntry] = {}
+    manifests = []
+
+    for directory, files in walk_tree(assets_root):
+        rel = directory.relative_to(assets_root).parts
+        if "manifest.json" in files:
+            manifests.append(directory)
+
+        frames = frame_names(files, extensions=(".png", ".webp"))
+        frames = [f for f in frames if f != "palette.png"]
+        info = classify(rel)
+        if not frames or info is None:
+            continue
+        kind, depth = info
+        asset_dir = assets_root.joinpath(*rel[:depth])
+        entry = assets.get(asset_dir)
+        if entry is None:
+            entry = assets[asset_dir] = AssetEntry(kind, asset_dir.name, asset_dir)
+
+        if len(rel) > depth:
+            # Frames in an action subfolder
+            folder = Path(*rel[depth:]).as_posix()
+            entry.actions[directory.name.lower()] = (folder, frames)
+        else:
+            # Frames directly in the asset folder; group them by name prefix
+            groups: Dict[str, list] = {}
+            for frame in frames:
+                groups.setdefault(action_key([frame], directory.name), []).append(frame)
+            for key, names in groups.items():
+                entry.actions[key] = (".", names)
+
+    for directory in manifests:
+        entry = assets.get(directory)
+        if entry is None:
+            rel = directory.relative_to(assets_root).parts
+            kind = (classify(rel + ("_",)) or ("character",))[0]
+            entry = assets[directory] = AssetEntry(kind, directory.name, directory)
+        entry.manifest_path = directory / "manifest.json"
+
+    return sorted(assets.values(), key=lambda e: e.path.as_posix())
+
+def measure_frames(paths):
+    """Frame size (largest) and union alpha bounds [x, y, w, h] across frames"""
+    width = height = 0
+    left = top = None
+    right = bottom = 0
+    for path in paths:
+        with Image.open(path) as img:
+            width, height = max(width, img.width), max(height, img.height)
+            if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+                box = img.convert("RGBA").getchannel("A").getbbox()
+            else:
+                box = (0, 0, img.width, img.height)
+        if box is None:
+            continue
+        left = box[0] if left is None else min(left, box[0])
+        top = box[1] if top is None else min(top, box[1])
+        right, bottom = max(right, box[2]), max(bottom, box[3])
+    if left is None:
+        return [width, height], [0, 0, 0, 0]
+    return [width, height], [left, top, right - left, bottom - top]
+
+def build_action(entry: AssetEntry, key, folder, frames, previous, measure=True):
+    action = {k: v for k, v in previous.items() if k not in GENERATED_ACTION_FIELDS}
+    frame_rate = action.setdefault("frameRate", DEFAULT_FRAME_RATE[entry.kind])
+    action.setdefault("loop", entry.kind in ("character", "enemy") and key not in ONE_SHOT_ACTIONS)
+
+    size = bounds = None
+    if measure:
+        base = entry.path if folder == "." else entry.path / folder
+        size, bounds = measure_frames([base / f for f in frames])
+        if bounds[2]:
+            # Bottom centre of the visible sprite
+            action.setdefault("origin", [bounds[0] + bounds[2] // 2, bounds[1] + bounds[3]])
+
+    action["folder"] = folder
+    action["frames"] = frames
+    action["frameCount"] = len(frames)
+    action["frameDuration"] = round(1 / frame_rate, 4)
+    action["durationMs"] = round(len(frames) * 1000 / frame_rate)
+    if measure:
+        action["size"] = size
+        action["bounds"] = bounds
+    return action
+
+def build_manifest(entry: AssetEntry, measure=True):
+    manifest = {}
+    if entry.manifest_path and entry.manifest_path.exists():
+        manifest = json.loads(entry.manifest_path.read_text(encoding="utf-8"))
+
+    manifest.setdefault("name", entry.name)
+    manifest.setdefault("type", entry.kind)
+    previous_actions = manifest.get("actions", {})
+    if not entry.actions:
+        # Hand-written manifest whose frames are not on disk yet: leave it alone
+        return manifest, False
+
+    # Hand-written actions without frames on disk are kept as they are;
+    # actions found on disk are refreshed in place or appended
+    actions = dict(previous_actions)
+    for key in list(previous_actions) + sorted(k for k in entry.actions if k not in previous_actions):
+        if key in entry.actions:
+            folder, frames = entry.actions[key]
+            actions[key] = build_action(entry, key, folder, frames, previous_actions.get(key, {}), measure)
+    manifest["actions"] = actions
+    return manifest, True
+
+def index_entry(entry: AssetEntry, manifest, project_root: Path):
+    base = Path(os.path.relpath(entry.path.resolve(), project_root.resolve())).as_posix()
+    actions = {}
+    frame_total = 0
+    for key, action in manifest.get("actions", {}).items():
+        folder = action.get("folder", key)
+        prefix = base if folder == "." else f"{base}/{folder}"
+        frames = [f"{prefix}/{name}" for name in action.get("frames", [])]
+        frame_total += len(frames)
+        actions[key] = {k: action[k] for k in ("frameRate", "frameDuration", "durationMs", "loop",
+                                               "origin", "size", "bounds", "onComplete") if k in action}
+        actions[key]["frames"] = frames
+    item = {"kind": entry.kind, "path": base, "manifest": f"{base}/manifest.json",
+            "frameCount": frame_total, "actions": actions}
+    if "palette" in manifest:
+        item["palette"] = f"{base}/{manifest['palette']}"
+    return item
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate manifest.json files and a combined asset index from frame folders",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Update every manifest under ../assets and write ../assets/asset-index.json
+  python manifest_generator.py
+
+  # Show what would change without writing
+  python manifest_generator.py --dry-run
+
+  # Only frame lists and durations (skip decoding frames for bounds)
+  python manifest_generator.py --no-bounds
+        """
+    )
+
+    parser.add_argument("--assets", "-a", type=str, default="../assets", help="Assets root to scan")
+    parser.add_argument("--project-root", type=str, default="..", help="Paths in the index are relative to this")
+    parser.add_argument("--index", type=str, help="Combined index path (default: <assets>/asset-index.json)")
+    parser.add_argument("--no-bounds", action="store_true", help="Do not decode frames for size/bounds/origin")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(), help="Assets measured in parallel")
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing files")
+
+    args = parser.parse_args()
+
+    assets_root = Path(args.assets)
+    if not assets_root.exists():
+        print(f"❌ Assets directory does not exist: {assets_root}")
+        sys.exit(1)
+    project_root = Path(args.project_root)
+    index_path = Path(args.index) if args.index else assets_root / "asset-index.json"
+
+    print(f"\n{'='*70}")
+    print(f"📋 Asset Manifest Generator")
+    print(f"{'='*70}")
+    print(f"Assets: {assets_root}")
+    print(f"Index:  {index_path}")
+    if args.dry_run:
+        print(f"Mode:   dry run")
+    print(f"{'='*70}\n")
+
+    start = time.perf_counter()
+    entries = scan_assets(assets_root)
+    scan_seconds = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs or 1)) as pool:
+        built = list(pool.map(lambda e: build_manifest(e, not args.no_bounds), entries))
+
+    index = {"version": INDEX_VERSION, "generated": time.strftime("%Y-%m-%dT%H:%M:%S"), "assets": {}}
+    written = unchanged = 0
+    for entry, (manifest, generated) in zip(entries, built):
+        key = f"{entry.kind}/{entry.name}"
+        index["assets"][key] = index_entry(entry, manifest, project_root)
+        frame_count = index["assets"][key]["frameCount"]
+
+        if not generated:
+            print(f"  📄 {key:<32} hand-written, no frames on disk")
+            continue
+
+        manifest_path = entry.path / "manifest.json"
+        text = json.dumps(manifest, indent=2) + "\n"
+        old = manifest_path.read_text(encoding="utf-8") if manifest_path.exists() else None
+        if old == text:
+            unchanged += 1
+            status = "⏭️ "
+        else:
+            written += 1
+            status = "🆕" if old is None else "✏️ "
+            if not args.dry_run:
+                atomic_write(manifest_path, text)
+        print(f"  {status} {key:<32} {len(manifest['actions'])} actions, {frame_count} frames")
+
+    if not args.dry_run:
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(index_path, json.dumps(index, indent=2))
+
+    print(f"\n{'='*70}")
+    print(f"✅ {len(entries)} assets ({written} manifests {'to write' if args.dry_run else 'written'}, "
+          f"{unchanged} unchanged)")
+    print(f"Scan: {scan_seconds * 1000:.1f} ms, total {time.perf_counter() - start:.2f}s")
+    if not args.dry_run:
+        print(f"Index: {index_path}")
+    print(f"{'='*70}\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Model Registry
+模型清單（下載來源與推薦模型）
+
+One JSON file (model_registry.json next to this script) describes every
+model the pipeline knows: name, kind, file name, URL, size, SHA-256,
+priority, mirrors and the name patterns that mark it as recommended.
+download_models.py downloads from it and verify_sd_paths.py uses the same
+entries to recognise recommended models, so neither hard-codes a list.
+
+Sources are tried in order, and the first one that yields a file with the
+expected SHA-256 (when known) wins:
+
+    1. Offline cache directory ($MODEL_CACHE or --cache-dir) holding
+       <filename> or <sha256> files, linked or copied at disk speed
+    2. Mirrors: registry-wide, $MODEL_MIRRORS and --mirror, then per-model.
+       Each is a base URL (http://nas.lan/models, file:///mnt/nas/models)
+       the file name is appended to, or a template using {filename},
+       {kind}, {sha256} or {name}
+    3. The upstream URL
+
+Usage:
+    python model_registry.py                        # list entries
+    python model_registry.py --kind controlnet --sources --mirror http://nas.lan/models
+
+    # From Python
+    registry = ModelRegistry()                      # the file is read on first use
+    for entry in registry.by_kind("controlnet"):
+        print(entry.filename, registry.sources(entry))
+"""
+
+import argparse
+import json
+import os
+import re
+from pathlib import Path
+from typing import List, Optional
+
+DEFAULT_REGISTRY = os.environ.get("MODEL_REGISTRY", str(Path(__file__).with_name("model_registry.json")))
+
+def env_list(name: str) -> List[str]:
+    """Comma or whitespace separated values of an environment variable"""
+    return [v for v in re.split(r"[,\s]+", os.environ.get(name, "")) if v]
+
+class ModelEntry:
+    """One model described by the registry"""
+
+    def __init__(self, data: dict):
+        self.name = data["name"]
+        self.label = data.get("label") or self.name
+        self.kind = data["kind"]
+        self.filename = data.get("filename")
+        self.url = data.get("url")
+        self.size = data.get("size") or "?"
+        self.sha256 = (data.get("sha256") or "").lower() or None
+        self.priority = int(data.get("priority", 3))
+        self.mirrors = list(data.get("mirrors", []))
+        self.match = [m.lower() for m in data.get("match", [])]
+        self.note = data.get("note")
+
+    def matches(self, filename: str) -> bool:
+        lowered = filename.lower()
+        if self.filename and lowered == self.filename.lower():
+            return True
+        return any(pattern in lowered for pattern in self.match)
+
+class ModelRegistry:
+    """Lazily loaded model_registry.json plus mirror and cache settings"""
+
+    def __init__(self, path=DEFAULT_REGISTRY, mirrors=(), cache_dir=None):
+        self.path = Path(path)
+        self.extra_mirrors = list(mirrors) + env_list("MODEL_MIRRORS")
+        cache_dir = cache_dir or os.environ.get("MODEL_CACHE")
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._data = None
+        self._entries = None
+
+    def _load(self):
+        if self._entries is None:
+            self._data = json.loads(self.path.read_text(encoding="utf-8"))
+            self._entries = [ModelEntry(item) for item in self._data.get("models", [])]
+        return self._entries
+
+    @property
+    def entries(self) -> List[ModelEntry]:
+        return self._load()
+
+    def by_kind(self, kind: str, priority_only=False) -> List[ModelEntry]:
+        entries = [e for e in self.entries if e.kind == kind]
+        if priority_only:
+            entries = [e for e in entries if e.priority == 1]
+        return entries
+
+    def downloadable(self, kind: str, priority_only=False) -> List[ModelEntry]:
+        return [e for e in self.by_kind(kind, priority_only) if e.filename and (e.url or e.mirrors or self.mirrors)]
+
+    def get(self, name: str) -> Optional[ModelEntry]:
+        for entry in self.entries:
+            if entry.name == name or entry.filename == name:
+                return entry
+        return None
+
+    def recommended(self, kind: str, filename: str) -> Optional[ModelEntry]:
+        """Registry entry a file on disk corresponds to, if any"""
+        for entry in self.by_kind(kind):
+            if entry.matches(filename):
+                return entry
+        return None
+
+    @property
+    def mirrors(self) -> List[str]:
+        self._load()
+        return self.extra_mirrors + list(self._data.get("mirrors", []))
+
+    def cached_file(self, entry: ModelEntry) -> Optional[Path]:
+        """Pre-seeded copy in the offline cache directory"""
+        if self.cache_dir is None:
+            return None
+        for name in (entry.filename, entry.sha256, f"{entry.kind}/{entry.filename}"):
+            if name and (self.cache_dir / name).is_file():
+                return self.cache_dir / name
+        return None
+
+    @staticmethod
+    def mirror_url(base: str, entry: ModelEntry) -> Optional[str]:
+        if "{" in base:
+            try:
+                return base.format(filename=entry.filename, kind=entry.kind, sha256=entry.sha256 or "",
+                                   name=entry.name)
+            except (KeyError, IndexError):
+                return None
+        return f"{base.rstrip('/')}/{entry.filename}"
+
+    def sources(self, entry: ModelEntry) -> List[str]:
+        """URLs to try in order: shared mirrors, the model's own mirrors, upstream"""
+        urls = []
+        for base in self.mirrors + entry.mirrors:
+            url = self.mirror_url(base, entry)
+            if url and url not in urls:
+                urls.append(url)
+        if entry.url and entry.url not in urls:
+            urls.append(entry.url)
+        return urls
+
+def add_registry_arguments(parser):
+    """--registry/--mirror/--cache-dir shared by the model scripts"""
+    parser.add_argument("--registry", type=str, default=DEFAULT_REGISTRY,
+                        help="Model registry JSON (default: model_registry.json, or $MODEL_REGISTRY)")
+    parser.add_argument("--mirror", type=str, action="append", default=[],
+                        help="Extra mirror base URL or template, tried before upstream (repeatable; "
+                             "also $MODEL_MIRRORS)")
+    parser.add_argument("--cache-dir", type=str,
+                        help="Offline cache of pre-seeded model files (default: $MODEL_CACHE)")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Show the model registry and where each model would be fetched from",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # All registered models
+  python model_registry.py
+
+  # Sources for ControlNet models with a LAN mirror first
+  python model_registry.py --kind controlnet --sources --mirror http://nas.lan/models
+        """
+    )
+    parser.add_argument("--kind", type=str, help="Only this kind")
+    parser.add_argument("--sources", action="store_true", help="Also print the source order")
+    add_registry_arguments(parser)
+
+    args = parser.parse_args()
+    registry = ModelRegistry(args.registry, mirrors=args.mirror, cache_dir=args.cache_dir)
+
+    print(f"\n{'='*70}")
+    print(f"📚 Model Registry: {registry.path}")
+    print(f"{'='*70}\n")
+
+    for entry in registry.entries:
+        if args.kind and entry.kind != args.kind:
+            continue
+        stars = "⭐" * entry.priority
+        checksum = entry.sha256[:12] if entry.sha256 else "no sha256"
+        print(f"  {entry.kind:<10} {entry.label:<28} {entry.size:<8} {checksum:<12} {stars}")
+        if args.sources:
+            cached = registry.cached_file(entry)
+            if cached:
+                print(f"      cache  {cached}")
+            for url in registry.sources(entry):
+                print(f"      url    {url}")
+    print()
+
+if __name__ == "__main__":
+    main()
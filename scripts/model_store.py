@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Model Store
+內容定址模型倉庫（SHA-256 去重）
+
+Every model file is stored once, keyed by its SHA-256:
+
+    <root>/.store/blobs/sha256/ab/abcdef…   read-only blob
+    <root>/.store/index.db                  SQLite index of blobs and the links to them
+
+Tool layouts (the warehouse folders the WebUI scripts point at, a WebUI
+install, a ComfyUI install) are views made of hardlinks to the blobs, or
+symlinks where a hardlink is impossible (different drive). Two tools that
+use the same checkpoint share one copy on disk, and a model that is
+already in the store is linked instead of downloaded again.
+
+Layouts:
+    warehouse   stable-diffusion/{checkpoints,lora,vae,embeddings}, controlnet
+    webui       models/{Stable-diffusion,Lora,VAE,ControlNet}, embeddings
+    comfyui     models/{checkpoints,loras,vae,embeddings,controlnet}
+
+The store root defaults to $MODEL_WAREHOUSE, else
+/mnt/c/AI_LLM_projects/ai_warehouse/models.
+
+Usage:
+    python model_store.py scan                                  # dedupe the warehouse folders in place
+    python model_store.py link --layout comfyui --target /opt/ComfyUI
+    python model_store.py ingest ~/Downloads/model.safetensors --kind checkpoint
+    python model_store.py list
+    python model_store.py gc --dry-run
+"""
+
+import argparse
+import errno
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from atomic_io import commit_file, rename_into, temp_path
+
+DEFAULT_ROOT = os.environ.get("MODEL_WAREHOUSE", "/mnt/c/AI_LLM_projects/ai_warehouse/models")
+STORE_DIR = ".store"
+
+MODEL_EXTENSIONS = (".safetensors", ".ckpt", ".pt", ".pth", ".bin")
+KINDS = ("checkpoint", "lora", "vae", "embedding", "controlnet")
+
+LAYOUTS: Dict[str, Dict[str, str]] = {
+    "warehouse": {
+        "checkpoint": "stable-diffusion/checkpoints",
+        "lora": "stable-diffusion/lora",
+        "vae": "stable-diffusion/vae",
+        "embedding": "stable-diffusion/embeddings",
+        "controlnet": "controlnet",
+    },
+    "webui": {
+        "checkpoint": "models/Stable-diffusion",
+        "lora": "models/Lora",
+        "vae": "models/VAE",
+        "embedding": "embeddings",
+        "controlnet": "models/ControlNet",
+    },
+    "comfyui": {
+        "checkpoint": "models/checkpoints",
+        "lora": "models/loras",
+        "vae": "models/vae",
+        "embedding": "models/embeddings",
+        "controlnet": "models/controlnet",
+    },
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256      TEXT PRIMARY KEY,
+    size        INTEGER NOT NULL,
+    source      TEXT,
+    added_at    REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS links (
+    path        TEXT PRIMARY KEY,
+    sha256      TEXT NOT NULL REFERENCES blobs(sha256),
+    name        TEXT NOT NULL,
+    kind        TEXT NOT NULL,
+    layout      TEXT NOT NULL,
+    mode        TEXT NOT NULL,
+    created_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS links_by_blob ON links (sha256);
+CREATE INDEX IF NOT EXISTS links_by_name ON links (kind, name);
+"""
+
+class ModelStoreError(Exception):
+    """A model could not be stored or linked"""
+
+def file_sha256(path: Path, block_size=4 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def layout_dir(layout: str, kind: str, target: Path) -> Path:
+    """Folder for one model kind inside a tool layout rooted at target"""
+    try:
+        return Path(target) / LAYOUTS[layout][kind]
+    except KeyError:
+        raise ModelStoreError(f"Unknown layout/kind: {layout}/{kind}")
+
+def human_size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+class ModelStore:
+    """SHA-256 keyed blob store with hardlink/symlink views and an SQLite index"""
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = Path(root)
+        self.store_dir = self.root / STORE_DIR
+        self.blob_dir = self.store_dir / "blobs" / "sha256"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.store_dir / "index.db"), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._conn:
+            self._conn.execute(sql, params)
+
+    def _query(self, sql, params=()) -> List[Dict]:
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    # ------------------------------------------------------------------
+    # Blobs
+    # ------------------------------------------------------------------
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.blob_dir / sha256[:2] / sha256
+
+    def has(self, sha256: str) -> bool:
+        return self.blob_path(sha256).exists()
+
+    def find(self, kind: str, name: str) -> Optional[str]:
+        """SHA-256 of a stored model known under this kind and file name"""
+        for row in self._query("SELECT sha256 FROM links WHERE kind = ? AND name = ? ORDER BY created_at DESC",
+                               (kind, name)):
+            if self.has(row["sha256"]):
+                return row["sha256"]
+        return None
+
+    def _add_blob(self, path: Path, sha256: str, source: Optional[str]) -> Path:
+        """Make path's content the blob for sha256 without copying when possible"""
+        blob = self.blob_path(sha256)
+        if blob.exists():
+            return blob
+        tmp = temp_path(blob)
+        os.unlink(tmp)
+        try:
+            os.link(path, tmp)
+        except OSError:
+            # Different filesystem (or no hardlinks): one copy into the store
+            shutil.copyfile(path, tmp)
+        commit_file(tmp, blob, mode=0o444)
+        self._execute("INSERT OR IGNORE INTO blobs (sha256, size, source, added_at) VALUES (?, ?, ?, ?)",
+                      (sha256, blob.stat().st_size, source, time.time()))
+        return blob
+
+    # ------------------------------------------------------------------
+    # Links
+    # ------------------------------------------------------------------
+
+    def _place(self, blob: Path, dest: Path, mode: str) -> str:
+        """Atomically put a hardlink or symlink to blob at dest; returns the mode used"""
+        tmp = temp_path(dest)
+        os.unlink(tmp)
+        used = mode
+        if mode in ("auto", "hardlink"):
+            try:
+                os.link(blob, tmp)
+                used = "hardlink"
+            except OSError as e:
+                if mode == "hardlink" or e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                    raise ModelStoreError(f"Cannot hardlink {dest}: {e}")
+                used = "symlink"
+        if used == "symlink":
+            try:
+                os.symlink(blob.resolve(), tmp)
+            except OSError as e:
+                raise ModelStoreError(f"Cannot symlink {dest}: {e}")
+        rename_into(tmp, dest)
+        return used
+
+    def link(self, sha256: str, dest: Path, kind: str, layout: str = "warehouse", mode: str = "auto") -> str:
+        """Expose a stored blob at dest; an existing file there is replaced"""
+        blob = self.blob_path(sha256)
+        if not blob.exists():
+            raise ModelStoreError(f"Blob {sha256[:12]} is not in the store")
+        dest = Path(dest)
+        if not (dest.exists() and self._points_to(dest, blob)):
+            mode = self._place(blob, dest, mode)
+        else:
+            mode = "symlink" if dest.is_symlink() else "hardlink"
+        self._execute(
+            "INSERT OR REPLACE INTO links (path, sha256, name, kind, layout, mode, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (str(dest.absolute()), sha256, dest.name, kind, layout, mode, time.time()))
+        return mode
+
+    @staticmethod
+    def _points_to(path: Path, blob: Path) -> bool:
+        try:
+            return os.path.samefile(path, blob)
+        except OSError:
+            return False
+
+    def ingest(self, path: Path, kind: str, layout: str = "warehouse", source: Optional[str] = None,
+               sha256: Optional[str] = None) -> Tuple[str, bool]:
+        """Store a model file and turn it into a link to its blob
+
+        Returns (sha256, duplicate); duplicate means the content was already
+        stored, so the file's own copy was released.
+        """
+        path = Path(path)
+        if kind not in KINDS:
+            raise ModelStoreError(f"Unknown kind {kind!r} (expected one of {', '.join(KINDS)})")
+        sha256 = sha256 or file_sha256(path)
+        duplicate = self.has(sha256)
+        # A new file becomes the blob itself (hardlink) or is copied in once;
+        # a duplicate is replaced by a link and its own copy released
+        self._add_blob(path, sha256, source or str(path))
+        self.link(sha256, path, kind, layout)
+        return sha256, duplicate
+
+    def links(self, sha256: Optional[str] = None) -> List[Dict]:
+        if sha256:
+            return self._query("SELECT * FROM links WHERE sha256 = ? ORDER BY path", (sha256,))
+        return self._query("SELECT * FROM links ORDER BY kind, name, path")
+
+    def blobs(self) -> List[Dict]:
+        return self._query("SELECT * FROM blobs ORDER BY added_at")
+
+    # ------------------------------------------------------------------
+    # Layout views
+    # ------------------------------------------------------------------
+
+    def scan(self, layout: str = "warehouse", target: Optional[Path] = None, on_file=None):
+        """Ingest every model file of a layout, replacing duplicates with links"""
+        target = Path(target) if target else self.root
+        stats = {"files": 0, "duplicates": 0, "linked": 0, "saved": 0}
+        for kind in KINDS:
+            directory = layout_dir(layout, kind, target)
+            if not directory.is_dir():
+                continue
+            for path in sorted(directory.iterdir()):
+                if path.suffix.lower() not in MODEL_EXTENSIONS or not path.is_file():
+                    continue
+                stats["files"] += 1
+                known = self._query("SELECT sha256 FROM links WHERE path = ?", (str(path.absolute()),))
+                if known and self._points_to(path, self.blob_path(known[0]["sha256"])):
+                    stats["linked"] += 1
+                    continue
+                sha256, duplicate = self.ingest(path, kind, layout)
+                if duplicate:
+                    stats["duplicates"] += 1
+                    stats["saved"] += path.stat().st_size
+                if on_file:
+                    on_file(kind, path, sha256, duplicate)
+        return stats
+
+    def expose(self, layout: str, target: Path, mode: str = "auto", kinds=KINDS):
+        """Link every stored model into a tool layout under target"""
+        count = 0
+        seen = set()
+        for row in self.links():
+            key = (row["kind"], row["name"])
+            if row["kind"] not in kinds or key in seen or not self.has(row["sha256"]):
+                continue
+            seen.add(key)
+            self.link(row["sha256"], layout_dir(layout, row["kind"], target) / row["name"],
+                      row["kind"], layout, mode)
+            count += 1
+        return count
+
+    # ------------------------------------------------------------------
+    # Garbage collection
+    # ------------------------------------------------------------------
+
+    def gc(self, dry_run=False):
+        """Forget dead links and delete blobs nothing points to any more
+
+        A link is dead when its path is gone or holds different content. A
+        blob with extra hardlinks the index does not know about is kept.
+        """
+        dead_links = []
+        live = set()
+        for row in self.links():
+            if self._points_to(Path(row["path"]), self.blob_path(row["sha256"])):
+                live.add(row["sha256"])
+            else:
+                dead_links.append(row["path"])
+
+        removed = []
+        for row in self.blobs():
+            blob = self.blob_path(row["sha256"])
+            if row["sha256"] in live:
+                continue
+            if blob.exists() and blob.stat().st_nlink > 1:
+                continue
+            removed.append(row)
+
+        if not dry_run:
+            for path in dead_links:
+                self._execute("DELETE FROM links WHERE path = ?", (path,))
+            for row in removed:
+                blob = self.blob_path(row["sha256"])
+                if blob.exists():
+                    os.chmod(blob, 0o644)
+                    blob.unlink()
+                self._execute("DELETE FROM blobs WHERE sha256 = ?", (row["sha256"],))
+            for tmp in self.blob_dir.glob("*/*.tmp"):
+                tmp.unlink()
+        return dead_links, removed
+
+def add_store_arguments(parser):
+    """--root shared by the model scripts"""
+    parser.add_argument("--root", type=str, default=DEFAULT_ROOT,
+                        help=f"Model warehouse root (default: $MODEL_WAREHOUSE or {DEFAULT_ROOT})")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Deduplicating SHA-256 model store with WebUI/ComfyUI layouts",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Move existing warehouse models into the store (duplicates become links)
+  python model_store.py scan
+
+  # Give ComfyUI the same models without copying them
+  python model_store.py link --layout comfyui --target /opt/ComfyUI
+
+  # Add one file
+  python model_store.py ingest OpenPoseXL2.safetensors --kind controlnet
+
+  # Drop blobs no layout uses any more
+  python model_store.py gc --dry-run
+        """
+    )
+    parser.add_argument("command", choices=["scan", "link", "ingest", "list", "gc"], help="Action")
+    parser.add_argument("paths", nargs="*", help="Files to ingest")
+    add_store_arguments(parser)
+    parser.add_argument("--layout", choices=list(LAYOUTS), default="warehouse", help="Tool layout")
+    parser.add_argument("--target", type=str, help="Layout root (default: the store root for warehouse)")
+    parser.add_argument("--kind", choices=KINDS, help="Model kind (ingest)")
+    parser.add_argument("--mode", choices=["auto", "hardlink", "symlink"], default="auto",
+                        help="Link type (auto: hardlink, symlink across drives)")
+    parser.add_argument("--dry-run", action="store_true", help="gc: only report")
+
+    args = parser.parse_args()
+    store = ModelStore(args.root)
+
+    print(f"\n{'='*70}")
+    print(f"🗃️  Model Store: {store.root}")
+    print(f"{'='*70}\n")
+
+    if args.command == "scan":
+        def on_file(kind, path, sha256, duplicate):
+            print(f"  {'♻️ ' if duplicate else '📦'} {kind:<10} {path.name:<45} {sha256[:12]}"
+                  + ("  (duplicate → link)" if duplicate else ""))
+
+        target = Path(args.target) if args.target else None
+        stats = store.scan(args.layout, target, on_file=on_file)
+        print(f"\n✅ {stats['files']} files: {stats['linked']} already linked, "
+              f"{stats['duplicates']} duplicates, {human_size(stats['saved'])} freed")
+
+    elif args.command == "link":
+        if not args.target and args.layout != "warehouse":
+            print("❌ --target is required for the webui and comfyui layouts")
+            sys.exit(1)
+        target = Path(args.target) if args.target else store.root
+        try:
+            count = store.expose(args.layout, target, args.mode)
+        except ModelStoreError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ {count} models linked into {args.layout} layout at {target}")
+
+    elif args.command == "ingest":
+        if not args.paths or not args.kind:
+            print("❌ ingest needs file paths and --kind")
+            sys.exit(1)
+        for path in map(Path, args.paths):
+            sha256, duplicate = store.ingest(path, args.kind)
+            print(f"  {'♻️ ' if duplicate else '📦'} {path.name}  {sha256[:12]}"
+                  + ("  (already stored)" if duplicate else ""))
+
+    elif args.command == "list":
+        total = 0
+        for blob in store.blobs():
+            total += blob["size"]
+            print(f"  {blob['sha256'][:12]}  {human_size(blob['size']):>10}")
+            for link in store.links(blob["sha256"]):
+                print(f"      {link['mode']:<8} {link['layout']:<9} {link['path']}")
+        print(f"\n{len(store.blobs())} blobs, {human_size(total)} on disk")
+
+    elif args.command == "gc":
+        dead_links, removed = store.gc(dry_run=args.dry_run)
+        for path in dead_links:
+            print(f"  🔗 dead link {path}")
+        for row in removed:
+            print(f"  🗑️  {row['sha256'][:12]}  {human_size(row['size'])}")
+        verb = "would free" if args.dry_run else "freed"
+        print(f"\n✅ {len(dead_links)} dead links, {len(removed)} blobs, "
+              f"{verb} {human_size(sum(r['size'] for r in removed))}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Shared Palette Quantizer for Character Frames
+角色影格共用調色盤量化
+
+Generated frames of one character each carry slightly different colours,
+which hurts PNG compression and makes animations flicker. This tool builds
+one palette per character from the opaque pixels of all its frames
+(median-cut seeding refined with vectorized k-means), remaps every frame to
+it (optionally with 4x4 ordered dithering) and writes indexed PNGs plus
+palette.json / palette.png. Index 0 is always the transparent colour, so
+palette swaps at runtime only need a different palette strip.
+
+If the character folder has a manifest.json, a "palette" entry pointing to
+palette.json is added to it.
+
+Installation:
+    pip install numpy pillow
+
+Usage:
+    python palette_quantizer.py --input ../assets/sprites/enemies/slime
+    python palette_quantizer.py --input ../assets/sprites/enemies/slime --colors 24 --dither --in-place
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from asset_tree import scan_frame_dirs
+from atomic_io import atomic_copy, atomic_write, save_image, sync_batch
+from frame_store import FrameStore, load_frames
+
+LUT_BITS = 6  # nearest-colour lookup table resolution per channel
+
+BAYER_4X4 = (np.array([
+    [0, 8, 2, 10],
+    [12, 4, 14, 6],
+    [3, 11, 1, 9],
+    [15, 7, 13, 5],
+], dtype=np.float32) + 0.5) / 16 - 0.5
+
+# ----------------------------------------------------------------------
+# Palette construction
+# ----------------------------------------------------------------------
+
+def sample_opaque_pixels(frames, alpha_threshold=128, max_samples=200_000, seed=0):
+    """Collect opaque RGB pixels from RGBA frames, evenly subsampled to max_samples"""
+    chunks = []
+    for rgba in frames:
+        chunks.append(rgba[rgba[..., 3] >= alpha_threshold][:, :3])
+    pixels = np.concatenate(chunks) if chunks else np.zeros((0, 3), dtype=np.uint8)
+    if len(pixels) > max_samples:
+        rng = np.random.default_rng(seed)
+        pixels = pixels[rng.choice(len(pixels), max_samples, replace=False)]
+    return pixels.astype(np.float32)
+
+def median_cut(pixels, colors):
+    """Split the box with the widest weighted range until there are `colors` boxes"""
+    boxes = [pixels]
+    while len(boxes) < colors:
+        scores = [(np.ptp(b, axis=0).max() * len(b)) if len(b) > 1 else -1 for b in boxes]
+        i = int(np.argmax(scores))
+        if scores[i] <= 0:
+            break
+        box = boxes.pop(i)
+        channel = int(np.argmax(np.ptp(box, axis=0)))
+        order = np.argsort(box[:, channel], kind="stable")
+        half = len(box) // 2
+        boxes += [box[order[:half]], box[order[half:]]]
+    return np.array([b.mean(axis=0) for b in boxes], dtype=np.float32)
+
+def nearest(points, palette, chunk=65536):
+    """Index of the nearest palette colour for every point (squared RGB distance)"""
+    c2 = (palette ** 2).sum(axis=1)
+    out = np.empty(len(points), dtype=np.int64)
+    for start in range(0, len(points), chunk):
+        p = points[start:start + chunk]
+        out[start:start + chunk] = np.argmin(c2 - 2 * p @ palette.T, axis=1)
+    return out
+
+def kmeans(pixels, initial, iterations=12, tolerance=0.5):
+    """Lloyd iterations; empty clusters keep their previous centre"""
+    centres = initial.copy()
+    k = len(centres)
+    for _ in range(iterations):
+        labels = nearest(pixels, centres)
+        counts = np.bincount(labels, minlength=k).astype(np.float32)
+        sums = np.stack([np.bincount(labels, weights=pixels[:, c], minlength=k) for c in range(3)], axis=1)
+        updated = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centres)
+        shift = np.abs(updated - centres).max()
+        centres = updated.astype(np.float32)
+        if shift < tolerance:
+            break
+    return centres
+
+def build_palette(pixels, colors, iterations=12):
+    """Return an (n, 3) uint8 palette sorted by luminance, n <= colors"""
+    if len(pixels) == 0:
+        return np.zeros((1, 3), dtype=np.uint8)
+    palette = median_cut(pixels, colors)
+    if iterations:
+        palette = kmeans(pixels, palette, iterations)
+    palette = np.unique(np.clip(np.rint(palette), 0, 255).astype(np.uint8), axis=0)
+    luma = palette.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    return palette[np.argsort(luma, kind="stable")]
+
+def build_lut(palette):
+    """Map every LUT_BITS-per-channel RGB cell to its nearest palette index"""
+    levels = 1 << LUT_BITS
+    step = 256 / levels
+    axis = (np.arange(levels, dtype=np.float32) + 0.5) * step
+    grid = np.stack(np.meshgrid(axis, axis, axis, indexing="ij"), axis=-1).reshape(-1, 3)
+    return nearest(grid, palette.astype(np.float32)).astype(np.uint8)
+
+# ----------------------------------------------------------------------
+# Remapping
+# ----------------------------------------------------------------------
+
+def remap_frame(rgba, lut, alpha_threshold=128, dither=0.0):
+    """Return palette indices (H, W) for an RGBA frame; 0 is transparent"""
+    rgb = rgba[..., :3].astype(np.float32)
+    if dither:
+        h, w = rgb.shape[:2]
+        pattern = np.tile(BAYER_4X4, ((h + 3) // 4, (w + 3) // 4))[:h, :w]
+        rgb += pattern[..., None] * dither
+    cells = np.clip(rgb, 0, 255).astype(np.uint16) >> (8 - LUT_BITS)
+    flat = (cells[..., 0] << (2 * LUT_BITS)) | (cells[..., 1] << LUT_BITS) | cells[..., 2]
+    indices = lut[flat] + 1
+    indices[rgba[..., 3] < alpha_threshold] = 0
+    return indices.astype(np.uint8)
+
+def save_indexed(indices, palette, output_path):
+    img = Image.frombytes("P", (indices.shape[1], indices.shape[0]), indices.tobytes())
+    flat = [0, 0, 0] + palette.reshape(-1).tolist()
+    img.putpalette(flat + [0] * (768 - len(flat)))
+    save_image(img, output_path, "PNG", optimize=True, transparency=0)
+
+def write_palette_files(palette, output_dir, source, colors_requested):
+    colors = [[int(c) for c in rgb] for rgb in palette]
+    data = {
+        "version": 1,
+        "source": source,
+        "transparentIndex": 0,
+        "requested": colors_requested,
+        "colors": [[0, 0, 0, 0]] + [rgb + [255] for rgb in colors],
+        "hex": ["transparent"] + ["#%02x%02x%02x" % tuple(rgb) for rgb in colors],
+    }
+    atomic_write(output_dir / "palette.json", json.dumps(data, indent=2))
+
+    strip = np.zeros((1, len(colors) + 1, 4), dtype=np.uint8)
+    strip[0, 1:, :3] = palette
+    strip[0, 1:, 3] = 255
+    save_image(Image.fromarray(strip), output_dir / "palette.png", "PNG")
+
+def link_manifest(input_dir: Path, output_dir: Path):
+    """Add "palette": "palette.json" to the character manifest, if there is one"""
+    manifest_path = output_dir / "manifest.json"
+    if not manifest_path.exists() and (input_dir / "manifest.json").exists():
+        atomic_copy(input_dir / "manifest.json", manifest_path)
+    if not manifest_path.exists():
+        return None
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    manifest["palette"] = "palette.json"
+    atomic_write(manifest_path, json.dumps(manifest, indent=2))
+    return manifest_path
+
+def quantize_character(input_dir, output_dir, colors=32, dither=0.0, alpha_threshold=128,
+                       iterations=12, jobs=4, store=None):
+    """Build the shared palette for one character tree and remap all of its frames
+
+    Frames are decoded once per pass, or not at all when a FrameStore
+    already holds them.
+    """
+    input_dir = Path(input_dir)
+    output_dir = Path(output_dir)
+    actions = []
+    for directory, names in scan_frame_dirs(input_dir, extensions=(".png",)):
+        names = [n for n in names if not (directory == input_dir and n == "palette.png")]
+        if names:
+            actions.append((directory, names))
+    frame_paths = [d / name for d, names in actions for name in names]
+    if not frame_paths:
+        return None
+
+    start = time.perf_counter()
+    if store is not None:
+        frames = [f for d, names in actions for f in load_frames(d, names, store)]
+    else:
+        frames = [None] * len(frame_paths)
+
+    def decoded():
+        for path, rgba in zip(frame_paths, frames):
+            yield rgba if rgba is not None else load_frames(path.parent, [path.name])[0]
+
+    pixels = sample_opaque_pixels(decoded(), alpha_threshold)
+    # Index 0 is reserved for transparency
+    palette = build_palette(pixels, min(colors, 255), iterations)
+    lut = build_lut(palette)
+    palette_seconds = time.perf_counter() - start
+
+    def remap(item):
+        path, rgba = item
+        target = output_dir / path.relative_to(input_dir)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        before = path.stat().st_size
+        if rgba is None:
+            rgba = load_frames(path.parent, [path.name])[0]
+        save_indexed(remap_frame(rgba, lut, alpha_threshold, dither), palette, target)
+        return before, target.stat().st_size
+
+    with sync_batch(), ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        sizes = list(pool.map(remap, zip(frame_paths, frames)))
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    write_palette_files(palette, output_dir, input_dir.name, colors)
+    manifest = link_manifest(input_dir, output_dir)
+
+    return {
+        "frames": len(frame_paths),
+        "actions": len({path.parent for path in frame_paths}),
+        "colors": len(palette),
+        "samples": len(pixels),
+        "bytes_before": sum(b for b, _ in sizes),
+        "bytes_after": sum(a for _, a in sizes),
+        "palette_seconds": palette_seconds,
+        "seconds": time.perf_counter() - start,
+        "manifest": manifest,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Quantize all frames of a character to one shared palette",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Write indexed frames to ../assets/sprites/enemies/slime_indexed
+  python palette_quantizer.py --input ../assets/sprites/enemies/slime
+
+  # 24 colours with ordered dithering, overwriting the originals
+  python palette_quantizer.py --input ../assets/sprites/enemies/slime --colors 24 --dither --in-place
+        """
+    )
+
+    parser.add_argument("--input", "-i", type=str, required=True, help="Character folder (all actions below it)")
+    parser.add_argument("--output", "-o", type=str, help="Output folder (default: <input>_indexed)")
+    parser.add_argument("--in-place", action="store_true", help="Overwrite the original frames")
+    parser.add_argument("--colors", "-c", type=int, default=32, help="Palette size excluding transparency (default: 32)")
+    parser.add_argument("--dither", action="store_true", help="Apply 4x4 ordered dithering")
+    parser.add_argument("--dither-strength", type=float, default=24.0, help="Dither amplitude in 0-255 units")
+    parser.add_argument("--alpha-threshold", type=int, default=128, help="Pixels below this alpha become transparent")
+    parser.add_argument("--iterations", type=int, default=12, help="k-means refinement passes (0 = median-cut only)")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(), help="Frames remapped in parallel")
+    parser.add_argument("--frame-store", type=str, help="Read frames through a memory-mapped frame store at this path")
+
+    args = parser.parse_args()
+
+    input_dir = Path(args.input)
+    if not input_dir.exists():
+        print(f"❌ Input directory does not exist: {input_dir}")
+        sys.exit(1)
+    if not 1 <= args.colors <= 255:
+        print("❌ --colors must be between 1 and 255")
+        sys.exit(1)
+
+    if args.in_place:
+        output_dir = input_dir
+    elif args.output:
+        output_dir = Path(args.output)
+    else:
+        output_dir = input_dir.parent / f"{input_dir.name}_indexed"
+
+    print(f"\n{'='*70}")
+    print(f"🎨 Shared Palette Quantizer")
+    print(f"{'='*70}")
+    print(f"Input:   {input_dir}")
+    print(f"Output:  {output_dir}")
+    print(f"Colors:  {args.colors}{' (dithered)' if args.dither else ''}")
+    print(f"{'='*70}\n")
+
+    result = quantize_character(input_dir, output_dir, args.colors,
+                                args.dither_strength if args.dither else 0.0,
+                                args.alpha_threshold, args.iterations, args.jobs or 1,
+                                FrameStore(args.frame_store) if args.frame_store else None)
+    if result is None:
+        print(f"❌ No PNG frames found in {input_dir}")
+        sys.exit(1)
+
+    saved = result["bytes_before"] - result["bytes_after"]
+    ratio = result["bytes_after"] / max(result["bytes_before"], 1)
+    print(f"Frames:  {result['frames']} in {result['actions']} actions")
+    print(f"Palette: {result['colors']} colours from {result['samples']} samples "
+          f"({result['palette_seconds']:.2f}s)")
+    print(f"Size:    {result['bytes_before'] / 1024:.1f} KB → {result['bytes_after'] / 1024:.1f} KB "
+          f"({ratio:.0%}, saved {saved / 1024:.1f} KB)")
+    if result["manifest"]:
+        print(f"Manifest: {result['manifest']} → palette.json")
+
+    print(f"\n{'='*70}")
+    print(f"✅ Done in {result['seconds']:.2f}s")
+    print(f"{'='*70}\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Parallax Background Tiler and Mip-Chain Generator
+視差背景切圖與多層級縮圖產生器
+
+Slices each large background (assets/background/layer-*.png, BG.png) into
+fixed-size tiles at several downscaled mip levels and writes a tile index.
+At runtime the camera can then fetch only the tiles that intersect the
+viewport, at the level whose scale matches the on-screen size:
+
+    level = clamp(floor(log2(1 / drawScale)), 0, levels - 1)
+    visible columns = floor(viewX * s / tileSize) .. floor((viewX + viewW) * s / tileSize)
+    (s = 2 ** -level)
+
+Downscaling uses premultiplied alpha with a 2x2 box reduction per level, so
+transparent edges do not pick up dark fringes. Fully transparent tiles are
+not written and are listed as empty in the index.
+
+Usage:
+    python parallax_tiles.py
+    python parallax_tiles.py --input ../assets/background/layer-1.png --tile-size 256 --min-size 128
+    python parallax_tiles.py --format webp --force
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from atomic_io import atomic_write, save_image, sync_batch
+
+DEFAULT_INPUTS = [
+    "../assets/background/layer-1.png",
+    "../assets/background/layer-2.png",
+    "../assets/background/layer-3.png",
+    "../assets/background/layer-4.png",
+    "../assets/freetileset/png/BG/BG.png",
+]
+
+INDEX_VERSION = 1
+
+def source_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+def build_mip_chain(img: Image.Image, min_size: int):
+    """Halve the image until its longest side would drop below min_size"""
+    has_alpha = img.mode in ("RGBA", "LA") or "transparency" in img.info
+    current = img.convert("RGBa" if has_alpha else "RGB")
+    chain = [current]
+    while max(current.size) // 2 >= min_size and min(current.size) >= 2:
+        current = current.reduce(2)
+        chain.append(current)
+    if has_alpha:
+        chain = [level.convert("RGBA") for level in chain]
+    return chain, has_alpha
+
+def tile_is_empty(tile: Image.Image) -> bool:
+    if tile.mode != "RGBA":
+        return False
+    return tile.getchannel("A").getbbox() is None
+
+def tile_background(source: Path, output_dir: Path, root: Path, tile_size=256, min_size=128,
+                    fmt="png", force=False):
+    """Tile one background; returns its index entry (reused when unchanged)"""
+    name = source.stem
+    target = output_dir / name
+    index_path = target / "index.json"
+    digest = source_hash(source)
+
+    if not force and index_path.exists():
+        try:
+            previous = json.loads(index_path.read_text(encoding="utf-8"))
+            if previous.get("sourceHash") == digest and previous.get("tileSize") == tile_size \
+                    and previous.get("minSize") == min_size and previous.get("format") == fmt \
+                    and previous.get("version") == INDEX_VERSION:
+                return previous, False
+        except (OSError, json.JSONDecodeError):
+            pass
+
+    with Image.open(source) as img:
+        img.load()
+        width, height = img.size
+        chain, has_alpha = build_mip_chain(img, min_size)
+
+    entry = {
+        "version": INDEX_VERSION,
+        "source": Path(os.path.relpath(source.resolve(), root.resolve())).as_posix(),
+        "sourceHash": digest,
+        "width": width,
+        "height": height,
+        "tileSize": tile_size,
+        "minSize": min_size,
+        "format": fmt,
+        "alpha": has_alpha,
+        "levels": [],
+    }
+
+    written = set()
+    for level_num, level_img in enumerate(chain):
+        level_dir = target / str(level_num)
+        level_dir.mkdir(parents=True, exist_ok=True)
+        lw, lh = level_img.size
+        cols = (lw + tile_size - 1) // tile_size
+        rows = (lh + tile_size - 1) // tile_size
+        tiles, empty = [], 0
+
+        for row in range(rows):
+            for col in range(cols):
+                box = (col * tile_size, row * tile_size,
+                       min(lw, (col + 1) * tile_size), min(lh, (row + 1) * tile_size))
+                tile = level_img.crop(box)
+                if tile_is_empty(tile):
+                    empty += 1
+                    continue
+                tile_path = level_dir / f"{col}_{row}.{fmt}"
+                if fmt == "webp":
+                    save_image(tile, tile_path, "WEBP", lossless=True, method=4)
+                else:
+                    save_image(tile, tile_path, "PNG", optimize=True)
+                written.add(tile_path)
+                tiles.append([col, row, Path(os.path.relpath(tile_path.resolve(), root.resolve())).as_posix()])
+
+        entry["levels"].append({
+            "level": level_num,
+            "scale": 1 / (2 ** level_num),
+            "width": lw,
+            "height": lh,
+            "cols": cols,
+            "rows": rows,
+            "empty": empty,
+            "tiles": tiles,
+        })
+
+    atomic_write(index_path, json.dumps(entry, indent=2))
+    prune_tiles(target, written)
+    return entry, True
+
+def prune_tiles(target: Path, keep: set):
+    """Delete tiles (and level folders) a previous run wrote that the new index no longer lists"""
+    for level_dir in target.iterdir():
+        if not level_dir.is_dir() or not level_dir.name.isdigit():
+            continue
+        for tile_path in level_dir.iterdir():
+            if tile_path.suffix in (".png", ".webp") and tile_path not in keep:
+                tile_path.unlink()
+        if not any(level_dir.iterdir()):
+            level_dir.rmdir()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Slice parallax backgrounds into mip-mapped tiles with an index",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Tile all default backgrounds into ../assets/background/tiles
+  python parallax_tiles.py
+
+  # One image, smaller tiles, lossless WebP
+  python parallax_tiles.py --input ../assets/background/layer-1.png --tile-size 128 --format webp
+        """
+    )
+
+    parser.add_argument("--input", "-i", type=str, nargs="+", default=DEFAULT_INPUTS, help="Background images")
+    parser.add_argument("--output", "-o", type=str, default="../assets/background/tiles", help="Output directory")
+    parser.add_argument("--root", type=str, default="..", help="Project root for paths in the index")
+    parser.add_argument("--tile-size", type=int, default=256, help="Tile edge in pixels (default: 256)")
+    parser.add_argument("--min-size", type=int, default=128, help="Stop the mip chain below this size")
+    parser.add_argument("--format", choices=["png", "webp"], default="png", help="Tile format")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(), help="Images processed in parallel")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the source is unchanged")
+
+    args = parser.parse_args()
+
+    sources = [Path(p) for p in args.input]
+    missing = [p for p in sources if not p.exists()]
+    if missing:
+        for path in missing:
+            print(f"❌ Input does not exist: {path}")
+        sys.exit(1)
+
+    output_dir = Path(args.output)
+    root = Path(args.root)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"\n{'='*70}")
+    print(f"🧩 Parallax Tile Generator")
+    print(f"{'='*70}")
+    print(f"Images:    {len(sources)}")
+    print(f"Output:    {output_dir}")
+    print(f"Tile size: {args.tile_size}px, min level size {args.min_size}px, {args.format}")
+    print(f"{'='*70}\n")
+
+    def run(source):
+        return source, tile_background(source, output_dir, root, args.tile_size,
+                                       args.min_size, args.format, args.force)
+
+    entries = {}
+    with sync_batch(), ThreadPoolExecutor(max_workers=max(1, args.jobs or 1)) as pool:
+        for source, (entry, rebuilt) in pool.map(run, sources):
+            entries[source.stem] = entry
+            tile_count = sum(len(level["tiles"]) for level in entry["levels"])
+            empty = sum(level["empty"] for level in entry["levels"])
+            status = "✅" if rebuilt else "⏭️ "
+            print(f"  {status} {source.name:<16} {entry['width']}x{entry['height']}  "
+                  f"{len(entry['levels'])} levels  {tile_count} tiles ({empty} empty skipped)")
+
+    index = {"version": INDEX_VERSION, "tileSize": args.tile_size, "backgrounds": entries}
+    atomic_write(output_dir / "index.json", json.dumps(index, indent=2))
+
+    print(f"\n✅ Index written to {output_dir / 'index.json'}\n")
+
+if __name__ == "__main__":
+    main()
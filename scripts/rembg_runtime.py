@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Tuned ONNX Runtime Background Removal for CPU Nodes
+CPU 節點的 ONNX Runtime 去背調校
+
+rembg.remove() runs one image per inference call with ONNX Runtime's
+default threading, so several processes on one machine oversubscribe the
+cores. This module runs the same u2net model that rembg downloads, with:
+
+- explicit intra-op / inter-op thread counts (spinning disabled by default)
+- a batched path: several preprocessed 320x320 inputs stacked into one
+  (B, 3, 320, 320) tensor, bound with IO binding to avoid extra copies
+- an affinity-aware worker layout: W processes × T threads, each process
+  pinned to its own disjoint set of CPUs (Linux)
+
+Output matches rembg.remove() without alpha matting: the predicted mask
+becomes the alpha channel of the original image.
+
+Installation:
+    pip install rembg onnxruntime pillow numpy
+
+Usage:
+    python rembg_runtime.py run --input temp_generated --output out --layout 2x4 --batch-size 4
+    python rembg_runtime.py bench --layouts 1x8 2x4 4x2 8x1 --batch-sizes 1 4 --images 32
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from atomic_io import save_image, sync_batch
+
+INPUT_SIZE = 320
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+def model_path(model="u2net") -> Path:
+    """Location rembg downloads its models to (U2NET_HOME, default ~/.u2net)"""
+    home = Path(os.path.expanduser(os.getenv("U2NET_HOME", os.path.join("~", ".u2net"))))
+    path = home / f"{model}.onnx"
+    if not path.exists():
+        # Let rembg fetch (and checksum) the model the way it normally does
+        from rembg import new_session
+        new_session(model)
+    return path
+
+def parse_layout(text: str) -> Tuple[int, int]:
+    """'2x4' → (2 workers, 4 threads each)"""
+    workers, _, threads = text.lower().partition("x")
+    return max(1, int(workers)), max(1, int(threads or 1))
+
+def cpu_layout(workers: int, threads: int) -> List[Optional[List[int]]]:
+    """Split the CPUs this process may use into one disjoint set per worker
+
+    Returns [None] * workers where affinity is unsupported (non-Linux) or
+    there are fewer CPUs than workers.
+    """
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * workers
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) < workers:
+        return [None] * workers
+    per_worker = max(1, min(threads, len(cpus) // workers))
+    return [cpus[i * per_worker:(i + 1) * per_worker] for i in range(workers)]
+
+class MattingSession:
+    """u2net-family ONNX session with explicit threading and batched inference"""
+
+    def __init__(self, model="u2net", intra_threads=None, inter_threads=1, batch_size=4,
+                 io_binding=True, spinning=False):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.execution_mode = ort.ExecutionMode.ORT_PARALLEL if inter_threads > 1 else ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.intra_op_num_threads = intra_threads or 0
+        opts.inter_op_num_threads = inter_threads
+        # Busy-waiting threads steal cores from the other workers on the node
+        opts.add_session_config_entry("session.intra_op.allow_spinning", "1" if spinning else "0")
+        opts.add_session_config_entry("session.inter_op.allow_spinning", "1" if spinning else "0")
+
+        self.session = ort.InferenceSession(str(model_path(model)), sess_options=opts,
+                                            providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_name = self.session.get_outputs()[0].name
+        batch_dim = self.session.get_inputs()[0].shape[0]
+        # Models exported with a fixed batch of 1 cannot be batched
+        self.batch_size = batch_size if not isinstance(batch_dim, int) else 1
+        if self.batch_size < batch_size:
+            print(f"  ⚠️  {model} has a fixed batch dimension; running batch 1 instead of {batch_size}")
+        self.io_binding = io_binding
+
+    @staticmethod
+    def preprocess(img: Image.Image) -> np.ndarray:
+        """Same normalization as rembg's u2net session: (3, 320, 320) float32"""
+        arr = np.asarray(img.convert("RGB").resize((INPUT_SIZE, INPUT_SIZE), Image.Resampling.LANCZOS),
+                         dtype=np.float32)
+        arr /= max(float(arr.max()), 1e-6)
+        arr = (arr - MEAN) / STD
+        return arr.transpose(2, 0, 1)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """(B, 3, 320, 320) → (B, 320, 320) masks normalized to 0..1 per image"""
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        if self.io_binding:
+            binding = self.session.io_binding()
+            binding.bind_cpu_input(self.input_name, batch)
+            binding.bind_output(self.output_name, "cpu")
+            self.session.run_with_iobinding(binding)
+            pred = binding.copy_outputs_to_cpu()[0]
+        else:
+            pred = self.session.run([self.output_name], {self.input_name: batch})[0]
+        pred = pred[:, 0, :, :]
+        lo = pred.min(axis=(1, 2), keepdims=True)
+        hi = pred.max(axis=(1, 2), keepdims=True)
+        return (pred - lo) / np.maximum(hi - lo, 1e-6)
+
+    def remove(self, images: Sequence[Image.Image]) -> List[Image.Image]:
+        """Cut out every image; inference runs batch_size images at a time"""
+        results = []
+        for start in range(0, len(images), self.batch_size):
+            chunk = images[start:start + self.batch_size]
+            masks = self.predict(np.stack([self.preprocess(img) for img in chunk]))
+            for img, mask in zip(chunk, masks):
+                alpha = Image.fromarray((mask * 255).astype(np.uint8)).resize(img.size, Image.Resampling.LANCZOS)
+                rgba = img.convert("RGBA")
+                results.append(Image.composite(rgba, Image.new("RGBA", img.size, (0, 0, 0, 0)), alpha))
+        return results
+
+    def remove_bytes(self, data: bytes) -> bytes:
+        """Drop-in for rembg.remove(bytes) → PNG bytes"""
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            out = self.remove([img])[0]
+        buffer = io.BytesIO()
+        out.save(buffer, "PNG")
+        return buffer.getvalue()
+
+# ----------------------------------------------------------------------
+# Worker pool
+# ----------------------------------------------------------------------
+
+_worker_session: Optional[MattingSession] = None
+
+def _init_worker(layout_queue, model, batch_size):
+    global _worker_session
+    cpus, threads = layout_queue.get()
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    _worker_session = MattingSession(model, intra_threads=threads, batch_size=batch_size)
+
+def _work(task):
+    """Process one batch of (input, output) paths inside a worker"""
+    pairs = task
+    images = []
+    for src, _ in pairs:
+        with Image.open(src) as img:
+            img.load()
+            images.append(img)
+    done = 0
+    with sync_batch():
+        for (_, dst), out in zip(pairs, _worker_session.remove(images)):
+            save_image(out, dst, "PNG", optimize=True)
+            done += 1
+    return done
+
+class MattingPool:
+    """W pinned worker processes, each with its own T-thread session"""
+
+    def __init__(self, workers=1, threads=None, batch_size=4, model="u2net"):
+        threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        self.workers = workers
+        self.threads = threads
+        self.batch_size = batch_size
+        ctx = multiprocessing.get_context("spawn")
+        layout_queue = ctx.Queue()
+        self.layout = cpu_layout(workers, threads)
+        # One intra-op thread per pinned CPU; more would oversubscribe the worker's cores
+        self.worker_threads = [len(cpus) if cpus else threads for cpus in self.layout]
+        for cpus, worker_threads in zip(self.layout, self.worker_threads):
+            layout_queue.put((cpus, worker_threads))
+        self.pool = ctx.Pool(workers, initializer=_init_worker,
+                             initargs=(layout_queue, model, batch_size))
+
+    def process(self, pairs: List[Tuple[Path, Path]]) -> int:
+        tasks = [pairs[i:i + self.batch_size] for i in range(0, len(pairs), self.batch_size)]
+        return sum(self.pool.imap_unordered(_work, tasks))
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ----------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------
+
+def synthetic_inputs(directory: Path, count: int, size=768) -> List[Path]:
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        arr = np.full((size, size, 3), rng.integers(180, 255, 3), dtype=np.uint8)
+        y0, x0 = rng.integers(size // 8, size // 3, 2)
+        arr[y0:size - y0, x0:size - x0] = rng.integers(0, 120, 3)
+        path = directory / f"bench_{i:03d}.png"
+        Image.fromarray(arr).save(path)
+        paths.append(path)
+    return paths
+
+def benchmark(inputs: List[Path], layouts: List[Tuple[int, int]], batch_sizes: List[int], model="u2net"):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = Path(tmp)
+        pairs = [(p, out_dir / p.name) for p in inputs]
+        for workers, threads in layouts:
+            for batch_size in batch_sizes:
+                with MattingPool(workers, threads, batch_size, model) as pool:
+                    # Warm-up: session creation and the first run are not counted
+                    pool.process(pairs[:workers * batch_size])
+                    start = time.perf_counter()
+                    done = pool.process(pairs)
+                    elapsed = time.perf_counter() - start
+                    # Threads actually given to each session (capped by its pinned CPUs)
+                    used_threads = min(pool.worker_threads)
+                results.append({
+                    "workers": workers, "threads": used_threads, "batch": batch_size,
+                    "images": done, "seconds": round(elapsed, 3),
+                    "images_per_sec": round(done / elapsed, 2) if elapsed else 0.0,
+                })
+                r = results[-1]
+                print(f"  {workers}x{used_threads:<4} batch {batch_size:<3} {r['images_per_sec']:>7.2f} img/s  "
+                      f"({r['images']} in {r['seconds']:.2f}s)")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Background removal with tuned ONNX Runtime threading, batching and CPU pinning",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # 2 pinned workers x 4 threads, 4 images per inference
+  python rembg_runtime.py run --input temp_generated --output out --layout 2x4 --batch-size 4
+
+  # Compare layouts on 32 synthetic 768px frames
+  python rembg_runtime.py bench --layouts 1x8 2x4 4x2 8x1 --batch-sizes 1 4 --images 32
+        """
+    )
+    parser.add_argument("command", choices=["run", "bench"], help="Process a folder or benchmark layouts")
+    parser.add_argument("--input", "-i", type=str, help="Folder of PNGs (bench: optional, default synthetic)")
+    parser.add_argument("--output", "-o", type=str, help="Output folder (run)")
+    parser.add_argument("--model", type=str, default="u2net", help="rembg model name (default: u2net)")
+    parser.add_argument("--layout", type=str, default=f"1x{os.cpu_count() or 1}", help="WORKERSxTHREADS for run")
+    parser.add_argument("--batch-size", type=int, default=4, help="Images per inference call for run")
+    parser.add_argument("--layouts", nargs="+", default=None, help="Layouts to benchmark (default: 1xN, 2xN/2, ...)")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 4], help="Batch sizes to benchmark")
+    parser.add_argument("--images", type=int, default=32, help="Synthetic images for bench")
+
+    args = parser.parse_args()
+
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        print("❌ Error: onnxruntime is not installed")
+        print("\nInstall with:")
+        print("  pip install rembg onnxruntime")
+        sys.exit(1)
+
+    if args.command == "run":
+        if not args.input or not args.output:
+            print("❌ run needs --input and --output")
+            sys.exit(1)
+        input_dir, output_dir = Path(args.input), Path(args.output)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        pairs = [(p, output_dir / p.name) for p in sorted(input_dir.glob("*.png"))]
+        workers, threads = parse_layout(args.layout)
+        start = time.perf_counter()
+        with MattingPool(workers, threads, args.batch_size, args.model) as pool:
+            done = pool.process(pairs)
+        elapsed = time.perf_counter() - start
+        print(f"✅ {done}/{len(pairs)} images in {elapsed:.2f}s ({done / max(elapsed, 1e-9):.2f} img/s, "
+              f"{workers}x{threads}, batch {args.batch_size})")
+        return
+
+    cpus = os.cpu_count() or 1
+    layouts = [parse_layout(l) for l in args.layouts] if args.layouts else \
+        sorted({(w, max(1, cpus // w)) for w in (1, 2, 4, 8) if w <= cpus})
+
+    print(f"\n{'='*70}")
+    print(f"⚙️  ONNX Runtime rembg Benchmark ({cpus} CPUs, model {args.model})")
+    print(f"{'='*70}\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.input:
+            inputs = sorted(Path(args.input).glob("*.png"))
+        else:
+            inputs = synthetic_inputs(Path(tmp), args.images)
+        results = benchmark(inputs, layouts, args.batch_sizes, args.model)
+
+    best = max(results, key=lambda r: r["images_per_sec"])
+    print(f"\n🏆 Best: {best['workers']}x{best['threads']} batch {best['batch']} "
+          f"→ {best['images_per_sec']:.2f} img/s\n")
+
+if __name__ == "__main__":
+    main()
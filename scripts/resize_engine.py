@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Batch Resize Engine for Sprite Frames
+精靈影格批次縮放引擎
+
+Resizes a whole action's frames as one (N, H, W, 4) NumPy batch:
+
+1. Premultiply alpha, so transparent pixels do not bleed dark halos
+2. Halve with 2x2 area averaging until the image is less than twice the
+   target (the pyramid is shared by every requested scale)
+3. Finish with a separable Lanczos-3 filter expressed as two matrix
+   products, which run in BLAS with the GIL released
+4. Un-premultiply and round back to uint8
+
+Frames are split into chunks processed on a thread pool, and several
+target scales (1x/2x/4x for HiDPI) come out of one pass.
+
+Usage:
+    python resize_engine.py --input ../assets/sprites/enemies/slime/idle --output out --size 64 64 --scales 1 2 4
+    python resize_engine.py --input frames/idle --output out/idle --size 64 64 --frame-store temp_generated/frame_store
+
+    # From Python
+    engine = ResizeEngine()
+    outputs = engine.resize(frames, (64, 64), scales=(1, 2))   # {1: (N,64,64,4), 2: (N,128,128,4)}
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from asset_tree import frame_names
+from atomic_io import save_image, sync_batch
+from frame_store import FrameStore
+
+LANCZOS_A = 3
+
+# ----------------------------------------------------------------------
+# Pixel operations (all on (N, H, W, 4) arrays)
+# ----------------------------------------------------------------------
+
+def premultiply(stack: np.ndarray) -> np.ndarray:
+    out = stack.astype(np.float32)
+    alpha = out[..., 3:4] * (1.0 / 255.0)
+    out[..., :3] *= alpha
+    return out
+
+def unpremultiply(stack: np.ndarray) -> np.ndarray:
+    alpha = stack[..., 3:4]
+    scale = np.where(alpha > 1e-3, 255.0 / np.maximum(alpha, 1e-3), 0.0).astype(np.float32)
+    stack[..., :3] *= scale
+    np.clip(stack, 0, 255, out=stack)
+    return np.rint(stack).astype(np.uint8)
+
+def halve(stack: np.ndarray) -> np.ndarray:
+    """2x2 area average; odd edges are replicated first"""
+    h, w = stack.shape[1:3]
+    if h % 2 or w % 2:
+        stack = np.pad(stack, ((0, 0), (0, h % 2), (0, w % 2), (0, 0)), mode="edge")
+    out = stack[:, 0::2, 0::2] + stack[:, 1::2, 0::2]
+    out += stack[:, 0::2, 1::2]
+    out += stack[:, 1::2, 1::2]
+    out *= 0.25
+    return out
+
+@lru_cache(maxsize=128)
+def lanczos_matrix(in_size: int, out_size: int, a: int = LANCZOS_A) -> np.ndarray:
+    """(out_size, in_size) resampling weights; the kernel widens when downscaling"""
+    scale = in_size / out_size
+    support = a * max(scale, 1.0)
+    centres = (np.arange(out_size, dtype=np.float64) + 0.5) * scale - 0.5
+    taps = np.arange(in_size, dtype=np.float64)
+    x = (taps[None, :] - centres[:, None]) / max(scale, 1.0)
+    weights = np.sinc(x) * np.sinc(x / a)
+    weights[np.abs(taps[None, :] - centres[:, None]) >= support] = 0.0
+    weights /= weights.sum(axis=1, keepdims=True)
+    return weights.astype(np.float32)
+
+def lanczos(stack: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """Separable Lanczos resize of a float (N, H, W, C) stack to size=(width, height)"""
+    n, h, w, c = stack.shape
+    out_w, out_h = size
+    if (w, h) == (out_w, out_h):
+        return stack
+    wy = lanczos_matrix(h, out_h)
+    wx = lanczos_matrix(w, out_w)
+    # Rows: (out_h, h) @ (N, h, w*c) → (N, out_h, w*c)
+    rows = np.matmul(wy, stack.reshape(n, h, w * c)).reshape(n, out_h, w, c)
+    # Columns: (out_w, w) @ (N*out_h, w, c) → (N*out_h, out_w, c)
+    cols = np.matmul(wx, rows.reshape(n * out_h, w, c))
+    return cols.reshape(n, out_h, out_w, c)
+
+def resize_premultiplied(pyramid: List[np.ndarray], size: Tuple[int, int]) -> np.ndarray:
+    """Pick the smallest pyramid level still >= 2x the target, then Lanczos to size"""
+    out_w, out_h = size
+    level = pyramid[0]
+    for candidate in pyramid[1:]:
+        if candidate.shape[2] < 2 * out_w or candidate.shape[1] < 2 * out_h:
+            break
+        level = candidate
+    return lanczos(level, size)
+
+def build_pyramid(stack: np.ndarray, smallest: Tuple[int, int]) -> List[np.ndarray]:
+    pyramid = [stack]
+    while pyramid[-1].shape[2] >= 4 * smallest[0] and pyramid[-1].shape[1] >= 4 * smallest[1]:
+        pyramid.append(halve(pyramid[-1]))
+    return pyramid
+
+# ----------------------------------------------------------------------
+# Engine
+# ----------------------------------------------------------------------
+
+class ResizeEngine:
+    """Thread-pooled batch resizer producing several scales per pass"""
+
+    def __init__(self, workers=None, chunk=8):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.chunk = max(1, chunk)
+
+    def _resize_chunk(self, stack: np.ndarray, targets: Dict[int, Tuple[int, int]]):
+        pyramid = build_pyramid(premultiply(stack), min(targets.values()))
+        return {scale: unpremultiply(resize_premultiplied(pyramid, size)) for scale, size in targets.items()}
+
+    def resize(self, frames, size: Tuple[int, int], scales: Iterable[int] = (1,)) -> Dict[int, np.ndarray]:
+        """Resize uint8 RGBA frames (N, H, W, 4) to size * scale for every scale"""
+        stack = np.asarray(frames)
+        if stack.ndim == 3:
+            stack = stack[None]
+        if stack.shape[-1] != 4:
+            raise ValueError(f"Expected RGBA frames, got shape {stack.shape}")
+        targets = {s: (size[0] * s, size[1] * s) for s in sorted(set(scales))}
+
+        chunks = [stack[i:i + self.chunk] for i in range(0, len(stack), self.chunk)]
+        if len(chunks) == 1 or self.workers == 1:
+            results = [self._resize_chunk(c, targets) for c in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(chunks))) as pool:
+                results = list(pool.map(lambda c: self._resize_chunk(c, targets), chunks))
+        return {s: np.concatenate([r[s] for r in results]) for s in targets}
+
+    def resize_images(self, images: List[Image.Image], size, scales=(1,)) -> Dict[int, List[Image.Image]]:
+        """PIL convenience wrapper; images with different sizes are batched separately"""
+        groups: Dict[Tuple[int, int], List[int]] = {}
+        arrays = [np.asarray(img.convert("RGBA")) for img in images]
+        for i, arr in enumerate(arrays):
+            groups.setdefault(arr.shape[:2], []).append(i)
+
+        out = {s: [None] * len(images) for s in scales}
+        for indices in groups.values():
+            resized = self.resize(np.stack([arrays[i] for i in indices]), size, scales)
+            for s, batch in resized.items():
+                for i, frame in zip(indices, batch):
+                    out[s][i] = Image.fromarray(frame)
+        return out
+
+def scaled_name(path: Path, scale: int) -> Path:
+    """idle(1).png → idle(1)@2x.png; 1x keeps the original name"""
+    return path if scale == 1 else path.with_name(f"{path.stem}@{scale}x{path.suffix}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Resize sprite frames with premultiplied alpha, area reduction and Lanczos",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # 64x64 frames plus @2x and @4x versions
+  python resize_engine.py --input frames/idle --output out/idle --size 64 64 --scales 1 2 4
+
+  # Read and write frames through the memory-mapped frame store
+  python resize_engine.py --input frames/idle --output out/idle --size 64 64 --frame-store temp_generated/frame_store
+
+  # Compare against PIL's single-image LANCZOS
+  python resize_engine.py --input frames/idle --output out/idle --size 64 64 --compare-pil
+        """
+    )
+
+    parser.add_argument("--input", "-i", type=str, required=True, help="Folder of PNG frames")
+    parser.add_argument("--output", "-o", type=str, required=True, help="Output folder")
+    parser.add_argument("--size", nargs=2, type=int, required=True, metavar=("WIDTH", "HEIGHT"), help="1x size")
+    parser.add_argument("--scales", nargs="+", type=int, default=[1], help="Scale factors to write (default: 1)")
+    parser.add_argument("--workers", "-j", type=int, default=os.cpu_count(), help="Threads")
+    parser.add_argument("--compare-pil", action="store_true", help="Also time PIL LANCZOS on straight alpha")
+    parser.add_argument("--frame-store", type=str,
+                        help="Read input and write 1x output frames through a memory-mapped frame store")
+
+    args = parser.parse_args()
+
+    input_dir = Path(args.input)
+    paths = [input_dir / name for name in frame_names(os.listdir(input_dir)) if name.lower().endswith(".png")] \
+        if input_dir.is_dir() else []
+    if not paths:
+        print(f"❌ No PNG files found in {input_dir}")
+        sys.exit(1)
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    store = FrameStore(args.frame_store) if args.frame_store else None
+    if store is not None:
+        frames = store.load(input_dir, [p.name for p in paths])
+        images = [frames.image(i) for i in range(len(frames))]
+    else:
+        images = [Image.open(p) for p in paths]
+        for img in images:
+            img.load()
+
+    engine = ResizeEngine(workers=args.workers)
+    start = time.perf_counter()
+    outputs = engine.resize_images(images, tuple(args.size), args.scales)
+    elapsed = time.perf_counter() - start
+
+    with sync_batch():
+        for scale, frames in outputs.items():
+            for path, frame in zip(paths, frames):
+                save_image(frame, scaled_name(output_dir / path.name, scale), "PNG", optimize=True)
+    if store is not None and 1 in outputs:
+        store.write_images(output_dir, [p.name for p in paths], outputs[1])
+
+    print(f"✅ Resized {len(paths)} frames to {args.size[0]}x{args.size[1]} "
+          f"x{{{', '.join(map(str, sorted(outputs)))}}} in {elapsed * 1000:.1f} ms")
+
+    if args.compare_pil:
+        start = time.perf_counter()
+        for img in images:
+            for scale in args.scales:
+                img.resize((args.size[0] * scale, args.size[1] * scale), Image.Resampling.LANCZOS)
+        print(f"   PIL LANCZOS (straight alpha, serial): {(time.perf_counter() - start) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -8,34 +8,77 @@ Usage:
     python sd_batch_generator.py --effect explosion --frames 12
     python sd_batch_generator.py --projectile fireball --frames 6
 
+    # asyncio client: per-request deadlines, stall retry, Ctrl-C interrupts the WebUI
+    python sd_batch_generator.py --type character --name slime --action idle --async --stall-timeout 15
+
+    # Score every frame on the CPU and regenerate rejected ones with new seeds
+    python sd_batch_generator.py --type character --name slime --action idle --quality --regen-budget 5
+
+    # Put finished runs into the memory-mapped frame store for the next stage
+    python sd_batch_generator.py --type character --name slime --action idle --frame-store temp_generated/frame_store
+
 Requirements:
     pip install requests pillow
 """
 
 import argparse
-import requests
 import json
 import base64
 from pathlib import Path
+import random
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from adaptive_limiter import BackendPool
+from asset_metrics import metrics, add_metrics_arguments
+from asset_tree import frame_names
+from atomic_io import atomic_copy, atomic_write
+from job_store import JobStore, DONE, FAILED, PENDING
+
+STEPS = 28
+
 class GameAssetGenerator:
-    def __init__(self, webui_url="http://127.0.0.1:7860", project_root="../assets"):
-        self.api_url = f"{webui_url}/sdapi/v1"
+    def __init__(self, webui_url="http://127.0.0.1:7860", project_root="../assets",
+                 jobs_db=None, resume=False, max_attempts=3, max_concurrency=4, poll_progress=False,
+                 use_async=False, deadline=120.0, stall_timeout=20.0, scorer=None, regen_budget=5,
+                 frame_store=None):
+        # webui_url may list several WebUI instances; frames are spread across them
+        urls = [webui_url] if isinstance(webui_url, str) else list(webui_url)
+        self.backends = BackendPool(urls, max_concurrency=max_concurrency)
+        if poll_progress:
+            self.backends.start_progress_polling()
+        self.api_url = self.backends.backends[0].api_url
         self.project_root = Path(project_root)
         self.temp_output = Path("temp_generated")
         self.temp_output.mkdir(exist_ok=True)
-
-    def generate_character_animation(self, character_name, action, frame_count=10, seed=-1):
+        self.jobs = JobStore(jobs_db or self.temp_output / "jobs.db")
+        self.resume = resume
+        self.max_attempts = max(1, max_attempts)
+        # use_async routes frames through async_webui.AsyncWebUIClient
+        self.urls = urls
+        self.max_concurrency = max_concurrency
+        self.use_async = use_async
+        self.deadline = deadline
+        self.stall_timeout = stall_timeout
+        # scorer (frame_quality.FrameScorer) checks each frame before it is saved;
+        # up to regen_budget rejected frames per run are regenerated with new seeds
+        self.scorer = scorer
+        self.regen_budget = max(0, regen_budget)
+        # frame_store (frame_store.FrameStore) receives every completed run's frames
+        self.frame_store = frame_store
+        # One pooled session keeps connections to the WebUI alive between frames
+        self.session = self.backends.backends[0].session
+
+    def generate_character_animation(self, character_name, action, frame_count=10, seed=-1,
+                                     on_event=None, cancel=None):
         """生成角色動畫序列"""
 
-        output_dir = self.project_root / "sprites" / "enemies" / character_name / action
+        spec = self.character_spec(character_name, action, frame_count)
+        output_dir = spec["output_dir"]
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        prompt = self._build_character_prompt(character_name, action)
-        negative_prompt = self._build_negative_prompt()
-
         print(f"\n{'='*70}")
         print(f"🎮 Generating Character Animation")
         print(f"{'='*70}")
@@ -46,42 +89,7 @@ class GameAssetGenerator:
         print(f"Seed: {seed if seed != -1 else 'Random (will be locked after first frame)'}")
         print(f"{'='*70}\n")
 
-        generated_seed = seed
-        success_count = 0
-
-        for frame_num in range(1, frame_count + 1):
-            print(f"[Frame {frame_num}/{frame_count}] Generating...")
-
-            result = self._generate_image(
-                prompt=prompt,
-                negative_prompt=negative_prompt,
-                seed=generated_seed,
-                width=768,
-                height=768,
-                model="AnythingXL_v50"
-            )
-
-            if result:
-                img_data, info = result
-
-                # Lock seed after first frame
-                if frame_num == 1 and seed == -1:
-                    generated_seed = info["seed"]
-                    print(f"  🔒 Seed locked: {generated_seed}")
-
-                # Save image
-                filename = f"{action}({frame_num}).png"
-                filepath = output_dir / filename
-
-                with open(filepath, "wb") as f:
-                    f.write(img_data)
-
-                success_count += 1
-                print(f"  ✅ Saved: {filename}")
-            else:
-                print(f"  ❌ Failed to generate frame {frame_num}")
-
-            time.sleep(0.5)
+        generated_seed, success_count = self._run_frames(**spec, seed=seed, on_event=on_event, cancel=cancel)
 
         print(f"\n{'='*70}")
         print(f"✅ Animation Complete: {success_count}/{frame_count} frames generated")
@@ -91,15 +99,14 @@ class GameAssetGenerator:
 
         return generated_seed
 
-    def generate_effect_animation(self, effect_type, effect_name, frame_count=8, seed=-1):
+    def generate_effect_animation(self, effect_type, effect_name, frame_count=8, seed=-1,
+                                  on_event=None, cancel=None):
         """生成特效動畫序列"""
 
-        output_dir = self.project_root / "effects" / effect_type / effect_name
+        spec = self.effect_spec(effect_type, effect_name, frame_count)
+        output_dir = spec["output_dir"]
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        prompt = self._build_effect_prompt(effect_name)
-        negative_prompt = self._build_negative_prompt()
-
         print(f"\n{'='*70}")
         print(f"✨ Generating Effect Animation")
         print(f"{'='*70}")
@@ -109,51 +116,17 @@ class GameAssetGenerator:
         print(f"Output: {output_dir}")
         print(f"{'='*70}\n")
 
-        generated_seed = seed
-        success_count = 0
-
-        for frame_num in range(1, frame_count + 1):
-            print(f"[Frame {frame_num}/{frame_count}] Generating...")
-
-            result = self._generate_image(
-                prompt=prompt,
-                negative_prompt=negative_prompt,
-                seed=generated_seed if frame_num == 1 else -1,  # Each frame slightly different
-                width=512,
-                height=512,
-                model="AnythingXL_v50"
-            )
-
-            if result:
-                img_data, info = result
-
-                if frame_num == 1:
-                    generated_seed = info["seed"]
-
-                filename = f"{effect_name}({frame_num}).png"
-                filepath = output_dir / filename
-
-                with open(filepath, "wb") as f:
-                    f.write(img_data)
-
-                success_count += 1
-                print(f"  ✅ Saved: {filename}")
-            else:
-                print(f"  ❌ Failed to generate frame {frame_num}")
-
-            time.sleep(0.5)
+        generated_seed, success_count = self._run_frames(**spec, seed=seed, on_event=on_event, cancel=cancel)
 
         print(f"\n✅ Effect Complete: {success_count}/{frame_count} frames\n")
         return generated_seed
 
-    def generate_projectile(self, projectile_name, animated=False, frame_count=4, seed=-1):
+    def generate_projectile(self, projectile_name, animated=False, frame_count=4, seed=-1,
+                            on_event=None, cancel=None):
         """生成發射物"""
 
-        output_dir = self.project_root / "projectiles" / projectile_name
-        output_dir.mkdir(parents=True, exist_ok=True)
-
-        prompt = self._build_projectile_prompt(projectile_name)
-        negative_prompt = self._build_negative_prompt()
+        spec = self.projectile_spec(projectile_name, animated, frame_count)
+        spec["output_dir"].mkdir(parents=True, exist_ok=True)
 
         print(f"\n{'='*70}")
         print(f"🎯 Generating Projectile")
@@ -163,52 +136,379 @@ class GameAssetGenerator:
         print(f"Frames: {frame_count if animated else 1}")
         print(f"{'='*70}\n")
 
-        generated_seed = seed
-        frames_to_generate = frame_count if animated else 1
+        generated_seed, _ = self._run_frames(**spec, seed=seed, on_event=on_event, cancel=cancel)
 
-        for frame_num in range(1, frames_to_generate + 1):
-            print(f"[Frame {frame_num}/{frames_to_generate}] Generating...")
+        print(f"\n✅ Projectile Complete\n")
+        return generated_seed
 
-            result = self._generate_image(
-                prompt=prompt,
-                negative_prompt=negative_prompt,
-                seed=generated_seed,
-                width=512,
-                height=256,
-                model="AnythingXL_v50"
-            )
+    def character_spec(self, character_name, action, frame_count=10):
+        """Run key, output folder, frame names and txt2img payload of a character action"""
+        return {
+            "run_key": f"character/{character_name}/{action}",
+            "output_dir": self.project_root / "sprites" / "enemies" / character_name / action,
+            "filenames": [f"{action}({n}).png" for n in range(1, frame_count + 1)],
+            "payload": {
+                "prompt": self._build_character_prompt(character_name, action),
+                "negative_prompt": self._build_negative_prompt(),
+                "width": 768,
+                "height": 768,
+                "model": "AnythingXL_v50",
+            },
+            "lock_seed": True,
+        }
 
-            if result:
-                img_data, info = result
+    def effect_spec(self, effect_type, effect_name, frame_count=8):
+        """Run description of an effect; only its first frame uses the given seed"""
+        return {
+            "run_key": f"effect/{effect_type}/{effect_name}",
+            "output_dir": self.project_root / "effects" / effect_type / effect_name,
+            "filenames": [f"{effect_name}({n}).png" for n in range(1, frame_count + 1)],
+            "payload": {
+                "prompt": self._build_effect_prompt(effect_name),
+                "negative_prompt": self._build_negative_prompt(),
+                "width": 512,
+                "height": 512,
+                "model": "AnythingXL_v50",
+            },
+            # Each later frame is slightly different
+            "lock_seed": False,
+        }
 
-                if frame_num == 1 and seed == -1:
-                    generated_seed = info["seed"]
+    def projectile_spec(self, projectile_name, animated=False, frame_count=4):
+        """Run description of a projectile, one frame unless animated"""
+        if animated:
+            filenames = [f"{projectile_name}({n}).png" for n in range(1, frame_count + 1)]
+        else:
+            filenames = [f"{projectile_name}.png"]
+        return {
+            "run_key": f"projectile/{projectile_name}",
+            "output_dir": self.project_root / "projectiles" / projectile_name,
+            "filenames": filenames,
+            "payload": {
+                "prompt": self._build_projectile_prompt(projectile_name),
+                "negative_prompt": self._build_negative_prompt(),
+                "width": 512,
+                "height": 256,
+                "model": "AnythingXL_v50",
+            },
+            "lock_seed": True,
+        }
 
-                if animated:
-                    filename = f"{projectile_name}({frame_num}).png"
-                else:
-                    filename = f"{projectile_name}.png"
+    def _run_frames(self, run_key, output_dir, filenames, payload, seed, lock_seed=True,
+                    on_event=None, cancel=None):
+        """Generate one job per frame through the job store, retrying failures
+
+        lock_seed=True reuses one seed for every frame (locked from the first
+        success when seed is -1); lock_seed=False only seeds frame 1 and lets
+        later frames vary. Frames run concurrently up to each backend's
+        adaptive limit. on_event receives a dict per finished frame and
+        cancel (a threading.Event) stops the run between frames. With a
+        scorer, frames it rejects go back to the queue with a new seed.
+        Returns (run seed, completed frame count).
+        """
 
-                filepath = output_dir / filename
+        resuming = self.resume and self.jobs.get_run(run_key) is not None
+        run = self.jobs.start_run(run_key, seed, fresh=not self.resume)
+        for frame_num, filename in enumerate(filenames, 1):
+            self.jobs.add_job(run_key, frame_num, payload, output_dir / filename)
+        dropped = self.jobs.trim_jobs(run_key, len(filenames))
+        if dropped:
+            kept = {job["output_path"] for job in self.jobs.jobs(run_key)}
+            for path in dropped:
+                if path not in kept:
+                    Path(path).unlink(missing_ok=True)
+            print(f"  ✂️  Dropped {len(dropped)} job(s) beyond frame {len(filenames)} and their files")
+
+        if run["seed"] != -1:
+            self._reuse_preview(run_key, run["seed"])
+
+        if resuming:
+            # Each invocation gets --max-attempts tries per unfinished frame
+            self.jobs.reset_attempts(run_key)
+            requeued = self.jobs.requeue_missing_outputs(run_key)
+            counts = self.jobs.counts(run_key)
+            print(f"♻️  Resuming {run_key}: {counts['done']} done, "
+                  f"{len(filenames) - counts['done']} to go"
+                  + (f" ({requeued} missing file(s) requeued)" if requeued else ""))
+            if run["seed"] != seed and run["seed"] != -1:
+                print(f"  🔒 Using seed from previous run: {run['seed']}")
+
+        state = {
+            "run_key": run_key,
+            "seed": run["seed"],
+            "lock_seed": lock_seed,
+            "total": len(filenames),
+            "on_event": on_event,
+            "lock": threading.Lock(),
+            "regen_left": self.regen_budget,
+            "reference": self._run_reference(run_key) if self.scorer else None,
+        }
 
-                with open(filepath, "wb") as f:
-                    f.write(img_data)
+        def cancelled():
+            return cancel is not None and cancel.is_set()
+
+        if self.use_async:
+            import asyncio
+
+            try:
+                asyncio.run(self._run_frames_async(state, cancel))
+            except KeyboardInterrupt:
+                # In-flight jobs were interrupted on the WebUI; their frames stay pending
+                print(f"\n  ⏹️  Interrupted {run_key}")
+        else:
+            with ThreadPoolExecutor(max_workers=self.backends.max_concurrency) as pool:
+                first_round = True
+                while not cancelled():
+                    pending = self._next_round(run_key, first_round)
+                    first_round = False
+                    if not pending:
+                        break
+
+                    # The first success locks the seed, so go one frame at a time until then
+                    while lock_seed and state["seed"] == -1 and pending and not cancelled():
+                        job = pending.pop(0)
+                        job["queued_at"] = time.perf_counter()
+                        self._run_job(job, state, cancel)
+
+                    futures = []
+                    for job in pending:
+                        job["queued_at"] = time.perf_counter()
+                        futures.append(pool.submit(self._run_job, job, state, cancel))
+                    for future in futures:
+                        future.result()
+
+        if cancelled():
+            print(f"  ⏹️  Cancelled {run_key}")
+
+        counts = self.jobs.counts(run_key)
+        if counts["done"] < state["total"]:
+            print(f"\n⚠️  {state['total'] - counts['done']} frame(s) still missing; "
+                  f"rerun with --resume to retry only those")
+        elif self.frame_store is not None:
+            # Decode the run once here so background removal and analysis read the memory map
+            try:
+                self.frame_store.load(output_dir, frame_names(filenames))
+                print(f"🗄️  Frames stored in {self.frame_store.root}")
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Frame store not updated: {e}")
+
+        if self.scorer:
+            scores = self.jobs.scores(run_key)
+            rejected = sum(not s["accepted"] for s in scores)
+            kept = sum(s["accepted"] and bool(s["flags"]) for s in scores)
+            if rejected or kept:
+                print(f"🧪 Quality: {rejected} frame(s) regenerated"
+                      + (f", {kept} kept below threshold (budget used up)" if kept else ""))
+
+        return state["seed"], counts["done"]
+
+    def _reuse_preview(self, run_key, seed):
+        """Take frame 1 from a seed sweep preview made with the same seed and settings"""
+        job = self.jobs.jobs(run_key)[0]
+        if job["status"] == DONE:
+            return
+        preview = self.jobs.find_preview(run_key, seed, dict(job["payload"], steps=STEPS))
+        if preview is None:
+            return
+        atomic_copy(preview["path"], job["output_path"])
+        self.jobs.mark_done(job["id"], seed, job["output_path"])
+        print(f"♻️  Frame 1 taken from the seed sweep preview ({Path(preview['path']).name})")
 
-                print(f"  ✅ Saved: {filename}")
+    def _next_round(self, run_key, first_round):
+        """Jobs for the next round of a run
 
-            time.sleep(0.5)
+        Failed frames are retried until their attempt count in the job store
+        reaches max_attempts; frames the scorer sent back start a new count,
+        since the regeneration budget bounds them.
+        """
+        pending = self.jobs.pending_jobs(run_key)
+        if first_round:
+            return pending
+
+        failed = [job for job in pending if job["status"] == FAILED and job["attempts"] < self.max_attempts]
+        requeued = [job for job in pending if job["status"] == PENDING]
+        if failed:
+            print(f"\n🔁 Retrying {len(failed)} failed frame(s) "
+                  f"(attempt {min(job['attempts'] for job in failed) + 1}/{self.max_attempts})...")
+        if requeued:
+            print(f"\n🎲 Regenerating {len(requeued)} rejected frame(s) with new seeds...")
+        return sorted(failed + requeued, key=lambda job: job["frame"])
+
+    def _run_reference(self, run_key):
+        """Reference frame for the quality check: --reference, else the run's first finished frame"""
+        if self.scorer.reference is not None:
+            return self.scorer.reference
+        for job in self.jobs.jobs(run_key):
+            if job["status"] == DONE and Path(job["output_path"]).exists():
+                return self.scorer.prepare(job["output_path"])
+        return None
+
+    def _run_job(self, job, state, cancel=None):
+        """Generate and save one frame job; safe to call from worker threads"""
+
+        frame_num = job["frame"]
+        with state["lock"]:
+            frame_seed = self._frame_seed(job, state)
+
+        backend = self.backends.acquire(cancel)
+        if backend is None:
+            return
+        # From submission to the pool until this job holds a backend slot
+        metrics.observe("queue_wait", time.perf_counter() - job["queued_at"])
 
-        print(f"\n✅ Projectile Complete\n")
-        return generated_seed
+        print(f"[Frame {frame_num}/{state['total']}] Generating...")
+        self.jobs.mark_running(job["id"])
+
+        result = self._generate_image(
+            seed=frame_seed,
+            backend=backend,
+            **job["payload"]
+        )
+        self._finish_job(job, state, result)
 
-    def _generate_image(self, prompt, negative_prompt, seed, width, height, model="AnythingXL_v50"):
-        """Generate single image via SD WebUI API"""
+    async def _run_frames_async(self, state, cancel=None):
+        """Asyncio counterpart of the thread pool in _run_frames
 
-        payload = {
+        Every pending frame becomes a task on one event loop; the client
+        bounds in-flight requests per backend, retries stalls and deadline
+        misses, and interrupts the WebUI when cancelled.
+        """
+        import asyncio
+        from async_webui import AsyncWebUIClient
+
+        def on_progress(url, data):
+            if state["on_event"]:
+                state["on_event"]({"event": "progress", "run_key": state["run_key"], "backend": url,
+                                   "progress": data.get("progress"), "eta": data.get("eta_relative")})
+
+        async with AsyncWebUIClient(self.urls, max_inflight=self.max_concurrency, deadline=self.deadline,
+                                    stall_timeout=self.stall_timeout, on_progress=on_progress,
+                                    cancel=cancel) as client:
+            print(f"⚡ Async client ({client.transport.name}), deadline {self.deadline:.0f}s, "
+                  f"stall timeout {self.stall_timeout:.0f}s")
+            first_round = True
+            while not (cancel is not None and cancel.is_set()):
+                pending = self._next_round(state["run_key"], first_round)
+                first_round = False
+                if not pending:
+                    break
+
+                # The first success locks the seed, so go one frame at a time until then
+                while state["lock_seed"] and state["seed"] == -1 and pending and not client.aborted:
+                    job = pending.pop(0)
+                    job["queued_at"] = time.perf_counter()
+                    await self._run_job_async(client, job, state)
+
+                for job in pending:
+                    job["queued_at"] = time.perf_counter()
+                await asyncio.gather(*(self._run_job_async(client, job, state) for job in pending))
+
+    async def _run_job_async(self, client, job, state):
+        """Generate and save one frame job through the async client"""
+        from async_webui import WebUICancelled, WebUIError
+
+        frame_num = job["frame"]
+        frame_seed = self._frame_seed(job, state)
+        if client.aborted:
+            return
+
+        print(f"[Frame {frame_num}/{state['total']}] Generating...")
+        self.jobs.mark_running(job["id"])
+
+        try:
+            result = await client.txt2img(self._txt2img_payload(seed=frame_seed, **job["payload"]),
+                                          queued_at=job["queued_at"])
+        except WebUICancelled:
+            # Left as running; pending_jobs picks it up on --resume
+            return
+        except WebUIError as e:
+            print(f"  ❌ {e}")
+            result = None
+        self._finish_job(job, state, result)
+
+    @staticmethod
+    def _frame_seed(job, state):
+        """Seed for a job: its own after a rejection or a lost output, else the run's"""
+        if job["seed"] is not None:
+            return job["seed"]
+        return state["seed"] if state["lock_seed"] or job["frame"] == 1 else -1
+
+    def _check_quality(self, job, state, img_data, info, event):
+        """Score a frame; returns False when it was sent back for regeneration"""
+
+        with metrics.timer("score"):
+            quality = self.scorer.score(img_data, reference=state["reference"])
+        event.update(score=quality["score"], flags=quality["flags"])
+
+        with state["lock"]:
+            regenerate = not quality["ok"] and state["regen_left"] > 0
+            if regenerate:
+                state["regen_left"] -= 1
+            elif state["reference"] is None and quality["ok"]:
+                state["reference"] = self.scorer.prepare(img_data)
+
+        self.jobs.record_score(job["id"], info["seed"], quality["score"], quality["flags"],
+                               accepted=not regenerate)
+        if regenerate:
+            new_seed = random.randrange(1, 2**31)
+            self.jobs.requeue(job["id"], new_seed, "rejected: " + ", ".join(quality["flags"]))
+            metrics.inc("frames_rejected")
+            print(f"  🎲 Rejected frame {job['frame']} ({', '.join(quality['flags'])}, "
+                  f"score {quality['score']:.2f}); retrying with seed {new_seed}")
+            event.update(status="rejected", seed=info["seed"], next_seed=new_seed)
+            return False
+
+        if not quality["ok"]:
+            print(f"  ⚠️  Keeping frame {job['frame']} despite {', '.join(quality['flags'])} "
+                  f"(regeneration budget used up)")
+        return True
+
+    def _finish_job(self, job, state, result):
+        """Score, lock the seed, write the frame and record the outcome of one job"""
+
+        frame_num = job["frame"]
+        output_path = Path(job["output_path"])
+        event = {"event": "frame", "frame": frame_num, "run_key": state["run_key"]}
+        if result and self.scorer and not self._check_quality(job, state, *result, event):
+            if state["on_event"]:
+                state["on_event"](event)
+            return
+
+        if result:
+            img_data, info = result
+
+            with state["lock"]:
+                # Lock seed after first successful frame
+                if state["lock_seed"] and state["seed"] == -1:
+                    state["seed"] = info["seed"]
+                    self.jobs.set_run_seed(state["run_key"], state["seed"])
+                    print(f"  🔒 Seed locked: {state['seed']}")
+                elif not state["lock_seed"] and frame_num == 1:
+                    state["seed"] = info["seed"]
+                    self.jobs.set_run_seed(state["run_key"], state["seed"])
+
+            with metrics.timer("write"):
+                atomic_write(output_path, img_data)
+
+            self.jobs.mark_done(job["id"], info["seed"], output_path)
+            print(f"  ✅ Saved: {output_path.name}")
+            event.update(status="done", seed=info["seed"], output_path=str(output_path))
+        else:
+            self.jobs.mark_failed(job["id"], "generation failed")
+            print(f"  ❌ Failed to generate frame {frame_num}")
+            # job is the row read before mark_running, so this try is one more
+            event.update(status="failed", attempt=job["attempts"] + 1)
+
+        if state["on_event"]:
+            state["on_event"](event)
+
+    @staticmethod
+    def _txt2img_payload(prompt, negative_prompt, seed, width, height, model="AnythingXL_v50", steps=STEPS):
+        return {
             "prompt": prompt,
             "negative_prompt": negative_prompt,
             "seed": seed,
-            "steps": 28,
+            "steps": steps,
             "cfg_scale": 7,
             "width": width,
             "height": height,
@@ -219,24 +519,75 @@ class GameAssetGenerator:
             "save_images": False,
         }
 
+    def _generate_image(self, prompt, negative_prompt, seed, width, height, model="AnythingXL_v50",
+                        steps=STEPS, queued_at=None, backend=None):
+        """Generate single image via SD WebUI API
+
+        Without a backend, a slot is taken from the pool for the duration of
+        the request; the observed latency feeds that backend's limiter.
+        """
+        import requests
+
+        if backend is None:
+            backend = self.backends.acquire()
+
+        if queued_at is not None:
+            metrics.observe("queue_wait", time.perf_counter() - queued_at)
+
+        payload = self._txt2img_payload(prompt, negative_prompt, seed, width, height, model, steps)
+
+        latency = None
+        ok = False
         try:
-            response = requests.post(f"{self.api_url}/txt2img", json=payload, timeout=300)
+            start = time.perf_counter()
+            response = backend.session.post(f"{backend.api_url}/txt2img", json=payload,
+                                            timeout=backend.limiter.timeout())
+            latency = time.perf_counter() - start
+            metrics.observe("http", latency, backend=backend.url)
+
+            metrics.add_bytes("http_out", len(response.request.body or b""))
+            metrics.add_bytes("http_in", len(response.content))
 
             if response.status_code == 200:
-                result = response.json()
-                img_data = base64.b64decode(result["images"][0])
-                info = json.loads(result["info"])
+                with metrics.timer("decode"):
+                    result = response.json()
+                    img_data = base64.b64decode(result["images"][0])
+                    info = json.loads(result["info"])
+
+                server_seconds = self._server_seconds(response, info)
+                if server_seconds is not None:
+                    metrics.observe("server_generate", server_seconds)
+                ok = True
                 return img_data, info
             else:
                 print(f"  ❌ API Error: {response.status_code} - {response.text}")
                 return None
         except requests.exceptions.ConnectionError:
-            print(f"  ❌ Cannot connect to WebUI at {self.api_url}")
+            print(f"  ❌ Cannot connect to WebUI at {backend.api_url}")
             print(f"     Make sure SD WebUI is running with --api flag")
             return None
+        except requests.exceptions.Timeout:
+            print(f"  ❌ Timed out after {backend.limiter.timeout():.0f}s at {backend.url}")
+            return None
         except Exception as e:
             print(f"  ❌ Exception: {e}")
             return None
+        finally:
+            self.backends.release(backend, latency, ok)
+
+    @staticmethod
+    def _server_seconds(response, info):
+        """Server-side generation time, when the WebUI reports it"""
+        # A1111's API middleware stamps every response with X-Process-Time;
+        # some forks put the duration into the info JSON instead
+        for value in (response.headers.get("X-Process-Time"),
+                      info.get("generation_time"), info.get("process_time")):
+            try:
+                if value is not None:
+                    return float(value)
+            except (TypeError, ValueError):
+                continue
+        return None
 
     def _build_character_prompt(self, character, action):
         """Build character prompt"""
@@ -313,12 +664,17 @@ grainy, noise, jpeg artifacts, worst quality, low quality, normal quality,
 multiple characters, speech bubble, frame border"""
 
     def check_webui_connection(self):
-        """Check if WebUI is running"""
+        """Check if every configured WebUI is running"""
+        return all([self._check_backend(backend) for backend in self.backends.backends])
+
+    def _check_backend(self, backend):
+        import requests
+
         try:
-            response = requests.get(f"{self.api_url}/sd-models", timeout=5)
+            response = backend.session.get(f"{backend.api_url}/sd-models", timeout=5)
             if response.status_code == 200:
                 models = response.json()
-                print(f"✅ Connected to SD WebUI")
+                print(f"✅ Connected to SD WebUI at {backend.url}")
                 print(f"📦 Available models: {len(models)}")
                 for model in models:
                     print(f"   - {model['title']}")
@@ -327,11 +683,11 @@ multiple characters, speech bubble, frame border"""
                 print(f"❌ WebUI responded with status {response.status_code}")
                 return False
         except requests.exceptions.ConnectionError:
-            print(f"❌ Cannot connect to SD WebUI at {self.api_url}")
+            print(f"❌ Cannot connect to SD WebUI at {backend.api_url}")
             print(f"   Make sure:")
             print(f"   1. SD WebUI is running")
             print(f"   2. Started with --api flag")
-            print(f"   3. Accessible at http://127.0.0.1:7860")
+            print(f"   3. Accessible at {backend.url}")
             return False
         except Exception as e:
             print(f"❌ Error checking connection: {e}")
@@ -355,8 +711,27 @@ Examples:
   python sd_batch_generator.py --type projectile --name arrow --animated --frames 4
   python sd_batch_generator.py --type projectile --name bullet
 
+  # Continue an interrupted run (only lost or failed frames are regenerated)
+  python sd_batch_generator.py --type character --name slime --action idle --frames 10 --resume
+
   # Check WebUI connection
   python sd_batch_generator.py --check
+
+  # Spread frames across two WebUI instances with adaptive concurrency
+  python sd_batch_generator.py --type character --name bat --action idle --url http://127.0.0.1:7860 http://gpu2:7860
+
+  # Reject empty, cropped, blurry or off-model frames and regenerate up to 5 of them
+  python sd_batch_generator.py --type character --name slime --action idle --quality --regen-budget 5
+
+  # Preview 16 seeds across all WebUIs, then run the best one (see seed_sweep.py)
+  python sd_batch_generator.py --type character --name slime --action idle --sweep 16
+  python sd_batch_generator.py --type character --name slime --action idle --frames 10 --best-seed
+
+  # Cache finished frames in the memory-mapped frame store (see frame_store.py)
+  python sd_batch_generator.py --type character --name slime --action idle --frame-store temp_generated/frame_store
+
+  # Keep a warm generator running for editor tooling (see generator_daemon.py)
+  python sd_batch_generator.py --serve --port 7870
         """
     )
 
@@ -367,13 +742,76 @@ Examples:
     parser.add_argument("--frames", type=int, default=10, help="Number of frames")
     parser.add_argument("--animated", action="store_true", help="Generate animated projectile")
     parser.add_argument("--seed", type=int, default=-1, help="Seed value (-1 for random)")
-    parser.add_argument("--url", type=str, default="http://127.0.0.1:7860", help="WebUI URL")
+    parser.add_argument("--url", type=str, nargs="+", default=["http://127.0.0.1:7860"],
+                        help="WebUI URL (several URLs spread frames across instances)")
+    parser.add_argument("--max-concurrency", type=int, default=4,
+                        help="Upper bound on adaptive in-flight requests per WebUI")
+    parser.add_argument("--poll-progress", action="store_true",
+                        help="Use /sdapi/v1/progress to hold back concurrency while the WebUI is backlogged")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Drive frames from one asyncio loop with deadlines, stall retry and WebUI interrupt")
+    parser.add_argument("--deadline", type=float, default=120.0,
+                        help="Async: seconds per request attempt before it is interrupted and retried")
+    parser.add_argument("--stall-timeout", type=float, default=20.0,
+                        help="Async: seconds without sampler progress before a job is interrupted and retried (0: off)")
+    parser.add_argument("--quality", action="store_true",
+                        help="Score frames on the CPU (see frame_quality.py) and regenerate rejected ones")
+    parser.add_argument("--regen-budget", type=int, default=5,
+                        help="Quality: rejected frames regenerated per run before bad ones are kept")
+    parser.add_argument("--reference", type=str,
+                        help="Quality: reference frame (default: first accepted frame of the run)")
+    parser.add_argument("--matte", choices=["auto", "key", "rembg"], default="auto",
+                        help="Quality: how the subject is separated from the background")
+    parser.add_argument("--min-score", type=float, default=0.0, help="Quality: also reject frames scoring below this")
+    parser.add_argument("--sweep", type=int, metavar="N",
+                        help="Preview N seeds (from --seed, or random) concurrently and write a contact sheet")
+    parser.add_argument("--preview-steps", type=int, default=12, help="Sweep: sampling steps per preview")
+    parser.add_argument("--preview-scale", type=float, default=0.5, help="Sweep: preview size relative to the frame")
+    parser.add_argument("--best-seed", action="store_true",
+                        help="Use the best-scoring seed from an earlier --sweep of this asset")
     parser.add_argument("--project-root", type=str, default="../assets", help="Project assets root")
     parser.add_argument("--check", action="store_true", help="Check WebUI connection and exit")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue a previous run, generating only pending or failed frames")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per frame before giving up")
+    parser.add_argument("--jobs-db", type=str, help="Job store path (default: temp_generated/jobs.db)")
+    parser.add_argument("--frame-store", type=str, help="Write finished runs to a memory-mapped frame store at this path")
+    parser.add_argument("--serve", action="store_true", help="Run as a daemon accepting jobs over a local HTTP API")
+    parser.add_argument("--port", type=int, default=7870, help="Daemon port (default: 7870)")
+    parser.add_argument("--socket", type=str, help="Serve the daemon API on a Unix socket instead of TCP")
+    add_metrics_arguments(parser)
 
     args = parser.parse_args()
 
-    generator = GameAssetGenerator(webui_url=args.url, project_root=args.project_root)
+    metrics.configure("sd_batch_generator", args.metrics_out, args.metrics_port)
+
+    frame_store = None
+    if args.frame_store:
+        from frame_store import FrameStore
+        frame_store = FrameStore(args.frame_store)
+
+    scorer = None
+    if args.quality:
+        from frame_quality import FrameScorer
+        scorer = FrameScorer(reference=args.reference, matte=args.matte, min_score=args.min_score)
+
+    generator = GameAssetGenerator(webui_url=args.url, project_root=args.project_root,
+                                   jobs_db=args.jobs_db, resume=args.resume,
+                                   max_attempts=args.max_attempts,
+                                   max_concurrency=args.max_concurrency,
+                                   poll_progress=args.poll_progress,
+                                   use_async=args.use_async, deadline=args.deadline,
+                                   stall_timeout=args.stall_timeout,
+                                   scorer=scorer, regen_budget=args.regen_budget,
+                                   frame_store=frame_store)
+
+    # Daemon mode keeps the generator warm between jobs
+    if args.serve:
+        from generator_daemon import serve
+        generator.check_webui_connection()
+        serve(generator, port=args.port, socket_path=args.socket)
+        metrics.finish()
+        return
 
     # Check connection mode
     if args.check:
@@ -390,35 +828,57 @@ Examples:
         parser.print_help()
         return
 
+    if args.type == "character" and not args.action:
+        print("❌ Error: --action is required for character type")
+        return
+
+    if args.type == "effect" and not args.category:
+        print("❌ Error: --category is required for effect type")
+        return
+
+    if args.type == "character":
+        spec = generator.character_spec(args.name, args.action, args.frames)
+    elif args.type == "effect":
+        spec = generator.effect_spec(args.category, args.name, args.frames)
+    else:
+        spec = generator.projectile_spec(args.name, args.animated, args.frames)
+
+    seed = args.seed
+    if args.best_seed:
+        from seed_sweep import best_seed
+        seed = best_seed(generator.jobs, spec["run_key"])
+        if seed is None:
+            print(f"❌ No seed sweep previews stored for {spec['run_key']}; run with --sweep N first")
+            return
+        print(f"🏆 Best sweep seed for {spec['run_key']}: {seed}")
+
     # Check WebUI connection first
     if not generator.check_webui_connection():
         return
 
     print()
 
+    if args.sweep:
+        from seed_sweep import SeedSweep
+        SeedSweep(generator, steps=args.preview_steps, scale=args.preview_scale).run(spec, args.sweep, seed=seed)
+        metrics.finish()
+        return
+
     # Generate based on type
     if args.type == "character":
-        if not args.action:
-            print("❌ Error: --action is required for character type")
-            return
-
         generator.generate_character_animation(
             character_name=args.name,
             action=args.action,
             frame_count=args.frames,
-            seed=args.seed
+            seed=seed
         )
 
     elif args.type == "effect":
-        if not args.category:
-            print("❌ Error: --category is required for effect type")
-            return
-
         generator.generate_effect_animation(
             effect_type=args.category,
             effect_name=args.name,
             frame_count=args.frames,
-            seed=args.seed
+            seed=seed
         )
 
     elif args.type == "projectile":
@@ -426,12 +886,14 @@ Examples:
             projectile_name=args.name,
             animated=args.animated,
             frame_count=args.frames if args.animated else 1,
-            seed=args.seed
+            seed=seed
         )
 
+    metrics.finish()
+
     print("\n🎉 Generation complete! Don't forget to:")
     print("   1. Remove backgrounds using batch_remove_bg.py")
-    print("   2. Verify frame consistency")
+    print("   2. Verify frame consistency" + (" (frames were quality-scored)" if scorer else ""))
     print("   3. Update config JSON files if needed\n")
 
 if __name__ == "__main__":
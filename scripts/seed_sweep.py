@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Seed Sweep with Contact Sheet
+種子探索（平行預覽與索引圖）
+
+Instead of rerunning the generator by hand until a seed looks right, a sweep
+generates one cheap preview per seed for N seeds at once, spread across
+every configured WebUI. Each preview is scored on the CPU (frame_quality.py)
+and all of them are stitched into one labelled contact sheet, best first.
+
+Every preview is recorded in the job store under the asset's run key:
+    - --best-seed starts the full run with the top-scoring seed
+    - a full run whose seed and settings match a preview takes frame 1 from
+      it instead of generating it again (sweep with --preview-steps 28
+      --preview-scale 1 to get reusable previews)
+
+Usage:
+    python sd_batch_generator.py --type character --name slime --action idle --sweep 16
+    python sd_batch_generator.py --type character --name slime --action idle --best-seed
+
+    # List stored previews and redraw the contact sheet
+    python seed_sweep.py --run-key character/slime/idle
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from asset_metrics import metrics
+from atomic_io import atomic_write, save_image
+from job_store import JobStore
+
+CELL = 192
+LABEL_HEIGHT = 30
+
+def sweep_dir(root, run_key: str) -> Path:
+    """Folder holding the previews and contact sheet of one run key"""
+    return Path(root) / "sweeps" / run_key.replace("/", "_")
+
+def preview_payload(payload: dict, steps: int, scale: float) -> dict:
+    """The run's txt2img payload at fewer steps and a smaller size (multiples of 64)"""
+    preview = dict(payload, steps=steps)
+    for key in ("width", "height"):
+        preview[key] = max(64, int(round(payload[key] * scale / 64)) * 64)
+    return preview
+
+def best_seed(jobs: JobStore, run_key: str) -> Optional[int]:
+    """Seed of the best-scoring stored preview, preferring ones without flags"""
+    previews = jobs.previews(run_key)
+    clean = [p for p in previews if not p["flags"]]
+    ranked = clean or previews
+    return ranked[0]["seed"] if ranked else None
+
+def contact_sheet(previews: List[Dict], output_path, cell=CELL, columns=None):
+    """Stitch previews into a grid labelled with rank, seed, score and flags"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    columns = columns or max(1, math.ceil(math.sqrt(len(previews))))
+    rows = max(1, math.ceil(len(previews) / columns))
+    sheet = Image.new("RGB", (columns * cell, rows * (cell + LABEL_HEIGHT)), (32, 32, 36))
+    draw = ImageDraw.Draw(sheet)
+    font = ImageFont.load_default()
+
+    for i, preview in enumerate(previews):
+        x, y = (i % columns) * cell, (i // columns) * (cell + LABEL_HEIGHT)
+        try:
+            with Image.open(preview["path"]) as img:
+                thumb = img.convert("RGBA")
+        except OSError:
+            continue
+        thumb.thumbnail((cell - 8, cell - 8))
+        tile = Image.new("RGBA", (cell - 8, cell - 8), (96, 96, 104, 255))
+        tile.alpha_composite(thumb, ((tile.width - thumb.width) // 2, (tile.height - thumb.height) // 2))
+        sheet.paste(tile.convert("RGB"), (x + 4, y + 4))
+
+        score = preview.get("score")
+        ok = not preview.get("flags")
+        draw.text((x + 6, y + cell + 1), f"#{i + 1}  seed {preview['seed']}", fill=(235, 235, 235), font=font)
+        detail = f"{score:.2f}" if score is not None else "-"
+        if not ok:
+            detail += "  " + ",".join(preview["flags"])
+        draw.text((x + 6, y + cell + 15), detail, fill=(120, 220, 120) if ok else (240, 170, 80), font=font)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    save_image(sheet, output_path, "PNG")
+    return output_path
+
+class SeedSweep:
+    """Concurrent low-cost previews of one asset over many seeds"""
+
+    def __init__(self, generator, steps=12, scale=0.5, scorer=None):
+        self.generator = generator
+        self.steps = steps
+        self.scale = scale
+        if scorer is None:
+            from frame_quality import FrameScorer
+            scorer = generator.scorer or FrameScorer()
+        self.scorer = scorer
+
+    def _generate_threads(self, payload, seeds, cancel=None):
+        g = self.generator
+
+        def one(seed):
+            if cancel is not None and cancel.is_set():
+                return None
+            return g._generate_image(seed=seed, **payload)
+
+        with ThreadPoolExecutor(max_workers=g.backends.max_concurrency * len(g.backends.backends)) as pool:
+            return list(pool.map(one, seeds))
+
+    def _generate_async(self, payload, seeds, cancel=None):
+        import asyncio
+        from async_webui import AsyncWebUIClient
+
+        g = self.generator
+
+        async def sweep():
+            async with AsyncWebUIClient(g.urls, max_inflight=g.max_concurrency, deadline=g.deadline,
+                                        stall_timeout=g.stall_timeout, cancel=cancel) as client:
+                payloads = [g._txt2img_payload(seed=seed, **payload) for seed in seeds]
+                results = await client.txt2img_many(payloads)
+            return [r if isinstance(r, tuple) else None for r in results]
+
+        return asyncio.run(sweep())
+
+    def run(self, spec: dict, count: int, seed=-1, columns=None, cancel=None) -> List[Dict]:
+        """Preview `count` seeds (seed, seed+1, ... or random), score, store and draw them
+
+        Returns the stored previews of this sweep, best first.
+        """
+        g = self.generator
+        run_key = spec["run_key"]
+        payload = preview_payload(spec["payload"], self.steps, self.scale)
+        seeds = ([seed + i for i in range(count)] if seed != -1
+                 else random.sample(range(1, 2**31), count))
+        out_dir = sweep_dir(g.temp_output, run_key)
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        print(f"\n{'='*70}")
+        print(f"🎲 Seed Sweep: {run_key}")
+        print(f"{'='*70}")
+        print(f"Seeds:    {count} ({'from ' + str(seed) if seed != -1 else 'random'})")
+        print(f"Preview:  {payload['width']}x{payload['height']}, {self.steps} steps")
+        print(f"Backends: {len(g.urls)}")
+        print(f"Output:   {out_dir}")
+        print(f"{'='*70}\n")
+
+        start = time.perf_counter()
+        generate = self._generate_async if g.use_async else self._generate_threads
+        results = generate(payload, seeds, cancel)
+
+        previews = []
+        for i, (preview_seed, result) in enumerate(zip(seeds, results), 1):
+            if not result:
+                print(f"  [{i}/{count}] seed {preview_seed}: ❌ failed")
+                continue
+            img_data, info = result
+            path = out_dir / f"seed_{preview_seed}.png"
+            with metrics.timer("write"):
+                atomic_write(path, img_data)
+            with metrics.timer("score"):
+                quality = self.scorer.score(img_data)
+            g.jobs.add_preview(run_key, preview_seed, payload, path, quality["score"], quality["flags"])
+            previews.append({"seed": preview_seed, "path": str(path), "score": quality["score"],
+                             "flags": quality["flags"]})
+            flags = f"  {', '.join(quality['flags'])}" if quality["flags"] else ""
+            print(f"  [{i}/{count}] seed {preview_seed}: {'✅' if not flags else '⚠️ '} "
+                  f"score {quality['score']:.2f}{flags}")
+        elapsed = time.perf_counter() - start
+
+        previews.sort(key=lambda p: (bool(p["flags"]), -p["score"]))
+        sheet = contact_sheet(previews, out_dir / "contact_sheet.png", columns=columns) if previews else None
+
+        print(f"\n{'='*70}")
+        print(f"✅ {len(previews)}/{count} previews in {elapsed:.1f}s")
+        if sheet:
+            print(f"🖼️  Contact sheet: {sheet}")
+            print(f"🏆 Best seed: {previews[0]['seed']} (score {previews[0]['score']:.2f})")
+            print(f"   Full run: --seed {previews[0]['seed']}  or  --best-seed")
+        print(f"{'='*70}\n")
+        return previews
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="List stored seed sweep previews and redraw their contact sheet",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Run a sweep (through the generator, which knows the prompts)
+  python sd_batch_generator.py --type character --name slime --action idle --sweep 16
+
+  # Ranked previews of that asset and a fresh contact sheet
+  python seed_sweep.py --run-key character/slime/idle --columns 8
+        """
+    )
+    parser.add_argument("--run-key", type=str, required=True,
+                        help="Asset run key, e.g. character/slime/idle or effect/combat/slash")
+    parser.add_argument("--jobs-db", type=str, default="temp_generated/jobs.db", help="Job store path")
+    parser.add_argument("--columns", type=int, help="Contact sheet columns (default: square grid)")
+    parser.add_argument("--sheet", type=str, help="Contact sheet path (default: next to the previews)")
+
+    args = parser.parse_args()
+
+    jobs = JobStore(args.jobs_db)
+    previews = [p for p in jobs.previews(args.run_key) if Path(p["path"]).exists()]
+    if not previews:
+        print(f"❌ No previews stored for {args.run_key} in {args.jobs_db}")
+        sys.exit(1)
+
+    print(f"\n{'='*70}")
+    print(f"🎲 Seed previews: {args.run_key}")
+    print(f"{'='*70}\n")
+    previews.sort(key=lambda p: (bool(p["flags"]), -(p["score"] or 0)))
+    for rank, preview in enumerate(previews, 1):
+        settings = f"{preview['payload']['width']}x{preview['payload']['height']}, {preview['payload'].get('steps')} steps"
+        print(f"  #{rank:<3} seed {preview['seed']:<11} score {preview['score'] or 0:.2f}  {settings:<22} "
+              f"{', '.join(preview['flags'])}")
+
+    sheet = args.sheet or Path(previews[0]["path"]).parent / "contact_sheet.png"
+    contact_sheet(previews, sheet, columns=args.columns)
+    print(f"\n🖼️  Contact sheet: {sheet}")
+    print(f"🏆 Best seed: {best_seed(jobs, args.run_key)}\n")
+
+if __name__ == "__main__":
+    main()
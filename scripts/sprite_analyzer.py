@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Sprite Animation Consistency Analyzer
+動畫影格一致性分析
+
+Loads every frame of an action (e.g. sprites/enemies/slime/idle/idle(1..10).png)
+into one stacked NumPy array and, in a single vectorized pass, computes per
+frame: alpha centroid, alpha bounding box, distance from the action's median
+colour histogram and SSIM to its best-matching neighbour. Frames that deviate
+from the rest of the action are flagged and everything is written to a JSON
+report, so the generate → rembg pipeline can be gated automatically.
+
+Installation:
+    pip install numpy pillow
+
+Usage:
+    python sprite_analyzer.py --input ../assets/sprites/enemies/slime/idle
+    python sprite_analyzer.py --input ../assets/sprites --report sprite_report.json --fail-on-outliers
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from asset_tree import scan_frame_dirs
+from atomic_io import atomic_open
+from frame_store import FrameStore, load_frames
+
+HIST_BINS = 8  # per channel → 512 colour bins
+ALPHA_THRESHOLD = 16
+
+DEFAULT_THRESHOLDS = {
+    "z": 3.5,              # robust z-score (median / MAD) to call a frame an outlier
+    "position": 0.04,      # min centroid shift, fraction of frame size
+    "scale": 0.10,         # min bbox size change, fraction of the median bbox
+    "histogram": 0.25,     # min colour histogram distance (0..1)
+    "structure": 0.15,     # min drop in SSIM against the best-matching neighbour
+    "ssim": 0.35,          # best neighbour SSIM below this is always suspicious
+}
+
+# ----------------------------------------------------------------------
+# Loading
+# ----------------------------------------------------------------------
+
+def load_action(directory: Path, frame_names, analysis_size=192, store=None):
+    """Decode frames into one (N, H, W, 4) uint8 stack at a common analysis size
+
+    Returns (stack, scale, original sizes); scale maps analysis pixels back
+    to source pixels. With a FrameStore the frames come from its memory map
+    instead of the PNGs.
+    """
+    images, sizes = [], []
+    for frame in load_frames(directory, frame_names, store):
+        img = Image.fromarray(np.ascontiguousarray(frame))
+        sizes.append(img.size)
+        factor = max(1, max(img.size) // analysis_size)
+        images.append(img.reduce(factor) if factor > 1 else img)
+
+    width = max(img.size[0] for img in images)
+    height = max(img.size[1] for img in images)
+    stack = np.zeros((len(images), height, width, 4), dtype=np.uint8)
+    for i, img in enumerate(images):
+        arr = np.asarray(img)
+        stack[i, :arr.shape[0], :arr.shape[1]] = arr
+
+    scale = max(sizes[0]) / max(width, height)
+    return stack, scale, sizes
+
+# ----------------------------------------------------------------------
+# Vectorized metrics
+# ----------------------------------------------------------------------
+
+def alpha_geometry(alpha):
+    """Centroid and bbox for every frame of an (N, H, W) float alpha stack"""
+    n, h, w = alpha.shape
+    total = alpha.sum(axis=(1, 2))
+    safe = np.where(total > 0, total, 1)
+    cx = alpha.sum(axis=1) @ np.arange(w, dtype=np.float32) / safe
+    cy = alpha.sum(axis=2) @ np.arange(h, dtype=np.float32) / safe
+
+    mask = alpha > ALPHA_THRESHOLD / 255
+    rows = mask.any(axis=2)
+    cols = mask.any(axis=1)
+    has = rows.any(axis=1)
+    top = np.argmax(rows, axis=1)
+    bottom = h - np.argmax(rows[:, ::-1], axis=1)
+    left = np.argmax(cols, axis=1)
+    right = w - np.argmax(cols[:, ::-1], axis=1)
+    bbox = np.stack([left, top, right - left, bottom - top], axis=1) * has[:, None]
+    return cx, cy, bbox, total, has
+
+def colour_histograms(stack):
+    """Alpha-weighted, normalized RGB histograms: (N, HIST_BINS ** 3)"""
+    n = stack.shape[0]
+    shift = 8 - int(np.log2(HIST_BINS))
+    rgb = (stack[..., :3] >> shift).astype(np.int64)
+    bins = (rgb[..., 0] * HIST_BINS + rgb[..., 1]) * HIST_BINS + rgb[..., 2]
+    bins += np.arange(n)[:, None, None] * HIST_BINS ** 3
+    weights = stack[..., 3].astype(np.float64)
+    hist = np.bincount(bins.ravel(), weights=weights.ravel(), minlength=n * HIST_BINS ** 3)
+    hist = hist.reshape(n, HIST_BINS ** 3)
+    totals = hist.sum(axis=1, keepdims=True)
+    return hist / np.where(totals > 0, totals, 1)
+
+def box_filter(stack, k):
+    """Mean over every k×k window of an (N, H, W) stack ('valid' region)"""
+    c = stack.cumsum(axis=1).cumsum(axis=2)
+    c = np.pad(c, ((0, 0), (1, 0), (1, 0)))
+    return (c[:, k:, k:] - c[:, :-k, k:] - c[:, k:, :-k] + c[:, :-k, :-k]) / (k * k)
+
+def ssim_pairs(x, y, k=7):
+    """Mean SSIM between matching frames of two (N, H, W) stacks in [0, 1]"""
+    if min(x.shape[1:]) < k:
+        return np.ones(x.shape[0])
+    c1, c2 = 0.01 ** 2, 0.03 ** 2
+    cov_norm = k * k / (k * k - 1)
+    mx, my = box_filter(x, k), box_filter(y, k)
+    sxx = (box_filter(x * x, k) - mx * mx) * cov_norm
+    syy = (box_filter(y * y, k) - my * my) * cov_norm
+    sxy = (box_filter(x * y, k) - mx * my) * cov_norm
+    ssim = ((2 * mx * my + c1) * (2 * sxy + c2)) / ((mx * mx + my * my + c1) * (sxx + syy + c2))
+    return ssim.mean(axis=(1, 2))
+
+def best_neighbour(pair_values):
+    """Per-frame max of the values for (i-1, i) and (i, i+1)
+
+    A single broken frame scores low against both neighbours, while its
+    neighbours still match the frame on their other side.
+    """
+    n = len(pair_values) + 1
+    best = np.full(n, -np.inf)
+    best[:-1] = np.maximum(best[:-1], pair_values)
+    best[1:] = np.maximum(best[1:], pair_values)
+    return best
+
+def robust_z(values):
+    median = np.median(values)
+    mad = np.median(np.abs(values - median)) * 1.4826
+    if mad < 1e-9:
+        # Every other frame is identical: any deviation at all is an outlier
+        return np.where(values > median, np.inf, np.where(values < median, -np.inf, 0.0)), median
+    return (values - median) / mad, median
+
+# ----------------------------------------------------------------------
+# Analysis
+# ----------------------------------------------------------------------
+
+def analyze_action(directory: Path, frame_names, analysis_size=192, thresholds=None, store=None):
+    thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+    stack, scale, sizes = load_action(directory, frame_names, analysis_size, store)
+    n, h, w, _ = stack.shape
+
+    alpha = stack[..., 3].astype(np.float32) / 255
+    cx, cy, bbox, coverage, has_content = alpha_geometry(alpha)
+    hist = colour_histograms(stack)
+
+    # Premultiplied luminance so the background under transparent pixels is ignored
+    luma = (stack[..., :3].astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)) / 255 * alpha
+
+    # Total variation distance to the action's median palette
+    reference = np.median(hist, axis=0)
+    reference /= max(reference.sum(), 1e-12)
+    hist_dist = 0.5 * np.abs(hist - reference).sum(axis=1)
+
+    ssim = best_neighbour(ssim_pairs(luma[:-1], luma[1:])) if n > 1 else np.ones(1)
+
+    frames = [{"frame": name, "flags": []} for name in frame_names]
+    frame_dim = max(w, h)
+
+    def flag(metric, values, min_abs, low_side=False):
+        z, median = robust_z(values)
+        deviation = (median - values) if low_side else np.abs(values - median)
+        z = -z if low_side else np.abs(z)
+        for i in np.nonzero((z > thresholds["z"]) & (deviation > min_abs))[0]:
+            frames[i]["flags"].append(metric)
+
+    flag("position_x", cx, thresholds["position"] * frame_dim)
+    flag("position_y", cy, thresholds["position"] * frame_dim)
+    median_w = max(np.median(bbox[:, 2]), 1)
+    median_h = max(np.median(bbox[:, 3]), 1)
+    flag("scale_w", bbox[:, 2].astype(np.float64), thresholds["scale"] * median_w)
+    flag("scale_h", bbox[:, 3].astype(np.float64), thresholds["scale"] * median_h)
+    if n > 2:
+        flag("palette", hist_dist, thresholds["histogram"])
+        flag("structure", ssim, thresholds["structure"], low_side=True)
+
+    for i, record in enumerate(frames):
+        if not has_content[i]:
+            record["flags"].append("empty")
+        if sizes[i] != sizes[0]:
+            record["flags"].append("size_mismatch")
+        if n > 1 and ssim[i] < thresholds["ssim"] and "structure" not in record["flags"]:
+            record["flags"].append("structure")
+        record.update({
+            "size": list(sizes[i]),
+            "centroid": [round(float(cx[i]) * scale, 1), round(float(cy[i]) * scale, 1)],
+            "bbox": [int(round(v * scale)) for v in bbox[i]],
+            "coverage": round(float(coverage[i]) / (w * h), 4),
+            "histogram_distance": round(float(hist_dist[i]), 4),
+            "ssim": round(float(ssim[i]), 4),
+        })
+
+    outliers = [r["frame"] for r in frames if r["flags"]]
+    return {
+        "path": str(directory),
+        "frame_count": n,
+        "ok": not outliers,
+        "outliers": outliers,
+        "frames": frames,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check generated animation frames for scale, palette and position consistency",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # One action
+  python sprite_analyzer.py --input ../assets/sprites/enemies/slime/idle
+
+  # Every action under a tree, as a pipeline gate
+  python sprite_analyzer.py --input ../assets/sprites --report report.json --fail-on-outliers
+        """
+    )
+
+    parser.add_argument("--input", "-i", type=str, required=True, help="Action folder or tree of action folders")
+    parser.add_argument("--report", "-o", type=str, help="Write the JSON report to this file")
+    parser.add_argument("--analysis-size", type=int, default=192,
+                        help="Downscale frames to about this size before analysis (default: 192)")
+    parser.add_argument("--min-frames", type=int, default=2, help="Skip folders with fewer frames")
+    parser.add_argument("--z", type=float, default=DEFAULT_THRESHOLDS["z"], help="Robust z-score threshold")
+    parser.add_argument("--jobs", "-j", type=int, default=4, help="Actions analyzed in parallel")
+    parser.add_argument("--frame-store", type=str, help="Read frames through a memory-mapped frame store at this path")
+    parser.add_argument("--fail-on-outliers", action="store_true", help="Exit with status 1 if any frame is flagged")
+
+    args = parser.parse_args()
+
+    input_dir = Path(args.input)
+    if not input_dir.exists():
+        print(f"❌ Input directory does not exist: {input_dir}")
+        sys.exit(1)
+
+    actions = [(d, frames) for d, frames in scan_frame_dirs(input_dir) if len(frames) >= args.min_frames]
+    if not actions:
+        print(f"❌ No animation folders found in {input_dir}")
+        sys.exit(1)
+
+    print(f"\n{'='*70}")
+    print(f"🔬 Sprite Consistency Analyzer")
+    print(f"{'='*70}")
+    print(f"Input:   {input_dir}")
+    print(f"Actions: {len(actions)}")
+    print(f"{'='*70}\n")
+
+    start = time.perf_counter()
+    thresholds = {"z": args.z}
+    store = FrameStore(args.frame_store) if args.frame_store else None
+
+    def analyze(action):
+        directory, names = action
+        try:
+            return analyze_action(directory, names, args.analysis_size, thresholds, store)
+        except (OSError, ValueError) as e:
+            # An unreadable frame fails its action, not the whole scan
+            return {"path": str(directory), "frame_count": len(names), "ok": False,
+                    "error": str(e), "outliers": [], "frames": []}
+
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        results = list(pool.map(analyze, actions))
+    elapsed = time.perf_counter() - start
+
+    flagged = 0
+    failed = 0
+    for result in results:
+        if "error" in result:
+            failed += 1
+            print(f"  ❌ {result['path']}: {result['error']}")
+            continue
+        if result["ok"]:
+            print(f"  ✅ {result['path']} ({result['frame_count']} frames)")
+            continue
+        flagged += 1
+        print(f"  ⚠️  {result['path']} ({result['frame_count']} frames)")
+        for frame in result["frames"]:
+            if frame["flags"]:
+                print(f"      {frame['frame']:<24} {', '.join(frame['flags'])}")
+
+    report = {
+        "input": str(input_dir),
+        "seconds": round(elapsed, 3),
+        "thresholds": dict(DEFAULT_THRESHOLDS, **thresholds),
+        "summary": {"actions": len(results), "flagged": flagged, "failed": failed,
+                    "frames": sum(r["frame_count"] for r in results)},
+        "actions": results,
+    }
+    if args.report:
+        with atomic_open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"\n{'='*70}")
+    print(f"{'✅' if not flagged and not failed else '⚠️ '} {len(results) - flagged - failed}/{len(results)} "
+          f"actions consistent ({report['summary']['frames']} frames in {elapsed:.2f}s)")
+    if failed:
+        print(f"❌ {failed} action(s) could not be read")
+    if args.report:
+        print(f"📄 Report: {args.report}")
+    print(f"{'='*70}\n")
+
+    if failed or (flagged and args.fail_on_outliers):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Delta-Encoded Sprite Animations
+差分編碼精靈動畫（關鍵影格 + 髒矩形）
+
+Most frames of an animation differ from the previous one in a small region
+(the slime's breathing idle, a blinking eye, the tail of an explosion), yet
+every {action}({n}).png stores the whole image. The encoder keeps full
+keyframes and, for the frames in between, only the rectangles that changed
+since the previous frame, packed into one .spd file per action.
+
+Dirty regions come from one vectorized NumPy diff over the whole stack of
+frames: changed pixels are reduced to a grid of --tile sized cells, cells are
+merged into rectangles (the same run merging the level compiler uses for
+collision) and each rectangle is shrunk to the changed pixels it contains.
+Fully transparent pixels are normalized to (0, 0, 0, 0) first, so invisible
+RGB noise left by background removal never counts as a change.
+
+A frame becomes a keyframe when it is the first one, every --keyframe-interval
+frames (0 = only the first) or when its rectangles would cover more than
+--max-dirty of the canvas, where a full image compresses better anyway.
+
+SPD1 container (little-endian):
+
+    "SPD1"                 4 bytes magic
+    header length          u32
+    header                 UTF-8 JSON, space-padded to a multiple of 4 bytes
+    payload                PNG blobs, offsets relative to the payload start
+
+    header = {
+      "version": 1, "width": W, "height": H, "tile": 16,
+      "frames": [
+        {"name": "Idle(1).png", "size": [w, h], "key": true,  "offset": 0,    "length": 9120},
+        {"name": "Idle(2).png", "size": [w, h], "key": false, "offset": 9120, "length": 812,
+         "rects": [[x, y, w, h, sy], ...]},
+        {"name": "Idle(3).png", "size": [w, h], "key": false, "offset": 0,    "length": 0, "rects": []}
+      ]
+    }
+
+Decoding keeps one W×H RGBA canvas (frames are padded to the largest size,
+anchored top-left; "size" is a frame's own size for cropping):
+
+    key frame     the PNG is the whole canvas: replace it
+    delta frame   the PNG is a patch strip, rectangles stacked vertically;
+                  for each [x, y, w, h, sy] copy strip rows sy..sy+h, columns
+                  0..w over canvas (x, y, w, h). Copy means replace, not
+                  blend: on a 2D canvas clearRect(x, y, w, h) first, then
+                  drawImage(strip, 0, sy, w, h, x, y, w, h)
+    empty rects   the frame equals the previous one (no PNG, length 0)
+
+Every frame after the first depends on the one before it, so frames decode
+in order; seeking jumps to the closest keyframe at or before the target.
+
+Usage:
+    python sprite_delta.py encode --input ../assets/sprites/player/Cat/idle
+    python sprite_delta.py encode --input ../assets/sprites --output temp_generated/delta --verify
+    python sprite_delta.py info --input temp_generated/delta/player/Cat/idle.spd
+    python sprite_delta.py decode --input idle.spd --output temp_generated/idle_frames
+
+    # From Python
+    blob = encode_frames(frames, names)       # RGBA arrays → SPD1 bytes
+    header, frames = decode(blob)
+"""
+
+import argparse
+import io
+import json
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from asset_tree import scan_frame_dirs
+from atomic_io import atomic_write, save_image, sync_batch
+from frame_store import FrameStore, load_frames
+from level_compiler import merge_solid_rects
+
+SPD_MAGIC = b"SPD1"
+SPD_VERSION = 1
+TILE = 16
+MAX_DIRTY = 0.5
+
+class SpriteDeltaError(Exception):
+    """Raised when a file is not a valid SPD1 animation"""
+
+def encode_png(pixels: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, "RGBA").save(buffer, "PNG", compress_level=9)
+    return buffer.getvalue()
+
+def decode_png(data: bytes) -> np.ndarray:
+    with Image.open(io.BytesIO(data)) as img:
+        return np.array(img.convert("RGBA"))
+
+def stack_frames(frames: List[np.ndarray]) -> np.ndarray:
+    """(N, H, W, 4) stack padded top-left to the largest frame, transparent RGB zeroed"""
+    height = max(f.shape[0] for f in frames)
+    width = max(f.shape[1] for f in frames)
+    stack = np.zeros((len(frames), height, width, 4), np.uint8)
+    for i, frame in enumerate(frames):
+        stack[i, :frame.shape[0], :frame.shape[1]] = frame
+    stack[stack[..., 3] == 0] = 0
+    return stack
+
+def dirty_masks(stack: np.ndarray) -> np.ndarray:
+    """(N-1, H, W) bool: pixels of frame i+1 that differ from frame i"""
+    return np.any(stack[1:] != stack[:-1], axis=-1)
+
+def dirty_rects(mask: np.ndarray, tile=TILE) -> List[List[int]]:
+    """Merged [x, y, w, h] pixel rectangles covering every True pixel of a mask"""
+    height, width = mask.shape
+    rows, cols = -(-height // tile), -(-width // tile)
+    padded = np.zeros((rows * tile, cols * tile), bool)
+    padded[:height, :width] = mask
+    cells = padded.reshape(rows, tile, cols, tile).any(axis=(1, 3))
+
+    rects = []
+    for cx, cy, cw, ch in merge_solid_rects(cells.ravel().tolist(), cols, rows, bool):
+        x0, y0 = cx * tile, cy * tile
+        region = mask[y0:min(height, (cy + ch) * tile), x0:min(width, (cx + cw) * tile)]
+        ys = np.flatnonzero(region.any(axis=1))
+        xs = np.flatnonzero(region.any(axis=0))
+        rects.append([x0 + int(xs[0]), y0 + int(ys[0]),
+                      int(xs[-1] - xs[0]) + 1, int(ys[-1] - ys[0]) + 1])
+    return rects
+
+def patch_strip(frame: np.ndarray, rects: List[List[int]]) -> Tuple[np.ndarray, List[List[int]]]:
+    """Stack the rectangles' pixels vertically; returns the strip and [x, y, w, h, sy] entries"""
+    strip = np.zeros((sum(r[3] for r in rects), max(r[2] for r in rects), 4), np.uint8)
+    entries = []
+    sy = 0
+    for x, y, w, h in rects:
+        strip[sy:sy + h, :w] = frame[y:y + h, x:x + w]
+        entries.append([x, y, w, h, sy])
+        sy += h
+    return strip, entries
+
+def encode_frames(frames: List[np.ndarray], names: Optional[List[str]] = None, tile=TILE,
+                  keyframe_interval=0, max_dirty=MAX_DIRTY) -> bytes:
+    """Pack RGBA frames as an SPD1 animation"""
+    if not frames:
+        raise SpriteDeltaError("No frames to encode")
+    names = names or [f"{i + 1}.png" for i in range(len(frames))]
+    stack = stack_frames(frames)
+    _, height, width, _ = stack.shape
+    masks = dirty_masks(stack)
+
+    header = {"version": SPD_VERSION, "width": width, "height": height, "tile": tile, "frames": []}
+    payload = bytearray()
+    for i, (frame, name) in enumerate(zip(frames, names)):
+        entry = {"name": name, "size": [frame.shape[1], frame.shape[0]]}
+        rects = dirty_rects(masks[i - 1], tile) if i else None
+        key = (i == 0 or (keyframe_interval and i % keyframe_interval == 0)
+               or sum(r[2] * r[3] for r in rects) > max_dirty * width * height)
+        if key:
+            data = encode_png(stack[i])
+            entry.update(key=True, offset=len(payload), length=len(data))
+        elif rects:
+            strip, entries = patch_strip(stack[i], rects)
+            data = encode_png(strip)
+            entry.update(key=False, offset=len(payload), length=len(data), rects=entries)
+        else:
+            data = b""
+            entry.update(key=False, offset=0, length=0, rects=[])
+        payload.extend(data)
+        header["frames"].append(entry)
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % 4)
+    return SPD_MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes + bytes(payload)
+
+def read_header(blob: bytes) -> Tuple[dict, int]:
+    """Parsed header and the payload start offset"""
+    if blob[:4] != SPD_MAGIC:
+        raise SpriteDeltaError("Not an SPD1 file")
+    (header_len,) = struct.unpack_from("<I", blob, 4)
+    header = json.loads(blob[8:8 + header_len].decode("utf-8"))
+    if header.get("version") != SPD_VERSION:
+        raise SpriteDeltaError(f"Unsupported SPD version: {header.get('version')}")
+    return header, 8 + header_len
+
+def decode(blob: bytes) -> Tuple[dict, List[np.ndarray]]:
+    """Reference decoder: header and every frame cropped to its own size"""
+    header, base = read_header(blob)
+    canvas = np.zeros((header["height"], header["width"], 4), np.uint8)
+    frames = []
+    for entry in header["frames"]:
+        data = blob[base + entry["offset"]:base + entry["offset"] + entry["length"]]
+        if entry["key"]:
+            canvas = decode_png(data)
+        elif entry["rects"]:
+            strip = decode_png(data)
+            for x, y, w, h, sy in entry["rects"]:
+                canvas[y:y + h, x:x + w] = strip[sy:sy + h, :w]
+        w, h = entry["size"]
+        frames.append(canvas[:h, :w].copy())
+    return header, frames
+
+def encode_action(directory: Path, names: List[str], output: Path, verify=False,
+                  store: Optional[FrameStore] = None, **options) -> dict:
+    """Encode one action folder to `output`; returns byte counts for the report"""
+    frames = load_frames(directory, names, store)
+    blob = encode_frames(frames, names, **options)
+    atomic_write(output, blob)
+
+    header, _ = read_header(blob)
+    result = {
+        "directory": directory, "output": output, "frames": len(names),
+        "keyframes": sum(1 for f in header["frames"] if f["key"]),
+        "png_bytes": sum((directory / name).stat().st_size for name in names),
+        "spd_bytes": len(blob), "verified": None,
+    }
+    if verify:
+        _, decoded = decode(blob)
+        expected = stack_frames(frames)
+        result["verified"] = all(
+            np.array_equal(d, expected[i, :d.shape[0], :d.shape[1]]) and d.shape == f.shape
+            for i, (d, f) in enumerate(zip(decoded, frames)))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Encode action folders as delta-encoded SPD1 animations",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # One action, written next to its folder (../assets/sprites/player/Cat/idle.spd)
+  python sprite_delta.py encode --input ../assets/sprites/player/Cat/idle
+
+  # Every action under a tree, mirrored into another folder, with a lossless check
+  python sprite_delta.py encode --input ../assets/sprites --output temp_generated/delta --verify
+
+  # Frame table of an encoded animation
+  python sprite_delta.py info --input temp_generated/delta/player/Cat/idle.spd
+
+  # Encode from the memory-mapped frame store instead of decoding the PNGs
+  python sprite_delta.py encode --input ../assets/sprites --output temp_generated/delta --frame-store temp_generated/frame_store
+
+  # Back to PNG frames
+  python sprite_delta.py decode --input idle.spd --output temp_generated/idle_frames
+        """
+    )
+    parser.add_argument("command", choices=["encode", "decode", "info"], help="Action")
+    parser.add_argument("--input", "-i", type=str, required=True,
+                        help="Action folder or tree (encode), .spd file (decode, info)")
+    parser.add_argument("--output", "-o", type=str,
+                        help="Output folder (default: .spd next to each action folder; decode: required)")
+    parser.add_argument("--tile", type=int, default=TILE, help=f"Dirty cell size in pixels (default: {TILE})")
+    parser.add_argument("--keyframe-interval", type=int, default=0,
+                        help="Force a keyframe every N frames (default: 0, only the first)")
+    parser.add_argument("--max-dirty", type=float, default=MAX_DIRTY,
+                        help=f"Store a keyframe when rectangles cover more than this share "
+                             f"of the canvas (default: {MAX_DIRTY})")
+    parser.add_argument("--verify", action="store_true", help="Decode each file and compare with the source frames")
+    parser.add_argument("--jobs", "-j", type=int, default=4, help="Actions encoded in parallel (default: 4)")
+    parser.add_argument("--frame-store", type=str,
+                        help="Read source frames (encode) or write decoded frames through a memory-mapped frame store")
+
+    args = parser.parse_args()
+    source = Path(args.input)
+    store = FrameStore(args.frame_store) if args.frame_store else None
+    if not source.exists():
+        print(f"❌ Input not found: {source}")
+        sys.exit(1)
+
+    if args.command in ("info", "decode"):
+        try:
+            blob = source.read_bytes()
+            header, frames = decode(blob) if args.command == "decode" else (read_header(blob)[0], None)
+        except SpriteDeltaError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+
+        if args.command == "info":
+            print(f"\n{source}: {header['width']}x{header['height']}, {len(header['frames'])} frames, "
+                  f"{len(blob) / 1024:.1f} KB\n")
+            for entry in header["frames"]:
+                kind = "key" if entry["key"] else f"{len(entry['rects'])} rects"
+                area = sum(r[2] * r[3] for r in entry.get("rects", []))
+                share = 1.0 if entry["key"] else area / (header["width"] * header["height"])
+                print(f"  {entry['name']:<24} {kind:<10} {share:>6.1%}  {entry['length'] / 1024:>8.1f} KB")
+            print()
+            return
+
+        if not args.output:
+            print(f"❌ decode needs --output")
+            sys.exit(1)
+        out_dir = Path(args.output)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for entry, frame in zip(header["frames"], frames):
+            save_image(Image.fromarray(frame, "RGBA"), out_dir / entry["name"], "PNG")
+        if store is not None:
+            store.write(out_dir, [entry["name"] for entry in header["frames"]], frames)
+        print(f"✅ {len(frames)} frames → {out_dir}")
+        return
+
+    actions = list(scan_frame_dirs(source))
+    if not actions:
+        print(f"❌ No frame folders under {source}")
+        sys.exit(1)
+
+    def output_path(directory: Path) -> Path:
+        if not args.output:
+            return directory.parent / f"{directory.name}.spd"
+        relative = directory.relative_to(source) if directory != source else Path(directory.name)
+        return Path(args.output) / relative.parent / f"{relative.name}.spd"
+
+    print(f"\n{'='*70}")
+    print(f"🎞️  Sprite Delta Encoder")
+    print(f"{'='*70}")
+    print(f"Input:     {source}")
+    print(f"Actions:   {len(actions)}")
+    print(f"Tile:      {args.tile}px, keyframe when > {args.max_dirty:.0%} dirty"
+          f"{f', every {args.keyframe_interval} frames' if args.keyframe_interval else ''}")
+    print(f"{'='*70}\n")
+
+    options = {"tile": args.tile, "keyframe_interval": args.keyframe_interval, "max_dirty": args.max_dirty}
+    start = time.perf_counter()
+    with sync_batch(), ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = [pool.submit(encode_action, directory, names, output_path(directory), args.verify, store, **options)
+                   for directory, names in actions]
+        results = []
+        for future in futures:
+            r = future.result()
+            results.append(r)
+            check = {None: "", True: "  ✅ lossless", False: "  ❌ MISMATCH"}[r["verified"]]
+            print(f"  {str(r['output']):<56} {r['frames']:>3} frames, {r['keyframes']} key  "
+                  f"{r['png_bytes'] / 1024:>8.1f} → {r['spd_bytes'] / 1024:>7.1f} KB "
+                  f"({r['spd_bytes'] / r['png_bytes']:.0%}){check}")
+
+    png_total = sum(r["png_bytes"] for r in results)
+    spd_total = sum(r["spd_bytes"] for r in results)
+    print(f"\n{'='*70}")
+    print(f"✅ {len(results)} animations in {time.perf_counter() - start:.1f}s: "
+          f"{png_total / 1024 / 1024:.2f} MB PNG → {spd_total / 1024 / 1024:.2f} MB SPD "
+          f"({spd_total / png_total:.0%})")
+    print(f"{'='*70}\n")
+    if any(r["verified"] is False for r in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
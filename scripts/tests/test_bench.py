@@ -0,0 +1,61 @@
+"""
+pytest-benchmark cases for the asset pipeline
+素材管線 pytest-benchmark 測試
+
+Usage:
+    cd scripts
+    pytest tests/test_bench.py --benchmark-only
+    pytest tests/test_bench.py --benchmark-autosave          # store a baseline
+    pytest tests/test_bench.py --benchmark-compare           # compare with the last one
+"""
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from bench_pipeline import bench_batching, file_server, quiet, synthetic_frames, write_blob
+
+@pytest.fixture
+def frames(tmp_path):
+    src = tmp_path / "frames_in"
+    src.mkdir()
+    return synthetic_frames(src, 1, 256)
+
+def test_process_image(benchmark, frames, tmp_path):
+    pytest.importorskip("rembg")
+    from batch_remove_bg import process_image
+
+    target = tmp_path / "out.png"
+    with quiet():
+        ok = benchmark(process_image, frames[0], target)
+    assert ok
+    assert target.exists()
+
+@pytest.mark.parametrize("size_mb", [1, 8])
+def test_download_file(benchmark, tmp_path, size_mb):
+    from download_models import ModelDownloader
+
+    served = tmp_path / "served"
+    served.mkdir()
+    write_blob(served / "model.safetensors", size_mb)
+    target = tmp_path / "model.safetensors"
+    downloader = ModelDownloader()
+
+    def download():
+        if target.exists():
+            target.unlink()
+        return downloader.download_file(url, target, "bench", f"{size_mb}MB")
+
+    with file_server(served) as base_url, quiet():
+        url = f"{base_url}/model.safetensors"
+        ok = benchmark(download)
+    assert ok
+    assert target.stat().st_size == size_mb * 1024 * 1024
+
+@pytest.mark.parametrize("batch_size,n_iter", [(1, 1), (4, 1), (2, 2)])
+def test_webui_batching(benchmark, batch_size, n_iter):
+    result = benchmark.pedantic(bench_batching, args=(batch_size, n_iter, 4, 2, 0.02, 0.005),
+                                kwargs={"slots": 1}, rounds=3)
+    benchmark.extra_info["images_per_s"] = result["throughput"]
+    assert result["images"] == 4 * batch_size * n_iter
+    assert result["server_images"] == result["images"]
@@ -11,12 +11,16 @@ Usage:
 import argparse
 import sys
 from pathlib import Path
-import requests
 from typing import Dict, List
 
+from model_registry import DEFAULT_REGISTRY, ModelRegistry
+from model_store import DEFAULT_ROOT, STORE_DIR, add_store_arguments, human_size, layout_dir
+
 class SDPathVerifier:
-    def __init__(self):
-        self.base_path = Path("/mnt/c/AI_LLM_projects/ai_warehouse/models")
+    def __init__(self, base_path=None, registry=None):
+        self.base_path = Path(base_path or DEFAULT_ROOT)
+        # Recommended models come from model_registry.json, shared with download_models.py
+        self.registry = registry or ModelRegistry()
         self.errors = []
         self.warnings = []
         self.successes = []
@@ -50,7 +54,7 @@ class SDPathVerifier:
         print("📦 Checking Checkpoint Models")
         print("="*70)
 
-        ckpt_path = self.base_path / "stable-diffusion" / "checkpoints"
+        ckpt_path = layout_dir("warehouse", "checkpoint", self.base_path)
 
         if not self.verify_directory(ckpt_path, "Checkpoints", required=True):
             return False
@@ -70,8 +74,9 @@ class SDPathVerifier:
             print(f"   📄 {model_file.name:<40} ({size_mb:>7.1f} MB)")
 
             # Check recommended model
-            if "AnythingXL" in model_file.name or "anything" in model_file.name.lower():
-                print(f"      ⭐ Recommended for project")
+            entry = self.registry.recommended("checkpoint", model_file.name)
+            if entry and entry.priority == 1:
+                print(f"      ⭐ {entry.note}")
 
         for model_file in sorted(ckpt_path.glob("*.ckpt")):
             size_mb = model_file.stat().st_size / (1024 * 1024)
@@ -86,7 +91,7 @@ class SDPathVerifier:
         print("🎨 Checking LoRA Models")
         print("="*70)
 
-        lora_path = self.base_path / "stable-diffusion" / "lora"
+        lora_path = layout_dir("warehouse", "lora", self.base_path)
 
         if not self.verify_directory(lora_path, "LoRA", required=False):
             print("\n⚠️  No LoRA directory found (optional)")
@@ -119,7 +124,7 @@ class SDPathVerifier:
         print("🖼️  Checking VAE Models")
         print("="*70)
 
-        vae_path = self.base_path / "stable-diffusion" / "vae"
+        vae_path = layout_dir("warehouse", "vae", self.base_path)
 
         if not self.verify_directory(vae_path, "VAE", required=False):
             print("\n⚠️  No VAE directory found (optional)")
@@ -132,15 +137,17 @@ class SDPathVerifier:
         if count == 0:
             self.warnings.append("⚠️  No VAE models found (recommended)")
             print("\n⚠️  No VAE models found")
-            print("   Recommended: sdxl_vae.safetensors")
+            for entry in self.registry.by_kind("vae", priority_only=True):
+                print(f"   Recommended: {entry.filename}")
         else:
             print(f"\n✅ Found {count} VAE model(s):\n")
             for vae_file in sorted(vae_path.glob("*.safetensors")):
                 size_mb = vae_file.stat().st_size / (1024 * 1024)
                 print(f"   📄 {vae_file.name:<40} ({size_mb:>6.1f} MB)")
 
-                if "sdxl" in vae_file.name.lower():
-                    print(f"      ⭐ Recommended for SDXL models")
+                entry = self.registry.recommended("vae", vae_file.name)
+                if entry:
+                    print(f"      ⭐ {entry.note}")
 
             self.successes.append(f"✅ VAE: {count} models found")
 
@@ -152,15 +159,14 @@ class SDPathVerifier:
         print("🎯 Checking ControlNet Models")
         print("="*70)
 
-        cn_path = self.base_path / "controlnet"
+        cn_path = layout_dir("warehouse", "controlnet", self.base_path)
 
         if not self.verify_directory(cn_path, "ControlNet", required=False):
             print("\n⚠️  No ControlNet directory found")
-            print("   Create with: mkdir -p /mnt/c/AI_LLM_projects/ai_warehouse/models/controlnet")
+            print(f"   Create with: mkdir -p {cn_path}")
             print("\n   Recommended ControlNet models for SDXL:")
-            print("   - OpenPoseXL2.safetensors (pose control)")
-            print("   - sai_xl_canny_256lora.safetensors (edge detection)")
-            print("   - sai_xl_depth_256lora.safetensors (depth map)")
+            for entry in self.registry.by_kind("controlnet"):
+                print(f"   - {entry.filename} ({entry.label})")
             return True
 
         count = self.count_files(cn_path, [".safetensors", ".pth"])
@@ -173,28 +179,54 @@ class SDPathVerifier:
         else:
             print(f"\n✅ Found {count} ControlNet model(s):\n")
 
-            recommended = ["openpose", "canny", "depth", "sketch"]
-
             for cn_file in sorted(cn_path.glob("*.safetensors")):
                 size_mb = cn_file.stat().st_size / (1024 * 1024)
                 print(f"   📄 {cn_file.name:<40} ({size_mb:>6.1f} MB)")
 
                 # Check if it's recommended
-                for rec in recommended:
-                    if rec in cn_file.name.lower():
-                        print(f"      ⭐ Essential for character pose control")
-                        break
+                entry = self.registry.recommended("controlnet", cn_file.name)
+                if entry:
+                    print(f"      ⭐ {entry.note}")
 
             self.successes.append(f"✅ ControlNet: {count} models found")
 
         return True
 
+    def verify_store(self) -> bool:
+        """Report the deduplicating model store, if the warehouse uses one"""
+        if not (self.base_path / STORE_DIR / "index.db").exists():
+            return True
+
+        from model_store import ModelStore
+
+        print("\n" + "="*70)
+        print("🗃️  Checking Model Store")
+        print("="*70)
+
+        store = ModelStore(self.base_path)
+        blobs = store.blobs()
+        links = store.links()
+        missing = [b for b in blobs if not store.has(b["sha256"])]
+        linked_bytes = sum(b["size"] * max(1, len(store.links(b["sha256"]))) for b in blobs)
+        stored_bytes = sum(b["size"] for b in blobs)
+        store.close()
+
+        print(f"\n✅ {len(blobs)} stored model(s), {len(links)} link(s)")
+        print(f"   On disk: {human_size(stored_bytes)} (would be {human_size(linked_bytes)} as copies)")
+        if missing:
+            self.errors.append(f"❌ Model store: {len(missing)} blob(s) missing from disk")
+            return False
+        self.successes.append(f"✅ Model store: {len(blobs)} models, {human_size(linked_bytes - stored_bytes)} saved")
+        return True
+
     def verify_webui_connection(self, url: str = "http://127.0.0.1:7860") -> bool:
         """Verify WebUI is running and accessible"""
         print("\n" + "="*70)
         print("🌐 Checking WebUI Connection")
         print("="*70)
 
+        import requests
+
         try:
             # Test basic connection
             response = requests.get(f"{url}", timeout=5)
@@ -220,7 +252,7 @@ class SDPathVerifier:
                     print(f"   ✓ {title}")
 
                     # Check if custom models are loaded
-                    if any(name in title.lower() for name in ['anything', 'disney', 'pixar']):
+                    if self.registry.recommended("checkpoint", title):
                         print(f"     🎉 Custom model detected!")
 
                 self.successes.append("✅ WebUI API: Connected")
@@ -290,6 +322,7 @@ class SDPathVerifier:
         self.verify_lora()
         self.verify_vae()
         self.verify_controlnet()
+        self.verify_store()
 
         if check_webui:
             self.verify_webui_connection()
@@ -318,10 +351,13 @@ Examples:
                        help="Also check if WebUI is running and accessible")
     parser.add_argument("--url", type=str, default="http://127.0.0.1:7860",
                        help="WebUI URL (default: http://127.0.0.1:7860)")
+    parser.add_argument("--registry", type=str, default=DEFAULT_REGISTRY,
+                       help="Model registry JSON (default: model_registry.json)")
+    add_store_arguments(parser)
 
     args = parser.parse_args()
 
-    verifier = SDPathVerifier()
+    verifier = SDPathVerifier(base_path=args.root, registry=ModelRegistry(args.registry))
     success = verifier.run_full_verification(check_webui=args.check_webui)
 
     print("\n" + "="*70)